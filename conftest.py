@@ -4,3 +4,146 @@
 # All rights reserved.
 #
 # SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+
+import httpx
+import pytest
+
+from podcast_charts import models
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.backends.hedging import reset_latency_windows
+from podcast_charts.backends.ratelimit import reset_rate_limiters
+from podcast_charts.models import (
+    ChartCategory,
+    ChartCountry,
+    ChartSourceCategory,
+    PodcastChart,
+    PodcastChartVersion,
+)
+from podcast_charts.tasks import persist_chart_positions
+
+
+@pytest.fixture(autouse=True)
+def clean_rate_limiters():
+    reset_rate_limiters()
+    reset_latency_windows()
+    yield
+    reset_rate_limiters()
+    reset_latency_windows()
+
+
+@pytest.fixture
+def chart_country(db):
+    return ChartCountry.objects.create(country="us")
+
+
+@pytest.fixture
+def chart_category(db):
+    return ChartCategory.objects.create(label="Comedy")
+
+
+@pytest.fixture
+def source_category(chart_category):
+    return ChartSourceCategory.objects.create(
+        chart_category=chart_category, chart_source_category_remote_id="1303"
+    )
+
+
+@pytest.fixture
+def podcast_chart(source_category, chart_country):
+    chart = PodcastChart.objects.create(
+        chart_source_category=source_category,
+        chart_remote_id="top-podcasts-comedy",
+    )
+    chart.enabled_countries.add(chart_country)
+    return chart
+
+
+@pytest.fixture
+def store_chart_version():
+    """
+    Store a finished chart version from podcast ids in rank order.
+
+    Storing the same chart, country and day again replaces its ranking.
+    """
+
+    def store(podcast_chart, country, day: int, podcast_ids: list[str]):
+        version, _ = PodcastChartVersion.objects.get_or_create(
+            podcast_chart=podcast_chart,
+            country=country,
+            chart_date=datetime.date(2024, 12, day),
+            defaults={"chart_remote_id": podcast_chart.chart_remote_id},
+        )
+        persist_chart_positions(
+            version,
+            [
+                ChartPositionData(
+                    podcast_id=pid, position=rank, podcast_title=f"P{pid}"
+                )
+                for rank, pid in enumerate(podcast_ids, start=1)
+            ],
+        )
+        return version
+
+    return store
+
+
+class FakeBackend:
+    base_url = "https://charts.example.com"
+    errors: dict[str, Exception] = {}
+
+    def __init__(self, client=None):
+        self.client = client
+
+    async def fetch_raw(self, remote_chart_id, country):
+        if country in self.errors:
+            raise self.errors[country]
+        return f"{country}:100:First,200:"
+
+    async def parse_chart(self, body, *, filter_to_podcast_ids):
+        return [
+            ChartPositionData(
+                podcast_id=podcast_id, position=position, podcast_title=title or None
+            )
+            for position, (podcast_id, title) in enumerate(
+                (entry.split(":") for entry in body.split(":", 1)[1].split(",")),
+                start=1,
+            )
+        ]
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    FakeBackend.errors = {}
+    monkeypatch.setitem(
+        models.SOURCE_BACKEND_MAPPING, models.SourceBackendChoices.APPLE, FakeBackend
+    )
+    return FakeBackend
+
+
+@pytest.fixture
+def mock_transport(monkeypatch):
+    """
+    Route every httpx.AsyncClient created by the app through a MockTransport.
+
+    Set `handler` on the returned object to control responses.
+    """
+
+    class MockRoutes:
+        handler = None
+        requests: list[httpx.Request] = []
+
+        def __call__(self, request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return self.handler(request)
+
+    routes = MockRoutes()
+    routes.requests = []
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        httpx,
+        "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(routes), **kwargs),
+    )
+    return routes
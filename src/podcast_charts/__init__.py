@@ -11,6 +11,8 @@ from podcast_charts.backends import (
     AppleChartFetchError,
     ChartFetchError,
     ChartParseError,
+    ChartRateLimitedError,
+    ChartSourceUnavailableError,
     PodcastSearchError,
 )
 from podcast_charts.exceptions import (
@@ -26,7 +28,9 @@ __all__ = [
     "ChartFetchError",
     "ChartImproperlyConfiguredError",
     "ChartParseError",
+    "ChartRateLimitedError",
     "ChartSourceNotSupportedError",
+    "ChartSourceUnavailableError",
     "ChartStatusInvalidError",
     "PodcastSearchError",
 ]
@@ -8,16 +8,26 @@
 """Admin registration objects for podcast_charts"""
 
 from django.contrib import admin
+from django.db.models import QuerySet
+from django.http import HttpRequest
 
 from podcast_charts.models import (
     ChartCategory,
     ChartCountry,
+    ChartFetchSchedule,
+    ChartPowerScore,
     ChartSourceCategory,
+    FetchRun,
+    FetchRunTiming,
+    NotificationSubscriber,
     PodcastChart,
     PodcastChartPodcastIdentifier,
     PodcastChartPosition,
+    PodcastChartStats,
     PodcastChartVersion,
+    PodcastSubscription,
 )
+from podcast_charts.search import search_podcast_identifiers
 
 
 @admin.register(ChartCountry)
@@ -27,7 +37,9 @@ class ChartCountryAdmin(admin.ModelAdmin):
 
 @admin.register(ChartCategory)
 class ChartCategoryAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["label", "parent_label", "depth"]
+    list_select_related = ["parent_label"]
+    search_fields = ["label"]
 
 
 @admin.register(ChartSourceCategory)
@@ -52,4 +64,110 @@ class PodcastChartPositionAdmin(admin.ModelAdmin):
 
 @admin.register(PodcastChartPodcastIdentifier)
 class PodcastChartPodcastIdentifierAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["podcast_title", "chart_source", "chart_source_podcast_id"]
+    list_filter = ["chart_source"]
+    search_fields = ["podcast_title", "chart_source_podcast_id"]
+
+    def get_search_results(
+        self,
+        request: HttpRequest,
+        queryset: QuerySet[PodcastChartPodcastIdentifier],
+        search_term: str,
+    ) -> tuple[QuerySet[PodcastChartPodcastIdentifier], bool]:
+        """Search by title similarity instead of a full table `icontains` scan."""
+        if not search_term or search_term.isdigit():
+            return super().get_search_results(request, queryset, search_term)
+        matches = search_podcast_identifiers(search_term, limit=200)
+        return queryset.filter(
+            id__in=[match.podcast_identifier.id for match in matches]
+        ), False
+
+
+@admin.register(PodcastChartStats)
+class PodcastChartStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        "podcast_identifier",
+        "podcast_chart",
+        "country",
+        "best_position",
+        "last_position",
+        "current_streak",
+        "days_on_chart",
+    ]
+    list_filter = ["country"]
+    list_select_related = ["podcast_identifier", "podcast_chart", "country"]
+
+
+class PodcastSubscriptionInline(admin.TabularInline):
+    model = PodcastSubscription
+    autocomplete_fields = ["podcast_identifier"]
+    extra = 0
+
+
+@admin.register(NotificationSubscriber)
+class NotificationSubscriberAdmin(admin.ModelAdmin):
+    list_display = ["name", "endpoint", "enabled"]
+    list_filter = ["enabled"]
+    inlines = [PodcastSubscriptionInline]
+
+
+@admin.register(ChartFetchSchedule)
+class ChartFetchScheduleAdmin(admin.ModelAdmin):
+    list_display = [
+        "podcast_chart",
+        "country",
+        "next_fetch_at",
+        "poll_interval",
+        "last_changed_at",
+        "changes",
+        "checks",
+    ]
+    list_filter = ["country"]
+    list_select_related = ["podcast_chart", "country"]
+
+
+class FetchRunTimingInline(admin.TabularInline):
+    model = FetchRunTiming
+    fields = [
+        "podcast_chart",
+        "country",
+        "fetch_status",
+        "http_seconds",
+        "parse_seconds",
+        "store_seconds",
+        "response_bytes",
+        "rows_written",
+    ]
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+
+
+@admin.register(FetchRun)
+class FetchRunAdmin(admin.ModelAdmin):
+    list_display = [
+        "started_at",
+        "finished_at",
+        "attempted",
+        "succeeded",
+        "retried",
+        "failed",
+        "rows_written",
+    ]
+    date_hierarchy = "started_at"
+    inlines = [FetchRunTimingInline]
+
+
+@admin.register(ChartPowerScore)
+class ChartPowerScoreAdmin(admin.ModelAdmin):
+    list_display = [
+        "chart_date",
+        "rank",
+        "podcast_identifier",
+        "score",
+        "appearances",
+        "best_position",
+    ]
+    list_select_related = ["podcast_identifier"]
+    date_hierarchy = "chart_date"
+    autocomplete_fields = ["podcast_identifier"]
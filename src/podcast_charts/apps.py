@@ -15,3 +15,6 @@ class PodcastChartsConfig(AppConfig):
     name = "podcast_charts"
     verbose_name = _("Podcast Charts")
     default_auto_field = "django.db.models.AutoField"
+
+    def ready(self) -> None:
+        import podcast_charts.receivers  # noqa: F401
@@ -0,0 +1,86 @@
+# archive.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Optional archive of raw chart responses.
+
+When `CHART_ARCHIVE_RESPONSES` is enabled, the fetch pipeline stores every chart
+body it parses as a [ChartResponseArchive][podcast_charts.models.ChartResponseArchive]
+so that positions can later be rebuilt with the `reparse_chart_archives` command
+without another trip to the chart source.
+"""
+
+import hashlib
+from collections.abc import Iterable
+
+from django.conf import settings
+
+from podcast_charts.backends.parsing import compress_body, decompress_body
+from podcast_charts.models import ChartResponseArchive
+
+
+def archive_enabled() -> bool:
+    """
+    Returns:
+        bool: Whether raw chart responses should be archived.
+    """
+    return bool(getattr(settings, "CHART_ARCHIVE_RESPONSES", False))
+
+
+def get_content_hash(body: str) -> str:
+    """
+    Args:
+        body (str): The response body.
+
+    Returns:
+        str: The SHA-256 hex digest of the UTF-8 encoded body.
+    """
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def store_chart_responses(
+    chart_source: str, bodies: Iterable[str]
+) -> dict[str, ChartResponseArchive]:
+    """
+    Archive response bodies, skipping any whose content is already stored.
+
+    Args:
+        chart_source (str): The source backend the responses came from.
+        bodies (Iterable[str]): The response bodies.
+
+    Returns:
+        dict[str, ChartResponseArchive]: The archive records keyed by content hash.
+    """
+    archives = {}
+    for body in bodies:
+        content_hash = get_content_hash(body)
+        if content_hash not in archives:
+            archives[content_hash] = ChartResponseArchive(
+                content_hash=content_hash,
+                chart_source=chart_source,
+                body=compress_body(body),
+                body_size=len(body.encode("utf-8")),
+            )
+    if not archives:
+        return {}
+    ChartResponseArchive.objects.bulk_create(
+        archives.values(), batch_size=100, ignore_conflicts=True
+    )
+    return ChartResponseArchive.objects.defer("body").in_bulk(
+        archives.keys(), field_name="content_hash"
+    )
+
+
+def load_chart_response(archive: ChartResponseArchive) -> str:
+    """
+    Args:
+        archive (ChartResponseArchive): The archive record.
+
+    Returns:
+        str: The original response body.
+    """
+    return decompress_body(bytes(archive.body))
@@ -8,7 +8,11 @@
 """Backends for podcast charts"""
 
 import dataclasses
-from typing import ClassVar, Protocol
+from collections.abc import Callable
+from typing import TYPE_CHECKING, ClassVar, Protocol
+
+if TYPE_CHECKING:  # no cov
+    from podcast_charts.backends.parsing import CompactChart
 
 
 class PodcastNotFoundError(Exception):
@@ -49,6 +53,27 @@ class AppleChartFetchError(ChartFetchError):
     pass
 
 
+class ChartRateLimitedError(ChartFetchError):
+    """
+    Used when the chart source asks us to slow down.
+
+    Attributes:
+        retry_after (float | None): Seconds the source asked us to wait, if known.
+    """
+
+    def __init__(self, *args: object, retry_after: float | None = None) -> None:
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
+class ChartSourceUnavailableError(ChartRateLimitedError):
+    """
+    Used when requests to a chart source are suspended because it appears to be down.
+    """
+
+    pass
+
+
 class ChartParseError(Exception):
     """
     Used when we can't parse the chart data.
@@ -71,6 +96,17 @@ class PodcastData:
     backend_url: str | None
 
 
+@dataclasses.dataclass
+class SourceCategoryData:
+    """
+    One category in a chart source's genre hierarchy.
+    """
+
+    label: str
+    remote_id: str
+    parent_remote_id: str | None = None
+
+
 @dataclasses.dataclass
 class ChartIdReturnValue:
     """
@@ -91,6 +127,8 @@ class ChartPositionData:
 
 class ChartBackend(Protocol):
     base_url: ClassVar[str]
+    # A picklable function that parses a raw chart body into a CompactChart.
+    chart_parser: ClassVar[Callable[[str, list[str]], "CompactChart"]]
 
     async def get_remote_podcast_data(
         self,
@@ -99,12 +137,22 @@ class ChartBackend(Protocol):
         podcast_id: str | None = None,
     ) -> PodcastData: ...
 
+    async def lookup_podcasts(self, podcast_ids: list[str]) -> list[PodcastData]: ...
+
     async def get_chart_id_for_category(
         self,
         category_id: str,
         country: str | None = None,
     ) -> ChartIdReturnValue: ...
 
+    async def get_category_tree(self) -> list[SourceCategoryData]: ...
+
+    async def fetch_raw(self, remote_chart_id: str, country: str) -> str: ...
+
+    async def parse_chart(
+        self, body: str, *, filter_to_podcast_ids: list[str] | None
+    ) -> list[ChartPositionData]: ...
+
     async def fetch(
         self,
         remote_chart_id: str,
@@ -5,7 +5,10 @@
 #
 # SPDX-License-Identifier: BSD-3-Clause
 
+import collections
+import contextlib
 import logging
+from collections.abc import AsyncIterator
 from typing import Any
 
 import httpx
@@ -22,13 +25,123 @@ from podcast_charts.backends import (
     PodcastData,
     PodcastNotFoundError,
     PodcastSearchError,
+    SourceCategoryData,
 )
+from podcast_charts.backends.hedging import hedged_get
+from podcast_charts.backends.parsing import CompactChart, run_parser
+from podcast_charts.backends.ratelimit import limited_get
+from podcast_charts.normalize import title_similarity
 
 logger = logging.getLogger(__name__)
 
+ITUNES_LOOKUP_URL = "https://itunes.apple.com/lookup"
+ITUNES_GENRES_URL = "https://itunes.apple.com/WebObjects/MZStoreServices.woa/ws/genres"
+# The top level iTunes genre that every podcast category descends from.
+ITUNES_PODCASTS_GENRE_ID = "26"
+
+# The iTunes lookup API accepts many comma separated ids, but very long urls are
+# rejected, so keep batches to a size known to work.
+ITUNES_LOOKUP_MAX_IDS = 200
+
+
+def parse_apple_chart_html(html: str, podcast_apple_ids: list[str]) -> CompactChart:
+    """
+    Parse an Apple Podcasts room page into compact chart positions.
+
+    This runs in a parse worker, so it only returns plain data.
+
+    Args:
+        html (str): The body of the room page.
+        podcast_apple_ids (list[str]): Optional podcast ids to filter against.
+
+    Returns:
+        CompactChart: The chart positions found.
+
+    Raises:
+        ChartParseError: If the chart list cannot be found.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    return CompactChart.from_positions(
+        ApplePodcastsChartBackend._extract_apple_chart_positions_from_soup(
+            soup, podcast_apple_ids
+        )
+    )
+
+
+def parse_apple_chart_id_html(html: str) -> ChartIdReturnValue:
+    """
+    Parse the chart id out of an Apple Podcasts genre page.
+
+    Args:
+        html (str): The body of the genre page.
+
+    Returns:
+        ChartIdReturnValue: The chart id for the genre.
+
+    Raises:
+        ChartParseError: If the chart link cannot be found.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    return ApplePodcastsChartBackend._extract_chart_id_from_soup(soup)
+
+
+def parse_itunes_genres_json(
+    data: dict[str, Any], root_id: str = ITUNES_PODCASTS_GENRE_ID
+) -> list[SourceCategoryData]:
+    """
+    Flatten the nested iTunes genres response into a list of categories.
+
+    Args:
+        data (dict[str, Any]): The decoded genres response.
+        root_id (str): The id of the genre the response was requested for.
+
+    Returns:
+        list[SourceCategoryData]: Every genre in the tree, parents before children.
+
+    Raises:
+        ChartParseError: If the root genre is missing from the response.
+    """
+    root = data.get(root_id)
+    if not isinstance(root, dict):
+        msg = f"Genre {root_id} was not found in the iTunes genres response."
+        raise ChartParseError(msg)
+    categories = []
+    pending: collections.deque[tuple[dict[str, Any], str | None]] = collections.deque(
+        [(root, None)]
+    )
+    while pending:
+        genre, parent_id = pending.popleft()
+        remote_id = str(genre["id"])
+        categories.append(
+            SourceCategoryData(
+                label=genre["name"], remote_id=remote_id, parent_remote_id=parent_id
+            )
+        )
+        pending.extend(
+            (subgenre, remote_id) for subgenre in genre.get("subgenres", {}).values()
+        )
+    return categories
+
 
 class ApplePodcastsChartBackend(ChartBackend):
     base_url = "https://podcasts.apple.com"
+    chart_parser = staticmethod(parse_apple_chart_html)
+
+    def __init__(self, client: httpx.AsyncClient | None = None) -> None:
+        """
+        Args:
+            client (httpx.AsyncClient | None): A shared client to reuse across
+                requests. If omitted, a client is created for each request.
+        """
+        self.client = client
+
+    @contextlib.asynccontextmanager
+    async def _get_client(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self.client is not None:
+            yield self.client
+        else:
+            async with httpx.AsyncClient() as client:
+                yield client
 
     @staticmethod
     def _form_podcast_data_from_itunes_podcast_json(
@@ -45,14 +158,14 @@ class ApplePodcastsChartBackend(ChartBackend):
             index_num += 1
         return PodcastData(
             podcast_title=podcast["trackName"],
-            podcast_id=podcast["trackId"],
+            podcast_id=str(podcast["trackId"]),
             categories=categories,
             backend_url=podcast["trackViewUrl"],
         )
 
     @staticmethod
     def _extract_chart_id_from_soup(soup: BeautifulSoup) -> ChartIdReturnValue:
-        kwargs = {"data-testId": "header-title"}
+        kwargs = {"data-testid": "header-title"}
         header_element = soup.find(name="h2", attrs=kwargs)
         if header_element is None:
             msg = "Could not find the room link element in html body."
@@ -86,7 +199,9 @@ class ApplePodcastsChartBackend(ChartBackend):
                 logger.error(f"Could not parse podcast at position {position}")
             else:
                 podcast_url = link["href"]
-                podcast_id = podcast_url.rsplit("/id", max_splits=1)[0]
+                podcast_id = podcast_url.split("?", maxsplit=1)[0].rsplit(
+                    "/id", maxsplit=1
+                )[-1]
                 if (
                     len(podcast_apple_ids) > 0 and podcast_id in podcast_apple_ids
                 ) or len(podcast_apple_ids) == 0:
@@ -132,32 +247,85 @@ class ApplePodcastsChartBackend(ChartBackend):
             "attribute": "titleTerm",
         }
         try:
-            async with httpx.AsyncClient(headers=headers) as client:
-                response = await client.get(itunes_search_url, params=params)
+            async with self._get_client() as client:
+                response = await limited_get(
+                    client, itunes_search_url, params=params, headers=headers
+                )
                 response.raise_for_status()
         except httpx.HTTPStatusError as hse:
             msg = f"Received invalid status code from ITunes search API: {hse}"
             raise PodcastSearchError(msg) from hse
+        except httpx.TransportError as te:
+            msg = f"Could not reach ITunes search API: {te}"
+            raise PodcastSearchError(msg) from te
         data = response.json()
-        if data["num_results"] == 0:
+        results = data.get("results", [])
+        if not results:
             msg = "Received 0 results for podcast!"
             raise PodcastNotFoundError(msg)
-        elif data["num_results"] == 1:
-            return self._form_podcast_data_from_itunes_podcast_json(data["results"][0])
-        elif data["num_results"] > 1 and (podcast_rss is None and podcast_id is None):
+        if len(results) == 1:
+            return self._form_podcast_data_from_itunes_podcast_json(results[0])
+        for podcast in results:
+            if (podcast_id is not None and str(podcast["trackId"]) == podcast_id) or (
+                podcast_rss is not None and podcast.get("feedUrl") == podcast_rss
+            ):
+                return self._form_podcast_data_from_itunes_podcast_json(podcast)
+        exact_matches = [
+            podcast
+            for podcast in results
+            if title_similarity(podcast_title, podcast.get("trackName", "")) == 1.0
+        ]
+        if len(exact_matches) == 1:
+            return self._form_podcast_data_from_itunes_podcast_json(exact_matches[0])
+        if podcast_rss is None and podcast_id is None:
             msg = (
-                f"Received {data['num_results']} records from remote server, but no "
+                f"Received {len(results)} records from remote server, but no "
                 f"rss feed or id is available to narrow results."
             )
             raise MultiplePodcastsFoundError(msg)
-        else:
-            for podcast in data["results"]:
-                if (podcast_id is not None and podcast["trackId"] == podcast_id) or (
-                    podcast_rss is not None and podcast["feedUrl"] == podcast_rss
-                ):
-                    return self._form_podcast_data_from_itunes_podcast_json(podcast)
-            msg = "Podcast was not found in results!"
-            raise PodcastNotFoundError(msg)
+        msg = "Podcast was not found in results!"
+        raise PodcastNotFoundError(msg)
+
+    async def lookup_podcasts(self, podcast_ids: list[str]) -> list[PodcastData]:
+        """
+        Look up many podcasts at once by their remote ids.
+
+        Args:
+            podcast_ids (list[str]): Up to `ITUNES_LOOKUP_MAX_IDS` iTunes podcast ids.
+
+        Returns:
+            list[PodcastData]: The podcasts that were found. Ids that Apple does not
+                know about are omitted.
+
+        Raises:
+            PodcastSearchError: If the iTunes lookup API responds with an error.
+            ChartRateLimitedError: If Apple is throttling requests.
+            ValueError: If too many ids are requested at once.
+        """
+        if len(podcast_ids) > ITUNES_LOOKUP_MAX_IDS:
+            msg = f"Cannot look up more than {ITUNES_LOOKUP_MAX_IDS} podcasts at once."
+            raise ValueError(msg)
+        if not podcast_ids:
+            return []
+        params = {"id": ",".join(podcast_ids), "entity": "podcast"}
+        headers = {"Accept": "application/json"}
+        try:
+            async with self._get_client() as client:
+                response = await limited_get(
+                    client, ITUNES_LOOKUP_URL, params=params, headers=headers
+                )
+                response.raise_for_status()
+        except httpx.HTTPStatusError as hse:
+            msg = f"Received invalid status code from ITunes lookup API: {hse}"
+            raise PodcastSearchError(msg) from hse
+        except httpx.TransportError as te:
+            msg = f"Could not reach ITunes lookup API: {te}"
+            raise PodcastSearchError(msg) from te
+        return [
+            self._form_podcast_data_from_itunes_podcast_json(result)
+            for result in response.json().get("results", [])
+            if result.get("kind") == "podcast"
+        ]
 
     async def get_chart_id_for_category(
         self,
@@ -179,21 +347,112 @@ class ApplePodcastsChartBackend(ChartBackend):
             AppleChartFetchError: If the information cannot be retrieved.
         """
         category_url = f"{self.base_url}/us/genre/{category_id}"
-        async with httpx.AsyncClient() as client:
+        async with self._get_client() as client:
             try:
-                response = await client.get(category_url)
+                response = await limited_get(client, category_url)
                 response.raise_for_status()
             except httpx.HTTPStatusError as hse:
                 msg = f"Received invalid status code from Apple Podcasts: {hse}"
                 raise AppleChartFetchError(msg) from hse
-            category_soup = BeautifulSoup(response.text)
+            except httpx.TransportError as te:
+                msg = f"Could not reach Apple Podcasts: {te}"
+                raise AppleChartFetchError(msg) from te
             try:
-                chart_id = self._extract_chart_id_from_soup(category_soup)
+                chart_id = await run_parser(parse_apple_chart_id_html, response.text)
             except ChartParseError as cpe:
                 msg = str(cpe)
                 raise AppleChartFetchError(msg) from cpe
             return chart_id
 
+    async def get_category_tree(
+        self, root_id: str = ITUNES_PODCASTS_GENRE_ID
+    ) -> list[SourceCategoryData]:
+        """
+        Fetch the whole podcast genre hierarchy in a single request.
+
+        Args:
+            root_id (str): The genre to fetch the tree below.
+
+        Returns:
+            list[SourceCategoryData]: Every genre, parents before children.
+
+        Raises:
+            AppleChartFetchError: If the genres cannot be retrieved or parsed.
+        """
+        headers = {"Accept": "application/json"}
+        async with self._get_client() as client:
+            try:
+                response = await limited_get(
+                    client, ITUNES_GENRES_URL, params={"id": root_id}, headers=headers
+                )
+                response.raise_for_status()
+            except httpx.HTTPStatusError as hse:
+                msg = f"Received invalid status code from ITunes genres API: {hse}"
+                raise AppleChartFetchError(msg) from hse
+            except httpx.TransportError as te:
+                msg = f"Could not reach ITunes genres API: {te}"
+                raise AppleChartFetchError(msg) from te
+        try:
+            return parse_itunes_genres_json(response.json(), root_id)
+        except (ValueError, KeyError, ChartParseError) as err:
+            msg = f"Could not parse ITunes genres response: {err}"
+            raise AppleChartFetchError(msg) from err
+
+    async def fetch_raw(self, remote_chart_id: str, country: str) -> str:
+        """
+        Fetch the raw room page for a chart from Apple Podcasts.
+
+        Args:
+            remote_chart_id (str): The remote chart id to fetch the data from.
+            country (str): The country code to use for fetching the market data.
+
+        Returns:
+            str: The body of the chart page.
+
+        Raises:
+            AppleChartFetchError: If the remote chart could not be fetched.
+            ChartRateLimitedError: If Apple is throttling requests or the circuit
+                for Apple Podcasts is open.
+            NotImplementedError: If the chart request is not implemented.
+        """
+        if country == "all":
+            msg = "Getting worldwide charts via Apple Podcasts is not supported."
+            raise NotImplementedError(msg)
+        url = f"{self.base_url}/{country}/room/{remote_chart_id}"
+        async with self._get_client() as client:
+            try:
+                response = await hedged_get(client, url, key=country)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as hse:
+                msg = f"Received invalid status code from Apple Podcasts: {hse}"
+                raise AppleChartFetchError(msg) from hse
+            except httpx.TransportError as te:
+                msg = f"Could not reach Apple Podcasts: {te}"
+                raise AppleChartFetchError(msg) from te
+        return response.text
+
+    async def parse_chart(
+        self, body: str, *, filter_to_podcast_ids: list[str] | None
+    ) -> list[ChartPositionData]:
+        """
+        Parse a room page previously retrieved with `fetch_raw`.
+
+        Args:
+            body (str): The body of the chart page.
+            filter_to_podcast_ids (list[str] | None): An optional list of podcast ids to
+                filter the results against.
+
+        Returns:
+            list[ChartPositionData]: The chart positions found in the page.
+
+        Raises:
+            ChartParseError: If the page could not be parsed.
+        """
+        compact_chart = await run_parser(
+            self.chart_parser, body, filter_to_podcast_ids or []
+        )
+        return compact_chart.to_positions()
+
     async def fetch(
         self,
         remote_chart_id: str,
@@ -215,23 +474,10 @@ class ApplePodcastsChartBackend(ChartBackend):
 
         Raises:
             AppleChartFetchError: If the remote chart could not be fetched.
+            ChartParseError: If the chart page could not be parsed.
+            ChartRateLimitedError: If Apple is throttling requests or the circuit
+                for Apple Podcasts is open.
             NotImplementedError: If the chart request is not implemented.
         """
-        if country == "all":
-            msg = "Getting worldwide charts via Apple Podcasts is not supported."
-            raise NotImplementedError(msg)
-        if filter_to_podcast_ids is None:
-            filter_to_podcast_ids = []
-        url = f"{self.base_url}/{country}/room/{remote_chart_id}"
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url)
-                response.raise_for_status()
-            except httpx.HTTPStatusError as hse:
-                msg = f"Received invalid status code from Apple Podcasts: {hse}"
-                raise AppleChartFetchError(msg) from hse
-        chart_soup = BeautifulSoup(response.text)
-        chart_positions = self._extract_apple_chart_positions_from_soup(
-            chart_soup, podcast_apple_ids=filter_to_podcast_ids
-        )
-        return chart_positions
+        body = await self.fetch_raw(remote_chart_id, country)
+        return await self.parse_chart(body, filter_to_podcast_ids=filter_to_podcast_ids)
@@ -0,0 +1,155 @@
+# apple_feed.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+An Apple Podcasts chart engine that reads the structured iTunes top podcasts feed
+instead of scraping the HTML room pages.
+
+The feed is keyed by genre id rather than room id, so charts using this engine
+take their remote id from the `chart_source_category_remote_id` of their
+[ChartSourceCategory][podcast_charts.models.ChartSourceCategory].
+"""
+
+import logging
+from typing import Any
+
+import httpx
+
+from podcast_charts.backends import (
+    AppleChartFetchError,
+    ChartParseError,
+    ChartPositionData,
+)
+from podcast_charts.backends.apple import ApplePodcastsChartBackend
+from podcast_charts.backends.hedging import hedged_get
+from podcast_charts.backends.parsing import CompactChart, json_loads
+
+logger = logging.getLogger(__name__)
+
+# The top level "Podcasts" genre, which is the overall chart.
+ALL_PODCASTS_GENRE_ID = "26"
+
+FEED_LIMIT = 200
+
+
+def _label(entry: dict[str, Any], key: str) -> str | None:
+    value = entry.get(key)
+    if isinstance(value, dict):
+        return value.get("label")
+    return None
+
+
+def parse_apple_feed_json(body: str, podcast_apple_ids: list[str]) -> CompactChart:
+    """
+    Parse an iTunes top podcasts JSON feed into compact chart positions.
+
+    Args:
+        body (str): The body of the feed.
+        podcast_apple_ids (list[str]): Optional podcast ids to filter against.
+
+    Returns:
+        CompactChart: The chart positions found, including titles and urls.
+
+    Raises:
+        ChartParseError: If the body is not a valid top podcasts feed.
+    """
+    try:
+        feed = json_loads(body)["feed"]
+    except (ValueError, KeyError, TypeError) as err:
+        msg = f"Could not find feed in chart response: {err}"
+        raise ChartParseError(msg) from err
+    entries = feed.get("entry", [])
+    if isinstance(entries, dict):
+        # The feed returns a bare object instead of a list for a single entry.
+        entries = [entries]
+    results = []
+    for position, entry in enumerate(entries, start=1):
+        try:
+            podcast_id = entry["id"]["attributes"]["im:id"]
+        except (KeyError, TypeError):
+            logger.error(f"Could not parse podcast at position {position}")
+            continue
+        if podcast_apple_ids and podcast_id not in podcast_apple_ids:
+            continue
+        podcast_url = _label(entry, "id")
+        results.append(
+            ChartPositionData(
+                podcast_id=podcast_id,
+                position=position,
+                podcast_title=_label(entry, "im:name"),
+                podcast_url=podcast_url.split("?", maxsplit=1)[0]
+                if podcast_url
+                else None,
+            )
+        )
+    return CompactChart.from_positions(results)
+
+
+class AppleFeedChartBackend(ApplePodcastsChartBackend):
+    """
+    Reads Apple chart rankings from the iTunes top podcasts JSON feed.
+
+    The feed is a fraction of the size of the room page and decodes far faster
+    than HTML, so it is parsed directly on the event loop.
+    """
+
+    base_url = "https://itunes.apple.com"
+    chart_parser = staticmethod(parse_apple_feed_json)
+
+    async def fetch_raw(self, remote_chart_id: str, country: str) -> str:
+        """
+        Fetch the top podcasts feed for a genre from Apple.
+
+        Args:
+            remote_chart_id (str): The genre id of the chart.
+            country (str): The country code to use for fetching the market data.
+
+        Returns:
+            str: The body of the JSON feed.
+
+        Raises:
+            AppleChartFetchError: If the feed could not be fetched.
+            ChartRateLimitedError: If Apple is throttling requests or the circuit
+                for the feed host is open.
+            NotImplementedError: If the chart request is not implemented.
+        """
+        if country == "all":
+            msg = "Getting worldwide charts via Apple Podcasts is not supported."
+            raise NotImplementedError(msg)
+        url = f"{self.base_url}/{country}/rss/toppodcasts/limit={FEED_LIMIT}"
+        if remote_chart_id != ALL_PODCASTS_GENRE_ID:
+            url = f"{url}/genre={remote_chart_id}"
+        async with self._get_client() as client:
+            try:
+                response = await hedged_get(client, f"{url}/json", key=country)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as hse:
+                msg = f"Received invalid status code from Apple chart feed: {hse}"
+                raise AppleChartFetchError(msg) from hse
+            except httpx.TransportError as te:
+                msg = f"Could not reach Apple chart feed: {te}"
+                raise AppleChartFetchError(msg) from te
+        return response.text
+
+    async def parse_chart(
+        self, body: str, *, filter_to_podcast_ids: list[str] | None
+    ) -> list[ChartPositionData]:
+        """
+        Parse a feed previously retrieved with `fetch_raw`.
+
+        Args:
+            body (str): The body of the feed.
+            filter_to_podcast_ids (list[str] | None): An optional list of podcast ids to
+                filter the results against.
+
+        Returns:
+            list[ChartPositionData]: The chart positions found in the feed.
+
+        Raises:
+            ChartParseError: If the feed could not be parsed.
+        """
+        return parse_apple_feed_json(body, filter_to_podcast_ids or []).to_positions()
@@ -0,0 +1,260 @@
+# hedging.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Deadlines and hedged requests for chart pages.
+
+A handful of slow storefronts tend to dominate the duration of a fetch run.
+[hedged_get][podcast_charts.backends.hedging.hedged_get] bounds every chart
+request with an explicit timeout and an overall deadline, and once a request
+has been outstanding for longer than a recent latency percentile for its host
+and country it sends one duplicate and takes whichever answers first.
+
+Hedges are sent through the same [HostRateLimiter][] as every other request
+and are limited to a fraction of all requests, so the extra load stays small. A
+missed deadline counts as a failure against the host's circuit breaker.
+Latency windows, like rate limiters, are shared per process so that what is
+learned in one fetch run carries over to the next.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import math
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from podcast_charts.backends.ratelimit import get_rate_limiter, limited_get
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class HedgingConfig:
+    """
+    Tuning options for hedged requests to a host.
+
+    Attributes:
+        timeout (float): Seconds each individual attempt may take to connect,
+            send, or wait for data.
+        deadline (float): Seconds the whole request may take, including time
+            spent waiting on the rate limiter and any hedge.
+        percentile (float | None): The latency percentile after which a hedge is
+            sent, or `None` to disable hedging.
+        min_delay (float): The least time to wait before hedging.
+        min_samples (int): Responses that must be observed for a host and
+            country before hedging starts.
+        window_size (int): How many recent latencies to keep per host and country.
+        max_hedge_ratio (float): The largest fraction of requests that may be
+            hedged.
+    """
+
+    timeout: float = 10.0
+    deadline: float = 30.0
+    percentile: float | None = 0.95
+    min_delay: float = 0.05
+    min_samples: int = 20
+    window_size: int = 200
+    max_hedge_ratio: float = 0.1
+
+
+def get_hedging_config(host: str) -> HedgingConfig:
+    """
+    Build the hedging configuration for a host from settings.
+
+    `CHART_FETCH_HEDGING` may be defined as a dict mapping host names to dicts of
+    [HedgingConfig][] options. A `"default"` key applies to all hosts and is
+    overridden by any host specific values.
+
+    Args:
+        host (str): The host name, e.g. `podcasts.apple.com`.
+
+    Returns:
+        HedgingConfig: The configuration to use for the host.
+    """
+    overrides = getattr(settings, "CHART_FETCH_HEDGING", None) or {}
+    options: dict[str, Any] = {}
+    options.update(overrides.get("default", {}))
+    options.update(overrides.get(host, {}))
+    return HedgingConfig(**options)
+
+
+class LatencyWindow:
+    """
+    Recent response latencies and hedge counts for one host and country.
+
+    Attributes:
+        requests (int): Requests made.
+        hedges (int): Hedges sent.
+    """
+
+    def __init__(self, size: int) -> None:
+        """
+        Args:
+            size (int): How many recent latencies to keep.
+        """
+        self._samples: collections.deque[float] = collections.deque(maxlen=size)
+        self.requests = 0
+        self.hedges = 0
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        """
+        Args:
+            seconds (float): The latency of a response.
+        """
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Args:
+            q (float): The percentile as a fraction, e.g. `0.95`.
+
+        Returns:
+            float | None: The nearest rank percentile of the recorded latencies,
+                or `None` if nothing was recorded.
+
+        Examples:
+            >>> window = LatencyWindow(10)
+            >>> for seconds in range(1, 11):
+            ...     window.record(seconds)
+            >>> window.percentile(0.9)
+            9
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def hedge_delay(self, config: HedgingConfig) -> float | None:
+        """
+        Args:
+            config (HedgingConfig): The options for the host.
+
+        Returns:
+            float | None: Seconds to wait before hedging a new request, or `None`
+                if it should not be hedged.
+        """
+        if config.percentile is None or len(self) < config.min_samples:
+            return None
+        return max(config.min_delay, self.percentile(config.percentile))  # type: ignore
+
+    def allow_hedge(self, config: HedgingConfig) -> bool:
+        """
+        Args:
+            config (HedgingConfig): The options for the host.
+
+        Returns:
+            bool: Whether another hedge fits in the budget.
+        """
+        return self.hedges < config.max_hedge_ratio * self.requests
+
+
+_windows: dict[tuple[str, str | None], LatencyWindow] = {}
+
+
+def get_latency_window(host: str, key: str | None = None) -> LatencyWindow:
+    """
+    Get the shared latency window for a host and key, creating it if needed.
+
+    Args:
+        host (str): The host name.
+        key (str | None): Narrows the window within the host, e.g. a country code.
+
+    Returns:
+        LatencyWindow: The window.
+    """
+    window = _windows.get((host, key))
+    if window is None:
+        window = _windows[host, key] = LatencyWindow(
+            get_hedging_config(host).window_size
+        )
+    return window
+
+
+def reset_latency_windows() -> None:
+    """Discard all shared latency windows, e.g. between tests."""
+    _windows.clear()
+
+
+async def _first_response(
+    tasks: set[asyncio.Task[httpx.Response]],
+) -> httpx.Response:
+    error: BaseException | None = None
+    while tasks:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        tasks.clear()
+        tasks.update(pending)
+        for task in done:
+            if task.exception() is None:
+                return task.result()
+            error = error or task.exception()
+    raise error  # type: ignore
+
+
+async def hedged_get(
+    client: httpx.AsyncClient, url: str, *, key: str | None = None, **kwargs: Any
+) -> httpx.Response:
+    """
+    Perform a rate limited GET request with a deadline, hedging it if it is slow.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to request.
+        key (str | None): Latencies are tracked per host and key, e.g. a country
+            code for storefronts that differ in speed.
+        **kwargs: Passed through to `client.get`.
+
+    Returns:
+        httpx.Response: The first successful response, which may still have an
+            error status.
+
+    Raises:
+        ChartSourceUnavailableError: If the circuit for the host is open.
+        ChartRateLimitedError: If the host responded with 429 Too Many Requests.
+        httpx.TimeoutException: If no response arrived before the deadline.
+        httpx.TransportError: If the request could not be completed.
+    """
+    host = urlsplit(url).netloc
+    config = get_hedging_config(host)
+    window = get_latency_window(host, key)
+    kwargs.setdefault("timeout", config.timeout)
+
+    async def attempt() -> httpx.Response:
+        # Timed like the hedge delay, including any wait on the rate limiter.
+        started = time.monotonic()
+        response = await limited_get(client, url, **kwargs)
+        window.record(time.monotonic() - started)
+        return response
+
+    window.requests += 1
+    delay = window.hedge_delay(config)
+    tasks = {asyncio.create_task(attempt())}
+    try:
+        async with asyncio.timeout(config.deadline):
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and window.allow_hedge(config):
+                    logger.debug(f"Hedging request to {url} after {delay:.3f}s.")
+                    window.hedges += 1
+                    tasks.add(asyncio.create_task(attempt()))
+            return await _first_response(tasks)
+    except TimeoutError as te:
+        get_rate_limiter(host).record_transport_error()
+        msg = f"No response from {host} within {config.deadline}s."
+        raise httpx.TimeoutException(msg) from te
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
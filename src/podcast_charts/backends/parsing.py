@@ -0,0 +1,234 @@
+# parsing.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Run chart parsing off the event loop.
+
+Parsing a chart page is CPU bound, so backends hand the raw response body to a
+worker pool and await the result while other requests keep their sockets busy.
+The pool is configured via settings:
+
+- `CHART_PARSE_EXECUTOR`: One of `"process"` (default), `"thread"`, or `"inline"`.
+    `"inline"` parses on the event loop and is mostly useful for debugging.
+- `CHART_PARSE_MAX_WORKERS`: Maximum number of workers. Defaults to the executor's
+    own default, which for processes is the number of CPUs.
+
+Workers only send back a [CompactChart][], which keeps the data crossing the
+process boundary small.
+"""
+
+import array
+import asyncio
+import concurrent.futures
+import functools
+import json
+import typing
+import zlib
+from collections.abc import Callable
+from typing import Any
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # no cov
+    orjson = None
+
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.exceptions import ChartImproperlyConfiguredError
+
+PARSE_EXECUTOR_CHOICES = ("process", "thread", "inline")
+
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+T = typing.TypeVar("T")
+
+_executor: concurrent.futures.Executor | None = None
+
+
+class CompactChart(typing.NamedTuple):
+    """
+    A compact representation of parsed chart positions for transfer between
+    processes.
+
+    Attributes:
+        podcast_ids (tuple[str, ...]): The remote podcast ids in chart order.
+        positions (bytes): The positions as a packed unsigned int array.
+        podcast_titles (tuple[str | None, ...] | None): Titles in chart order,
+            if the source provides them.
+        podcast_urls (tuple[str | None, ...] | None): Urls in chart order, if the
+            source provides them.
+    """
+
+    podcast_ids: tuple[str, ...]
+    positions: bytes
+    podcast_titles: tuple[str | None, ...] | None = None
+    podcast_urls: tuple[str | None, ...] | None = None
+
+    @classmethod
+    def from_positions(cls, positions: list[ChartPositionData]) -> "CompactChart":
+        """
+        Pack a list of chart positions.
+
+        Args:
+            positions (list[ChartPositionData]): The positions to pack.
+
+        Returns:
+            CompactChart: The packed positions.
+        """
+        titles = tuple(p.podcast_title for p in positions)
+        urls = tuple(p.podcast_url for p in positions)
+        return cls(
+            podcast_ids=tuple(p.podcast_id for p in positions),
+            positions=array.array("I", (p.position for p in positions)).tobytes(),
+            podcast_titles=titles if any(titles) else None,
+            podcast_urls=urls if any(urls) else None,
+        )
+
+    def to_positions(self) -> list[ChartPositionData]:
+        """
+        Unpack into chart position data.
+
+        Returns:
+            list[ChartPositionData]: The chart positions.
+        """
+        positions = array.array("I")
+        positions.frombytes(self.positions)
+        count = len(self.podcast_ids)
+        titles = self.podcast_titles or (None,) * count
+        urls = self.podcast_urls or (None,) * count
+        return [
+            ChartPositionData(
+                podcast_id=podcast_id,
+                position=position,
+                podcast_title=title,
+                podcast_url=url,
+            )
+            for podcast_id, position, title, url in zip(
+                self.podcast_ids, positions, titles, urls, strict=True
+            )
+        ]
+
+
+def json_loads(data: str | bytes) -> Any:
+    """
+    Decode JSON using `orjson` when it is installed, otherwise the standard library.
+
+    Install the `speedups` extra to get `orjson`.
+
+    Args:
+        data (str | bytes): The JSON document.
+
+    Returns:
+        Any: The decoded document.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def get_parse_executor() -> concurrent.futures.Executor | None:
+    """
+    Get the shared executor used for parsing, creating it on first use.
+
+    Returns:
+        concurrent.futures.Executor | None: The executor, or None when parsing
+            should happen inline.
+
+    Raises:
+        ChartImproperlyConfiguredError: If `CHART_PARSE_EXECUTOR` is not valid.
+    """
+    global _executor  # noqa: PLW0603
+    kind = getattr(settings, "CHART_PARSE_EXECUTOR", "process")
+    if kind not in PARSE_EXECUTOR_CHOICES:
+        msg = (
+            f"CHART_PARSE_EXECUTOR must be one of {PARSE_EXECUTOR_CHOICES}, "
+            f"not {kind!r}."
+        )
+        raise ChartImproperlyConfiguredError(msg)
+    if kind == "inline":
+        return None
+    if _executor is None:
+        max_workers = getattr(settings, "CHART_PARSE_MAX_WORKERS", None)
+        if kind == "process":
+            _executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="podcast_charts_parse"
+            )
+    return _executor
+
+
+def shutdown_parse_executor() -> None:
+    """Shut down the shared parse executor, e.g. after settings change."""
+    global _executor  # noqa: PLW0603
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_parser(func: Callable[..., T], *args: Any) -> T:
+    """
+    Run a parse function in the configured executor.
+
+    The function and its arguments must be picklable when the process executor
+    is in use, so pass module level functions and plain data.
+
+    Args:
+        func (Callable): The parse function.
+        *args: Positional arguments for the parse function.
+
+    Returns:
+        The return value of the parse function.
+    """
+    executor = get_parse_executor()
+    if executor is None:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+def compress_body(body: str) -> bytes:
+    """
+    Compress a raw response body for archiving.
+
+    Args:
+        body (str): The decoded response body.
+
+    Returns:
+        bytes: The zlib compressed UTF-8 body.
+    """
+    return zlib.compress(body.encode("utf-8"), ARCHIVE_COMPRESSION_LEVEL)
+
+
+def decompress_body(data: bytes) -> str:
+    """
+    Reverse [compress_body][podcast_charts.backends.parsing.compress_body].
+
+    Args:
+        data (bytes): The compressed body.
+
+    Returns:
+        str: The decoded response body.
+    """
+    return zlib.decompress(data).decode("utf-8")
+
+
+def parse_archived_body(
+    parser: Callable[[str, list[str]], CompactChart], data: bytes
+) -> CompactChart:
+    """
+    Decompress and parse an archived response body inside a worker.
+
+    Args:
+        parser (Callable): The backend's `chart_parser`.
+        data (bytes): The compressed response body.
+
+    Returns:
+        CompactChart: The parsed chart positions.
+    """
+    return parser(decompress_body(data), [])
@@ -0,0 +1,457 @@
+# ratelimit.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Client side rate limiting for chart sources.
+
+Every request made by a backend should pass through the [HostRateLimiter][]
+for the host being called. Each limiter combines:
+
+- A token bucket that caps the sustained request rate for the host.
+- An AIMD (additive increase, multiplicative decrease) concurrency limit that
+  shrinks when the host responds with a 429 or 5xx and slowly grows back while
+  the host is healthy.
+- A circuit breaker that refuses new requests while the host appears to be down.
+
+Limiters are shared per host for the lifetime of the process so that the health
+of a source is remembered across fetch runs.
+"""
+
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import datetime
+import email.utils
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from podcast_charts.backends import ChartRateLimitedError, ChartSourceUnavailableError
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+
+@dataclasses.dataclass(frozen=True)
+class RateLimitConfig:
+    """
+    Tuning options for a host rate limiter.
+
+    Attributes:
+        rate (float): Sustained number of requests per second allowed.
+        burst (int): Maximum number of requests that can be made at once after
+            a period of inactivity.
+        initial_concurrency (int): Number of concurrent requests allowed at start.
+        min_concurrency (int): Floor for the adaptive concurrency limit.
+        max_concurrency (int): Ceiling for the adaptive concurrency limit.
+        increase_step (float): How much the concurrency limit grows over a full
+            window of successful requests.
+        decrease_factor (float): Multiplier applied to the concurrency limit when
+            the host throttles us.
+        failure_threshold (int): Consecutive failures before the circuit opens.
+        recovery_timeout (float): Seconds to wait before probing an open circuit.
+        max_retry_after (float): Upper bound in seconds honored from a
+            `Retry-After` header.
+    """
+
+    rate: float = 2.0
+    burst: int = 4
+    initial_concurrency: int = 2
+    min_concurrency: int = 1
+    max_concurrency: int = 8
+    increase_step: float = 1.0
+    decrease_factor: float = 0.5
+    failure_threshold: int = 5
+    recovery_timeout: float = 60.0
+    max_retry_after: float = 300.0
+
+
+def get_rate_limit_config(host: str) -> RateLimitConfig:
+    """
+    Build the rate limit configuration for a host from settings.
+
+    `CHART_FETCH_RATE_LIMITS` may be defined as a dict mapping host names to dicts
+    of [RateLimitConfig][] options. A `"default"` key applies to all hosts and is
+    overridden by any host specific values.
+
+    Args:
+        host (str): The host name, e.g. `podcasts.apple.com`.
+
+    Returns:
+        RateLimitConfig: The configuration to use for the host.
+    """
+    overrides = getattr(settings, "CHART_FETCH_RATE_LIMITS", None) or {}
+    options: dict[str, Any] = {}
+    options.update(overrides.get("default", {}))
+    options.update(overrides.get(host, {}))
+    return RateLimitConfig(**options)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse the value of a `Retry-After` header into a number of seconds.
+
+    Args:
+        value (str | None): The header value, either delay seconds or an HTTP date.
+
+    Returns:
+        float | None: Seconds to wait or None if the header is missing or invalid.
+
+    Examples:
+        >>> parse_retry_after("120")
+        120.0
+        >>> parse_retry_after(None) is None
+        True
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.UTC)
+    return max(0.0, (retry_at - datetime.datetime.now(tz=datetime.UTC)).total_seconds())
+
+
+class TokenBucket:
+    """
+    A token bucket that hands out reservations rather than polling.
+
+    Each call to `reserve` takes a token immediately, even if that drives the
+    bucket negative, and returns how long the caller must wait before using it.
+    This keeps requests in FIFO order without a lock.
+    """
+
+    def __init__(
+        self, rate: float, capacity: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket.
+
+        Returns:
+            float: Number of seconds to wait before the token is valid.
+        """
+        now = self._clock()
+        self._tokens = min(
+            float(self.capacity), self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight requests using additive increase, multiplicative decrease.
+
+    Waiters are plain futures created on the running loop, so a limiter can be
+    shared by successive calls to `asyncio.run`.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._waiters: collections.deque[asyncio.Future[None]] = collections.deque()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self) -> None:
+        """Wait for a free concurrency slot."""
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # We were handed a slot right as we were cancelled.
+                self.release()
+            else:
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        """Return a slot and wake as many waiters as the limit permits."""
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def on_success(self) -> None:
+        """Grow the limit by roughly `increase_step` per window of successes."""
+        self.limit = min(
+            float(self.maximum), self.limit + self.increase_step / self.limit
+        )
+        self._wake()
+
+    def on_throttle(self) -> None:
+        """Shrink the limit after the host signals overload."""
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a host after repeated failures and probes it again later.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        recovery_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a request may be attempted.
+
+        Returns:
+            bool: False while the circuit is open or a recovery probe is running.
+        """
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            if self._clock() - self._opened_at < self.recovery_timeout:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Let another request probe the host after a probe ended without an outcome."""
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        """
+        Returns:
+            float: Seconds until an open circuit will allow a probe.
+        """
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (self._clock() - self._opened_at))
+
+
+class HostRateLimiter:
+    """
+    Combines a token bucket, adaptive concurrency, and a circuit breaker for a host.
+
+    Attributes:
+        host (str): The host this limiter controls.
+        config (RateLimitConfig): The tuning options in use.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        config: RateLimitConfig | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.host = host
+        self.config = config or get_rate_limit_config(host)
+        self._clock = clock
+        self.bucket = TokenBucket(self.config.rate, self.config.burst, clock=clock)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=self.config.initial_concurrency,
+            minimum=self.config.min_concurrency,
+            maximum=self.config.max_concurrency,
+            increase_step=self.config.increase_step,
+            decrease_factor=self.config.decrease_factor,
+        )
+        self.breaker = CircuitBreaker(
+            self.config.failure_threshold, self.config.recovery_timeout, clock=clock
+        )
+        self._blocked_until = 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Wait until a request may be sent to the host.
+
+        If the request holding a half open circuit's probe is cancelled or fails
+        before its outcome is recorded, the probe is released so that a later
+        request may try again.
+
+        Raises:
+            ChartSourceUnavailableError: If the circuit for the host is open.
+        """
+        if not self.breaker.allow_request():
+            msg = f"{self.host} is unavailable, circuit is {self.breaker.state}."
+            raise ChartSourceUnavailableError(msg, retry_after=self.breaker.retry_in())
+        probe = self.breaker.state == CircuitState.HALF_OPEN
+        try:
+            await self.concurrency.acquire()
+            try:
+                delay = max(self.bucket.reserve(), self._blocked_until - self._clock())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield
+            finally:
+                self.concurrency.release()
+        except BaseException:
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+    def record_response(
+        self, status_code: int, retry_after: float | None = None
+    ) -> None:
+        """
+        Update the limiter state based on a response from the host.
+
+        Args:
+            status_code (int): The HTTP status code received.
+            retry_after (float | None): Seconds requested by a `Retry-After` header.
+        """
+        if status_code in THROTTLE_STATUS_CODES:
+            logger.warning(
+                f"{self.host} responded with {status_code}, backing off "
+                f"(concurrency limit {self.concurrency.limit:.2f})."
+            )
+            self.concurrency.on_throttle()
+            self.breaker.record_failure()
+            if retry_after:
+                retry_after = min(retry_after, self.config.max_retry_after)
+                self._blocked_until = max(
+                    self._blocked_until, self._clock() + retry_after
+                )
+        else:
+            self.concurrency.on_success()
+            self.breaker.record_success()
+
+    def record_transport_error(self) -> None:
+        """Count a connection level failure or a missed deadline against the host."""
+        self.breaker.record_failure()
+
+
+_limiters: dict[str, HostRateLimiter] = {}
+
+
+def get_rate_limiter(host: str) -> HostRateLimiter:
+    """
+    Get the shared rate limiter for a host, creating it if needed.
+
+    Args:
+        host (str): The host name.
+
+    Returns:
+        HostRateLimiter: The limiter for that host.
+    """
+    limiter = _limiters.get(host)
+    if limiter is None:
+        limiter = _limiters[host] = HostRateLimiter(host)
+    return limiter
+
+
+def reset_rate_limiters() -> None:
+    """Discard all shared limiters, e.g. after settings change or between tests."""
+    _limiters.clear()
+
+
+async def limited_get(
+    client: httpx.AsyncClient, url: str, **kwargs: Any
+) -> httpx.Response:
+    """
+    Perform a GET request through the rate limiter for the URL's host.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        url (str): The URL to request.
+        **kwargs: Passed through to `client.get`.
+
+    Returns:
+        httpx.Response: The response, which may still have an error status.
+
+    Raises:
+        ChartSourceUnavailableError: If the circuit for the host is open.
+        ChartRateLimitedError: If the host responded with 429 Too Many Requests.
+        httpx.TransportError: If the request could not be completed.
+    """
+    limiter = get_rate_limiter(urlsplit(url).netloc)
+    async with limiter.slot():
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            limiter.record_transport_error()
+            raise
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    limiter.record_response(response.status_code, retry_after)
+    if response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+        msg = f"Rate limited by {limiter.host}."
+        raise ChartRateLimitedError(msg, retry_after=retry_after)
+    return response
@@ -0,0 +1,209 @@
+# cache.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Read caching for chart data.
+
+Keys embed the id and `modified` time of every
+[PodcastChartVersion][podcast_charts.models.PodcastChartVersion] the value was
+computed from, so storing new positions moves readers to a new key and old entries
+simply expire. Cached values also include podcast titles, which change without
+touching any version, so keys embed a title generation as well that is replaced
+whenever a stored title changes. Misses are single-flight: within a process a
+striped lock lets one thread compute while the others wait, and across processes
+a short-lived lock key added with `cache.add` does the same. Rankings are written
+to the cache as soon as a version is stored, so the first readers after a fetch
+run find them warm.
+"""
+
+import dataclasses
+import threading
+import time
+import uuid
+import zlib
+from collections.abc import Callable
+from typing import TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+from podcast_charts.models import PodcastChartPosition, PodcastChartVersion
+
+T = TypeVar("T")
+
+CACHE_PREFIX = "podcast_charts"
+TITLE_GENERATION_KEY = f"{CACHE_PREFIX}:title-generation"
+
+_MISSING = object()
+_LOCK_STRIPES = tuple(threading.Lock() for _ in range(64))
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartRankingEntry:
+    """
+    One row of a cached chart ranking.
+
+    Attributes:
+        podcast_identifier_id (int): The id of the podcast identifier.
+        chart_source_podcast_id (str): The remote id of the podcast.
+        podcast_title (str): The podcast title.
+        position (int): The position on the chart.
+    """
+
+    podcast_identifier_id: int
+    chart_source_podcast_id: str
+    podcast_title: str
+    position: int
+
+
+def get_cache_timeout() -> int:
+    """
+    Returns:
+        int: Seconds chart reads are kept in the cache.
+    """
+    return getattr(settings, "CHART_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def get_title_generation() -> int:
+    """
+    Returns:
+        int: A token that changes whenever a stored podcast title changes.
+    """
+    generation = cache.get(TITLE_GENERATION_KEY)
+    if generation is None:
+        # A lost token is replaced by a new one, never reset to an old value.
+        generation = time.time_ns()
+        if not cache.add(TITLE_GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(TITLE_GENERATION_KEY, generation)
+    return generation
+
+
+def invalidate_podcast_titles() -> None:
+    """Move every cached value that includes podcast titles to a new key."""
+    cache.set(TITLE_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def version_cache_key(kind: str, *versions: PodcastChartVersion) -> str:
+    """
+    Build a cache key that changes whenever any of the versions is modified or a
+    podcast title changes.
+
+    Args:
+        kind (str): What is being cached, e.g. `"ranking"` or `"diff"`.
+        *versions (PodcastChartVersion): The versions the value is derived from.
+            Only `id` and `modified` need to be loaded.
+
+    Returns:
+        str: The cache key.
+    """
+    parts = (
+        f"{version.id}-{int(version.modified.timestamp() * 1_000_000)}"
+        for version in versions
+    )
+    return f"{CACHE_PREFIX}:{kind}:{get_title_generation()}:{':'.join(parts)}"
+
+
+def get_or_compute(key: str, compute: Callable[[], T], timeout: int | None = None) -> T:
+    """
+    Get a value from the cache, computing it at most once across concurrent misses.
+
+    Args:
+        key (str): The cache key.
+        compute (Callable[[], T]): Produces the value on a miss.
+        timeout (int | None): Seconds to cache the value. Defaults to
+            `CHART_CACHE_TIMEOUT`.
+
+    Returns:
+        T: The cached or freshly computed value.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    timeout = get_cache_timeout() if timeout is None else timeout
+    with _LOCK_STRIPES[zlib.crc32(key.encode()) % len(_LOCK_STRIPES)]:
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        lock_key = f"{key}:lock"
+        lock_timeout = getattr(settings, "CHART_CACHE_LOCK_TIMEOUT", 30)
+        token = uuid.uuid4().hex
+        owned = cache.add(lock_key, token, timeout=lock_timeout)
+        if not owned:
+            # Another process is computing the value, so wait for it to appear.
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = cache.get(key, _MISSING)
+                if value is not _MISSING:
+                    return value
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            # Only release our own lock. One that was held by another process, or
+            # taken over after ours expired, is left to expire.
+            if owned and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        return value
+
+
+def read_chart_version_ranking(
+    version: PodcastChartVersion,
+) -> list[ChartRankingEntry]:
+    """
+    Read a version's positions in rank order straight from the database.
+
+    Args:
+        version (PodcastChartVersion): The version.
+
+    Returns:
+        list[ChartRankingEntry]: The ranking.
+    """
+    return [
+        ChartRankingEntry(*row)
+        for row in PodcastChartPosition.objects.filter(chart_version=version)
+        .order_by("position")
+        .values_list(
+            "podcast_identifier_id",
+            "podcast_identifier__chart_source_podcast_id",
+            "podcast_identifier__podcast_title",
+            "position",
+        )
+    ]
+
+
+def get_chart_version_ranking(
+    version: PodcastChartVersion,
+) -> list[ChartRankingEntry]:
+    """
+    Get a version's positions in rank order, from the cache when possible.
+
+    Args:
+        version (PodcastChartVersion): The version, with `id` and `modified`
+            loaded.
+
+    Returns:
+        list[ChartRankingEntry]: The ranking.
+    """
+    return get_or_compute(
+        version_cache_key("ranking", version),
+        lambda: read_chart_version_ranking(version),
+    )
+
+
+def warm_chart_version_cache(version: PodcastChartVersion) -> None:
+    """
+    Store a version's ranking under its current key ahead of any reads.
+
+    Args:
+        version (PodcastChartVersion): A version whose positions were just stored.
+    """
+    cache.set(
+        version_cache_key("ranking", version),
+        read_chart_version_ranking(version),
+        timeout=get_cache_timeout(),
+    )
@@ -0,0 +1,142 @@
+# categories.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Chart queries across a category and its subgenres.
+
+Every [ChartCategory][podcast_charts.models.ChartCategory] stores its materialized
+path, so "everything under Comedy" is a single prefix match joined through the
+chart's source category rather than a recursive walk of the tree.
+"""
+
+import dataclasses
+import datetime
+
+from django.db.models import Count, Max, Min, QuerySet
+
+from podcast_charts.models import (
+    ChartCategory,
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPosition,
+    PodcastChartVersion,
+)
+
+CHART_CATEGORY_PATH = "chart_source_category__chart_category__path__startswith"
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CategoryRollupEntry:
+    """
+    A podcast's presence across the charts of a category subtree on one date.
+
+    Attributes:
+        podcast_identifier_id (int): The id of the podcast identifier.
+        podcast_title (str | None): The podcast title.
+        charts (int): How many charts in the subtree the podcast appeared on.
+        countries (int): How many countries the podcast charted in.
+        appearances (int): How many chart versions the podcast appeared in.
+        best_position (int): The podcast's best position on any of them.
+    """
+
+    podcast_identifier_id: int
+    podcast_title: str | None
+    charts: int
+    countries: int
+    appearances: int
+    best_position: int
+
+
+def get_category_charts(category: ChartCategory) -> QuerySet[PodcastChart]:
+    """
+    Args:
+        category (ChartCategory): The root of the subtree.
+
+    Returns:
+        QuerySet[PodcastChart]: Charts for the category and all of its subgenres.
+    """
+    return PodcastChart.objects.filter(**{CHART_CATEGORY_PATH: category.path})
+
+
+def get_category_versions(
+    category: ChartCategory,
+    chart_date: datetime.date | None = None,
+    country: ChartCountry | int | None = None,
+) -> QuerySet[PodcastChartVersion]:
+    """
+    Get the fetched chart versions across a category subtree.
+
+    Args:
+        category (ChartCategory): The root of the subtree.
+        chart_date (datetime.date | None): Only include versions for this date.
+        country (ChartCountry | int | None): Only include versions for this country.
+
+    Returns:
+        QuerySet[PodcastChartVersion]: The versions.
+    """
+    versions = PodcastChartVersion.objects.filter(
+        fetch_status=FetchStatusChoices.DONE,
+        **{f"podcast_chart__{CHART_CATEGORY_PATH}": category.path},
+    )
+    if chart_date is not None:
+        versions = versions.filter(chart_date=chart_date)
+    if country is not None:
+        versions = versions.filter(country=country)
+    return versions
+
+
+def get_category_rollup(
+    category: ChartCategory,
+    chart_date: datetime.date | None = None,
+    country: ChartCountry | int | None = None,
+    limit: int | None = None,
+) -> list[CategoryRollupEntry]:
+    """
+    Aggregate chart presence for every podcast across a category subtree.
+
+    Args:
+        category (ChartCategory): The root of the subtree.
+        chart_date (datetime.date | None): The date to aggregate. Defaults to the
+            latest date any chart in the subtree was fetched for.
+        country (ChartCountry | int | None): Only aggregate this country.
+        limit (int | None): The maximum number of podcasts to return.
+
+    Returns:
+        list[CategoryRollupEntry]: Podcasts on the most charts first, then by best
+            position.
+    """
+    if chart_date is None:
+        chart_date = get_category_versions(category, country=country).aggregate(
+            latest=Max("chart_date")
+        )["latest"]
+        if chart_date is None:
+            return []
+    positions = PodcastChartPosition.objects.filter(
+        chart_version__in=get_category_versions(category, chart_date, country)
+    )
+    rows = (
+        positions.values("podcast_identifier_id", "podcast_identifier__podcast_title")
+        .annotate(
+            charts=Count("chart_version__podcast_chart", distinct=True),
+            countries=Count("chart_version__country", distinct=True),
+            appearances=Count("id"),
+            best_position=Min("position"),
+        )
+        .order_by("-charts", "best_position", "podcast_identifier_id")
+        .values_list(
+            "podcast_identifier_id",
+            "podcast_identifier__podcast_title",
+            "charts",
+            "countries",
+            "appearances",
+            "best_position",
+        )
+    )
+    if limit is not None:
+        rows = rows[:limit]
+    return [CategoryRollupEntry(*row) for row in rows]
@@ -0,0 +1,344 @@
+# category_sync.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Discover a chart source's categories and charts in bulk.
+
+The whole genre hierarchy is fetched with one request, then the chart id for each
+genre is resolved concurrently over a single shared client. Categories, source
+categories and charts are written with bulk upserts in a handful of transactions,
+so onboarding every genre for every country is one command rather than a long
+session in the admin.
+"""
+
+import asyncio
+import dataclasses
+import logging
+from collections.abc import Iterable
+
+import httpx
+from django.db import transaction
+from django.utils import timezone
+
+from podcast_charts.backends import ChartBackend, SourceCategoryData
+from podcast_charts.models import (
+    ChartCategory,
+    ChartCountry,
+    ChartEngineChoices,
+    ChartSourceCategory,
+    PodcastChart,
+    SourceBackendChoices,
+    get_chart_backend,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class CategorySyncResult:
+    """
+    Summary of a category sync.
+
+    Attributes:
+        categories (int): Categories found at the source.
+        created_categories (int): Categories that did not exist before the sync.
+        charts (int): Charts created or updated.
+        failed (list[str]): Remote category ids whose chart id could not be
+            resolved. Their charts are left as they were.
+    """
+
+    categories: int = 0
+    created_categories: int = 0
+    charts: int = 0
+    failed: list[str] = dataclasses.field(default_factory=list)
+
+
+async def resolve_chart_ids(
+    backend: ChartBackend, remote_ids: Iterable[str], *, concurrency: int = 8
+) -> tuple[dict[str, str], list[str]]:
+    """
+    Resolve the chart id for many source categories concurrently.
+
+    Args:
+        backend (ChartBackend): The backend to resolve chart ids with.
+        remote_ids (Iterable[str]): The remote category ids.
+        concurrency (int): How many category pages may be fetched at once.
+
+    Returns:
+        tuple[dict[str, str], list[str]]: Chart ids keyed by remote category id,
+            and the remote category ids that failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    remote_ids = list(remote_ids)
+
+    async def resolve(remote_id: str) -> str:
+        async with semaphore:
+            return (await backend.get_chart_id_for_category(remote_id)).chart_id
+
+    outcomes = await asyncio.gather(
+        *(resolve(remote_id) for remote_id in remote_ids), return_exceptions=True
+    )
+    chart_ids: dict[str, str] = {}
+    failed: list[str] = []
+    for remote_id, outcome in zip(remote_ids, outcomes, strict=True):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            logger.error(f"Could not resolve chart id for {remote_id}: {outcome}")
+            failed.append(remote_id)
+        else:
+            chart_ids[remote_id] = outcome
+    return chart_ids, failed
+
+
+async def _discover(
+    chart_source: str,
+    engine: str,
+    known_chart_ids: dict[str, str | None],
+    concurrency: int,
+) -> tuple[list[SourceCategoryData], dict[str, str], list[str]]:
+    async with httpx.AsyncClient() as client:
+        backend = get_chart_backend(chart_source, client=client)  # type: ignore
+        tree = await backend.get_category_tree()
+        if engine != ChartEngineChoices.HTML:
+            # Feed engines address charts by the category's remote id.
+            return tree, {node.remote_id: node.remote_id for node in tree}, []
+        unresolved = [
+            node.remote_id for node in tree if not known_chart_ids.get(node.remote_id)
+        ]
+        chart_ids, failed = await resolve_chart_ids(
+            backend, unresolved, concurrency=concurrency
+        )
+    for remote_id, chart_id in known_chart_ids.items():
+        if chart_id:
+            chart_ids.setdefault(remote_id, chart_id)
+    return tree, chart_ids, failed
+
+
+def _unique_labels(tree: list[SourceCategoryData]) -> dict[str, str]:
+    # Category labels are unique, so a genre name used twice in the tree gets its
+    # remote id appended the second time.
+    labels: dict[str, str] = {}
+    seen: set[str] = set()
+    for node in tree:
+        label = node.label
+        if label in seen:
+            label = f"{node.label} ({node.remote_id})"
+        seen.add(label)
+        labels[node.remote_id] = label
+    return labels
+
+
+def _store_categories(
+    chart_source: str, tree: list[SourceCategoryData]
+) -> tuple[dict[str, ChartSourceCategory], int]:
+    now = timezone.now()
+    existing = {
+        source_category.chart_source_category_remote_id: source_category
+        for source_category in ChartSourceCategory.objects.filter(
+            chart_source=chart_source, chart_source_category_remote_id__isnull=False
+        ).select_related("chart_category")
+    }
+    node_labels = _unique_labels(tree)
+    # Keep tree order so new categories get ids, and so paths, in genre order.
+    labels = [
+        node_labels[node.remote_id] for node in tree if node.remote_id not in existing
+    ]
+    categories = {
+        category.label: category
+        for category in ChartCategory.objects.filter(label__in=labels)
+    }
+    missing = [
+        ChartCategory(label=label) for label in labels if label not in categories
+    ]
+    ChartCategory.objects.bulk_create(missing, ignore_conflicts=True)
+    categories.update(
+        (category.label, category)
+        for category in ChartCategory.objects.filter(
+            label__in=[category.label for category in missing]
+        )
+    )
+    by_remote_id = {
+        node.remote_id: (
+            existing[node.remote_id].chart_category
+            if node.remote_id in existing
+            else categories[node_labels[node.remote_id]]
+        )
+        for node in tree
+    }
+    reparented = []
+    for node in tree:
+        category = by_remote_id[node.remote_id]
+        parent = by_remote_id.get(node.parent_remote_id)  # type: ignore
+        parent_id = None if parent is None else parent.id
+        if category.parent_label_id != parent_id:
+            category.parent_label_id = parent_id
+            category.modified = now
+            reparented.append(category)
+    ChartCategory.objects.bulk_update(
+        reparented, ["parent_label", "modified"], batch_size=500
+    )
+    ChartCategory.objects.rebuild_paths()
+    ChartSourceCategory.objects.bulk_create(
+        [
+            ChartSourceCategory(
+                chart_source=chart_source,
+                chart_category=category,
+                chart_source_category_remote_id=remote_id,
+            )
+            for remote_id, category in by_remote_id.items()
+            if remote_id not in existing
+        ],
+        update_conflicts=True,
+        unique_fields=["chart_source", "chart_category"],
+        update_fields=["chart_source_category_remote_id", "modified"],
+    )
+    source_categories = {
+        source_category.chart_source_category_remote_id: source_category
+        for source_category in ChartSourceCategory.objects.filter(
+            chart_source=chart_source, chart_source_category_remote_id__in=by_remote_id
+        )
+        if source_category.chart_source_category_remote_id is not None
+    }
+    return source_categories, len(missing)
+
+
+def _store_charts(
+    chart_source: str,
+    engine: str,
+    source_categories: dict[str, ChartSourceCategory],
+    chart_ids: dict[str, str],
+    countries: list[ChartCountry],
+    *,
+    refresh_chart_ids: bool = False,
+) -> int:
+    synced = {
+        source_categories[remote_id].id: chart_id
+        for remote_id, chart_id in chart_ids.items()
+        if remote_id in source_categories
+    }
+    existing = {
+        chart.chart_source_category_id: chart  # type: ignore
+        for chart in PodcastChart.objects.filter(
+            chart_source=chart_source, chart_source_category__in=synced
+        )
+    }
+    # Existing charts keep the engine they were set up with. Their chart id is
+    # only replaced when ids were resolved again for the engine they use.
+    now = timezone.now()
+    refreshed = []
+    if refresh_chart_ids:
+        for category_id, chart in existing.items():
+            if (
+                chart.chart_engine == engine
+                and chart.chart_remote_id != synced[category_id]
+            ):
+                chart.chart_remote_id = synced[category_id]
+                chart.modified = now
+                refreshed.append(chart)
+    PodcastChart.objects.bulk_update(
+        refreshed, ["chart_remote_id", "modified"], batch_size=500
+    )
+    PodcastChart.objects.bulk_create(
+        [
+            PodcastChart(
+                chart_source=chart_source,
+                chart_source_category_id=category_id,
+                chart_remote_id=chart_id,
+                chart_engine=engine,
+            )
+            for category_id, chart_id in synced.items()
+            if category_id not in existing
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    chart_pks = list(
+        PodcastChart.objects.filter(
+            chart_source=chart_source, chart_source_category__in=synced
+        ).values_list("id", flat=True)
+    )
+    through = PodcastChart.enabled_countries.through
+    through.objects.bulk_create(
+        [
+            through(podcastchart_id=chart_pk, chartcountry_id=country.id)
+            for chart_pk in chart_pks
+            for country in countries
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return len(synced)
+
+
+def sync_chart_categories(
+    chart_source: str = SourceBackendChoices.APPLE,
+    *,
+    countries: Iterable[str] | None = None,
+    engine: str = ChartEngineChoices.HTML,
+    concurrency: int = 8,
+    refresh_chart_ids: bool = False,
+) -> CategorySyncResult:
+    """
+    Create or update every category and chart a source offers.
+
+    Args:
+        chart_source (str): The source backend to sync.
+        countries (Iterable[str] | None): Country codes to enable the charts for.
+            Missing countries are created. Defaults to every existing country.
+        engine (str): The chart engine to resolve chart ids for and to create
+            new charts with. Existing charts keep their engine.
+        concurrency (int): How many category pages may be fetched at once.
+        refresh_chart_ids (bool): Resolve chart ids again even for categories
+            that already have a chart, and update the charts that use `engine`.
+
+    Returns:
+        CategorySyncResult: A summary of the sync.
+    """
+    known_chart_ids: dict[str, str | None] = {}
+    if not refresh_chart_ids:
+        known_chart_ids = dict(
+            PodcastChart.objects.filter(
+                chart_source=chart_source,
+                chart_source_category__chart_source_category_remote_id__isnull=False,
+            ).values_list(
+                "chart_source_category__chart_source_category_remote_id",
+                "chart_remote_id",
+            )
+        )
+    tree, chart_ids, failed = asyncio.run(
+        _discover(chart_source, engine, known_chart_ids, concurrency)
+    )
+    with transaction.atomic():
+        source_categories, created = _store_categories(chart_source, tree)
+    with transaction.atomic():
+        if countries is None:
+            chart_countries = list(ChartCountry.objects.all())
+        else:
+            codes = sorted(set(countries))
+            ChartCountry.objects.bulk_create(
+                [ChartCountry(country=code) for code in codes], ignore_conflicts=True
+            )
+            chart_countries = list(ChartCountry.objects.filter(country__in=codes))
+        charts = _store_charts(
+            chart_source,
+            engine,
+            source_categories,
+            chart_ids,
+            chart_countries,
+            refresh_chart_ids=refresh_chart_ids,
+        )
+    logger.info(
+        f"Synced {len(tree)} {chart_source} categories and {charts} charts, "
+        f"{len(failed)} chart ids could not be resolved."
+    )
+    return CategorySyncResult(
+        categories=len(tree),
+        created_categories=created,
+        charts=charts,
+        failed=failed,
+    )
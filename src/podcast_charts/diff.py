@@ -0,0 +1,200 @@
+# diff.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Compare the rankings of two chart versions.
+
+Each version's positions are read once, in rank order, and compared with a hash
+lookup so a diff is linear in the size of the charts. Versions do not need to
+belong to the same chart or country. Rankings and diffs are cached through
+[podcast_charts.cache][], keyed on the version ids and their `modified` timestamps,
+so a re-fetched version never serves a stale diff.
+"""
+
+import dataclasses
+from typing import Any
+
+from podcast_charts.cache import (
+    ChartRankingEntry,
+    get_chart_version_ranking,
+    get_or_compute,
+    version_cache_key,
+)
+from podcast_charts.exceptions import ChartStatusInvalidError
+from podcast_charts.models import FetchStatusChoices, PodcastChartVersion
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartDiffEntry:
+    """
+    A podcast that entered or left a chart.
+
+    Attributes:
+        podcast_identifier_id (int): The id of the podcast identifier.
+        podcast_title (str): The podcast title.
+        position (int): The position in the version the podcast appears in.
+    """
+
+    podcast_identifier_id: int
+    podcast_title: str
+    position: int
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartDiffMove:
+    """
+    A podcast that is on both charts at different positions.
+
+    Attributes:
+        podcast_identifier_id (int): The id of the podcast identifier.
+        podcast_title (str): The podcast title.
+        from_position (int): The position in the earlier version.
+        to_position (int): The position in the later version.
+    """
+
+    podcast_identifier_id: int
+    podcast_title: str
+    from_position: int
+    to_position: int
+
+    @property
+    def delta(self) -> int:
+        """
+        Returns:
+            int: How many places the podcast climbed. Negative when it fell.
+        """
+        return self.from_position - self.to_position
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartDiff:
+    """
+    The differences between two chart versions.
+
+    Attributes:
+        from_version_id (int): The id of the version compared from.
+        to_version_id (int): The id of the version compared to.
+        entries (tuple[ChartDiffEntry, ...]): Podcasts only in the later version,
+            in rank order.
+        exits (tuple[ChartDiffEntry, ...]): Podcasts only in the earlier version,
+            in their former rank order.
+        moves (tuple[ChartDiffMove, ...]): Podcasts whose position changed, in
+            their new rank order.
+        unchanged (int): How many podcasts kept their position.
+    """
+
+    from_version_id: int
+    to_version_id: int
+    entries: tuple[ChartDiffEntry, ...]
+    exits: tuple[ChartDiffEntry, ...]
+    moves: tuple[ChartDiffMove, ...]
+    unchanged: int
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict[str, Any]: A JSON serializable representation of the diff.
+        """
+        return {
+            "from_version_id": self.from_version_id,
+            "to_version_id": self.to_version_id,
+            "entries": [dataclasses.asdict(entry) for entry in self.entries],
+            "exits": [dataclasses.asdict(entry) for entry in self.exits],
+            "moves": [
+                {**dataclasses.asdict(move), "delta": move.delta} for move in self.moves
+            ],
+            "unchanged": self.unchanged,
+        }
+
+
+def compare_rankings(
+    from_version_id: int,
+    from_ranking: list[ChartRankingEntry],
+    to_version_id: int,
+    to_ranking: list[ChartRankingEntry],
+) -> ChartDiff:
+    """
+    Diff two rankings in a single pass over each.
+
+    Args:
+        from_version_id (int): The id of the earlier version.
+        from_ranking (list[ChartRankingEntry]): The earlier version's ranking.
+        to_version_id (int): The id of the later version.
+        to_ranking (list[ChartRankingEntry]): The later version's ranking.
+
+    Returns:
+        ChartDiff: The differences between the rankings.
+    """
+    previous = {row.podcast_identifier_id: row.position for row in from_ranking}
+    entries = []
+    moves = []
+    unchanged = 0
+    for row in to_ranking:
+        podcast_id, title = row.podcast_identifier_id, row.podcast_title
+        from_position = previous.pop(podcast_id, None)
+        if from_position is None:
+            entries.append(ChartDiffEntry(podcast_id, title, row.position))
+        elif from_position != row.position:
+            moves.append(ChartDiffMove(podcast_id, title, from_position, row.position))
+        else:
+            unchanged += 1
+    exits = tuple(
+        ChartDiffEntry(row.podcast_identifier_id, row.podcast_title, row.position)
+        for row in from_ranking
+        if row.podcast_identifier_id in previous
+    )
+    return ChartDiff(
+        from_version_id=from_version_id,
+        to_version_id=to_version_id,
+        entries=tuple(entries),
+        exits=exits,
+        moves=tuple(moves),
+        unchanged=unchanged,
+    )
+
+
+def diff_chart_versions(
+    from_version: PodcastChartVersion | int, to_version: PodcastChartVersion | int
+) -> ChartDiff:
+    """
+    Get the differences between two chart versions, using the cache when possible.
+
+    Args:
+        from_version (PodcastChartVersion | int): The earlier version or its id.
+        to_version (PodcastChartVersion | int): The later version or its id.
+
+    Returns:
+        ChartDiff: The differences between the versions.
+
+    Raises:
+        PodcastChartVersion.DoesNotExist: If a version id does not exist.
+        ChartStatusInvalidError: If either version has not finished fetching.
+    """
+    ids = [
+        version if isinstance(version, int) else version.id
+        for version in (from_version, to_version)
+    ]
+    versions = PodcastChartVersion.objects.only(
+        "id", "fetch_status", "modified"
+    ).in_bulk(ids)
+    for version_id in ids:
+        if version_id not in versions:
+            msg = f"Chart version {version_id} does not exist."
+            raise PodcastChartVersion.DoesNotExist(msg)
+        if versions[version_id].fetch_status != FetchStatusChoices.DONE:
+            msg = f"Chart version {version_id} has not finished fetching."
+            raise ChartStatusInvalidError(msg)
+    first, second = versions[ids[0]], versions[ids[1]]
+    return get_or_compute(
+        version_cache_key("diff", first, second),
+        lambda: compare_rankings(
+            first.id,
+            get_chart_version_ranking(first),
+            second.id,
+            get_chart_version_ranking(second),
+        ),
+    )
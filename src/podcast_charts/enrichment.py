@@ -0,0 +1,245 @@
+# enrichment.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Fill in podcast metadata for identifiers discovered by chart fetches.
+
+Scraped charts often only provide remote ids, so identifiers are created without
+a title. Enrichment runs separately from fetching: it collects every identifier
+that is missing metadata or has gone stale, looks them up with the source
+backend in large concurrent batches, and writes the results back in bulk.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import logging
+from collections.abc import Iterable
+
+import httpx
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from podcast_charts.backends import ChartBackend, PodcastData
+from podcast_charts.backends.apple import ITUNES_LOOKUP_MAX_IDS
+from podcast_charts.cache import invalidate_podcast_titles
+from podcast_charts.models import (
+    ChartSourceCategory,
+    PodcastChartPodcastIdentifier,
+    SourceBackendChoices,
+    get_chart_backend,
+)
+from podcast_charts.search import refresh_normalized_titles
+from podcast_charts.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STALE_AFTER = datetime.timedelta(days=30)
+
+
+@dataclasses.dataclass
+class EnrichmentResult:
+    """
+    Summary of an enrichment run.
+
+    Attributes:
+        requested (int): Identifiers that were looked up.
+        updated (int): Identifiers the source returned metadata for.
+        failed (int): Identifiers whose lookup batch raised an error. These are
+            left untouched so they are picked up again by the next run.
+    """
+
+    requested: int = 0
+    updated: int = 0
+    failed: int = 0
+
+
+def get_identifiers_to_enrich(
+    chart_source: str = SourceBackendChoices.APPLE,
+    stale_after: datetime.timedelta = DEFAULT_STALE_AFTER,
+) -> QuerySet[PodcastChartPodcastIdentifier]:
+    """
+    Get identifiers that have never been enriched or whose metadata is stale.
+
+    Args:
+        chart_source (str): The source backend to enrich identifiers for.
+        stale_after (datetime.timedelta): How old metadata may be before it is
+            refreshed.
+
+    Returns:
+        QuerySet[PodcastChartPodcastIdentifier]: The identifiers to enrich.
+    """
+    return PodcastChartPodcastIdentifier.objects.filter(
+        Q(last_enriched__isnull=True)
+        | Q(last_enriched__lt=timezone.now() - stale_after),
+        chart_source=chart_source,
+    )
+
+
+async def lookup_podcasts_in_batches(
+    backend: ChartBackend,
+    podcast_ids: list[str],
+    *,
+    batch_size: int = ITUNES_LOOKUP_MAX_IDS,
+    concurrency: int = 4,
+) -> tuple[list[PodcastData], list[str]]:
+    """
+    Look up podcasts in concurrent batches.
+
+    Args:
+        backend (ChartBackend): The backend to use for lookups.
+        podcast_ids (list[str]): The remote podcast ids to look up.
+        batch_size (int): How many ids to send per request.
+        concurrency (int): How many batches may be in flight at once.
+
+    Returns:
+        tuple[list[PodcastData], list[str]]: The podcasts found, and the ids
+            from batches that failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(batch: list[str]) -> list[PodcastData]:
+        async with semaphore:
+            return await backend.lookup_podcasts(batch)
+
+    batches = list(chunked(podcast_ids, batch_size))
+    outcomes = await asyncio.gather(
+        *(lookup(batch) for batch in batches), return_exceptions=True
+    )
+    found: list[PodcastData] = []
+    failed: list[str] = []
+    for batch, outcome in zip(batches, outcomes, strict=True):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            logger.error(f"Podcast lookup batch failed: {outcome}")
+            failed.extend(batch)
+        else:
+            found.extend(outcome)
+    return found, failed
+
+
+async def _lookup(
+    chart_source: str, podcast_ids: list[str], batch_size: int, concurrency: int
+) -> tuple[list[PodcastData], list[str]]:
+    async with httpx.AsyncClient() as client:
+        backend = get_chart_backend(chart_source, client=client)  # type: ignore
+        return await lookup_podcasts_in_batches(
+            backend, podcast_ids, batch_size=batch_size, concurrency=concurrency
+        )
+
+
+def _store_enrichment(
+    chart_source: str,
+    identifiers: dict[str, PodcastChartPodcastIdentifier],
+    podcasts: Iterable[PodcastData],
+) -> int:
+    now = timezone.now()
+    category_ids = dict(
+        ChartSourceCategory.objects.filter(
+            chart_source=chart_source, chart_source_category_remote_id__isnull=False
+        ).values_list("chart_source_category_remote_id", "id")
+    )
+    through = PodcastChartPodcastIdentifier.categories.through
+    category_links = []
+    updated = 0
+    retitled = False
+    for podcast in podcasts:
+        identifier = identifiers.get(str(podcast.podcast_id))
+        if identifier is None:
+            continue
+        retitled = retitled or identifier.podcast_title != podcast.podcast_title[:250]
+        identifier.podcast_title = podcast.podcast_title[:250]
+        identifier.chart_source_podcast_url = podcast.backend_url
+        for category in podcast.categories:
+            category_id = category_ids.get(str(category.remote_id))
+            if category_id is not None:
+                category_links.append(
+                    through(
+                        podcastchartpodcastidentifier_id=identifier.id,
+                        chartsourcecategory_id=category_id,
+                    )
+                )
+        updated += 1
+    for identifier in identifiers.values():
+        # Mark misses as well so they are not retried until they go stale.
+        identifier.last_enriched = now
+        identifier.modified = now
+    with transaction.atomic():
+        PodcastChartPodcastIdentifier.objects.bulk_update(
+            identifiers.values(),
+            [
+                "podcast_title",
+                "chart_source_podcast_url",
+                "last_enriched",
+                "modified",
+            ],
+            batch_size=500,
+        )
+        through.objects.filter(
+            podcastchartpodcastidentifier_id__in=[i.id for i in identifiers.values()]
+        ).delete()
+        through.objects.bulk_create(
+            category_links, batch_size=1000, ignore_conflicts=True
+        )
+        refresh_normalized_titles(i.id for i in identifiers.values())
+        if retitled:
+            transaction.on_commit(invalidate_podcast_titles)
+    return updated
+
+
+def enrich_podcast_identifiers(
+    identifiers: Iterable[PodcastChartPodcastIdentifier] | None = None,
+    *,
+    chart_source: str = SourceBackendChoices.APPLE,
+    batch_size: int = ITUNES_LOOKUP_MAX_IDS,
+    concurrency: int = 4,
+    stale_after: datetime.timedelta = DEFAULT_STALE_AFTER,
+) -> EnrichmentResult:
+    """
+    Look up and store titles, urls and categories for podcast identifiers.
+
+    Args:
+        identifiers (Iterable[PodcastChartPodcastIdentifier] | None): The
+            identifiers to enrich. Defaults to
+            [get_identifiers_to_enrich][podcast_charts.enrichment.get_identifiers_to_enrich].
+        chart_source (str): The source backend of the identifiers.
+        batch_size (int): How many ids to send per lookup request.
+        concurrency (int): How many lookup requests may be in flight at once.
+        stale_after (datetime.timedelta): How old metadata may be before it is
+            refreshed, used when `identifiers` is not given.
+
+    Returns:
+        EnrichmentResult: A summary of the run.
+    """
+    if identifiers is None:
+        identifiers = get_identifiers_to_enrich(chart_source, stale_after).only(
+            "id",
+            "chart_source",
+            "chart_source_podcast_id",
+            "podcast_title",
+            "chart_source_podcast_url",
+        )
+    by_remote_id = {
+        identifier.chart_source_podcast_id: identifier
+        for identifier in identifiers
+        if identifier.chart_source == chart_source
+    }
+    if not by_remote_id:
+        return EnrichmentResult()
+    podcasts, failed_ids = asyncio.run(
+        _lookup(chart_source, list(by_remote_id.keys()), batch_size, concurrency)
+    )
+    for remote_id in failed_ids:
+        del by_remote_id[remote_id]
+    updated = _store_enrichment(chart_source, by_remote_id, podcasts)
+    return EnrichmentResult(
+        requested=len(by_remote_id) + len(failed_ids),
+        updated=updated,
+        failed=len(failed_ids),
+    )
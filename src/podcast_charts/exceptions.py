@@ -30,3 +30,24 @@ class ChartStatusInvalidError(Exception):
     """
 
     pass
+
+
+class NotificationDeliveryError(Exception):
+    """
+    Raised when a notification could not be delivered.
+
+    Attributes:
+        retryable (bool): Whether delivering again may succeed.
+    """
+
+    def __init__(self, msg: str, *, retryable: bool = True) -> None:
+        super().__init__(msg)
+        self.retryable = retryable
+
+
+class ChartImportError(Exception):
+    """
+    Raised when chart history input is malformed or refers to unknown charts.
+    """
+
+    pass
@@ -0,0 +1,282 @@
+# feed.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Change feed of completed chart versions.
+
+Versions are ordered by `(completed_at, id)`, which is indexed, and consumers
+page through them with an opaque cursor instead of rescanning by `modified`.
+A version that is stored again moves to the end of the feed, so consumers see
+every change. Versions are only returned once they completed at least
+`CHART_FEED_SETTLE_SECONDS` ago, so a transaction that stamped an earlier time
+but committed late is not skipped.
+
+[wait_for_chart_feed][podcast_charts.feed.wait_for_chart_feed] long-polls: it
+sleeps on a cache key bumped whenever a version completes rather than querying
+the database in a loop.
+"""
+
+import asyncio
+import base64
+import binascii
+import dataclasses
+import datetime
+import time
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from podcast_charts.cache import CACHE_PREFIX
+from podcast_charts.models import FetchStatusChoices, PodcastChartVersion
+from podcast_charts.snapshot import ChartSnapshot, load_snapshots
+
+FEED_LATEST_CACHE_KEY = f"{CACHE_PREFIX}:feed:latest"
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartFeedCursor:
+    """
+    A position in the change feed.
+
+    Attributes:
+        completed_at (datetime.datetime): When the last seen version completed.
+        version_id (int): The id of the last seen version.
+    """
+
+    completed_at: datetime.datetime
+    version_id: int
+
+    def encode(self) -> str:
+        """
+        Returns:
+            str: The cursor as an opaque url safe string.
+        """
+        micros = (self.completed_at - _EPOCH) // datetime.timedelta(microseconds=1)
+        raw = f"{micros}.{self.version_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, value: str) -> "ChartFeedCursor":
+        """
+        Args:
+            value (str): A string produced by `encode`.
+
+        Returns:
+            ChartFeedCursor: The cursor.
+
+        Raises:
+            ValueError: If the value is not a valid cursor.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            micros, version_id = raw.split(".")
+            return cls(
+                _EPOCH + datetime.timedelta(microseconds=int(micros)), int(version_id)
+            )
+        except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError) as err:
+            msg = f"Invalid chart feed cursor: {value!r}"
+            raise ValueError(msg) from err
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartFeedEntry:
+    """
+    One completed chart version in the feed.
+
+    Attributes:
+        podcast_chart_id (int): The id of the chart.
+        country (str): The country code.
+        completed_at (datetime.datetime): When the version completed.
+        snapshot (ChartSnapshot): The version's ranking.
+    """
+
+    podcast_chart_id: int
+    country: str
+    completed_at: datetime.datetime
+    snapshot: ChartSnapshot
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict[str, Any]: The entry in a JSON serializable form.
+        """
+        return {
+            "version_id": self.snapshot.version_id,
+            "chart_id": self.podcast_chart_id,
+            "country": self.country,
+            "chart_date": self.snapshot.chart_date.isoformat(),
+            "completed_at": self.completed_at.isoformat(),
+            "podcast_ids": self.snapshot.podcast_ids.tolist(),
+            "positions": self.snapshot.positions.tolist(),
+        }
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartFeedPage:
+    """
+    A page of the change feed.
+
+    Attributes:
+        entries (list[ChartFeedEntry]): The versions, oldest completion first.
+        cursor (ChartFeedCursor | None): Where to continue from. Unchanged from
+            the request when the page is empty.
+        has_more (bool): Whether more versions are already available.
+    """
+
+    entries: list[ChartFeedEntry]
+    cursor: ChartFeedCursor | None
+    has_more: bool
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict[str, Any]: The page in a JSON serializable form.
+        """
+        return {
+            "entries": [entry.to_dict() for entry in self.entries],
+            "cursor": None if self.cursor is None else self.cursor.encode(),
+            "has_more": self.has_more,
+        }
+
+
+def get_settle_delay() -> datetime.timedelta:
+    """
+    Returns:
+        datetime.timedelta: How long after completing a version enters the feed.
+    """
+    return datetime.timedelta(
+        seconds=getattr(settings, "CHART_FEED_SETTLE_SECONDS", 1.0)
+    )
+
+
+def get_latest_chart_feed_cursor() -> ChartFeedCursor | None:
+    """
+    Get a cursor at the current end of the feed, for consumers that only want
+    versions completed from now on.
+
+    Returns:
+        ChartFeedCursor | None: The cursor, or `None` if the feed is empty.
+    """
+    latest = (
+        PodcastChartVersion.objects.filter(
+            fetch_status=FetchStatusChoices.DONE,
+            completed_at__lte=timezone.now() - get_settle_delay(),
+        )
+        .order_by("-completed_at", "-id")
+        .values_list("completed_at", "id")
+        .first()
+    )
+    return None if latest is None else ChartFeedCursor(*latest)
+
+
+def get_chart_feed(
+    cursor: ChartFeedCursor | None = None, limit: int = 100
+) -> ChartFeedPage:
+    """
+    Get the versions that completed after a cursor.
+
+    Args:
+        cursor (ChartFeedCursor | None): Where to start. Defaults to the start of
+            the feed.
+        limit (int): The maximum number of versions to return.
+
+    Returns:
+        ChartFeedPage: The versions and the cursor to continue from.
+    """
+    versions = PodcastChartVersion.objects.filter(
+        fetch_status=FetchStatusChoices.DONE,
+        completed_at__lte=timezone.now() - get_settle_delay(),
+    )
+    if cursor is not None:
+        versions = versions.filter(
+            Q(completed_at__gt=cursor.completed_at)
+            | Q(completed_at=cursor.completed_at, id__gt=cursor.version_id)
+        )
+    rows = list(
+        versions.order_by("completed_at", "id").values_list(
+            "id", "podcast_chart_id", "country__country", "completed_at"
+        )[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    snapshots = load_snapshots(row[0] for row in rows)
+    entries = [
+        ChartFeedEntry(
+            podcast_chart_id=chart_id,
+            country=country,
+            completed_at=completed_at,
+            snapshot=snapshots[version_id],
+        )
+        for version_id, chart_id, country, completed_at in rows
+        # A version reset between the two queries reappears once it completes again.
+        if version_id in snapshots
+    ]
+    if rows:
+        cursor = ChartFeedCursor(rows[-1][3], rows[-1][0])
+    return ChartFeedPage(entries=entries, cursor=cursor, has_more=has_more)
+
+
+def notify_chart_feed(completed_at: datetime.datetime) -> None:
+    """
+    Wake long-polling consumers after a version completes.
+
+    Args:
+        completed_at (datetime.datetime): When the version completed.
+    """
+    cache.set(FEED_LATEST_CACHE_KEY, completed_at.timestamp(), timeout=None)
+
+
+async def wait_for_chart_feed(
+    cursor: ChartFeedCursor | None = None,
+    limit: int = 100,
+    timeout: float = 30.0,
+    poll_interval: float | None = None,
+) -> ChartFeedPage:
+    """
+    Get the versions after a cursor, waiting up to `timeout` seconds for one.
+
+    Args:
+        cursor (ChartFeedCursor | None): Where to start.
+        limit (int): The maximum number of versions to return.
+        timeout (float): How long to wait for a version to complete.
+        poll_interval (float | None): How often to check the cache for new
+            completions. Defaults to `CHART_FEED_POLL_INTERVAL`.
+
+    Returns:
+        ChartFeedPage: The page, which is empty if nothing completed in time.
+    """
+    interval: float = (
+        getattr(settings, "CHART_FEED_POLL_INTERVAL", 0.5)
+        if poll_interval is None
+        else poll_interval
+    )
+    settle = get_settle_delay().total_seconds()
+    deadline = time.monotonic() + timeout
+
+    def capped(seconds: float) -> float:
+        return max(0.0, min(seconds, deadline - time.monotonic()))
+
+    seen = await cache.aget(FEED_LATEST_CACHE_KEY)
+    while True:
+        page = await sync_to_async(get_chart_feed)(cursor, limit)
+        if page.entries or time.monotonic() >= deadline:
+            return page
+        if seen is not None and seen + settle > time.time():
+            # The latest version is still settling, so query again once it has.
+            await asyncio.sleep(capped(seen + settle - time.time()))
+            continue
+        latest = seen
+        while latest == seen and time.monotonic() < deadline:
+            await asyncio.sleep(capped(interval))
+            latest = await cache.aget(FEED_LATEST_CACHE_KEY)
+        seen = latest
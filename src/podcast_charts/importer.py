@@ -0,0 +1,567 @@
+# importer.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Bulk import of chart history collected by other tools.
+
+Input is a stream of records, one per chart position, read lazily from CSV or
+NDJSON with [read_chart_history][podcast_charts.importer.read_chart_history].
+Each record has the columns:
+
+- `chart`: the id of the [PodcastChart][podcast_charts.models.PodcastChart];
+- `country`: the country code, created disabled if it does not exist yet;
+- `date`: the chart date in `YYYY-MM-DD` format;
+- `position`: the rank on the chart;
+- `podcast_id`: the id of the podcast at the chart source;
+- `podcast_title` and `podcast_url`: optional.
+
+Records for the same chart, country and date must be consecutive. The
+[ChartHistoryImporter][podcast_charts.importer.ChartHistoryImporter] buffers
+whole versions until a chunk is full, then writes the chunk in one transaction:
+identifiers are created in bulk, versions are bulk inserted as done, and
+positions are written with `COPY` on PostgreSQL or batched inserts elsewhere.
+Countries and recently seen identifiers are resolved through in-memory maps, and
+the identifier map is bounded, so memory use grows only with the ids of the
+versions created.
+
+Versions that already exist are skipped, so imports can be resumed from the
+record count reported after each chunk, or simply run again. Imported versions
+have no `completed_at`, which keeps them out of the change feed, and no signals
+are sent for them. Run `rebuild_chart_stats` afterwards if stats are needed.
+"""
+
+import collections
+import csv
+import dataclasses
+import datetime
+import importlib.util
+import io
+import itertools
+import json
+import logging
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import AbstractContextManager
+from typing import Any, Protocol, TextIO, cast
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from podcast_charts.cache import invalidate_podcast_titles
+from podcast_charts.exceptions import ChartImportError
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+    get_ranking_hash,
+)
+from podcast_charts.normalize import normalize_title
+from podcast_charts.search import index_podcast_identifiers, refresh_normalized_titles
+from podcast_charts.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Columns written for each position, in COPY order.
+POSITION_FIELDS = (
+    "chart_version",
+    "podcast_identifier",
+    "position",
+    "created",
+    "modified",
+)
+
+# Django uses psycopg 3 when it is installed, and psycopg2 otherwise.
+_PSYCOPG3 = importlib.util.find_spec("psycopg") is not None
+
+
+class _Copy(Protocol):
+    def write_row(self, row: tuple[Any, ...]) -> None: ...
+
+
+class _Psycopg3Cursor(Protocol):
+    def copy(self, statement: str) -> AbstractContextManager[_Copy]: ...
+
+
+class _Psycopg2Cursor(Protocol):
+    def copy_expert(self, sql: str, file: io.StringIO) -> None: ...
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartHistoryRecord:
+    """
+    One imported chart position.
+
+    Attributes:
+        podcast_chart_id (int): The id of the chart.
+        country (str): The country code.
+        chart_date (datetime.date): The date of the chart.
+        position (int): The rank on the chart.
+        podcast_id (str): The id of the podcast at the chart source.
+        podcast_title (str): The podcast title, if known.
+        podcast_url (str | None): The podcast url, if known.
+    """
+
+    podcast_chart_id: int
+    country: str
+    chart_date: datetime.date
+    position: int
+    podcast_id: str
+    podcast_title: str = ""
+    podcast_url: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ChartHistoryRecord":
+        """
+        Build a record from a parsed CSV row or JSON object.
+
+        Args:
+            data (dict[str, Any]): The row.
+
+        Returns:
+            ChartHistoryRecord: The record.
+
+        Raises:
+            ChartImportError: If a column is missing or invalid.
+
+        Example:
+            >>> ChartHistoryRecord.from_dict(
+            ...     {"chart": "1", "country": "US", "date": "2024-12-01",
+            ...      "position": "3", "podcast_id": "42"}
+            ... ).country
+            'us'
+        """
+        try:
+            return cls(
+                podcast_chart_id=int(data["chart"]),
+                country=str(data["country"]).strip().lower(),
+                chart_date=datetime.date.fromisoformat(str(data["date"])),
+                position=int(data["position"]),
+                podcast_id=str(data["podcast_id"]),
+                podcast_title=data.get("podcast_title") or "",
+                podcast_url=data.get("podcast_url") or None,
+            )
+        except (KeyError, TypeError, ValueError) as err:
+            msg = f"Invalid chart history record {data!r}: {err!r}"
+            raise ChartImportError(msg) from err
+
+    @property
+    def version_key(self) -> tuple[int, str, datetime.date]:
+        """
+        Returns:
+            tuple[int, str, datetime.date]: The chart, country and date.
+        """
+        return self.podcast_chart_id, self.country, self.chart_date
+
+
+def read_chart_history(
+    stream: TextIO, input_format: str = "csv"
+) -> Iterator[ChartHistoryRecord]:
+    """
+    Lazily read chart history records.
+
+    Args:
+        stream (TextIO): The input, CSV with a header row or one JSON object per
+            line.
+        input_format (str): `"csv"` or `"ndjson"`.
+
+    Returns:
+        Iterator[ChartHistoryRecord]: The records in input order.
+
+    Raises:
+        ChartImportError: If the input cannot be parsed.
+    """
+    if input_format == "csv":
+        rows: Iterable[dict[str, Any]] = csv.DictReader(stream)
+    elif input_format == "ndjson":
+        rows = (_parse_json_line(line) for line in stream if line.strip())
+    else:
+        msg = f"Unknown chart history format {input_format!r}."
+        raise ChartImportError(msg)
+    for row in rows:
+        yield ChartHistoryRecord.from_dict(row)
+
+
+def _parse_json_line(line: str) -> dict[str, Any]:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as jde:
+        msg = f"Invalid JSON chart history line {line[:100]!r}: {jde}"
+        raise ChartImportError(msg) from jde
+
+
+@dataclasses.dataclass
+class ChartHistoryImportResult:
+    """
+    What an import wrote.
+
+    Attributes:
+        records (int): Records read, including any skipped when resuming.
+        versions (int): Versions created.
+        skipped_versions (int): Versions that already existed.
+        positions (int): Positions created.
+        identifiers (int): Podcast identifiers created.
+        seconds (float): How long the import took.
+    """
+
+    records: int = 0
+    versions: int = 0
+    skipped_versions: int = 0
+    positions: int = 0
+    identifiers: int = 0
+    seconds: float = 0.0
+
+
+class ChartHistoryImporter:
+    """
+    Write streamed chart history to the database in large chunks.
+
+    Attributes:
+        chunk_size (int): Positions buffered before a chunk is written.
+        use_copy (bool): Whether positions are written with PostgreSQL `COPY`.
+        result (ChartHistoryImportResult): What has been written so far.
+    """
+
+    def __init__(
+        self,
+        *,
+        chunk_size: int = 10_000,
+        use_copy: bool | None = None,
+        identifier_cache_size: int = 100_000,
+    ) -> None:
+        """
+        Args:
+            chunk_size (int): Positions buffered before a chunk is written.
+            use_copy (bool | None): Whether to write positions with `COPY`.
+                Defaults to using it on PostgreSQL.
+            identifier_cache_size (int): The most identifier ids kept in memory.
+        """
+        self.chunk_size = chunk_size
+        self.use_copy = (
+            connection.vendor == "postgresql" if use_copy is None else use_copy
+        )
+        self.result = ChartHistoryImportResult()
+        self._identifier_cache_size = identifier_cache_size
+        self._chart_sources = dict(
+            PodcastChart.objects.values_list("id", "chart_source")
+        )
+        self._countries = dict(ChartCountry.objects.values_list("country", "id"))
+        self._identifiers: collections.OrderedDict[tuple[str, str], int] = (
+            collections.OrderedDict()
+        )
+        # Versions created by this run, to tell a resumed version from one whose
+        # records were split across chunks.
+        self._created_version_ids: set[int] = set()
+
+    def run(
+        self,
+        records: Iterable[ChartHistoryRecord],
+        *,
+        skip: int = 0,
+        checkpoint: Callable[[int], None] | None = None,
+    ) -> ChartHistoryImportResult:
+        """
+        Import records.
+
+        Args:
+            records (Iterable[ChartHistoryRecord]): The records in input order.
+            skip (int): Records at the start already imported by an earlier run.
+            checkpoint (Callable[[int], None] | None): Called after each chunk is
+                committed with the number of records imported so far, which can
+                be passed as `skip` to resume.
+
+        Returns:
+            ChartHistoryImportResult: What was written.
+
+        Raises:
+            ChartImportError: If a record refers to an unknown chart or a
+                version's records are not consecutive, even across chunks.
+        """
+        started = time.perf_counter()
+        self.result.records = skip
+        buffered: list[list[ChartHistoryRecord]] = []
+        size = 0
+        for version in self._group_versions(itertools.islice(records, skip, None)):
+            if size >= self.chunk_size:
+                self._write_chunk(buffered, checkpoint)
+                buffered, size = [], 0
+            buffered.append(version)
+            size += len(version)
+        if buffered:
+            self._write_chunk(buffered, checkpoint)
+        self.result.seconds = time.perf_counter() - started
+        logger.info(
+            f"Imported {self.result.versions} versions and {self.result.positions} "
+            f"positions in {self.result.seconds:.1f}s, skipped "
+            f"{self.result.skipped_versions} existing versions"
+        )
+        return self.result
+
+    @staticmethod
+    def _group_versions(
+        records: Iterable[ChartHistoryRecord],
+    ) -> Iterator[list[ChartHistoryRecord]]:
+        for _, group in itertools.groupby(records, key=lambda r: r.version_key):
+            yield list(group)
+
+    def _write_chunk(
+        self,
+        versions: list[list[ChartHistoryRecord]],
+        checkpoint: Callable[[int], None] | None,
+    ) -> None:
+        with transaction.atomic():
+            self._resolve_countries({records[0].country for records in versions})
+            new_versions = self._exclude_existing(versions)
+            version_ids = self._create_versions(new_versions)
+            self._created_version_ids.update(version_ids)
+            identifier_ids = self._resolve_identifiers(
+                record for records in new_versions for record in records
+            )
+            now = timezone.now()
+            rows = [
+                (
+                    version_id,
+                    identifier_ids[self._identifier_key(record)],
+                    record.position,
+                    now,
+                    now,
+                )
+                for version_id, records in zip(version_ids, new_versions, strict=True)
+                for record in records
+            ]
+            if self.use_copy:
+                self._copy_positions(rows)
+            else:
+                PodcastChartPosition.objects.bulk_create(
+                    [
+                        PodcastChartPosition(
+                            chart_version_id=version_id,
+                            podcast_identifier_id=identifier_id,
+                            position=position,
+                        )
+                        for version_id, identifier_id, position, *_ in rows
+                    ],
+                    batch_size=1000,
+                )
+        self.result.records += sum(len(records) for records in versions)
+        self.result.versions += len(new_versions)
+        self.result.skipped_versions += len(versions) - len(new_versions)
+        self.result.positions += len(rows)
+        if checkpoint is not None:
+            checkpoint(self.result.records)
+
+    def _resolve_countries(self, codes: set[str]) -> None:
+        missing = codes - self._countries.keys()
+        if not missing:
+            return
+        ChartCountry.objects.bulk_create(
+            [ChartCountry(country=code, enabled=False) for code in missing],
+            ignore_conflicts=True,
+        )
+        self._countries.update(
+            ChartCountry.objects.filter(country__in=missing).values_list(
+                "country", "id"
+            )
+        )
+
+    def _exclude_existing(
+        self, versions: list[list[ChartHistoryRecord]]
+    ) -> list[list[ChartHistoryRecord]]:
+        keys = [records[0].version_key for records in versions]
+        for (chart_id, *_), records in zip(keys, versions, strict=True):
+            if chart_id not in self._chart_sources:
+                msg = f"Unknown chart {chart_id} in record {records[0]}."
+                raise ChartImportError(msg)
+        if len(set(keys)) < len(keys):
+            msg = (
+                "Records for the same chart, country and date must be consecutive, "
+                f"but {len(keys) - len(set(keys))} versions were split."
+            )
+            raise ChartImportError(msg)
+        dates = [key[2] for key in keys]
+        existing = {
+            (chart_id, country, chart_date): version_id
+            for chart_id, country, chart_date, version_id in (
+                PodcastChartVersion.objects.filter(
+                    podcast_chart_id__in={key[0] for key in keys},
+                    country_id__in={self._countries[key[1]] for key in keys},
+                    chart_date__range=(min(dates), max(dates)),
+                ).values_list(
+                    "podcast_chart_id", "country__country", "chart_date", "id"
+                )
+            )
+        }
+        for key, records in zip(keys, versions, strict=True):
+            if existing.get(key) in self._created_version_ids:
+                msg = (
+                    "Records for the same chart, country and date must be "
+                    f"consecutive, but the records for {records[0]} were split."
+                )
+                raise ChartImportError(msg)
+        return [
+            records
+            for key, records in zip(keys, versions, strict=True)
+            if key not in existing
+        ]
+
+    def _create_versions(self, versions: list[list[ChartHistoryRecord]]) -> list[int]:
+        for records in versions:
+            positions = [record.position for record in records]
+            if len(set(positions)) < len(positions):
+                msg = f"Duplicate positions in the records for {records[0]}."
+                raise ChartImportError(msg)
+        created = PodcastChartVersion.objects.bulk_create(
+            [
+                PodcastChartVersion(
+                    podcast_chart_id=records[0].podcast_chart_id,
+                    country_id=self._countries[records[0].country],
+                    chart_date=records[0].chart_date,
+                    fetch_status=FetchStatusChoices.DONE,
+                    content_hash=get_ranking_hash(
+                        record.podcast_id
+                        for record in sorted(records, key=lambda r: r.position)
+                    ),
+                )
+                for records in versions
+            ],
+            batch_size=1000,
+        )
+        if not created or created[0].id is not None:
+            return [version.id for version in created]
+        # Backends that do not return ids from bulk inserts.
+        ids = {}
+        for batch in chunked(versions, 500):
+            keys = {records[0].version_key for records in batch}
+            for row in PodcastChartVersion.objects.filter(
+                podcast_chart_id__in={key[0] for key in keys},
+                country__country__in={key[1] for key in keys},
+                chart_date__in={key[2] for key in keys},
+            ).values_list("podcast_chart_id", "country__country", "chart_date", "id"):
+                ids[row[:3]] = row[3]
+        return [ids[records[0].version_key] for records in versions]
+
+    def _identifier_key(self, record: ChartHistoryRecord) -> tuple[str, str]:
+        return self._chart_sources[record.podcast_chart_id], record.podcast_id
+
+    def _remember_identifier(self, key: tuple[str, str], identifier_id: int) -> None:
+        self._identifiers[key] = identifier_id
+        if len(self._identifiers) > self._identifier_cache_size:
+            self._identifiers.popitem(last=False)
+
+    def _resolve_identifiers(
+        self, records: Iterable[ChartHistoryRecord]
+    ) -> dict[tuple[str, str], int]:
+        """Map `(chart_source, podcast_id)` to identifier ids, creating any missing."""
+        resolved: dict[tuple[str, str], int] = {}
+        wanted: dict[str, dict[str, ChartHistoryRecord]] = {}
+        for record in records:
+            key = self._identifier_key(record)
+            if key in resolved:
+                continue
+            if key in self._identifiers:
+                self._identifiers.move_to_end(key)
+                resolved[key] = self._identifiers[key]
+            else:
+                wanted.setdefault(key[0], {})[key[1]] = record
+        for chart_source, by_podcast_id in wanted.items():
+            for key, identifier_id in self._upsert_identifiers(
+                chart_source, by_podcast_id
+            ).items():
+                resolved[key] = identifier_id
+                self._remember_identifier(key, identifier_id)
+        return resolved
+
+    def _upsert_identifiers(
+        self, chart_source: str, records: dict[str, ChartHistoryRecord]
+    ) -> dict[tuple[str, str], int]:
+        existing = {
+            podcast_id: (identifier_id, title)
+            for podcast_id, identifier_id, title in (
+                PodcastChartPodcastIdentifier.objects.filter(
+                    chart_source=chart_source, chart_source_podcast_id__in=records
+                ).values_list("chart_source_podcast_id", "id", "podcast_title")
+            )
+        }
+        # Only fill in missing titles. Older history should not replace the titles
+        # stored by current fetches.
+        untitled = [
+            PodcastChartPodcastIdentifier(
+                id=identifier_id, podcast_title=records[podcast_id].podcast_title
+            )
+            for podcast_id, (identifier_id, title) in existing.items()
+            if not title and records[podcast_id].podcast_title
+        ]
+        if untitled:
+            PodcastChartPodcastIdentifier.objects.bulk_update(
+                untitled, ["podcast_title"], batch_size=500
+            )
+            refresh_normalized_titles(identifier.id for identifier in untitled)
+            transaction.on_commit(invalidate_podcast_titles)
+        missing = [
+            PodcastChartPodcastIdentifier(
+                chart_source=chart_source,
+                chart_source_podcast_id=podcast_id,
+                podcast_title=record.podcast_title,
+                podcast_title_normalized=normalize_title(record.podcast_title),
+                chart_source_podcast_url=record.podcast_url,
+            )
+            for podcast_id, record in records.items()
+            if podcast_id not in existing
+        ]
+        ids = {
+            (chart_source, podcast_id): identifier_id
+            for podcast_id, (identifier_id, _) in existing.items()
+        }
+        if missing:
+            PodcastChartPodcastIdentifier.objects.bulk_create(
+                missing, batch_size=1000, ignore_conflicts=True
+            )
+            created = list(
+                PodcastChartPodcastIdentifier.objects.filter(
+                    chart_source=chart_source,
+                    chart_source_podcast_id__in=[
+                        identifier.chart_source_podcast_id for identifier in missing
+                    ],
+                ).only("id", "chart_source_podcast_id", "podcast_title_normalized")
+            )
+            index_podcast_identifiers(
+                identifier
+                for identifier in created
+                if identifier.podcast_title_normalized
+            )
+            self.result.identifiers += len(created)
+            ids.update(
+                ((chart_source, identifier.chart_source_podcast_id), identifier.id)
+                for identifier in created
+            )
+        return ids
+
+    @staticmethod
+    def _copy_positions(rows: list[tuple[Any, ...]]) -> None:
+        """Write positions with PostgreSQL `COPY`, through psycopg 3 or psycopg2."""
+        meta = PodcastChartPosition._meta
+        quote = connection.ops.quote_name
+        columns = ", ".join(
+            quote(meta.get_field(name).column) for name in POSITION_FIELDS
+        )
+        sql = f"COPY {quote(meta.db_table)} ({columns}) FROM STDIN"
+        with connection.cursor() as cursor:
+            if _PSYCOPG3:
+                with cast(_Psycopg3Cursor, cursor.cursor).copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            else:
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write("\t".join(str(value) for value in row))
+                    buffer.write("\n")
+                buffer.seek(0)
+                cast(_Psycopg2Cursor, cursor.cursor).copy_expert(sql, buffer)
@@ -0,0 +1,135 @@
+# benchmark_chart_queries.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to time the main chart read queries at several data sizes."""
+
+import random
+import statistics
+import time
+from collections.abc import Callable
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from podcast_charts.models import ChartCountry, PodcastChart
+from podcast_charts.queries import (
+    get_chart_movers,
+    get_current_chart,
+    get_rank_history,
+)
+from podcast_charts.synthetic import SyntheticHistoryConfig, generate_chart_history
+
+
+class _Rollback(Exception):  # noqa: N818
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the current chart, rank history and movers queries against synthetic "
+        "history of increasing size, generated inside a rolled back transaction."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--days",
+            default="7,30,90",
+            help="Comma separated history lengths in days to benchmark.",
+        )
+        parser.add_argument("--charts", type=int, default=5)
+        parser.add_argument("--countries", type=int, default=5)
+        parser.add_argument("--chart-size", type=int, default=200)
+        parser.add_argument("--podcasts", type=int, default=10_000)
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Timed runs of each query."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--existing",
+            action="store_true",
+            help="Benchmark the data already in the database instead.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rng = random.Random(options["seed"])  # noqa: S311
+        if options["existing"]:
+            charts = list(PodcastChart.objects.all())
+            countries = list(ChartCountry.objects.all())
+            if not charts or not countries:
+                msg = "There are no charts to benchmark."
+                raise CommandError(msg)
+            self._benchmark("existing data", charts, countries, rng, options["repeat"])
+            return
+        for days in (int(value) for value in options["days"].split(",")):
+            config = SyntheticHistoryConfig(
+                charts=options["charts"],
+                countries=options["countries"],
+                days=days,
+                chart_size=options["chart_size"],
+                podcasts=options["podcasts"],
+                seed=options["seed"],
+            )
+            try:
+                with transaction.atomic():
+                    result = generate_chart_history(config)
+                    self._benchmark(
+                        f"{days} days, {result.positions:,} positions",
+                        result.charts,
+                        result.countries,
+                        rng,
+                        options["repeat"],
+                    )
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _benchmark(
+        self,
+        label: str,
+        charts: list[PodcastChart],
+        countries: list[ChartCountry],
+        rng: random.Random,
+        repeat: int,
+    ) -> None:
+        self.stdout.write(f"{label}:")
+        samples = []
+        for _ in range(repeat):
+            chart, country = rng.choice(charts), rng.choice(countries)
+            ranking = get_current_chart(chart, country, cached=False)
+            podcast_id = rng.choice(ranking).podcast_identifier_id if ranking else 0
+            samples.append((chart, country, podcast_id))
+        self._time(
+            "current chart",
+            [
+                lambda c=c, k=k: get_current_chart(c, k, cached=False)
+                for c, k, _ in samples
+            ],
+        )
+        self._time(
+            "rank history",
+            [lambda c=c, k=k, p=p: get_rank_history(p, c, k) for c, k, p in samples],
+        )
+        self._time(
+            "movers",
+            [
+                lambda c=c, k=k: get_chart_movers(c, k, cached=False)
+                for c, k, _ in samples
+            ],
+        )
+
+    def _time(self, label: str, queries: list[Callable[[], Any]]) -> None:
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"  {label}: p50 {statistics.median(timings):.2f}ms, p95 {p95:.2f}ms"
+        )
@@ -0,0 +1,127 @@
+# benchmark_podcast_search.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to benchmark podcast title search."""
+
+import random
+import statistics
+import time
+from collections.abc import Callable
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from podcast_charts.models import PodcastChartPodcastIdentifier
+from podcast_charts.normalize import normalize_title
+from podcast_charts.search import (
+    index_podcast_identifiers,
+    search_podcast_identifiers,
+    uses_postgres_trigram,
+)
+
+WORDS = (
+    "daily news comedy true crime history science weekly morning show radio "
+    "hour talk stories life business money health sports culture music film "
+    "tech politics mystery family kids learning english spanish late night "
+    "friends club inside outside american world great little big secret"
+).split()
+
+
+class _Rollback(Exception):  # noqa: N818
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Load synthetic podcast identifiers inside a rolled back transaction and "
+        "compare title search latency against a plain icontains lookup."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=100_000,
+            help="Number of synthetic podcast identifiers to create.",
+        )
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=50,
+            help="Number of search queries to time.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed for synthetic titles."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rng = random.Random(options["seed"])  # noqa: S311
+        try:
+            with transaction.atomic():
+                titles = self._load_identifiers(rng, options["count"])
+                queries = [rng.choice(titles) for _ in range(options["queries"])]
+                backend = "pg_trgm" if uses_postgres_trigram() else "trigram table"
+                self._report(
+                    f"search ({backend})",
+                    queries,
+                    lambda query: search_podcast_identifiers(query, limit=20),
+                )
+                self._report(
+                    "icontains",
+                    queries,
+                    lambda query: list(
+                        PodcastChartPodcastIdentifier.objects.filter(
+                            podcast_title__icontains=query
+                        )[:20]
+                    ),
+                )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _load_identifiers(self, rng: random.Random, count: int) -> list[str]:
+        started = time.perf_counter()
+        identifiers = []
+        for index in range(count):
+            identifier = PodcastChartPodcastIdentifier(
+                chart_source="apple",
+                chart_source_podcast_id=f"benchmark-{index}",
+                podcast_title=" ".join(rng.choices(WORDS, k=rng.randint(2, 5))),
+            )
+            identifier.podcast_title_normalized = normalize_title(
+                identifier.podcast_title
+            )
+            identifiers.append(identifier)
+        identifiers = PodcastChartPodcastIdentifier.objects.bulk_create(
+            identifiers, batch_size=2000
+        )
+        if identifiers and identifiers[0].id is None:
+            identifiers = list(
+                PodcastChartPodcastIdentifier.objects.filter(
+                    chart_source_podcast_id__startswith="benchmark-"
+                ).only("id", "podcast_title", "podcast_title_normalized")
+            )
+        index_podcast_identifiers(identifiers)
+        self.stdout.write(
+            f"Loaded {count} identifiers in {time.perf_counter() - started:.2f}s."
+        )
+        return [identifier.podcast_title for identifier in identifiers]
+
+    def _report(
+        self, label: str, queries: list[str], search: Callable[[str], Any]
+    ) -> None:
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{label}: p50 {statistics.median(timings):.2f}ms, p95 {p95:.2f}ms"
+        )
@@ -0,0 +1,105 @@
+# chart_fetch_report.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to report on the performance of recent fetch runs."""
+
+from typing import Any, Literal
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from podcast_charts.models import FetchRun
+from podcast_charts.runs import (
+    FetchRunSummary,
+    find_regressions,
+    get_slowest,
+    summarize_runs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the most recent fetch runs against the runs before them, flag "
+        "throughput and latency regressions, and list the slowest countries and "
+        "charts."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--recent", type=int, default=5, help="Number of recent runs to report."
+        )
+        parser.add_argument(
+            "--baseline",
+            type=int,
+            default=20,
+            help="Number of runs before the recent ones to compare against.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Relative change that counts as a regression.",
+        )
+        parser.add_argument(
+            "--slowest",
+            type=int,
+            default=5,
+            help="Number of slowest countries and charts to list.",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit with an error if any regression is found.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        runs = list(FetchRun.objects.all()[: options["recent"] + options["baseline"]])
+        recent_runs = runs[: options["recent"]]
+        if not recent_runs:
+            msg = "No fetch runs have been recorded."
+            raise CommandError(msg)
+        recent = summarize_runs(recent_runs)
+        self._write_summary("Recent", recent)
+        baseline_runs = runs[options["recent"] :]
+        regressions = []
+        if baseline_runs:
+            baseline = summarize_runs(baseline_runs)
+            self._write_summary("Baseline", baseline)
+            regressions = find_regressions(recent, baseline, options["threshold"])
+            for regression in regressions:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Regression in {regression.metric}: "
+                        f"{regression.baseline:.3f} -> {regression.recent:.3f} "
+                        f"({regression.change:+.0%})"
+                    )
+                )
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("No regressions."))
+        else:
+            self.stdout.write("No baseline runs to compare against.")
+        groups: tuple[tuple[Literal["country", "podcast_chart"], str], ...] = (
+            ("country", "countries"),
+            ("podcast_chart", "charts"),
+        )
+        for by, label in groups:
+            self.stdout.write(f"Slowest {label}:")
+            for entry in get_slowest(recent_runs, by, options["slowest"]):
+                self.stdout.write(
+                    f"  {entry.name}: avg {entry.avg_seconds:.3f}s, "
+                    f"max {entry.max_seconds:.3f}s over {entry.versions} versions"
+                )
+        if regressions and options["fail_on_regression"]:
+            msg = f"Found {len(regressions)} fetch performance regressions."
+            raise CommandError(msg)
+
+    def _write_summary(self, label: str, summary: FetchRunSummary) -> None:
+        self.stdout.write(
+            f"{label} {summary.runs} runs, {summary.versions} versions: "
+            f"{summary.throughput:.2f} versions/s, "
+            f"p50 {summary.p50_seconds:.3f}s, p95 {summary.p95_seconds:.3f}s, "
+            f"{summary.failure_rate:.1%} failed or retried."
+        )
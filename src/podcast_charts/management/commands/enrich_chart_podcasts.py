@@ -0,0 +1,62 @@
+# enrich_chart_podcasts.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to look up metadata for podcasts found on charts."""
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from podcast_charts.backends.apple import ITUNES_LOOKUP_MAX_IDS
+from podcast_charts.enrichment import enrich_podcast_identifiers
+from podcast_charts.models import ENABLED_SOURCES
+
+
+class Command(BaseCommand):
+    help = (
+        "Look up titles, urls and categories for podcast identifiers that are "
+        "missing metadata or are stale."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--source",
+            choices=[source.value for source in ENABLED_SOURCES],
+            default=ENABLED_SOURCES[0].value,
+            help="The chart source to enrich identifiers for.",
+        )
+        parser.add_argument(
+            "--stale-days",
+            type=int,
+            default=30,
+            help="Refresh metadata older than this many days.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ITUNES_LOOKUP_MAX_IDS,
+            help="Number of podcasts to look up per request.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of lookup requests to run at once.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        result = enrich_podcast_identifiers(
+            chart_source=options["source"],
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            stale_after=datetime.timedelta(days=options["stale_days"]),
+        )
+        self.stdout.write(
+            f"Looked up {result.requested} podcasts: {result.updated} updated, "
+            f"{result.failed} failed."
+        )
@@ -0,0 +1,95 @@
+# fetch_podcast_charts.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to fetch the current podcast chart rankings."""
+
+import contextlib
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.utils import timezone
+
+from podcast_charts.models import FetchStatusChoices
+from podcast_charts.profiling import PROFILE_MODES, ProfileCapture
+from podcast_charts.scheduling import plan_chart_fetches
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+    release_stale_chart_versions,
+)
+
+
+class Command(BaseCommand):
+    help = "Fetch chart rankings for all enabled charts and countries."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Chart date to fetch in YYYY-MM-DD format. Defaults to today.",
+        )
+        parser.add_argument(
+            "--retries-only",
+            action="store_true",
+            help="Only fetch versions that already exist and are pending or retrying.",
+        )
+        parser.add_argument(
+            "--scheduled",
+            action="store_true",
+            help=(
+                "Only fetch today's charts whose adaptive schedule is due, "
+                "refetching those that were already fetched."
+            ),
+        )
+        parser.add_argument(
+            "--profile",
+            nargs="?",
+            const="cprofile",
+            default=None,
+            choices=PROFILE_MODES,
+            help=(
+                "Profile the run and write the results to CHART_PROFILE_DIR. "
+                "Defaults to cprofile."
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        capture = (
+            ProfileCapture("fetch_podcast_charts", mode=options["profile"])
+            if options["profile"]
+            else contextlib.nullcontext()
+        )
+        with capture:
+            self._fetch(options)
+        if isinstance(capture, ProfileCapture):
+            self.stdout.write(capture.format_summary())
+
+    def _fetch(self, options: dict[str, Any]) -> None:
+        released = release_stale_chart_versions()
+        if released:
+            self.stdout.write(f"Released {released} chart versions with stale claims.")
+        if options["scheduled"]:
+            chart_date = timezone.localdate()
+            versions = plan_chart_fetches()
+        else:
+            chart_date = options["date"] or timezone.localdate()
+            if not options["retries_only"]:
+                create_pending_chart_versions(chart_date)
+            versions = get_versions_to_fetch(chart_date)
+        results = fetch_chart_versions(versions)
+        counts: dict[str, int] = dict.fromkeys(FetchStatusChoices.values, 0)
+        for result in results:
+            counts[result.fetch_status] += 1
+        self.stdout.write(
+            f"Fetched {len(results)} chart versions for {chart_date}: "
+            f"{counts[FetchStatusChoices.DONE]} done, "
+            f"{counts[FetchStatusChoices.RETRY]} to retry, "
+            f"{counts[FetchStatusChoices.ERROR]} failed."
+        )
@@ -0,0 +1,115 @@
+# generate_chart_history.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to generate synthetic chart history for scale testing."""
+
+import datetime
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from podcast_charts.models import PodcastChartVersion
+from podcast_charts.synthetic import (
+    SYNTHETIC_PREFIX,
+    SyntheticHistoryConfig,
+    generate_chart_history,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic charts, countries, podcasts and years of daily chart "
+        "versions with realistic rank churn. Positions are bulk inserted in chunks. "
+        "Run rebuild_chart_stats afterwards if stats are needed."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        defaults = SyntheticHistoryConfig()
+        parser.add_argument("--charts", type=int, default=defaults.charts)
+        parser.add_argument("--countries", type=int, default=defaults.countries)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=defaults.days,
+            help="Number of daily versions per chart and country.",
+        )
+        parser.add_argument("--chart-size", type=int, default=defaults.chart_size)
+        parser.add_argument(
+            "--podcasts",
+            type=int,
+            default=defaults.podcasts,
+            help="Size of the podcast pool charts draw from.",
+        )
+        parser.add_argument(
+            "--churn",
+            type=float,
+            default=defaults.churn,
+            help="Share of each chart replaced every day.",
+        )
+        parser.add_argument(
+            "--volatility",
+            type=float,
+            default=defaults.volatility,
+            help="Daily rank drift as a share of the chart size.",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Date of the most recent versions (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=defaults.batch_size,
+            help="Rows per bulk insert statement.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        config = SyntheticHistoryConfig(
+            charts=options["charts"],
+            countries=options["countries"],
+            days=options["days"],
+            chart_size=options["chart_size"],
+            podcasts=options["podcasts"],
+            churn=options["churn"],
+            volatility=options["volatility"],
+            end_date=options["end_date"] or timezone.localdate(),
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+        )
+        if min(config.charts, config.countries, config.days, config.chart_size) < 1:
+            msg = "Charts, countries, days and chart size must all be positive."
+            raise CommandError(msg)
+        first_date = config.end_date - datetime.timedelta(days=config.days - 1)
+        if PodcastChartVersion.objects.filter(
+            chart_remote_id__startswith=f"{SYNTHETIC_PREFIX}-",
+            chart_date__range=(first_date, config.end_date),
+        ).exists():
+            msg = (
+                f"Synthetic versions already exist between {first_date} and "
+                f"{config.end_date}. Pick another --end-date."
+            )
+            raise CommandError(msg)
+        self.stdout.write(
+            f"Generating {config.position_count:,} positions for {config.charts} "
+            f"charts in {config.countries} countries over {config.days} days."
+        )
+        every = max(1, config.days // 20)
+
+        def progress(chart_date: datetime.date, positions: int) -> None:
+            if (chart_date - first_date).days % every == 0:
+                self.stdout.write(f"  {chart_date}: {positions:,} positions")
+
+        result = generate_chart_history(config, progress=progress)
+        rate = result.positions / result.seconds if result.seconds else 0
+        self.stdout.write(
+            f"Created {result.versions:,} versions and {result.positions:,} "
+            f"positions in {result.seconds:.1f}s ({rate:,.0f} rows/s)."
+        )
@@ -0,0 +1,132 @@
+# import_chart_history.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to bulk import chart history from CSV or NDJSON."""
+
+import contextlib
+import gzip
+import json
+import pathlib
+import sys
+from typing import Any, TextIO
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from podcast_charts.exceptions import ChartImportError
+from podcast_charts.importer import (
+    IMPORT_FORMATS,
+    ChartHistoryImporter,
+    read_chart_history,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import chart history from CSV or NDJSON, one chart position per record "
+        "with chart, country, date, position, podcast_id and optional "
+        "podcast_title and podcast_url columns. Records for a version must be "
+        "consecutive. Existing versions are skipped. Run rebuild_chart_stats "
+        "afterwards if stats are needed."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "path",
+            help="The file to import, optionally gzipped, or - for standard input.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            default=None,
+            help="The input format. Defaults to ndjson for .ndjson and .jsonl files.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="Positions written per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=pathlib.Path,
+            default=None,
+            help=(
+                "Record progress in this file after every chunk, and resume from "
+                "it if it exists. It is removed once the import completes."
+            ),
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Write positions with batched inserts even on PostgreSQL.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path = options["path"]
+        input_format = options["format"] or self._guess_format(path)
+        checkpoint_path = options["checkpoint"]
+        skip = 0
+        if checkpoint_path is not None and checkpoint_path.exists():
+            state = json.loads(checkpoint_path.read_text())
+            if state["path"] != path:
+                msg = (
+                    f"The checkpoint {checkpoint_path} is for {state['path']}, "
+                    f"not {path}."
+                )
+                raise CommandError(msg)
+            skip = state["records"]
+            self.stdout.write(f"Resuming after {skip:,} records.")
+
+        def checkpoint(records: int) -> None:
+            if checkpoint_path is not None:
+                checkpoint_path.write_text(
+                    json.dumps({"path": path, "records": records})
+                )
+            self.stdout.write(f"  {records:,} records imported")
+
+        importer = ChartHistoryImporter(
+            chunk_size=options["chunk_size"],
+            use_copy=False if options["no_copy"] else None,
+        )
+        try:
+            with self._open(path) as stream:
+                result = importer.run(
+                    read_chart_history(stream, input_format),
+                    skip=skip,
+                    checkpoint=checkpoint,
+                )
+        except ChartImportError as cie:
+            raise CommandError(str(cie)) from cie
+        if checkpoint_path is not None:
+            checkpoint_path.unlink(missing_ok=True)
+        rate = result.positions / result.seconds if result.seconds else 0
+        self.stdout.write(
+            f"Imported {result.versions:,} versions, {result.positions:,} positions "
+            f"and {result.identifiers:,} new podcasts in {result.seconds:.1f}s "
+            f"({rate:,.0f} rows/s). Skipped {result.skipped_versions:,} existing "
+            "versions."
+        )
+
+    @staticmethod
+    def _guess_format(path: str) -> str:
+        suffixes = pathlib.Path(path).suffixes
+        if suffixes and suffixes[-1] == ".gz":
+            suffixes = suffixes[:-1]
+        if suffixes and suffixes[-1] in (".ndjson", ".jsonl"):
+            return "ndjson"
+        return "csv"
+
+    @staticmethod
+    def _open(path: str) -> contextlib.AbstractContextManager[TextIO]:
+        if path == "-":
+            return contextlib.nullcontext(sys.stdin)
+        try:
+            if path.endswith(".gz"):
+                return gzip.open(path, "rt", encoding="utf-8", newline="")
+            return open(path, encoding="utf-8", newline="")
+        except OSError as ose:
+            raise CommandError(str(ose)) from ose
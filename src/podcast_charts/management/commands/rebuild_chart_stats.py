@@ -0,0 +1,68 @@
+# rebuild_chart_stats.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to recompute per-podcast chart stats from scratch."""
+
+import concurrent.futures
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, connections
+
+from podcast_charts.stats import (
+    ChartStatsKey,
+    get_chart_stats_keys,
+    rebuild_chart_stats,
+)
+
+
+def _rebuild(key: ChartStatsKey) -> int:
+    try:
+        return rebuild_chart_stats(key)
+    finally:
+        # Each worker thread opens its own connection.
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute podcast chart stats from the stored position history, one "
+        "chart and country per worker."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--chart",
+            type=int,
+            default=None,
+            help="Only rebuild stats for the podcast chart with this id.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of charts and countries rebuilt concurrently.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        keys = get_chart_stats_keys()
+        if options["chart"] is not None:
+            keys = [key for key in keys if key.podcast_chart_id == options["chart"]]
+        workers = options["workers"]
+        if connection.vendor == "sqlite":
+            # SQLite only allows one writer at a time.
+            workers = 1
+        started = time.perf_counter()
+        written = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for count in executor.map(_rebuild, keys):
+                written += count
+        self.stdout.write(
+            f"Rebuilt {written} stats records for {len(keys)} charts in "
+            f"{time.perf_counter() - started:.2f}s."
+        )
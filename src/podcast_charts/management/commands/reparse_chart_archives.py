@@ -0,0 +1,142 @@
+# reparse_chart_archives.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to rebuild chart positions from archived responses."""
+
+import concurrent.futures
+import datetime
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from podcast_charts.backends import ChartParseError
+from podcast_charts.backends.parsing import CompactChart, parse_archived_body
+from podcast_charts.matrix import build_rank_matrix
+from podcast_charts.models import PodcastChartVersion, get_chart_backend
+from podcast_charts.scoring import update_chart_power_scores
+from podcast_charts.stats import ChartStatsKey, rebuild_chart_stats
+from podcast_charts.tasks import replace_chart_positions
+from podcast_charts.utils import chunked
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-parse archived chart responses in parallel and rebuild the positions "
+        "for their chart versions, then the stats, rank matrices and chart power "
+        "scores they affect."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Only re-parse versions for this chart date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--chart",
+            type=int,
+            default=None,
+            help="Only re-parse versions of the podcast chart with this id.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of parser processes. Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Number of archived responses loaded into memory at once.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Parse and report timings without writing any positions.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        versions = (
+            PodcastChartVersion.objects.filter(response_archive__isnull=False)
+            .select_related("podcast_chart", "country", "response_archive")
+            .order_by("id")
+        )
+        if options["date"] is not None:
+            versions = versions.filter(chart_date=options["date"])
+        if options["chart"] is not None:
+            versions = versions.filter(podcast_chart_id=options["chart"])
+        parsers: dict[tuple[str, str], Any] = {}
+        stats_keys: set[ChartStatsKey] = set()
+        chart_dates: set[datetime.date] = set()
+        parsed = failed = 0
+        parse_seconds = 0.0
+        started = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=options["workers"]
+        ) as executor:
+            for chunk in chunked(
+                versions.iterator(chunk_size=options["chunk_size"]),
+                options["chunk_size"],
+            ):
+                results, chunk_seconds = self._parse_chunk(executor, parsers, chunk)
+                parse_seconds += chunk_seconds
+                replaced = [
+                    (version, compact_chart.to_positions())
+                    for version, compact_chart in results
+                    if compact_chart is not None
+                ]
+                failed += len(results) - len(replaced)
+                parsed += len(replaced)
+                if replaced and not options["dry_run"]:
+                    replace_chart_positions(replaced)
+                    for version, _ in replaced:
+                        stats_keys.add(
+                            ChartStatsKey(version.podcast_chart_id, version.country_id)  # type: ignore
+                        )
+                        chart_dates.add(version.chart_date)
+        # Derived data is rebuilt once at the end rather than per version.
+        for key in sorted(stats_keys):
+            rebuild_chart_stats(key)
+        for chart_date in sorted(chart_dates):
+            build_rank_matrix(chart_date)
+            update_chart_power_scores(chart_date)
+        elapsed = time.perf_counter() - started
+        rate = parsed / parse_seconds if parse_seconds else 0
+        self.stdout.write(
+            f"Re-parsed {parsed} archived responses ({failed} failed) in "
+            f"{elapsed:.2f}s, {rate:.1f} pages/s while parsing. Rebuilt stats for "
+            f"{len(stats_keys)} charts and countries and {len(chart_dates)} dates."
+        )
+
+    def _parse_chunk(
+        self,
+        executor: concurrent.futures.Executor,
+        parsers: dict[tuple[str, str], Any],
+        chunk: list[PodcastChartVersion],
+    ) -> tuple[list[tuple[PodcastChartVersion, CompactChart | None]], float]:
+        started = time.perf_counter()
+        futures = []
+        for version in chunk:
+            key = (
+                version.podcast_chart.chart_source,
+                version.podcast_chart.chart_engine,
+            )
+            if key not in parsers:
+                parsers[key] = get_chart_backend(*key).chart_parser  # type: ignore
+            body = bytes(version.response_archive.body)  # type: ignore
+            futures.append(executor.submit(parse_archived_body, parsers[key], body))
+        results: list[tuple[PodcastChartVersion, CompactChart | None]] = []
+        for version, future in zip(chunk, futures, strict=True):
+            try:
+                results.append((version, future.result()))
+            except ChartParseError as cpe:
+                self.stderr.write(f"Could not parse archive for {version}: {cpe}")
+                results.append((version, None))
+        return results, time.perf_counter() - started
@@ -0,0 +1,57 @@
+# score_chart_power.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to rebuild the chart power leaderboard for past dates."""
+
+import datetime
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from podcast_charts.scoring import update_chart_power_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the cross-chart chart power leaderboard for a range of dates, "
+        "e.g. after importing chart history."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--start",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="First date to score in YYYY-MM-DD format. Defaults to today.",
+        )
+        parser.add_argument(
+            "--end",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Last date to score in YYYY-MM-DD format. Defaults to the start.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        start = options["start"] or timezone.localdate()
+        end = options["end"] or start
+        if end < start:
+            msg = "The end date must not be before the start date."
+            raise CommandError(msg)
+        started = time.perf_counter()
+        written = 0
+        days = (end - start).days + 1
+        for day in range(days):
+            # Past dates are read once, so they are not kept in the cache.
+            written += update_chart_power_scores(
+                start + datetime.timedelta(days=day), cached=False
+            )
+        self.stdout.write(
+            f"Stored {written} chart power scores for {days} dates in "
+            f"{time.perf_counter() - started:.2f}s."
+        )
@@ -0,0 +1,76 @@
+# sync_chart_categories.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Management command to discover every category and chart a source offers."""
+
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from podcast_charts.category_sync import sync_chart_categories
+from podcast_charts.models import ENABLED_SOURCES, ChartEngineChoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch the genre hierarchy of a chart source and create or update its "
+        "categories, source categories and charts in bulk."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--source",
+            choices=[source.value for source in ENABLED_SOURCES],
+            default=ENABLED_SOURCES[0].value,
+            help="The chart source to sync categories for.",
+        )
+        parser.add_argument(
+            "--country",
+            action="append",
+            dest="countries",
+            default=None,
+            help=(
+                "Country code to enable the charts for. May be repeated. "
+                "Defaults to every existing country."
+            ),
+        )
+        parser.add_argument(
+            "--engine",
+            choices=ChartEngineChoices.values,
+            default=ChartEngineChoices.HTML,
+            help=(
+                "The chart engine new charts should use. Existing charts keep "
+                "their engine."
+            ),
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Number of category pages to fetch at once.",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Resolve chart ids again for categories that already have a chart.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        result = sync_chart_categories(
+            options["source"],
+            countries=options["countries"],
+            engine=options["engine"],
+            concurrency=options["concurrency"],
+            refresh_chart_ids=options["refresh"],
+        )
+        self.stdout.write(
+            f"Synced {result.categories} categories "
+            f"({result.created_categories} new) and {result.charts} charts."
+        )
+        if result.failed:
+            failed = ", ".join(result.failed)
+            self.stderr.write(f"Could not resolve chart ids for categories: {failed}")
@@ -0,0 +1,277 @@
+# matrix.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Per-date rank matrix across every chart and country.
+
+A [RankMatrix][podcast_charts.matrix.RankMatrix] holds every position stored for
+a chart date in parallel integer arrays sorted by chart, country and position,
+with small indexes for slicing by chart, country or podcast. It is built with a
+single query once a fetch run completes and kept in the cache, so a full grid can
+be served without touching the position table.
+"""
+
+import array
+import bisect
+import dataclasses
+import datetime
+from collections.abc import Iterable
+
+from django.core.cache import cache
+
+from podcast_charts.cache import CACHE_PREFIX, get_cache_timeout, get_or_compute
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChartPosition,
+)
+
+RANK_MATRIX_CACHE_PREFIX = f"{CACHE_PREFIX}:rank_matrix"
+
+
+@dataclasses.dataclass(frozen=True)
+class RankMatrix:
+    """
+    Every position on a chart date, in sparse coordinate form.
+
+    Row `i` says podcast `podcast_ids[i]` held `positions[i]` on chart
+    `chart_ids[i]` in country `country_ids[i]`. Rows are sorted by chart, country
+    and position.
+
+    Attributes:
+        chart_date (datetime.date): The date the matrix covers.
+        chart_ids (array.array): The chart id of each row.
+        country_ids (array.array): The country id of each row.
+        podcast_ids (array.array): The podcast identifier id of each row.
+        positions (array.array): The position of each row.
+        countries (dict[int, str]): Country codes keyed by country id.
+        cell_bounds (dict[tuple[int, int], tuple[int, int]]): The `[start, end)`
+            row range for each `(chart_id, country_id)` cell.
+        podcast_index (array.array): Row numbers sorted by podcast id.
+        podcast_index_keys (array.array): The podcast id of each entry in
+            `podcast_index`, for bisecting.
+    """
+
+    chart_date: datetime.date
+    chart_ids: array.array
+    country_ids: array.array
+    podcast_ids: array.array
+    positions: array.array
+    countries: dict[int, str]
+    cell_bounds: dict[tuple[int, int], tuple[int, int]]
+    podcast_index: array.array
+    podcast_index_keys: array.array
+
+    @classmethod
+    def from_rows(
+        cls,
+        chart_date: datetime.date,
+        rows: Iterable[tuple[int, int, int, int]],
+        countries: dict[int, str],
+    ) -> "RankMatrix":
+        """
+        Build a matrix from position rows.
+
+        Args:
+            chart_date (datetime.date): The date the rows belong to.
+            rows (Iterable[tuple[int, int, int, int]]): `(chart_id, country_id,
+                podcast_identifier_id, position)` rows sorted by chart, country
+                and position.
+            countries (dict[int, str]): Country codes keyed by country id.
+
+        Returns:
+            RankMatrix: The matrix.
+        """
+        chart_ids = array.array("I")
+        country_ids = array.array("I")
+        podcast_ids = array.array("I")
+        positions = array.array("I")
+        cell_bounds: dict[tuple[int, int], tuple[int, int]] = {}
+        cell: tuple[int, int] | None = None
+        start = 0
+        for row_number, (chart_id, country_id, podcast_id, position) in enumerate(rows):
+            if (chart_id, country_id) != cell:
+                if cell is not None:
+                    cell_bounds[cell] = (start, row_number)
+                cell, start = (chart_id, country_id), row_number
+            chart_ids.append(chart_id)
+            country_ids.append(country_id)
+            podcast_ids.append(podcast_id)
+            positions.append(position)
+        if cell is not None:
+            cell_bounds[cell] = (start, len(positions))
+        order = sorted(range(len(podcast_ids)), key=podcast_ids.__getitem__)
+        return cls(
+            chart_date=chart_date,
+            chart_ids=chart_ids,
+            country_ids=country_ids,
+            podcast_ids=podcast_ids,
+            positions=positions,
+            countries=countries,
+            cell_bounds=cell_bounds,
+            podcast_index=array.array("I", order),
+            podcast_index_keys=array.array("I", (podcast_ids[i] for i in order)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def cell(self, chart_id: int, country_id: int) -> list[tuple[int, int]]:
+        """
+        Args:
+            chart_id (int): The podcast chart id.
+            country_id (int): The country id.
+
+        Returns:
+            list[tuple[int, int]]: `(podcast_identifier_id, position)` pairs for the
+                chart in that country, in rank order.
+        """
+        start, end = self.cell_bounds.get((chart_id, country_id), (0, 0))
+        return list(
+            zip(self.podcast_ids[start:end], self.positions[start:end], strict=True)
+        )
+
+    def for_chart(self, chart_id: int) -> dict[str, list[tuple[int, int]]]:
+        """
+        Args:
+            chart_id (int): The podcast chart id.
+
+        Returns:
+            dict[str, list[tuple[int, int]]]: The chart's ranking in each country,
+                keyed by country code.
+        """
+        return {
+            self.countries[country_id]: self.cell(chart_id, country_id)
+            for cell_chart_id, country_id in self.cell_bounds
+            if cell_chart_id == chart_id
+        }
+
+    def for_country(self, country_id: int) -> dict[int, list[tuple[int, int]]]:
+        """
+        Args:
+            country_id (int): The country id.
+
+        Returns:
+            dict[int, list[tuple[int, int]]]: The ranking of every chart in the
+                country, keyed by chart id.
+        """
+        return {
+            chart_id: self.cell(chart_id, country_id)
+            for chart_id, cell_country_id in self.cell_bounds
+            if cell_country_id == country_id
+        }
+
+    def for_podcast(self, podcast_identifier_id: int) -> dict[tuple[int, str], int]:
+        """
+        Args:
+            podcast_identifier_id (int): The podcast identifier id.
+
+        Returns:
+            dict[tuple[int, str], int]: The podcast's position keyed by
+                `(chart_id, country_code)` for every chart it appears on.
+        """
+        start = bisect.bisect_left(self.podcast_index_keys, podcast_identifier_id)
+        end = bisect.bisect_right(self.podcast_index_keys, podcast_identifier_id)
+        return {
+            (self.chart_ids[row], self.countries[self.country_ids[row]]): (
+                self.positions[row]
+            )
+            for row in self.podcast_index[start:end]
+        }
+
+    def grid(self) -> dict[int, dict[str, list[int]]]:
+        """
+        Returns:
+            dict[int, dict[str, list[int]]]: Podcast identifier ids in rank order,
+                keyed by chart id and then country code.
+        """
+        grid: dict[int, dict[str, list[int]]] = {}
+        for (chart_id, country_id), (start, end) in self.cell_bounds.items():
+            grid.setdefault(chart_id, {})[self.countries[country_id]] = (
+                self.podcast_ids[start:end].tolist()
+            )
+        return grid
+
+
+def get_rank_matrix_cache_key(chart_date: datetime.date) -> str:
+    """
+    Args:
+        chart_date (datetime.date): The chart date.
+
+    Returns:
+        str: The cache key for the date's rank matrix.
+    """
+    return f"{RANK_MATRIX_CACHE_PREFIX}:{chart_date.isoformat()}"
+
+
+def _read_rank_matrix(chart_date: datetime.date) -> RankMatrix:
+    rows = (
+        PodcastChartPosition.objects.filter(
+            chart_version__chart_date=chart_date,
+            chart_version__fetch_status=FetchStatusChoices.DONE,
+        )
+        .order_by(
+            "chart_version__podcast_chart_id", "chart_version__country_id", "position"
+        )
+        .values_list(
+            "chart_version__podcast_chart_id",
+            "chart_version__country_id",
+            "podcast_identifier_id",
+            "position",
+        )
+        .iterator(chunk_size=10000)
+    )
+    return RankMatrix.from_rows(
+        chart_date, rows, dict(ChartCountry.objects.values_list("id", "country"))
+    )
+
+
+def build_rank_matrix(chart_date: datetime.date) -> RankMatrix:
+    """
+    Build the rank matrix for a date from the database and cache it.
+
+    Args:
+        chart_date (datetime.date): The chart date.
+
+    Returns:
+        RankMatrix: The matrix.
+    """
+    matrix = _read_rank_matrix(chart_date)
+    cache.set(
+        get_rank_matrix_cache_key(chart_date), matrix, timeout=get_cache_timeout()
+    )
+    return matrix
+
+
+def get_rank_matrix(chart_date: datetime.date, *, cached: bool = True) -> RankMatrix:
+    """
+    Get the rank matrix for a date, building it once if it is not cached.
+
+    Args:
+        chart_date (datetime.date): The chart date.
+        cached (bool): Whether the matrix may be served from and kept in the
+            cache. Pass `False` when reading many past dates once.
+
+    Returns:
+        RankMatrix: The matrix.
+    """
+    if not cached:
+        return _read_rank_matrix(chart_date)
+    return get_or_compute(
+        get_rank_matrix_cache_key(chart_date),
+        lambda: _read_rank_matrix(chart_date),
+    )
+
+
+def invalidate_rank_matrix(chart_date: datetime.date) -> None:
+    """
+    Drop the cached rank matrix for a date.
+
+    Args:
+        chart_date (datetime.date): The chart date.
+    """
+    cache.delete(get_rank_matrix_cache_key(chart_date))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartResponseArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When this instance was created.')),
+                ('modified', models.DateTimeField(auto_now=True, help_text='When this instance was last modified.')),
+                ('content_hash', models.CharField(help_text='SHA-256 digest of the uncompressed response body.', max_length=64, unique=True)),
+                ('chart_source', models.CharField(choices=[('apple', 'Apple Podcasts'), ('spotify', 'Spotify Podcasts')], default='apple', help_text='Source backend for this response.', max_length=50)),
+                ('body', models.BinaryField(help_text='The compressed response body.')),
+                ('body_size', models.PositiveIntegerField(help_text='Size of the uncompressed response body in bytes.')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='podcastchartversion',
+            name='response_archive',
+            field=models.ForeignKey(blank=True, help_text='The archived raw response this version was parsed from.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chart_versions', to='podcast_charts.chartresponsearchive'),
+        ),
+    ]
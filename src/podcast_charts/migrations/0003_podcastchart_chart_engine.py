@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0002_chart_response_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastchart',
+            name='chart_engine',
+            field=models.CharField(choices=[('html', 'Web page scraping'), ('feed', 'Structured chart feed')], default='html', help_text='How chart data is retrieved. Feed based engines use the remote id of the chart source category.', max_length=10),
+        ),
+    ]
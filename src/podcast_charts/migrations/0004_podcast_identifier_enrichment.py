@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0003_podcastchart_chart_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastchartpodcastidentifier',
+            name='categories',
+            field=models.ManyToManyField(blank=True, help_text='Source categories this podcast is listed in.', related_name='podcast_identifiers', to='podcast_charts.chartsourcecategory'),
+        ),
+        migrations.AddField(
+            model_name='podcastchartpodcastidentifier',
+            name='last_enriched',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When metadata for this podcast was last looked up.', null=True),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:33
+
+import django.db.models.deletion
+from django.apps import apps as global_apps
+from django.db import migrations, models
+
+from podcast_charts.normalize import normalize_title, title_trigrams
+
+
+def uses_postgres_trigram(schema_editor):
+    return schema_editor.connection.vendor == "postgresql" and global_apps.is_installed(
+        "django.contrib.postgres"
+    )
+
+
+def index_titles(apps, schema_editor):
+    identifier_model = apps.get_model("podcast_charts", "PodcastChartPodcastIdentifier")
+    trigram_model = apps.get_model("podcast_charts", "PodcastTitleTrigram")
+    build_ngrams = not uses_postgres_trigram(schema_editor)
+    identifiers = []
+    trigrams = []
+    for identifier in identifier_model.objects.only("id", "podcast_title").iterator():
+        identifier.podcast_title_normalized = normalize_title(identifier.podcast_title)
+        identifiers.append(identifier)
+        if build_ngrams:
+            trigrams.extend(
+                trigram_model(podcast_identifier_id=identifier.id, trigram=gram)
+                for gram in title_trigrams(identifier.podcast_title_normalized)
+            )
+    identifier_model.objects.bulk_update(
+        identifiers, ["podcast_title_normalized"], batch_size=500
+    )
+    trigram_model.objects.bulk_create(trigrams, batch_size=2000)
+
+
+def create_postgres_trigram_index(apps, schema_editor):
+    if not uses_postgres_trigram(schema_editor):
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS podcast_title_normalized_trgm_idx "
+        "ON podcast_charts_podcastchartpodcastidentifier "
+        "USING gin (podcast_title_normalized gin_trgm_ops)"
+    )
+
+
+def drop_postgres_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS podcast_title_normalized_trgm_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("podcast_charts", "0004_podcast_identifier_enrichment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="podcastchartpodcastidentifier",
+            name="podcast_title_normalized",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                help_text="Normalized podcast title used for search.",
+                max_length=250,
+            ),
+        ),
+        migrations.CreateModel(
+            name="PodcastTitleTrigram",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "trigram",
+                    models.CharField(help_text="A title trigram.", max_length=3),
+                ),
+                (
+                    "podcast_identifier",
+                    models.ForeignKey(
+                        help_text="The podcast identifier this trigram belongs to.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="title_trigrams",
+                        to="podcast_charts.podcastchartpodcastidentifier",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["trigram", "podcast_identifier"],
+                        name="podcast_trigram_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("podcast_identifier", "trigram"),
+                        name="unique_trigram_for_podcast",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(index_titles, migrations.RunPython.noop),
+        migrations.RunPython(
+            create_postgres_trigram_index, drop_postgres_trigram_index
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0005_podcast_title_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PodcastChartStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When this instance was created.')),
+                ('modified', models.DateTimeField(auto_now=True, help_text='When this instance was last modified.')),
+                ('best_position', models.PositiveIntegerField(help_text='The best position reached.')),
+                ('last_position', models.PositiveIntegerField(blank=True, help_text='The position in the latest version, if still on the chart.', null=True)),
+                ('current_streak', models.PositiveIntegerField(default=0, help_text='Consecutive versions on the chart up to the latest.')),
+                ('days_on_chart', models.PositiveIntegerField(default=0, help_text='Number of versions the podcast appeared in.')),
+                ('position_total', models.PositiveBigIntegerField(default=0, help_text='Sum of all positions held, for the average.')),
+                ('first_chart_date', models.DateField(help_text='First date on the chart.')),
+                ('last_chart_date', models.DateField(help_text='Most recent date on the chart.')),
+                ('country', models.ForeignKey(help_text='The country these stats are for.', on_delete=django.db.models.deletion.CASCADE, related_name='podcast_stats', to='podcast_charts.chartcountry')),
+                ('podcast_chart', models.ForeignKey(help_text='The chart these stats are for.', on_delete=django.db.models.deletion.CASCADE, related_name='podcast_stats', to='podcast_charts.podcastchart')),
+                ('podcast_identifier', models.ForeignKey(help_text='The podcast these stats are for.', on_delete=django.db.models.deletion.CASCADE, related_name='chart_stats', to='podcast_charts.podcastchartpodcastidentifier')),
+            ],
+            options={
+                'verbose_name_plural': 'podcast chart stats',
+                'constraints': [models.UniqueConstraint(fields=('podcast_chart', 'country', 'podcast_identifier'), name='unique_stats_for_chart_country_podcast')],
+            },
+        ),
+    ]
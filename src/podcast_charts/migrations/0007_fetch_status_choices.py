@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0006_podcast_chart_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='podcastchartversion',
+            name='fetch_status',
+            field=models.CharField(choices=[('pend', 'Pending'), ('fetch', 'In progress...'), ('done', 'Done'), ('error', 'Error'), ('retry', 'Pending Retry')], db_index=True, default='pend', help_text='The fetch status of the chart data.', max_length=20),
+        ),
+    ]
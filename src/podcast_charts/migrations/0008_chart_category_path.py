@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def category_path_segment(category_id):
+    return f"{category_id:010d}/"
+
+
+def build_category_paths(apps, schema_editor):
+    category_model = apps.get_model("podcast_charts", "ChartCategory")
+    categories = {category.id: category for category in category_model.objects.all()}
+    paths = {}
+
+    def resolve(category, seen=()):
+        if category.id in paths:
+            return paths[category.id]
+        parent = categories.get(category.parent_label_id)
+        if parent is None or parent.id in seen:
+            # Break any existing cycle by making this category a root.
+            category.parent_label_id = None
+            paths[category.id] = category_path_segment(category.id)
+        else:
+            paths[category.id] = resolve(parent, (*seen, category.id)) + (
+                category_path_segment(category.id)
+            )
+        return paths[category.id]
+
+    for category in categories.values():
+        category.path = resolve(category)
+        category.depth = category.path.count("/") - 1
+    category_model.objects.bulk_update(
+        categories.values(), ["path", "depth", "parent_label"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0007_fetch_status_choices'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chartcategory',
+            options={'ordering': ('path',)},
+        ),
+        migrations.AddField(
+            model_name='chartcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Number of ancestor categories.'),
+        ),
+        migrations.AddField(
+            model_name='chartcategory',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Materialized path of category ids from the root.', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='chartcategory',
+            name='parent_label',
+            field=models.ForeignKey(blank=True, help_text='The parent category if applicable.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='podcast_charts.chartcategory'),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
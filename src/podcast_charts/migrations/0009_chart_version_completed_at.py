@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_completed_at(apps, schema_editor):
+    version_model = apps.get_model("podcast_charts", "PodcastChartVersion")
+    version_model.objects.filter(fetch_status="done").update(completed_at=F("modified"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0008_chart_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastchartversion',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the positions for this version were last stored.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='podcastchartversion',
+            index=models.Index(fields=['completed_at', 'id'], name='chart_version_feed_idx'),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+    ]
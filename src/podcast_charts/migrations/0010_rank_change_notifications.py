@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0009_chart_version_completed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSubscriber',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When this instance was created.')),
+                ('modified', models.DateTimeField(auto_now=True, help_text='When this instance was last modified.')),
+                ('name', models.CharField(help_text='Name of the subscriber.', max_length=100, unique=True)),
+                ('endpoint', models.URLField(blank=True, default='', help_text='Where notifications are delivered.', max_length=500)),
+                ('enabled', models.BooleanField(default=True, help_text='Whether notifications are delivered.')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PodcastSubscription',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When this instance was created.')),
+                ('modified', models.DateTimeField(auto_now=True, help_text='When this instance was last modified.')),
+                ('min_change', models.PositiveSmallIntegerField(default=1, help_text='Smallest change in position to notify about.')),
+                ('country', models.ForeignKey(blank=True, help_text='Limit notifications to this country.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='podcast_charts.chartcountry')),
+                ('podcast_chart', models.ForeignKey(blank=True, help_text='Limit notifications to this chart.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='podcast_charts.podcastchart')),
+                ('podcast_identifier', models.ForeignKey(help_text='The podcast to track.', on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='podcast_charts.podcastchartpodcastidentifier')),
+                ('subscriber', models.ForeignKey(help_text='The subscriber to notify.', on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='podcast_charts.notificationsubscriber')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:11
+
+import hashlib
+import itertools
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def get_ranking_hash(podcast_ids):
+    return hashlib.sha256("\n".join(podcast_ids).encode("utf-8")).hexdigest()
+
+
+def backfill_content_hashes(apps, schema_editor):
+    version_model = apps.get_model("podcast_charts", "PodcastChartVersion")
+    position_model = apps.get_model("podcast_charts", "PodcastChartPosition")
+    version_ids = list(
+        version_model.objects.filter(fetch_status="done")
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    for start in range(0, len(version_ids), 500):
+        chunk = version_ids[start : start + 500]
+        rows = (
+            position_model.objects.filter(chart_version_id__in=chunk)
+            .order_by("chart_version_id", "position")
+            .values_list("chart_version_id", "podcast_identifier__chart_source_podcast_id")
+        )
+        hashes = {
+            version_id: get_ranking_hash(podcast_id for _, podcast_id in group)
+            for version_id, group in itertools.groupby(rows, key=lambda row: row[0])
+        }
+        versions = [
+            version_model(id=version_id, content_hash=hashes.get(version_id, get_ranking_hash([])))
+            for version_id in chunk
+        ]
+        version_model.objects.bulk_update(versions, ["content_hash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0010_rank_change_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastchartversion',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of the stored ranking, used to detect unchanged charts.', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ChartFetchSchedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When this instance was created.')),
+                ('modified', models.DateTimeField(auto_now=True, help_text='When this instance was last modified.')),
+                ('next_fetch_at', models.DateTimeField(db_index=True, help_text='When the chart is next due to be fetched.')),
+                ('poll_interval', models.DurationField(help_text='Current wait between fetches while the chart is unchanged.')),
+                ('content_hash', models.CharField(blank=True, default='', help_text='Hash of the last ranking fetched.', max_length=64)),
+                ('last_checked_at', models.DateTimeField(blank=True, help_text='When the chart was last fetched.', null=True)),
+                ('last_changed_at', models.DateTimeField(blank=True, help_text='When the ranking last changed.', null=True)),
+                ('change_minutes', models.JSONField(blank=True, default=list, help_text='Estimated minutes past midnight UTC of recent changes.')),
+                ('checks', models.PositiveIntegerField(default=0, help_text='Fetches that stored a ranking.')),
+                ('changes', models.PositiveIntegerField(default=0, help_text='Fetches that found a changed ranking.')),
+                ('country', models.ForeignKey(help_text='The country this schedule is for.', on_delete=django.db.models.deletion.CASCADE, related_name='fetch_schedules', to='podcast_charts.chartcountry')),
+                ('podcast_chart', models.ForeignKey(help_text='The chart this schedule is for.', on_delete=django.db.models.deletion.CASCADE, related_name='fetch_schedules', to='podcast_charts.podcastchart')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('podcast_chart', 'country'), name='unique_fetch_schedule_for_chart_country')],
+            },
+        ),
+        migrations.RunPython(backfill_content_hashes, migrations.RunPython.noop),
+    ]
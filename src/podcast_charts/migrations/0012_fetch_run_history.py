@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0011_chart_fetch_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When this instance was created.')),
+                ('modified', models.DateTimeField(auto_now=True, help_text='When this instance was last modified.')),
+                ('started_at', models.DateTimeField(db_index=True, help_text='When the run started.')),
+                ('finished_at', models.DateTimeField(help_text='When the run finished.')),
+                ('attempted', models.PositiveIntegerField(default=0, help_text='Versions the run claimed.')),
+                ('succeeded', models.PositiveIntegerField(default=0, help_text='Versions stored as done.')),
+                ('retried', models.PositiveIntegerField(default=0, help_text='Versions left to retry.')),
+                ('failed', models.PositiveIntegerField(default=0, help_text='Versions that failed for good.')),
+                ('response_bytes', models.PositiveBigIntegerField(default=0, help_text='Size of the chart responses fetched.')),
+                ('rows_written', models.PositiveIntegerField(default=0, help_text='Chart positions stored.')),
+                ('phase_seconds', models.JSONField(blank=True, default=dict, help_text='Time spent per phase, added up over all versions.')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FetchRunTiming',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fetch_status', models.CharField(choices=[('pend', 'Pending'), ('fetch', 'In progress...'), ('done', 'Done'), ('error', 'Error'), ('retry', 'Pending Retry')], help_text='The status the version was left in.', max_length=20)),
+                ('http_seconds', models.FloatField(default=0.0, help_text='Time spent waiting for the chart response.')),
+                ('parse_seconds', models.FloatField(default=0.0, help_text='Time spent parsing the response.')),
+                ('store_seconds', models.FloatField(default=0.0, help_text='Time spent storing the positions.')),
+                ('response_bytes', models.PositiveIntegerField(default=0, help_text='Size of the chart response.')),
+                ('rows_written', models.PositiveIntegerField(default=0, help_text='Chart positions stored.')),
+                ('chart_version', models.ForeignKey(blank=True, help_text='The version that was fetched.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fetch_timings', to='podcast_charts.podcastchartversion')),
+                ('country', models.ForeignKey(help_text='The country of the version.', on_delete=django.db.models.deletion.CASCADE, related_name='fetch_timings', to='podcast_charts.chartcountry')),
+                ('podcast_chart', models.ForeignKey(help_text='The chart of the version.', on_delete=django.db.models.deletion.CASCADE, related_name='fetch_timings', to='podcast_charts.podcastchart')),
+                ('run', models.ForeignKey(help_text='The run the version was fetched in.', on_delete=django.db.models.deletion.CASCADE, related_name='timings', to='podcast_charts.fetchrun')),
+            ],
+        ),
+    ]
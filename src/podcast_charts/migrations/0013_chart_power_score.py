@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0012_fetch_run_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartPowerScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chart_date', models.DateField(help_text='The chart date scored.')),
+                ('rank', models.PositiveIntegerField(help_text='The place on the leaderboard.')),
+                ('score', models.FloatField(help_text='The combined score across all charts.')),
+                ('appearances', models.PositiveIntegerField(help_text='How many charts and countries the podcast was on.')),
+                ('best_position', models.PositiveIntegerField(help_text='The highest position on any chart.')),
+                ('podcast_identifier', models.ForeignKey(help_text='The podcast scored.', on_delete=django.db.models.deletion.CASCADE, related_name='power_scores', to='podcast_charts.podcastchartpodcastidentifier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chart_date', 'rank'], name='power_leaderboard_idx')],
+                'constraints': [models.UniqueConstraint(fields=('podcast_identifier', 'chart_date'), name='unique_power_score_for_podcast_date')],
+            },
+        ),
+    ]
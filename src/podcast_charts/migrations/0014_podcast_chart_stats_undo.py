@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_charts', '0013_chart_power_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastchartstats',
+            name='folded_chart_date',
+            field=models.DateField(blank=True, help_text='Date of the latest ranking folded in, while it can be undone.', null=True),
+        ),
+        migrations.AddField(
+            model_name='podcastchartstats',
+            name='previous_best_position',
+            field=models.PositiveIntegerField(blank=True, help_text='Best position before that ranking.', null=True),
+        ),
+        migrations.AddField(
+            model_name='podcastchartstats',
+            name='previous_current_streak',
+            field=models.PositiveIntegerField(blank=True, help_text='Current streak before that ranking.', null=True),
+        ),
+        migrations.AddField(
+            model_name='podcastchartstats',
+            name='previous_last_chart_date',
+            field=models.DateField(blank=True, help_text='Last chart date before that ranking.', null=True),
+        ),
+        migrations.AddField(
+            model_name='podcastchartstats',
+            name='previous_last_position',
+            field=models.PositiveIntegerField(blank=True, help_text='Last position before that ranking.', null=True),
+        ),
+    ]
@@ -7,13 +7,27 @@
 
 """Models for podcast_charts"""
 
+import contextlib
+import hashlib
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from podcast_charts import ChartImproperlyConfiguredError, ChartSourceNotSupportedError
+from podcast_charts import (
+    ChartImproperlyConfiguredError,
+    ChartSourceNotSupportedError,
+    ChartStatusInvalidError,
+)
 from podcast_charts.backends import ChartBackend
 from podcast_charts.backends.apple import ApplePodcastsChartBackend
+from podcast_charts.backends.apple_feed import AppleFeedChartBackend
+from podcast_charts.normalize import normalize_title
 
 MAX_CHART_RETRIES = (
     settings.CHART_FETCH_MAX_RETRIES
@@ -30,6 +44,13 @@ class SourceBackendChoices(models.TextChoices):
     SPOTIFY = "spotify", _("Spotify Podcasts")
 
 
+class ChartEngineChoices(models.TextChoices):
+    """How chart data is retrieved from a source backend."""
+
+    HTML = "html", _("Web page scraping")
+    FEED = "feed", _("Structured chart feed")
+
+
 ENABLED_SOURCES = (SourceBackendChoices.APPLE,)
 
 
@@ -37,14 +58,28 @@ SOURCE_BACKEND_MAPPING = {
     SourceBackendChoices.APPLE.value: ApplePodcastsChartBackend,
 }
 
+# Alternative engines for a source. The default engine for every source is the one
+# in SOURCE_BACKEND_MAPPING.
+SOURCE_ENGINE_BACKEND_MAPPING = {
+    (SourceBackendChoices.APPLE.value, ChartEngineChoices.FEED.value): (
+        AppleFeedChartBackend
+    ),
+}
+
 
-def get_chart_backend(source_backend_key: tuple[str, str]) -> ChartBackend:
+def get_chart_backend(
+    source_backend_key: tuple[str, str],
+    engine: str = ChartEngineChoices.HTML,
+    **kwargs: Any,
+) -> ChartBackend:
     """
     Given an option from SourceBackendChoices, return the mapped backend class.
 
     Args:
         source_backend_key (tuple[str, str]): Source backend to use from
             SourceBackendChoices.
+        engine (str): The chart engine to use from ChartEngineChoices.
+        **kwargs: Passed to the backend constructor, e.g. a shared `client`.
     Returns:
         ChartBackend: A chart backend instance.
     Raises:
@@ -53,10 +88,15 @@ def get_chart_backend(source_backend_key: tuple[str, str]) -> ChartBackend:
     if source_backend_key not in ENABLED_SOURCES:
         msg = f"{source_backend_key} is not an enabled source!"
         raise ChartSourceNotSupportedError(msg)
+    if engine != ChartEngineChoices.HTML:
+        if (source_backend_key, engine) not in SOURCE_ENGINE_BACKEND_MAPPING.keys():
+            msg = f"{source_backend_key} does not support the {engine} engine!"
+            raise ChartSourceNotSupportedError(msg)
+        return SOURCE_ENGINE_BACKEND_MAPPING[(source_backend_key, engine)](**kwargs)  # type: ignore
     if source_backend_key not in SOURCE_BACKEND_MAPPING.keys():
         msg = f"{source_backend_key} is not a configured source!"
         raise ChartSourceNotSupportedError(msg)
-    return SOURCE_BACKEND_MAPPING[source_backend_key]()
+    return SOURCE_BACKEND_MAPPING[source_backend_key](**kwargs)
 
 
 class FetchStatusChoices(models.TextChoices):
@@ -116,7 +156,130 @@ class ChartCountry(TimeStampedModel):
         ordering = ("country",)
 
     def __str__(self) -> str:  # no cov
-        return f"{self.get_country_display()} ({self.country})"  # type: ignore
+        return self.country
+
+
+CATEGORY_PATH_WIDTH = 10
+
+
+def category_path_segment(category_id: int) -> str:
+    """
+    Args:
+        category_id (int): The id of a category.
+
+    Returns:
+        str: The category's segment of a materialized path, zero padded so paths
+            sort parents before children.
+    """
+    return f"{category_id:0{CATEGORY_PATH_WIDTH}d}/"
+
+
+def get_ranking_hash(podcast_ids: Iterable[str]) -> str:
+    """
+    Args:
+        podcast_ids (Iterable[str]): Remote podcast ids in chart order.
+
+    Returns:
+        str: The SHA-256 hex digest of the ranking. Two versions with the same
+            podcasts in the same order have the same hash, whatever else differs
+            in the responses they were parsed from.
+    """
+    return hashlib.sha256("\n".join(podcast_ids).encode("utf-8")).hexdigest()
+
+
+class ChartCategoryQuerySet(models.QuerySet["ChartCategory"]):
+    """Tree queries over the materialized category path."""
+
+    def subtree(
+        self, category: "ChartCategory", *, include_self: bool = True
+    ) -> "ChartCategoryQuerySet":
+        """
+        Filter to a category and everything below it.
+
+        Args:
+            category (ChartCategory): The root of the subtree.
+            include_self (bool): Whether to include the root itself.
+
+        Returns:
+            ChartCategoryQuerySet: The filtered queryset.
+        """
+        queryset = self.filter(path__startswith=category.path)
+        return queryset if include_self else queryset.exclude(id=category.id)
+
+    def ancestors(
+        self, category: "ChartCategory", *, include_self: bool = False
+    ) -> "ChartCategoryQuerySet":
+        """
+        Filter to the categories above a category, root first.
+
+        Args:
+            category (ChartCategory): The category.
+            include_self (bool): Whether to include the category itself.
+
+        Returns:
+            ChartCategoryQuerySet: The filtered queryset.
+        """
+        ids = category.path_ids
+        if not include_self:
+            ids = ids[:-1]
+        return self.filter(id__in=ids).order_by("path")
+
+    def roots(self) -> "ChartCategoryQuerySet":
+        """
+        Returns:
+            ChartCategoryQuerySet: Categories without a parent.
+        """
+        return self.filter(depth=0)
+
+    def rebuild_paths(self) -> int:
+        """
+        Recompute the path and depth of every category from the parent links.
+
+        Used after parents are changed in bulk, which bypasses `save`. A parent
+        link that would form a cycle is cleared.
+
+        Returns:
+            int: The number of categories whose path or depth changed.
+        """
+        categories = {
+            category.id: category
+            for category in ChartCategory.objects.only(
+                "id", "parent_label", "path", "depth"
+            )
+        }
+        paths: dict[int, str] = {}
+
+        def resolve(category: ChartCategory, seen: frozenset[int]) -> str:
+            if category.id not in paths:
+                parent = categories.get(category.parent_label_id)  # type: ignore
+                if parent is None or parent.id in seen:
+                    category.parent_label_id = None
+                    parent_path = ""
+                else:
+                    parent_path = resolve(parent, seen | {category.id})
+                paths[category.id] = parent_path + category_path_segment(category.id)
+            return paths[category.id]
+
+        changed = []
+        for category in categories.values():
+            path = resolve(category, frozenset())
+            if path != category.path:
+                category.path = path
+                category.depth = path.count("/") - 1
+                changed.append(category)
+        ChartCategory.objects.bulk_update(
+            changed, ["path", "depth", "parent_label"], batch_size=500
+        )
+        return len(changed)
+
+
+if TYPE_CHECKING:  # no cov
+
+    class ChartCategoryManager(models.Manager["ChartCategory"], ChartCategoryQuerySet):
+        """Typed stand-in for the manager built from `ChartCategoryQuerySet`."""
+
+else:
+    ChartCategoryManager = models.Manager.from_queryset(ChartCategoryQuerySet)
 
 
 class ChartCategory(TimeStampedModel):
@@ -125,15 +288,22 @@ class ChartCategory(TimeStampedModel):
     chart categories may vary per source. Most charts follow the iTunes categories
     but this is kept generic in case of new implementations arising.
 
+    Each category stores the materialized path of ids from its root down to itself,
+    so a whole subtree can be selected with a single prefix match. The path is kept
+    in sync on save and when a parent is deleted.
+
     Attributes:
         id (int): The id of this category.
         label (str): The label of the category.
         parent_label (ChartCategory): The parent category, if applicable.
+        path (str): Zero padded ids from the root down to this category.
+        depth (int): The number of ancestors of this category.
         created (datetime.datetime): The datetime the category was created.
         modified (datetime.datetime): The datetime the category was last modified.
     """
 
     id: int
+    parent_label_id: int | None
     label = models.CharField(
         max_length=200, unique=True, help_text=_("The label of the category.")
     )
@@ -142,15 +312,103 @@ class ChartCategory(TimeStampedModel):
         null=True,
         blank=True,
         on_delete=models.SET_NULL,
+        related_name="children",
         help_text=_("The parent category if applicable."),
     )
+    path = models.CharField(
+        max_length=255,
+        db_index=True,
+        editable=False,
+        default="",
+        help_text=_("Materialized path of category ids from the root."),
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0, editable=False, help_text=_("Number of ancestor categories.")
+    )
+
+    objects: ChartCategoryManager = ChartCategoryManager()
 
     class Meta:
-        ordering = ("parent_label__label", "label",)
+        ordering = ("path",)
 
     def __str__(self) -> str:  # no cov
         return self.label
 
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Save the category and keep its path, and its descendants' paths, current.
+
+        Raises:
+            ChartImproperlyConfiguredError: If the parent is the category itself or
+                one of its descendants.
+        """
+        with transaction.atomic():
+            parent_path = self._parent_path()
+            if self.id is None:
+                super().save(*args, **kwargs)
+                self.path = parent_path + category_path_segment(self.id)
+                self.depth = parent_path.count("/")
+                ChartCategory.objects.filter(id=self.id).update(
+                    path=self.path, depth=self.depth
+                )
+                return
+            old_path, old_depth = self.path, self.depth
+            self.path = parent_path + category_path_segment(self.id)
+            self.depth = parent_path.count("/")
+            if old_path and parent_path.startswith(old_path):
+                self.path, self.depth = old_path, old_depth
+                msg = f"Category {self.label} cannot be its own ancestor."
+                raise ChartImproperlyConfiguredError(msg)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "path", "depth"}
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                self.rebase_descendants(old_path, self.path, self.depth - old_depth)
+
+    @property
+    def path_ids(self) -> list[int]:
+        """
+        Returns:
+            list[int]: The ids of this category's ancestors and itself, root first.
+        """
+        return [int(segment) for segment in self.path.split("/") if segment]
+
+    def _parent_path(self) -> str:
+        if self.parent_label_id is None:
+            return ""
+        return (
+            ChartCategory.objects.filter(id=self.parent_label_id)
+            .values_list("path", flat=True)
+            .get()
+        )
+
+    @staticmethod
+    def rebase_descendants(old_path: str, new_path: str, depth_change: int) -> int:
+        """
+        Move every category under `old_path` to sit under `new_path`.
+
+        Args:
+            old_path (str): The previous path of the moved category.
+            new_path (str): The new path of the moved category.
+            depth_change (int): How much the depth of the subtree changed.
+
+        Returns:
+            int: The number of descendants updated.
+        """
+        return (
+            ChartCategory.objects.filter(path__startswith=old_path)
+            .exclude(path=old_path)
+            .update(
+                path=Concat(
+                    models.Value(new_path),
+                    Substr("path", len(old_path) + 1),
+                    output_field=models.CharField(),
+                ),
+                depth=F("depth") + depth_change,
+            )
+        )
+
 
 class ChartSourceCategory(TimeStampedModel):
     """
@@ -208,6 +466,7 @@ class PodcastChart(TimeStampedModel):
         chart_source (str): The chart source backend.
         chart_source_category (ChartSourceCategory): The related chart category.
         chart_remote_id (str | none): The remote id for this chart.
+        chart_engine (str): How the chart data is retrieved from the source.
         enabled_countries (ChartCountry): A list of all the enabled countries.
         enabled (bool): Whether or not this podcast chart is enabled.
         created (datetime.datetime): The datetime the podcast chart was created.
@@ -233,6 +492,15 @@ class PodcastChart(TimeStampedModel):
         max_length=100,
         help_text=_("Remote id for this chart type. Null if unique per country"),
     )
+    chart_engine = models.CharField(
+        max_length=10,
+        choices=ChartEngineChoices,
+        default=ChartEngineChoices.HTML,
+        help_text=_(
+            "How chart data is retrieved. Feed based engines use the remote id of "
+            "the chart source category."
+        ),
+    )
     enabled_countries = models.ManyToManyField(
         ChartCountry, help_text=_("Countries enabled for this Chart.")
     )
@@ -244,7 +512,7 @@ class PodcastChart(TimeStampedModel):
         constraints = [
             models.constraints.UniqueConstraint(
                 name="unique_chart_for_source",
-                fields=["chart_source_category", "chart_source"]
+                fields=["chart_source_category", "chart_source"],
             )
         ]
 
@@ -255,6 +523,152 @@ class PodcastChart(TimeStampedModel):
         )
 
 
+class ChartResponseArchive(TimeStampedModel):
+    """
+    A compressed copy of a raw chart response, addressed by the hash of its content.
+
+    Identical responses are only stored once, and may be shared by several versions.
+
+    Attributes:
+        id (int): The id of this archive record.
+        content_hash (str): The SHA-256 hex digest of the uncompressed body.
+        chart_source (str): The source backend the response came from.
+        body (bytes): The zlib compressed body.
+        body_size (int): The size of the uncompressed body in bytes.
+        created (datetime.datetime): The datetime this archive was created.
+        modified (datetime.datetime): The datetime this archive was last modified.
+    """
+
+    id: int
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text=_("SHA-256 digest of the uncompressed response body."),
+    )
+    chart_source = models.CharField(
+        max_length=50,
+        choices=SourceBackendChoices,
+        default=SourceBackendChoices.APPLE,
+        help_text=_("Source backend for this response."),
+    )
+    body = models.BinaryField(help_text=_("The compressed response body."))
+    body_size = models.PositiveIntegerField(
+        help_text=_("Size of the uncompressed response body in bytes.")
+    )
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.chart_source} - {self.content_hash}"
+
+
+# The statuses a version may move to from each status. Positions may be stored
+# from any status, so imports and re-parses of archived responses can mark
+# versions done without fetching them.
+FETCH_STATUS_TRANSITIONS: dict[str, tuple[str, ...]] = {
+    FetchStatusChoices.PENDING: (
+        FetchStatusChoices.FETCHING,
+        FetchStatusChoices.DONE,
+        FetchStatusChoices.ERROR,
+    ),
+    FetchStatusChoices.RETRY: (
+        FetchStatusChoices.FETCHING,
+        FetchStatusChoices.DONE,
+        FetchStatusChoices.ERROR,
+    ),
+    FetchStatusChoices.FETCHING: (
+        FetchStatusChoices.DONE,
+        FetchStatusChoices.RETRY,
+        FetchStatusChoices.ERROR,
+    ),
+    FetchStatusChoices.DONE: (FetchStatusChoices.DONE, FetchStatusChoices.PENDING),
+    FetchStatusChoices.ERROR: (FetchStatusChoices.DONE, FetchStatusChoices.PENDING),
+}
+
+
+class PodcastChartVersionQuerySet(models.QuerySet["PodcastChartVersion"]):
+    """QuerySet for chart versions with atomic fetch status transitions."""
+
+    def transition(
+        self,
+        to_status: str,
+        *,
+        increment_retries: bool = False,
+        expected: int | None = None,
+        **updates: Any,
+    ) -> int:
+        """
+        Move every version in the queryset that may legally do so to a new status.
+
+        This is a single conditional `UPDATE ... WHERE fetch_status IN (...)`, so
+        nothing is read first and concurrent callers cannot both win. Versions
+        in a status that does not allow the transition are left untouched.
+        Moving to fetching also requires a retrying version to have retries left.
+
+        Args:
+            to_status (str): The status to move to.
+            increment_retries (bool): Whether to add one to `num_retries`.
+            expected (int | None): If given, the number of versions that must
+                transition. Otherwise no version is changed and an error is raised.
+            **updates (Any): Other fields to set in the same update. `modified`
+                defaults to now, and `completed_at` to `modified` when moving to
+                done.
+
+        Returns:
+            int: The number of versions that transitioned.
+
+        Raises:
+            ChartStatusInvalidError: If `to_status` is not a known status, or fewer
+                versions than `expected` could transition.
+        """
+        if to_status not in FetchStatusChoices.values:
+            msg = f"'{to_status}' is not a valid fetch status."
+            raise ChartStatusInvalidError(msg)
+        from_statuses = [
+            status
+            for status, targets in FETCH_STATUS_TRANSITIONS.items()
+            if to_status in targets
+        ]
+        condition = Q(fetch_status__in=from_statuses)
+        if to_status == FetchStatusChoices.FETCHING:
+            condition &= ~Q(
+                fetch_status=FetchStatusChoices.RETRY,
+                num_retries__gte=MAX_CHART_RETRIES,
+            )
+        updates.setdefault("modified", timezone.now())
+        if to_status == FetchStatusChoices.DONE:
+            updates.setdefault("completed_at", updates["modified"])
+        if increment_retries:
+            updates["num_retries"] = F("num_retries") + 1
+        # A partial bulk transition has to be rolled back, a single row cannot be
+        # partially applied.
+        atomic = (
+            transaction.atomic()
+            if expected is not None and expected > 1
+            else contextlib.nullcontext()
+        )
+        with atomic:
+            count = self.filter(condition).update(fetch_status=to_status, **updates)
+            if expected is not None and count != expected:
+                msg = (
+                    f"Only {count} of {expected} chart versions can move to "
+                    f"'{to_status}'."
+                )
+                raise ChartStatusInvalidError(msg)
+        return count
+
+
+if TYPE_CHECKING:  # no cov
+
+    class PodcastChartVersionManager(
+        models.Manager["PodcastChartVersion"], PodcastChartVersionQuerySet
+    ):
+        """Typed stand-in for the manager built from `PodcastChartVersionQuerySet`."""
+
+else:
+    PodcastChartVersionManager = models.Manager.from_queryset(
+        PodcastChartVersionQuerySet
+    )
+
+
 class PodcastChartVersion(TimeStampedModel):
     """
     A given version of the chart rankings for a specific country and date.
@@ -266,11 +680,20 @@ class PodcastChartVersion(TimeStampedModel):
         chart_date (datetime.date): The date when this chart data was sampled.
         fetch_status (str): The fetch status for this chart's data. One of: "pend",
             "fetch", "done", "error", "retry".
+        num_retries (int): How many retries have been attempted.
+        response_archive (ChartResponseArchive | None): The archived raw response,
+            if response archiving is enabled.
+        completed_at (datetime.datetime | None): When the version's positions were
+            last stored. Together with `id` this orders the change feed.
+        content_hash (str): The hash of the stored ranking, from
+            [get_ranking_hash][podcast_charts.models.get_ranking_hash].
         created (datetime.datetime): The datetime this version was created.
         modified (datetime.datetime): The datetime this version was last modified.
     """
 
     id: int
+    podcast_chart_id: int
+    country_id: int
     podcast_chart = models.ForeignKey(
         PodcastChart,
         on_delete=models.CASCADE,
@@ -286,24 +709,62 @@ class PodcastChartVersion(TimeStampedModel):
     )
     chart_date = models.DateField(help_text=_("The date this chart ranking represents"))
     fetch_status = models.CharField(
-        max_length=20, db_index=True, help_text=_("The fetch status of the chart data.")
+        max_length=20,
+        db_index=True,
+        choices=FetchStatusChoices,
+        default=FetchStatusChoices.PENDING,
+        help_text=_("The fetch status of the chart data."),
     )
     num_retries = models.PositiveIntegerField(
         default=0, help_text=_("How many retries have been attempted.")
     )
+    response_archive = models.ForeignKey(
+        ChartResponseArchive,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="chart_versions",
+        help_text=_("The archived raw response this version was parsed from."),
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_("When the positions for this version were last stored."),
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        editable=False,
+        help_text=_("Hash of the stored ranking, used to detect unchanged charts."),
+    )
+
+    objects: PodcastChartVersionManager = PodcastChartVersionManager()
 
     class Meta:
         constraints = [
             models.constraints.UniqueConstraint(
                 name="unique_chart_version_for_chart_country",
-                fields=["podcast_chart", "country", "chart_date"]
+                fields=["podcast_chart", "country", "chart_date"],
             )
         ]
+        indexes = [
+            models.Index(fields=["completed_at", "id"], name="chart_version_feed_idx")
+        ]
 
     def __str__(self) -> str:  # no cov
         return f"{self.podcast_chart} - {self.country} - {self.chart_date}"
 
     def get_remote_chart_id(self) -> str:
+        if self.podcast_chart.chart_engine == ChartEngineChoices.FEED:
+            category_remote_id = (
+                self.podcast_chart.chart_source_category.chart_source_category_remote_id
+            )
+            if category_remote_id is None:
+                msg = "Feed based charts require a remote id for the source category!"
+                raise ChartImproperlyConfiguredError(msg)
+            return category_remote_id
         if self.chart_remote_id is not None:
             return self.chart_remote_id
         elif self.podcast_chart.chart_remote_id is not None:
@@ -325,6 +786,36 @@ class PodcastChartVersion(TimeStampedModel):
             and self.num_retries < MAX_CHART_RETRIES
         )
 
+    def transition_to(
+        self, to_status: str, *, increment_retries: bool = False, **updates: Any
+    ) -> None:
+        """
+        Atomically move this version to a new fetch status.
+
+        The database row is changed only if its current status allows the
+        transition. The instance is updated to match without re-reading it.
+
+        Args:
+            to_status (str): The status to move to.
+            increment_retries (bool): Whether to add one to `num_retries`.
+            **updates (Any): Other fields to set in the same update.
+
+        Raises:
+            ChartStatusInvalidError: If the stored status does not allow the
+                transition.
+        """
+        updates.setdefault("modified", timezone.now())
+        if to_status == FetchStatusChoices.DONE:
+            updates.setdefault("completed_at", updates["modified"])
+        type(self).objects.filter(pk=self.pk).transition(
+            to_status, increment_retries=increment_retries, expected=1, **updates
+        )
+        for field, value in updates.items():
+            setattr(self, field, value)
+        self.fetch_status = to_status
+        if increment_retries:
+            self.num_retries += 1
+
 
 class PodcastChartPodcastIdentifier(TimeStampedModel):
     """
@@ -333,10 +824,16 @@ class PodcastChartPodcastIdentifier(TimeStampedModel):
     Attributes:
         id (int): The id of this podcast.
         podcast_title (str): The podcast title as reported by the backend.
+        podcast_title_normalized (str): The title reduced to a key for matching,
+            kept in sync on save.
         chart_source (str): The source backend for the identifier.
         chart_source_podcast_id (str): The remote id for the podcast.
         chart_source_podcast_url (str): The remote url reported for the podcast source
             backend.
+        categories (ChartSourceCategory): The source categories the podcast is
+            listed in, populated by enrichment.
+        last_enriched (datetime.datetime | None): When metadata was last looked up
+            from the source backend.
         created (datetime.datetime): The datetime this podcast data was created.
         modified (datetime.datetime): The datetime this podcast data was last modified.
     """
@@ -346,6 +843,13 @@ class PodcastChartPodcastIdentifier(TimeStampedModel):
         max_length=250,
         help_text=_("The podcast title as displayed on the remote chart."),
     )
+    podcast_title_normalized = models.CharField(
+        max_length=250,
+        blank=True,
+        default="",
+        db_index=True,
+        help_text=_("Normalized podcast title used for search."),
+    )
     chart_source = models.CharField(
         max_length=10,
         db_index=True,
@@ -365,18 +869,77 @@ class PodcastChartPodcastIdentifier(TimeStampedModel):
             "The remote URL provided by the backend for the pocast in its directory."
         ),
     )
+    categories = models.ManyToManyField(
+        ChartSourceCategory,
+        blank=True,
+        related_name="podcast_identifiers",
+        help_text=_("Source categories this podcast is listed in."),
+    )
+    last_enriched = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text=_("When metadata for this podcast was last looked up."),
+    )
 
     class Meta:
         constraints = [
             models.constraints.UniqueConstraint(
                 name="unique_source_podcast_id",
-                fields=["chart_source", "chart_source_podcast_id"]
+                fields=["chart_source", "chart_source_podcast_id"],
             )
         ]
 
     def __str__(self) -> str:  # no cov
         return f"{self.chart_source} - {self.chart_source_podcast_id}"
 
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        self.podcast_title_normalized = normalize_title(self.podcast_title)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "podcast_title" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "podcast_title_normalized"}
+        super().save(*args, **kwargs)
+
+
+class PodcastTitleTrigram(models.Model):
+    """
+    Portable n-gram index over normalized podcast titles.
+
+    Used for fuzzy title search on databases without trigram support. On
+    PostgreSQL with `django.contrib.postgres` installed, `pg_trgm` is used instead
+    and this table is left empty.
+
+    Attributes:
+        id (int): The id of this trigram record.
+        podcast_identifier (PodcastChartPodcastIdentifier): The indexed podcast.
+        trigram (str): One trigram of the podcast's normalized title.
+    """
+
+    id: int
+    podcast_identifier = models.ForeignKey(
+        PodcastChartPodcastIdentifier,
+        on_delete=models.CASCADE,
+        related_name="title_trigrams",
+        help_text=_("The podcast identifier this trigram belongs to."),
+    )
+    trigram = models.CharField(max_length=3, help_text=_("A title trigram."))
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["trigram", "podcast_identifier"], name="podcast_trigram_idx"
+            )
+        ]
+        constraints = [
+            models.constraints.UniqueConstraint(
+                name="unique_trigram_for_podcast",
+                fields=["podcast_identifier", "trigram"],
+            )
+        ]
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.podcast_identifier_id} - {self.trigram!r}"  # type: ignore
+
 
 class PodcastChartPosition(TimeStampedModel):
     """
@@ -411,7 +974,7 @@ class PodcastChartPosition(TimeStampedModel):
         constraints = [
             models.constraints.UniqueConstraint(
                 name="unique_position_for_chart_version",
-                fields=["chart_version", "position"]
+                fields=["chart_version", "position"],
             )
         ]
 
@@ -420,3 +983,485 @@ class PodcastChartPosition(TimeStampedModel):
             f"{self.chart_version} - Rank {self.position}: "
             f"{self.podcast_identifier.podcast_title}"
         )
+
+
+class PodcastChartStats(TimeStampedModel):
+    """
+    Running statistics for a podcast on a chart in a given country.
+
+    Maintained incrementally as chart versions are stored, and rebuilt from the
+    position history with the `rebuild_chart_stats` command.
+
+    Attributes:
+        id (int): The id of this stats record.
+        podcast_chart (PodcastChart): The chart the stats are for.
+        country (ChartCountry): The country the stats are for.
+        podcast_identifier (PodcastChartPodcastIdentifier): The podcast.
+        best_position (int): The best position the podcast has reached.
+        last_position (int | None): The podcast's position in the latest version,
+            or `None` if it is no longer on the chart.
+        current_streak (int): How many consecutive versions, up to the latest, the
+            podcast has appeared in.
+        days_on_chart (int): How many versions the podcast has appeared in.
+        position_total (int): The sum of every position held, used for the average.
+        first_chart_date (datetime.date): The first chart date it appeared on.
+        last_chart_date (datetime.date): The most recent chart date it appeared on.
+        folded_chart_date (datetime.date | None): The date of the latest ranking
+            that changed this record, which can still be undone if that ranking
+            is replaced.
+        previous_best_position (int | None): `best_position` before that ranking.
+        previous_last_position (int | None): `last_position` before that ranking.
+        previous_current_streak (int | None): `current_streak` before that
+            ranking.
+        previous_last_chart_date (datetime.date | None): `last_chart_date` before
+            that ranking.
+        created (datetime.datetime): When the record was created.
+        modified (datetime.datetime): When the record was last modified.
+    """
+
+    id: int
+    podcast_chart = models.ForeignKey(
+        PodcastChart,
+        on_delete=models.CASCADE,
+        related_name="podcast_stats",
+        help_text=_("The chart these stats are for."),
+    )
+    country = models.ForeignKey(
+        ChartCountry,
+        on_delete=models.CASCADE,
+        related_name="podcast_stats",
+        help_text=_("The country these stats are for."),
+    )
+    podcast_identifier = models.ForeignKey(
+        PodcastChartPodcastIdentifier,
+        on_delete=models.CASCADE,
+        related_name="chart_stats",
+        help_text=_("The podcast these stats are for."),
+    )
+    best_position = models.PositiveIntegerField(
+        help_text=_("The best position reached.")
+    )
+    last_position = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_("The position in the latest version, if still on the chart."),
+    )
+    current_streak = models.PositiveIntegerField(
+        default=0, help_text=_("Consecutive versions on the chart up to the latest.")
+    )
+    days_on_chart = models.PositiveIntegerField(
+        default=0, help_text=_("Number of versions the podcast appeared in.")
+    )
+    position_total = models.PositiveBigIntegerField(
+        default=0, help_text=_("Sum of all positions held, for the average.")
+    )
+    first_chart_date = models.DateField(help_text=_("First date on the chart."))
+    last_chart_date = models.DateField(help_text=_("Most recent date on the chart."))
+    folded_chart_date = models.DateField(
+        null=True,
+        blank=True,
+        help_text=_("Date of the latest ranking folded in, while it can be undone."),
+    )
+    previous_best_position = models.PositiveIntegerField(
+        null=True, blank=True, help_text=_("Best position before that ranking.")
+    )
+    previous_last_position = models.PositiveIntegerField(
+        null=True, blank=True, help_text=_("Last position before that ranking.")
+    )
+    previous_current_streak = models.PositiveIntegerField(
+        null=True, blank=True, help_text=_("Current streak before that ranking.")
+    )
+    previous_last_chart_date = models.DateField(
+        null=True, blank=True, help_text=_("Last chart date before that ranking.")
+    )
+
+    class Meta:
+        verbose_name_plural = _("podcast chart stats")
+        constraints = [
+            models.constraints.UniqueConstraint(
+                name="unique_stats_for_chart_country_podcast",
+                fields=["podcast_chart", "country", "podcast_identifier"],
+            )
+        ]
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.podcast_chart} - {self.country} - {self.podcast_identifier}"
+
+    @property
+    def average_position(self) -> float | None:
+        """
+        Returns:
+            float | None: The mean position held, or `None` if never on the chart.
+        """
+        if not self.days_on_chart:
+            return None
+        return self.position_total / self.days_on_chart
+
+
+class NotificationSubscriber(TimeStampedModel):
+    """
+    A consumer of rank change notifications.
+
+    Attributes:
+        id (int): The id of this subscriber.
+        name (str): A unique name for the subscriber.
+        endpoint (str): Where notifications are delivered, e.g. a webhook url.
+        enabled (bool): Whether notifications are currently delivered.
+        created (datetime.datetime): The datetime the subscriber was created.
+        modified (datetime.datetime): The datetime the subscriber was last modified.
+    """
+
+    id: int
+    name = models.CharField(
+        max_length=100, unique=True, help_text=_("Name of the subscriber.")
+    )
+    endpoint = models.URLField(
+        max_length=500,
+        blank=True,
+        default="",
+        help_text=_("Where notifications are delivered."),
+    )
+    enabled = models.BooleanField(
+        default=True, help_text=_("Whether notifications are delivered.")
+    )
+
+    def __str__(self) -> str:  # no cov
+        return self.name
+
+
+class PodcastSubscription(TimeStampedModel):
+    """
+    A subscriber's interest in the chart positions of a podcast.
+
+    Attributes:
+        id (int): The id of this subscription.
+        subscriber (NotificationSubscriber): Who is notified.
+        podcast_identifier (PodcastChartPodcastIdentifier): The tracked podcast.
+        podcast_chart (PodcastChart | None): Only notify about this chart, or
+            every chart if unset.
+        country (ChartCountry | None): Only notify about this country, or every
+            country if unset.
+        min_change (int): The smallest move in position worth a notification.
+            Entries and exits are always notified.
+        created (datetime.datetime): The datetime the subscription was created.
+        modified (datetime.datetime): The datetime the subscription was last modified.
+    """
+
+    id: int
+    subscriber = models.ForeignKey(
+        NotificationSubscriber,
+        on_delete=models.CASCADE,
+        related_name="subscriptions",
+        help_text=_("The subscriber to notify."),
+    )
+    podcast_identifier = models.ForeignKey(
+        PodcastChartPodcastIdentifier,
+        on_delete=models.CASCADE,
+        related_name="subscriptions",
+        help_text=_("The podcast to track."),
+    )
+    podcast_chart = models.ForeignKey(
+        PodcastChart,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="subscriptions",
+        help_text=_("Limit notifications to this chart."),
+    )
+    country = models.ForeignKey(
+        ChartCountry,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="subscriptions",
+        help_text=_("Limit notifications to this country."),
+    )
+    min_change = models.PositiveSmallIntegerField(
+        default=1, help_text=_("Smallest change in position to notify about.")
+    )
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.subscriber} - {self.podcast_identifier}"
+
+
+class ChartFetchSchedule(TimeStampedModel):
+    """
+    When to next fetch a chart in a country, learned from when its ranking
+    actually changes. Maintained by [podcast_charts.scheduling][].
+
+    Attributes:
+        id (int): The id of this schedule.
+        podcast_chart (PodcastChart): The chart.
+        country (ChartCountry): The country.
+        next_fetch_at (datetime.datetime): When the chart is next due.
+        poll_interval (datetime.timedelta): The current wait between fetches that
+            find nothing new. Doubles while the chart is unchanged.
+        content_hash (str): The hash of the last ranking fetched.
+        last_checked_at (datetime.datetime | None): When the chart was last fetched.
+        last_changed_at (datetime.datetime | None): When the ranking was last
+            estimated to have changed.
+        change_minutes (list[int]): Estimated minutes past midnight UTC of recent
+            changes, oldest first.
+        checks (int): Fetches that stored a ranking.
+        changes (int): Fetches that found a changed ranking.
+        created (datetime.datetime): The datetime the schedule was created.
+        modified (datetime.datetime): The datetime the schedule was last modified.
+    """
+
+    id: int
+    podcast_chart = models.ForeignKey(
+        PodcastChart,
+        on_delete=models.CASCADE,
+        related_name="fetch_schedules",
+        help_text=_("The chart this schedule is for."),
+    )
+    country = models.ForeignKey(
+        ChartCountry,
+        on_delete=models.CASCADE,
+        related_name="fetch_schedules",
+        help_text=_("The country this schedule is for."),
+    )
+    next_fetch_at = models.DateTimeField(
+        db_index=True, help_text=_("When the chart is next due to be fetched.")
+    )
+    poll_interval = models.DurationField(
+        help_text=_("Current wait between fetches while the chart is unchanged.")
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text=_("Hash of the last ranking fetched."),
+    )
+    last_checked_at = models.DateTimeField(
+        null=True, blank=True, help_text=_("When the chart was last fetched.")
+    )
+    last_changed_at = models.DateTimeField(
+        null=True, blank=True, help_text=_("When the ranking last changed.")
+    )
+    change_minutes = models.JSONField(
+        default=list,
+        blank=True,
+        help_text=_("Estimated minutes past midnight UTC of recent changes."),
+    )
+    checks = models.PositiveIntegerField(
+        default=0, help_text=_("Fetches that stored a ranking.")
+    )
+    changes = models.PositiveIntegerField(
+        default=0, help_text=_("Fetches that found a changed ranking.")
+    )
+
+    class Meta:
+        constraints = [
+            models.constraints.UniqueConstraint(
+                name="unique_fetch_schedule_for_chart_country",
+                fields=["podcast_chart", "country"],
+            )
+        ]
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.podcast_chart} - {self.country}: {self.next_fetch_at}"
+
+
+class FetchRun(TimeStampedModel):
+    """
+    A record of one call to
+    [fetch_chart_versions][podcast_charts.tasks.fetch_chart_versions], kept to
+    track fetch performance over time. Written by [podcast_charts.runs][].
+
+    Attributes:
+        id (int): The id of this run.
+        started_at (datetime.datetime): When the run started.
+        finished_at (datetime.datetime): When the run finished.
+        attempted (int): Versions the run claimed.
+        succeeded (int): Versions stored as done.
+        retried (int): Versions left to retry.
+        failed (int): Versions that failed for good.
+        response_bytes (int): Size of the chart responses fetched.
+        rows_written (int): Chart positions stored.
+        phase_seconds (dict[str, float]): Time spent per phase, such as `http`,
+            added up over all versions in the run.
+        timings (QuerySet[FetchRunTiming]): The timings of each version.
+        created (datetime.datetime): The datetime the run was created.
+        modified (datetime.datetime): The datetime the run was last modified.
+    """
+
+    id: int
+    started_at = models.DateTimeField(
+        db_index=True, help_text=_("When the run started.")
+    )
+    finished_at = models.DateTimeField(help_text=_("When the run finished."))
+    attempted = models.PositiveIntegerField(
+        default=0, help_text=_("Versions the run claimed.")
+    )
+    succeeded = models.PositiveIntegerField(
+        default=0, help_text=_("Versions stored as done.")
+    )
+    retried = models.PositiveIntegerField(
+        default=0, help_text=_("Versions left to retry.")
+    )
+    failed = models.PositiveIntegerField(
+        default=0, help_text=_("Versions that failed for good.")
+    )
+    response_bytes = models.PositiveBigIntegerField(
+        default=0, help_text=_("Size of the chart responses fetched.")
+    )
+    rows_written = models.PositiveIntegerField(
+        default=0, help_text=_("Chart positions stored.")
+    )
+    phase_seconds = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text=_("Time spent per phase, added up over all versions."),
+    )
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self) -> str:  # no cov
+        return f"Fetch run {self.started_at}: {self.succeeded}/{self.attempted}"
+
+    @property
+    def seconds(self) -> float:
+        """
+        Returns:
+            float: The wall clock duration of the run.
+        """
+        return (self.finished_at - self.started_at).total_seconds()
+
+    @property
+    def throughput(self) -> float:
+        """
+        Returns:
+            float: Versions stored per second of the run.
+        """
+        return self.succeeded / self.seconds if self.seconds > 0 else 0.0
+
+
+class FetchRunTiming(models.Model):
+    """
+    How long one version took within a fetch run.
+
+    The chart and country are stored on the timing itself so reports can group
+    by them without joining the versions, and so timings outlive the versions.
+
+    Attributes:
+        id (int): The id of this timing.
+        run (FetchRun): The run the version was fetched in.
+        chart_version (PodcastChartVersion | None): The version, if it still exists.
+        podcast_chart (PodcastChart): The chart of the version.
+        country (ChartCountry): The country of the version.
+        fetch_status (str): The status the version was left in.
+        http_seconds (float): Time spent waiting for the chart response.
+        parse_seconds (float): Time spent parsing the response.
+        store_seconds (float): Time spent storing the positions.
+        response_bytes (int): Size of the chart response.
+        rows_written (int): Chart positions stored.
+    """
+
+    id: int
+    run = models.ForeignKey(
+        FetchRun,
+        on_delete=models.CASCADE,
+        related_name="timings",
+        help_text=_("The run the version was fetched in."),
+    )
+    chart_version = models.ForeignKey(
+        PodcastChartVersion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="fetch_timings",
+        help_text=_("The version that was fetched."),
+    )
+    podcast_chart = models.ForeignKey(
+        PodcastChart,
+        on_delete=models.CASCADE,
+        related_name="fetch_timings",
+        help_text=_("The chart of the version."),
+    )
+    country = models.ForeignKey(
+        ChartCountry,
+        on_delete=models.CASCADE,
+        related_name="fetch_timings",
+        help_text=_("The country of the version."),
+    )
+    fetch_status = models.CharField(
+        max_length=20,
+        choices=FetchStatusChoices,
+        help_text=_("The status the version was left in."),
+    )
+    http_seconds = models.FloatField(
+        default=0.0, help_text=_("Time spent waiting for the chart response.")
+    )
+    parse_seconds = models.FloatField(
+        default=0.0, help_text=_("Time spent parsing the response.")
+    )
+    store_seconds = models.FloatField(
+        default=0.0, help_text=_("Time spent storing the positions.")
+    )
+    response_bytes = models.PositiveIntegerField(
+        default=0, help_text=_("Size of the chart response.")
+    )
+    rows_written = models.PositiveIntegerField(
+        default=0, help_text=_("Chart positions stored.")
+    )
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.podcast_chart} - {self.country}: {self.seconds:.2f}s"
+
+    @property
+    def seconds(self) -> float:
+        """
+        Returns:
+            float: The total time spent on the version.
+        """
+        return self.http_seconds + self.parse_seconds + self.store_seconds
+
+
+class ChartPowerScore(models.Model):
+    """
+    A podcast's place on the cross-chart leaderboard for a date, combining its
+    positions on every chart and country. Written by [podcast_charts.scoring][].
+
+    Attributes:
+        id (int): The id of this score.
+        chart_date (datetime.date): The chart date.
+        podcast_identifier (PodcastChartPodcastIdentifier): The podcast.
+        rank (int): The podcast's place on the leaderboard, from 1.
+        score (float): The combined score.
+        appearances (int): How many charts and countries the podcast was on.
+        best_position (int): The podcast's highest position on any chart.
+    """
+
+    id: int
+    podcast_identifier_id: int
+    chart_date = models.DateField(help_text=_("The chart date scored."))
+    podcast_identifier = models.ForeignKey(
+        PodcastChartPodcastIdentifier,
+        on_delete=models.CASCADE,
+        related_name="power_scores",
+        help_text=_("The podcast scored."),
+    )
+    rank = models.PositiveIntegerField(help_text=_("The place on the leaderboard."))
+    score = models.FloatField(help_text=_("The combined score across all charts."))
+    appearances = models.PositiveIntegerField(
+        help_text=_("How many charts and countries the podcast was on.")
+    )
+    best_position = models.PositiveIntegerField(
+        help_text=_("The highest position on any chart.")
+    )
+
+    class Meta:
+        constraints = [
+            models.constraints.UniqueConstraint(
+                name="unique_power_score_for_podcast_date",
+                fields=["podcast_identifier", "chart_date"],
+            )
+        ]
+        indexes = [
+            models.Index(fields=["chart_date", "rank"], name="power_leaderboard_idx")
+        ]
+
+    def __str__(self) -> str:  # no cov
+        return f"{self.chart_date} #{self.rank}: {self.score:.3f}"
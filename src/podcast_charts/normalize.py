@@ -0,0 +1,108 @@
+# normalize.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Text normalization and trigram helpers for matching podcast titles.
+
+Trigrams follow the same rules as PostgreSQL's `pg_trgm` extension, so scores
+from the portable n-gram index and from PostgreSQL are comparable.
+"""
+
+import re
+import unicodedata
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+_LEADING_ARTICLES = frozenset(("the", "a", "an"))
+
+
+def normalize_title(title: str) -> str:
+    """
+    Reduce a podcast title to a key for matching and indexing.
+
+    Accents and punctuation are removed, case is folded, whitespace collapsed, and
+    a leading article dropped.
+
+    Args:
+        title (str): The podcast title.
+
+    Returns:
+        str: The normalized title key.
+
+    Examples:
+        >>> normalize_title("The Joe Rogan Experience")
+        'joe rogan experience'
+        >>> normalize_title("Café  Crème: Stories & More!")
+        'cafe creme stories and more'
+    """
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold().replace("&", " and ")
+    words = _NON_WORD_RE.sub(" ", text).split()
+    if len(words) > 1 and words[0] in _LEADING_ARTICLES:
+        words = words[1:]
+    return " ".join(words)
+
+
+def title_trigrams(normalized_title: str) -> set[str]:
+    """
+    Get the trigrams of a normalized title.
+
+    Each word is padded with two spaces in front and one behind, like `pg_trgm`.
+
+    Args:
+        normalized_title (str): A title already passed through `normalize_title`.
+
+    Returns:
+        set[str]: The distinct trigrams.
+
+    Examples:
+        >>> sorted(title_trigrams("cat"))
+        ['  c', ' ca', 'at ', 'cat']
+    """
+    trigrams = set()
+    for word in normalized_title.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def trigram_similarity(first: set[str], second: set[str]) -> float:
+    """
+    Jaccard similarity of two trigram sets.
+
+    Args:
+        first (set[str]): Trigrams of the first title.
+        second (set[str]): Trigrams of the second title.
+
+    Returns:
+        float: A score between 0 and 1.
+    """
+    if not first or not second:
+        return 0.0
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+def title_similarity(first: str, second: str) -> float:
+    """
+    Compare two raw titles.
+
+    Args:
+        first (str): A podcast title.
+        second (str): Another podcast title.
+
+    Returns:
+        float: A score between 0 and 1, where 1 means the normalized titles match.
+
+    Examples:
+        >>> title_similarity("The Daily", "daily")
+        1.0
+    """
+    first_key, second_key = normalize_title(first), normalize_title(second)
+    if first_key == second_key:
+        return 1.0 if first_key else 0.0
+    return trigram_similarity(title_trigrams(first_key), title_trigrams(second_key))
@@ -0,0 +1,495 @@
+# notifications.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Batched rank change notifications for subscribed podcasts.
+
+After a fetch run, the changes for every subscribed podcast across all of the
+run's versions are computed in a fixed number of queries, coalesced into one
+payload per subscriber, and delivered concurrently with bounded concurrency and
+retries.
+
+Delivery is pluggable through `CHART_NOTIFICATION_SENDER`, the dotted path of a
+[NotificationSender][podcast_charts.notifications.NotificationSender] class. The
+default posts JSON to each subscriber's endpoint;
+[LocalNotificationSender][podcast_charts.notifications.LocalNotificationSender]
+collects payloads in [outbox][podcast_charts.notifications.outbox] instead, for
+tests and local development.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Any, Protocol
+
+import httpx
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils.module_loading import import_string
+
+from podcast_charts.exceptions import NotificationDeliveryError
+from podcast_charts.models import (
+    FetchStatusChoices,
+    PodcastChartPosition,
+    PodcastChartVersion,
+    PodcastSubscription,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOTIFICATION_SENDER = "podcast_charts.notifications.WebhookNotificationSender"
+
+# Payloads collected by LocalNotificationSender.
+outbox: list["NotificationPayload"] = []
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class RankChange:
+    """
+    A change in a podcast's position between consecutive versions of a chart.
+
+    Attributes:
+        podcast_identifier_id (int): The id of the podcast.
+        podcast_title (str): The podcast title.
+        podcast_chart_id (int): The id of the chart.
+        country (str): The country code.
+        chart_date (datetime.date): The date of the new version.
+        previous_position (int | None): The position in the previous version, or
+            `None` if the podcast entered the chart.
+        position (int | None): The position in the new version, or `None` if the
+            podcast left the chart.
+    """
+
+    podcast_identifier_id: int
+    podcast_title: str
+    podcast_chart_id: int
+    country: str
+    chart_date: datetime.date
+    previous_position: int | None
+    position: int | None
+
+    @property
+    def kind(self) -> str:
+        """
+        Returns:
+            str: One of `"entry"`, `"exit"` or `"move"`.
+        """
+        if self.previous_position is None:
+            return "entry"
+        if self.position is None:
+            return "exit"
+        return "move"
+
+    @property
+    def change(self) -> int:
+        """
+        Returns:
+            int: Places gained, negative for places lost, or 0 for entries and
+                exits.
+        """
+        if self.previous_position is None or self.position is None:
+            return 0
+        return self.previous_position - self.position
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict[str, Any]: The change in a JSON serializable form.
+        """
+        return {
+            "kind": self.kind,
+            "podcast_id": self.podcast_identifier_id,
+            "podcast_title": self.podcast_title,
+            "chart_id": self.podcast_chart_id,
+            "country": self.country,
+            "chart_date": self.chart_date.isoformat(),
+            "previous_position": self.previous_position,
+            "position": self.position,
+        }
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class NotificationPayload:
+    """
+    Every change a subscriber is interested in from one fetch run.
+
+    Attributes:
+        subscriber_id (int): The id of the subscriber.
+        subscriber_name (str): The name of the subscriber.
+        endpoint (str): Where to deliver the payload.
+        changes (tuple[RankChange, ...]): The changes, in chart order.
+    """
+
+    subscriber_id: int
+    subscriber_name: str
+    endpoint: str
+    changes: tuple[RankChange, ...]
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict[str, Any]: The payload in a JSON serializable form.
+        """
+        return {
+            "subscriber": self.subscriber_name,
+            "changes": [change.to_dict() for change in self.changes],
+        }
+
+
+@dataclasses.dataclass
+class DeliveryResult:
+    """
+    The outcome of delivering one payload.
+
+    Attributes:
+        payload (NotificationPayload): The payload.
+        attempts (int): How many times delivery was attempted.
+        error (Exception | None): The last error, if delivery failed.
+    """
+
+    payload: NotificationPayload
+    attempts: int = 0
+    error: Exception | None = None
+
+    @property
+    def delivered(self) -> bool:
+        """
+        Returns:
+            bool: Whether the payload was delivered.
+        """
+        return self.error is None
+
+
+class NotificationSender(Protocol):
+    """
+    Delivers notification payloads.
+
+    Senders are created once per delivery run with the run's shared client.
+    """
+
+    def __init__(self, client: httpx.AsyncClient | None = None) -> None: ...
+
+    async def send(self, payload: NotificationPayload) -> None:
+        """
+        Args:
+            payload (NotificationPayload): The payload to deliver.
+
+        Raises:
+            NotificationDeliveryError: If the payload could not be delivered.
+        """
+        ...
+
+
+class WebhookNotificationSender:
+    """Post each payload as JSON to the subscriber's endpoint."""
+
+    def __init__(self, client: httpx.AsyncClient | None = None) -> None:
+        """
+        Args:
+            client (httpx.AsyncClient | None): The client to post with.
+        """
+        self.client = client
+
+    async def send(self, payload: NotificationPayload) -> None:
+        if not payload.endpoint:
+            msg = f"Subscriber {payload.subscriber_name} has no endpoint."
+            raise NotificationDeliveryError(msg, retryable=False)
+        if self.client is None:
+            async with httpx.AsyncClient() as client:
+                await self._post(client, payload)
+        else:
+            await self._post(self.client, payload)
+
+    async def _post(
+        self, client: httpx.AsyncClient, payload: NotificationPayload
+    ) -> None:
+        try:
+            response = await client.post(payload.endpoint, json=payload.to_dict())
+        except httpx.TransportError as te:
+            msg = f"Could not reach {payload.endpoint}: {te}"
+            raise NotificationDeliveryError(msg) from te
+        if not response.is_success:
+            msg = f"{payload.endpoint} responded with {response.status_code}"
+            raise NotificationDeliveryError(
+                msg,
+                retryable=response.status_code == httpx.codes.TOO_MANY_REQUESTS
+                or response.is_server_error,
+            )
+
+
+class LocalNotificationSender:
+    """Collect payloads in the module level `outbox` instead of sending them."""
+
+    def __init__(self, client: httpx.AsyncClient | None = None) -> None:
+        self.client = client
+
+    async def send(self, payload: NotificationPayload) -> None:
+        outbox.append(payload)
+
+
+def get_notification_sender(
+    client: httpx.AsyncClient | None = None,
+) -> NotificationSender:
+    """
+    Args:
+        client (httpx.AsyncClient | None): The client for the sender to use.
+
+    Returns:
+        NotificationSender: An instance of the configured sender.
+    """
+    path = getattr(settings, "CHART_NOTIFICATION_SENDER", DEFAULT_NOTIFICATION_SENDER)
+    return import_string(path)(client=client)
+
+
+def compute_rank_changes(
+    versions: Iterable[PodcastChartVersion | int],
+) -> list[RankChange]:
+    """
+    Compare versions with the previous completed version of the same chart and
+    country, for subscribed podcasts only.
+
+    Uses two queries regardless of how many versions are given: one for the
+    versions and their predecessors, and one for the relevant positions of both.
+
+    Args:
+        versions (Iterable[PodcastChartVersion | int]): Completed versions or
+            their ids. Versions that are not complete are ignored.
+
+    Returns:
+        list[RankChange]: The entries, exits and moves of subscribed podcasts. A
+            version without a predecessor only has entries.
+    """
+    version_ids = {
+        version if isinstance(version, int) else version.id for version in versions
+    }
+    if not version_ids:
+        return []
+    previous = PodcastChartVersion.objects.filter(
+        podcast_chart=OuterRef("podcast_chart"),
+        country=OuterRef("country"),
+        chart_date__lt=OuterRef("chart_date"),
+        fetch_status=FetchStatusChoices.DONE,
+    ).order_by("-chart_date")
+    rows = list(
+        PodcastChartVersion.objects.filter(
+            id__in=version_ids, fetch_status=FetchStatusChoices.DONE
+        )
+        .annotate(previous_id=Subquery(previous.values("id")[:1]))
+        .order_by("chart_date", "podcast_chart_id", "country__country")
+        .values_list(
+            "id", "previous_id", "podcast_chart_id", "country__country", "chart_date"
+        )
+    )
+    if not rows:
+        return []
+    positions: dict[int, dict[int, tuple[int, str]]] = defaultdict(dict)
+    for version_id, podcast_id, position, title in PodcastChartPosition.objects.filter(
+        chart_version_id__in={
+            version_id for row in rows for version_id in row[:2] if version_id
+        },
+        podcast_identifier_id__in=PodcastSubscription.objects.filter(
+            subscriber__enabled=True
+        ).values("podcast_identifier_id"),
+    ).values_list(
+        "chart_version_id",
+        "podcast_identifier_id",
+        "position",
+        "podcast_identifier__podcast_title",
+    ):
+        positions[version_id][podcast_id] = (position, title)
+    changes = []
+    for version_id, previous_id, chart_id, country, chart_date in rows:
+        current = positions.get(version_id, {})
+        before = positions.get(previous_id, {}) if previous_id else {}
+        # Exits sort before entries at the same position, then by identifier.
+        for podcast_id in sorted(
+            current.keys() | before.keys(),
+            key=lambda pid: (
+                (current.get(pid) or before[pid])[0],
+                pid in current,
+                pid,
+            ),
+        ):
+            position, title = current.get(podcast_id, (None, ""))
+            previous_position, previous_title = before.get(podcast_id, (None, ""))
+            if position == previous_position:
+                continue
+            changes.append(
+                RankChange(
+                    podcast_identifier_id=podcast_id,
+                    podcast_title=title or previous_title,
+                    podcast_chart_id=chart_id,
+                    country=country,
+                    chart_date=chart_date,
+                    previous_position=previous_position,
+                    position=position,
+                )
+            )
+    return changes
+
+
+def build_notifications(changes: Iterable[RankChange]) -> list[NotificationPayload]:
+    """
+    Match changes against subscriptions and coalesce them into one payload per
+    subscriber, with a single query.
+
+    Args:
+        changes (Iterable[RankChange]): The changes, e.g. from
+            [compute_rank_changes][podcast_charts.notifications.compute_rank_changes].
+
+    Returns:
+        list[NotificationPayload]: One payload for each enabled subscriber with
+            at least one matching change.
+    """
+    changes = list(changes)
+    by_podcast: dict[int, list[RankChange]] = defaultdict(list)
+    for change in changes:
+        by_podcast[change.podcast_identifier_id].append(change)
+    if not by_podcast:
+        return []
+    subscribers: dict[int, tuple[str, str]] = {}
+    # A dict keeps each change once even if several subscriptions match it.
+    matched: dict[int, dict[RankChange, None]] = defaultdict(dict)
+    for (
+        subscriber_id,
+        name,
+        endpoint,
+        podcast_id,
+        chart_id,
+        country,
+        min_change,
+    ) in (
+        PodcastSubscription.objects.filter(
+            subscriber__enabled=True, podcast_identifier_id__in=by_podcast.keys()
+        )
+        .order_by("subscriber_id", "id")
+        .values_list(
+            "subscriber_id",
+            "subscriber__name",
+            "subscriber__endpoint",
+            "podcast_identifier_id",
+            "podcast_chart_id",
+            "country__country",
+            "min_change",
+        )
+    ):
+        for change in by_podcast[podcast_id]:
+            if chart_id is not None and change.podcast_chart_id != chart_id:
+                continue
+            if country is not None and change.country != country:
+                continue
+            if change.kind == "move" and abs(change.change) < min_change:
+                continue
+            subscribers[subscriber_id] = (name, endpoint)
+            matched[subscriber_id][change] = None
+    order = {change: index for index, change in enumerate(changes)}
+    return [
+        NotificationPayload(
+            subscriber_id=subscriber_id,
+            subscriber_name=name,
+            endpoint=endpoint,
+            changes=tuple(sorted(matched[subscriber_id], key=order.__getitem__)),
+        )
+        for subscriber_id, (name, endpoint) in subscribers.items()
+    ]
+
+
+async def deliver_notifications(
+    payloads: Iterable[NotificationPayload],
+    sender: NotificationSender,
+    *,
+    concurrency: int | None = None,
+    max_attempts: int | None = None,
+    backoff: float | None = None,
+) -> list[DeliveryResult]:
+    """
+    Deliver payloads concurrently, retrying failures with exponential backoff.
+
+    Args:
+        payloads (Iterable[NotificationPayload]): The payloads to deliver.
+        sender (NotificationSender): The sender to deliver them with.
+        concurrency (int | None): How many deliveries may be in flight at once.
+            Defaults to `CHART_NOTIFICATION_CONCURRENCY`.
+        max_attempts (int | None): How many times to try each payload. Defaults
+            to `CHART_NOTIFICATION_MAX_ATTEMPTS`.
+        backoff (float | None): Seconds to wait before the first retry, doubling
+            for each one after. Defaults to `CHART_NOTIFICATION_BACKOFF`.
+
+    Returns:
+        list[DeliveryResult]: The outcome for each payload, in order.
+    """
+    in_flight: int = (
+        getattr(settings, "CHART_NOTIFICATION_CONCURRENCY", 10)
+        if concurrency is None
+        else concurrency
+    )
+    attempts: int = (
+        getattr(settings, "CHART_NOTIFICATION_MAX_ATTEMPTS", 3)
+        if max_attempts is None
+        else max_attempts
+    )
+    delay: float = (
+        getattr(settings, "CHART_NOTIFICATION_BACKOFF", 0.5)
+        if backoff is None
+        else backoff
+    )
+    semaphore = asyncio.Semaphore(in_flight)
+
+    async def deliver(payload: NotificationPayload) -> DeliveryResult:
+        result = DeliveryResult(payload=payload)
+        while result.attempts < attempts:
+            if result.attempts:
+                # Wait outside the semaphore so other payloads are not held up.
+                await asyncio.sleep(delay * 2 ** (result.attempts - 1))
+            result.attempts += 1
+            try:
+                async with semaphore:
+                    await sender.send(payload)
+            except NotificationDeliveryError as nde:
+                result.error = nde
+                if not nde.retryable:
+                    break
+            else:
+                result.error = None
+                break
+        if result.error is not None:
+            logger.error(
+                f"Notification to {payload.subscriber_name} failed after "
+                f"{result.attempts} attempts: {result.error}"
+            )
+        return result
+
+    return await asyncio.gather(*(deliver(payload) for payload in payloads))
+
+
+async def _deliver(payloads: list[NotificationPayload]) -> list[DeliveryResult]:
+    async with httpx.AsyncClient() as client:
+        return await deliver_notifications(
+            payloads, get_notification_sender(client=client)
+        )
+
+
+def notify_rank_changes(
+    versions: Iterable[PodcastChartVersion | int],
+) -> list[DeliveryResult]:
+    """
+    Notify subscribers of the rank changes in a batch of completed versions.
+
+    Args:
+        versions (Iterable[PodcastChartVersion | int]): The versions, e.g. every
+            version stored by a fetch run.
+
+    Returns:
+        list[DeliveryResult]: The outcome for each subscriber notified.
+    """
+    payloads = build_notifications(compute_rank_changes(versions))
+    if not payloads:
+        return []
+    return asyncio.run(_deliver(payloads))
@@ -0,0 +1,469 @@
+# profiling.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+On demand profiling of single fetch runs and requests.
+
+A [ProfileCapture][podcast_charts.profiling.ProfileCapture] records, for the
+duration of a block:
+
+- a `cProfile` profile, or a sampled profile of the capturing thread's stacks in
+  the folded format flame graph tools read;
+- time spent in named phases, marked in the code with
+  [phase][podcast_charts.profiling.phase]: `http`, `parse`, `store` and
+  `serialize`;
+- the number and total time of ORM queries made from the capturing thread.
+
+Results are written to `CHART_PROFILE_DIR` as a profile file and a JSON summary,
+and the oldest captures are removed once the directory grows past
+`CHART_PROFILE_MAX_BYTES`.
+
+Use `fetch_podcast_charts --profile` for a fetch run. For requests add
+[ProfilingMiddleware][podcast_charts.profiling.ProfilingMiddleware] to
+`MIDDLEWARE`; staff users can then profile a request by sending an
+`X-Chart-Profile` header, or every request is profiled while
+`CHART_PROFILE_REQUESTS` is enabled. With no capture active, marking a phase
+costs one context variable lookup.
+
+Profiles and query counts only cover the capturing thread. Under ASGI that is the
+event loop thread, so sync views, which Django runs in an executor thread, only
+get their phase timings. Profile sync views under WSGI to see their full profile.
+"""
+
+import collections
+import contextlib
+import contextvars
+import cProfile
+import dataclasses
+import datetime
+import json
+import logging
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from types import FrameType, TracebackType
+from typing import Any, cast
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sampling")
+PROFILE_HEADER = "X-Chart-Profile"
+PROFILE_ID_HEADER = "X-Chart-Profile-Id"
+
+_capture: contextvars.ContextVar["ProfileCapture | None"] = contextvars.ContextVar(
+    "podcast_charts_profile_capture", default=None
+)
+
+
+def get_profile_directory() -> pathlib.Path:
+    """
+    Returns:
+        pathlib.Path: Where captures are written, from `CHART_PROFILE_DIR`.
+    """
+    directory = getattr(settings, "CHART_PROFILE_DIR", None)
+    if directory is None:
+        return pathlib.Path(tempfile.gettempdir()) / "podcast_charts_profiles"
+    return pathlib.Path(directory)
+
+
+@dataclasses.dataclass
+class PhaseTiming:
+    """
+    Time spent in one phase during a capture.
+
+    Concurrent work, such as requests gathered in a fetch run, is added up, so
+    a phase can take longer than the capture's wall clock time.
+
+    Attributes:
+        calls (int): How many times the phase was entered.
+        seconds (float): Total time spent in the phase.
+    """
+
+    calls: int = 0
+    seconds: float = 0.0
+
+
+class phase:  # noqa: N801
+    """
+    Mark a block as a phase of the active capture, if there is one.
+
+    Usable as a context manager in both sync and async code.
+
+    Args:
+        name (str): The phase name.
+        timings (dict[str, float] | None): Optionally also add the time spent to
+            this mapping under the phase name, whether a capture is active or not.
+    """
+
+    __slots__ = ("_capture", "_name", "_started", "_timings")
+
+    def __init__(self, name: str, timings: dict[str, float] | None = None) -> None:
+        self._name = name
+        self._timings = timings
+
+    def __enter__(self) -> None:
+        self._capture = _capture.get()
+        if self._capture is not None or self._timings is not None:
+            self._started = time.perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if self._capture is None and self._timings is None:
+            return
+        seconds = time.perf_counter() - self._started
+        if self._capture is not None:
+            self._capture.add_phase(self._name, seconds)
+        if self._timings is not None:
+            self._timings[self._name] = self._timings.get(self._name, 0.0) + seconds
+
+
+class StackSampler:
+    """
+    Sample the stack of one thread at a fixed interval from a background thread.
+
+    Stacks are counted in the folded format, one `outer;inner count` line per
+    distinct stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        """
+        Args:
+            thread_id (int): The thread to sample.
+            interval (float): Seconds between samples.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="podcast-charts-sampler", daemon=True
+        )
+
+    @staticmethod
+    def _fold(frame: FrameType | None) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            location = f"{code.co_filename}:{code.co_firstlineno}"
+            names.append(f"{code.co_qualname} ({location})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._fold(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: pathlib.Path) -> None:
+        """
+        Args:
+            path (pathlib.Path): Where to write the folded stacks.
+        """
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+        )
+
+
+class ProfileCapture:
+    """
+    Profile everything run in a block and write the results when it exits.
+
+    Attributes:
+        label (str): What was profiled, used in file names.
+        mode (str): `"cprofile"` or `"sampling"`.
+        phases (dict[str, PhaseTiming]): Time spent per phase.
+        queries (int): ORM queries made from the capturing thread.
+        query_seconds (float): Time spent in those queries.
+        seconds (float): Wall clock duration of the capture.
+        profile_path (pathlib.Path | None): The profile, once written.
+        summary_path (pathlib.Path | None): The JSON summary, once written.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        *,
+        mode: str = "cprofile",
+        directory: pathlib.Path | str | None = None,
+        interval: float | None = None,
+    ) -> None:
+        """
+        Args:
+            label (str): What is being profiled.
+            mode (str): `"cprofile"` for deterministic profiling or `"sampling"`
+                for lower overhead stack sampling.
+            directory (pathlib.Path | str | None): Where to write results.
+                Defaults to `CHART_PROFILE_DIR`.
+            interval (float | None): Seconds between stack samples. Defaults to
+                `CHART_PROFILE_SAMPLE_INTERVAL`.
+
+        Raises:
+            ValueError: If the mode is not supported.
+        """
+        if mode not in PROFILE_MODES:
+            msg = f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}."
+            raise ValueError(msg)
+        self.label = label
+        self.mode = mode
+        self.directory = (
+            get_profile_directory() if directory is None else pathlib.Path(directory)
+        )
+        self.interval = (
+            getattr(settings, "CHART_PROFILE_SAMPLE_INTERVAL", 0.005)
+            if interval is None
+            else interval
+        )
+        self.phases: dict[str, PhaseTiming] = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.seconds = 0.0
+        self.profile_path: pathlib.Path | None = None
+        self.summary_path: pathlib.Path | None = None
+        self._lock = threading.Lock()
+        self._stack = contextlib.ExitStack()
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        """
+        Args:
+            name (str): The phase.
+            seconds (float): Time spent in it.
+        """
+        with self._lock:
+            timing = self.phases.setdefault(name, PhaseTiming())
+            timing.calls += 1
+            timing.seconds += seconds
+
+    def _time_query(
+        self,
+        execute: Callable[..., Any],
+        sql: str,
+        params: Any,
+        many: bool,  # noqa: FBT001
+        context: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.query_seconds += elapsed
+
+    def __enter__(self) -> "ProfileCapture":
+        self._token = _capture.set(self)
+        for connection in connections.all():
+            # The stubs type execute_wrapper as the generator it wraps.
+            wrapper = cast(
+                contextlib.AbstractContextManager[None],
+                connection.execute_wrapper(self._time_query),
+            )
+            self._stack.enter_context(wrapper)
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.seconds = time.perf_counter() - self._started
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._sampler.stop()
+        self._stack.close()
+        _capture.reset(self._token)
+        try:
+            self.write()
+        except OSError as oe:
+            logger.error(f"Could not write profile for {self.label}: {oe}")
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict[str, Any]: The capture's timings in a JSON serializable form.
+        """
+        return {
+            "label": self.label,
+            "mode": self.mode,
+            "seconds": round(self.seconds, 6),
+            "queries": {"count": self.queries, "seconds": round(self.query_seconds, 6)},
+            "phases": {
+                name: {"calls": timing.calls, "seconds": round(timing.seconds, 6)}
+                for name, timing in sorted(self.phases.items())
+            },
+        }
+
+    def write(self) -> None:
+        """Write the profile and summary, then enforce the directory size cap."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.datetime.now(tz=datetime.UTC).strftime("%Y%m%dT%H%M%S%f")
+        stem = f"{stamp}-{slugify(self.label)[:80] or 'profile'}"
+        if self.mode == "cprofile":
+            self.profile_path = self.directory / f"{stem}.prof"
+            self._profiler.dump_stats(self.profile_path)
+        else:
+            self.profile_path = self.directory / f"{stem}.folded"
+            self._sampler.write(self.profile_path)
+        self.summary_path = self.directory / f"{stem}.json"
+        self.summary_path.write_text(json.dumps(self.summary(), indent=2))
+        enforce_size_cap(self.directory, keep={self.profile_path, self.summary_path})
+
+    def format_summary(self) -> str:
+        """
+        Returns:
+            str: A human readable breakdown of the capture.
+        """
+        lines = [
+            f"{self.label}: {self.seconds:.3f}s, {self.queries} queries in "
+            f"{self.query_seconds:.3f}s"
+        ]
+        lines.extend(
+            f"  {name}: {timing.seconds:.3f}s over {timing.calls} calls"
+            for name, timing in sorted(self.phases.items())
+        )
+        if self.profile_path is not None:
+            lines.append(f"  profile: {self.profile_path}")
+        return "\n".join(lines)
+
+
+def enforce_size_cap(
+    directory: pathlib.Path,
+    max_bytes: int | None = None,
+    keep: set[pathlib.Path] | None = None,
+) -> int:
+    """
+    Delete the oldest files in a directory until it fits in a size cap.
+
+    Args:
+        directory (pathlib.Path): The directory.
+        max_bytes (int | None): The cap. Defaults to `CHART_PROFILE_MAX_BYTES`.
+        keep (set[pathlib.Path] | None): Files never to delete, e.g. the capture
+            just written.
+
+    Returns:
+        int: The number of files deleted.
+    """
+    cap: int = (
+        getattr(settings, "CHART_PROFILE_MAX_BYTES", 100 * 1024 * 1024)
+        if max_bytes is None
+        else max_bytes
+    )
+    keep = keep or set()
+    files = sorted(
+        (path.stat().st_mtime, path.stat().st_size, path)
+        for path in directory.iterdir()
+        if path.is_file()
+    )
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for _, size, path in files:
+        if total <= cap:
+            break
+        if path in keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        deleted += 1
+    return deleted
+
+
+class ProfiledJsonResponse(JsonResponse):
+    """A `JsonResponse` that counts encoding the body as the `serialize` phase."""
+
+    def __init__(self, data: Any, *args: Any, **kwargs: Any) -> None:
+        with phase("serialize"):
+            super().__init__(data, *args, **kwargs)
+
+
+def _requested_mode(request: HttpRequest) -> str | None:
+    requested = request.headers.get(PROFILE_HEADER)
+    if requested is not None:
+        user = getattr(request, "user", None)
+        if user is None or not user.is_staff:
+            return None
+        return requested if requested in PROFILE_MODES else "cprofile"
+    if getattr(settings, "CHART_PROFILE_REQUESTS", False):
+        return getattr(settings, "CHART_PROFILE_MODE", "cprofile")
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests from staff users that send `X-Chart-Profile`, or every
+    request while `CHART_PROFILE_REQUESTS` is enabled.
+
+    The header's value may name the mode, `cprofile` or `sampling`. Profiled
+    responses carry the capture's file name in `X-Chart-Profile-Id`. Place it
+    after `AuthenticationMiddleware` so the user is known.
+
+    Under ASGI the capture runs on the event loop thread. A sync view runs in an
+    executor thread, so its profile and query counts are not captured, only its
+    phase timings.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> Any:
+        if self.is_async:
+            return self.__acall__(request)
+        mode = _requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        with ProfileCapture(f"{request.method} {request.path}", mode=mode) as capture:
+            response = self.get_response(request)
+        return self._tag(response, capture)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        mode = _requested_mode(request)
+        if mode is None:
+            return await self.get_response(request)
+        with ProfileCapture(f"{request.method} {request.path}", mode=mode) as capture:
+            response = await self.get_response(request)
+        return self._tag(response, capture)
+
+    @staticmethod
+    def _tag(response: HttpResponse, capture: ProfileCapture) -> HttpResponse:
+        if capture.summary_path is not None:
+            response[PROFILE_ID_HEADER] = capture.summary_path.stem
+        return response
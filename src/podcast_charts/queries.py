@@ -0,0 +1,158 @@
+# queries.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+The main chart read queries.
+
+These are the reads dashboards make most often, collected in one place so they
+can be benchmarked with `benchmark_chart_queries` and kept index friendly.
+"""
+
+import datetime
+
+from podcast_charts.cache import (
+    ChartRankingEntry,
+    get_chart_version_ranking,
+    read_chart_version_ranking,
+)
+from podcast_charts.diff import ChartDiffMove, compare_rankings, diff_chart_versions
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+)
+
+
+def get_latest_chart_versions(
+    podcast_chart: PodcastChart | int,
+    country: ChartCountry | int,
+    count: int = 1,
+) -> list[PodcastChartVersion]:
+    """
+    Get the most recent fetched versions of a chart in a country.
+
+    Args:
+        podcast_chart (PodcastChart | int): The chart.
+        country (ChartCountry | int): The country.
+        count (int): How many versions to return.
+
+    Returns:
+        list[PodcastChartVersion]: The versions, newest first, with only `id`,
+            `chart_date` and `modified` loaded.
+    """
+    return list(
+        PodcastChartVersion.objects.filter(
+            podcast_chart=podcast_chart,
+            country=country,
+            fetch_status=FetchStatusChoices.DONE,
+        )
+        .order_by("-chart_date")
+        .only("id", "chart_date", "modified")[:count]
+    )
+
+
+def get_current_chart(
+    podcast_chart: PodcastChart | int,
+    country: ChartCountry | int,
+    *,
+    cached: bool = True,
+) -> list[ChartRankingEntry]:
+    """
+    Get the latest ranking of a chart in a country.
+
+    Args:
+        podcast_chart (PodcastChart | int): The chart.
+        country (ChartCountry | int): The country.
+        cached (bool): Whether the ranking may be served from the cache.
+
+    Returns:
+        list[ChartRankingEntry]: The ranking, or an empty list if the chart has
+            never been fetched in that country.
+    """
+    versions = get_latest_chart_versions(podcast_chart, country)
+    if not versions:
+        return []
+    if cached:
+        return get_chart_version_ranking(versions[0])
+    return read_chart_version_ranking(versions[0])
+
+
+def get_rank_history(
+    podcast_identifier: PodcastChartPodcastIdentifier | int,
+    podcast_chart: PodcastChart | int,
+    country: ChartCountry | int,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+) -> list[tuple[datetime.date, int]]:
+    """
+    Get the positions a podcast held on a chart in a country over time.
+
+    Args:
+        podcast_identifier (PodcastChartPodcastIdentifier | int): The podcast.
+        podcast_chart (PodcastChart | int): The chart.
+        country (ChartCountry | int): The country.
+        start_date (datetime.date | None): The first date to include.
+        end_date (datetime.date | None): The last date to include.
+
+    Returns:
+        list[tuple[datetime.date, int]]: `(chart_date, position)` pairs in date
+            order. Dates the podcast was not on the chart are omitted.
+    """
+    positions = PodcastChartPosition.objects.filter(
+        podcast_identifier=podcast_identifier,
+        chart_version__podcast_chart=podcast_chart,
+        chart_version__country=country,
+        chart_version__fetch_status=FetchStatusChoices.DONE,
+    )
+    if start_date is not None:
+        positions = positions.filter(chart_version__chart_date__gte=start_date)
+    if end_date is not None:
+        positions = positions.filter(chart_version__chart_date__lte=end_date)
+    return list(
+        positions.order_by("chart_version__chart_date").values_list(
+            "chart_version__chart_date", "position"
+        )
+    )
+
+
+def get_chart_movers(
+    podcast_chart: PodcastChart | int,
+    country: ChartCountry | int,
+    limit: int = 10,
+    *,
+    cached: bool = True,
+) -> list[ChartDiffMove]:
+    """
+    Get the biggest movers between the two latest versions of a chart.
+
+    Args:
+        podcast_chart (PodcastChart | int): The chart.
+        country (ChartCountry | int): The country.
+        limit (int): How many movers to return.
+        cached (bool): Whether the diff may be served from the cache.
+
+    Returns:
+        list[ChartDiffMove]: The moves with the largest absolute change, biggest
+            first.
+    """
+    versions = get_latest_chart_versions(podcast_chart, country, count=2)
+    if len(versions) < 2:  # noqa: PLR2004
+        return []
+    current, previous = versions
+    if cached:
+        diff = diff_chart_versions(previous, current)
+    else:
+        diff = compare_rankings(
+            previous.id,
+            read_chart_version_ranking(previous),
+            current.id,
+            read_chart_version_ranking(current),
+        )
+    return sorted(diff.moves, key=lambda move: -abs(move.delta))[:limit]
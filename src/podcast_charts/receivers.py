@@ -0,0 +1,150 @@
+# receivers.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Signal receivers for podcast_charts."""
+
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from podcast_charts.cache import invalidate_podcast_titles, warm_chart_version_cache
+from podcast_charts.feed import notify_chart_feed
+from podcast_charts.matrix import build_rank_matrix, invalidate_rank_matrix
+from podcast_charts.models import (
+    ChartCategory,
+    FetchStatusChoices,
+    PodcastChartPodcastIdentifier,
+    PodcastChartVersion,
+)
+from podcast_charts.notifications import notify_rank_changes
+from podcast_charts.routers import get_replica_alias, pin_reads_to_primary
+from podcast_charts.scheduling import update_fetch_schedules
+from podcast_charts.scoring import update_chart_power_scores
+from podcast_charts.search import index_podcast_identifiers
+from podcast_charts.signals import chart_fetch_run_completed, chart_version_fetched
+from podcast_charts.stats import update_chart_stats
+
+
+@receiver(post_save, sender=PodcastChartPodcastIdentifier)
+def index_podcast_title(
+    sender: type[PodcastChartPodcastIdentifier],
+    instance: PodcastChartPodcastIdentifier,
+    update_fields: frozenset[str] | None = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Keep the title search index and cached rankings current for identifiers
+    saved one at a time.
+    """
+    if update_fields is None or "podcast_title" in update_fields:
+        index_podcast_identifiers([instance])
+        transaction.on_commit(invalidate_podcast_titles)
+
+
+@receiver(pre_delete, sender=ChartCategory)
+def detach_category_children(
+    sender: type[ChartCategory], instance: ChartCategory, **kwargs: Any
+) -> None:
+    """Make the children of a deleted category roots, moving their subtrees."""
+    path, depth = (
+        ChartCategory.objects.filter(id=instance.id).values_list("path", "depth").get()
+    )
+    ChartCategory.rebase_descendants(path, "", -(depth + 1))
+
+
+@receiver(chart_version_fetched, sender=PodcastChartVersion)
+def update_stats_for_version(
+    sender: type[PodcastChartVersion], version: PodcastChartVersion, **kwargs: Any
+) -> None:
+    """Fold each stored version into the per-podcast chart stats."""
+    update_chart_stats(version)
+
+
+@receiver(chart_version_fetched, sender=PodcastChartVersion)
+def pin_reads_after_version(
+    sender: type[PodcastChartVersion], version: PodcastChartVersion, **kwargs: Any
+) -> None:
+    """Keep chart reads on the primary until replicas have caught up."""
+    if get_replica_alias():
+        pin_reads_to_primary()
+
+
+@receiver(chart_version_fetched, sender=PodcastChartVersion)
+def warm_cache_for_version(
+    sender: type[PodcastChartVersion], version: PodcastChartVersion, **kwargs: Any
+) -> None:
+    """Cache each stored version's ranking before dashboards ask for it."""
+    warm_chart_version_cache(version)
+
+
+@receiver(chart_version_fetched, sender=PodcastChartVersion)
+def notify_feed_for_version(
+    sender: type[PodcastChartVersion], version: PodcastChartVersion, **kwargs: Any
+) -> None:
+    """Wake change feed consumers waiting for new versions."""
+    if version.completed_at is not None:
+        notify_chart_feed(version.completed_at)
+
+
+@receiver(chart_version_fetched, sender=PodcastChartVersion)
+def invalidate_rank_matrix_for_version(
+    sender: type[PodcastChartVersion], version: PodcastChartVersion, **kwargs: Any
+) -> None:
+    """Drop the cached rank matrix for a date whenever one of its versions changes."""
+    invalidate_rank_matrix(version.chart_date)
+
+
+@receiver(chart_fetch_run_completed, sender=PodcastChartVersion)
+def build_rank_matrices(
+    sender: type[PodcastChartVersion], results: list, **kwargs: Any
+) -> None:
+    """Rebuild the rank matrix for every date a fetch run stored versions for."""
+    for chart_date in sorted(
+        {
+            result.version.chart_date
+            for result in results
+            if result.fetch_status == FetchStatusChoices.DONE and not result.unchanged
+        }
+    ):
+        build_rank_matrix(chart_date)
+
+
+@receiver(chart_fetch_run_completed, sender=PodcastChartVersion)
+def score_chart_power_for_run(
+    sender: type[PodcastChartVersion], results: list, **kwargs: Any
+) -> None:
+    """Rebuild the chart power leaderboard for every date a fetch run stored."""
+    for chart_date in sorted(
+        {
+            result.version.chart_date
+            for result in results
+            if result.fetch_status == FetchStatusChoices.DONE and not result.unchanged
+        }
+    ):
+        update_chart_power_scores(chart_date)
+
+
+@receiver(chart_fetch_run_completed, sender=PodcastChartVersion)
+def notify_subscribers_for_run(
+    sender: type[PodcastChartVersion], results: list, **kwargs: Any
+) -> None:
+    """Send subscribers one batch of rank changes for everything a run stored."""
+    notify_rank_changes(
+        result.version
+        for result in results
+        if result.fetch_status == FetchStatusChoices.DONE and not result.unchanged
+    )
+
+
+@receiver(chart_fetch_run_completed, sender=PodcastChartVersion)
+def update_schedules_for_run(
+    sender: type[PodcastChartVersion], results: list, **kwargs: Any
+) -> None:
+    """Learn from each run when its charts change and plan their next fetch."""
+    update_fetch_schedules(results)
@@ -0,0 +1,181 @@
+# routers.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Opt-in database router that sends chart reads to a replica.
+
+Enable it by adding `"podcast_charts.routers.ChartReplicaRouter"` to
+`DATABASE_ROUTERS` and naming the replica alias in `CHART_REPLICA_DATABASE`.
+Reads of podcast_charts models then go to the replica, while writes, and any read
+that could observe a recent write, stay on the primary:
+
+- reads inside a transaction on the primary;
+- reads in the same thread or task within `CHART_READ_YOUR_WRITES_SECONDS` of a
+  write through the router;
+- reads in any process within the same window after a chart version completes,
+  shared through the cache so web workers see fetch workers' writes;
+- anything inside [use_primary][podcast_charts.routers.use_primary].
+
+With `ATOMIC_REQUESTS` enabled every view runs in a transaction on the primary,
+so views that should read from the replica must be marked with
+`transaction.non_atomic_requests`, as the bundled JSON views are.
+"""
+
+import contextlib
+import contextvars
+import math
+import time
+from collections.abc import Iterator
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Model
+
+from podcast_charts.cache import CACHE_PREFIX
+
+PRIMARY_PINNED_CACHE_KEY = f"{CACHE_PREFIX}:primary_pinned_until"
+
+_pinned_until: contextvars.ContextVar[float] = contextvars.ContextVar(
+    "podcast_charts_primary_pinned_until", default=0.0
+)
+_use_primary: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "podcast_charts_use_primary", default=False
+)
+# The shared window as last read from the cache, and when it was read.
+_shared_pin = {"until": 0.0, "checked": 0.0}
+
+
+def get_primary_alias() -> str:
+    """
+    Returns:
+        str: The database alias chart writes go to.
+    """
+    return getattr(settings, "CHART_PRIMARY_DATABASE", DEFAULT_DB_ALIAS)
+
+
+def get_replica_alias() -> str | None:
+    """
+    Returns:
+        str | None: The database alias chart reads go to, if one is configured.
+    """
+    return getattr(settings, "CHART_REPLICA_DATABASE", None)
+
+
+def get_read_your_writes_window() -> float:
+    """
+    Returns:
+        float: Seconds reads stay on the primary after a write.
+    """
+    return getattr(settings, "CHART_READ_YOUR_WRITES_SECONDS", 5.0)
+
+
+@contextlib.contextmanager
+def use_primary() -> Iterator[None]:
+    """Send every chart read inside the block to the primary."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def pin_reads_to_primary(seconds: float | None = None, *, shared: bool = True) -> None:
+    """
+    Keep chart reads on the primary for a while.
+
+    Args:
+        seconds (float | None): How long to pin reads. Defaults to
+            `CHART_READ_YOUR_WRITES_SECONDS`.
+        shared (bool): Whether to pin reads in every process through the cache,
+            or only in the current thread or task.
+    """
+    seconds = get_read_your_writes_window() if seconds is None else seconds
+    _pinned_until.set(time.monotonic() + seconds)
+    if shared:
+        until = time.time() + seconds
+        cache.set(PRIMARY_PINNED_CACHE_KEY, until, timeout=math.ceil(seconds))
+        _shared_pin.update(until=until, checked=time.monotonic())
+
+
+def reads_pinned_to_primary() -> bool:
+    """
+    Returns:
+        bool: Whether chart reads must currently go to the primary.
+    """
+    if _use_primary.get() or _pinned_until.get() > time.monotonic():
+        return True
+    if connections[get_primary_alias()].in_atomic_block:
+        return True
+    now = time.time()
+    if _shared_pin["until"] > now:
+        return True
+    # Only look the shared window up at most once per interval per process.
+    checked = time.monotonic()
+    interval = getattr(settings, "CHART_REPLICA_PIN_CHECK_INTERVAL", 1.0)
+    if checked - _shared_pin["checked"] >= interval:
+        _shared_pin.update(
+            until=cache.get(PRIMARY_PINNED_CACHE_KEY, 0.0), checked=checked
+        )
+    return _shared_pin["until"] > now
+
+
+class ChartReplicaRouter:
+    """
+    Route podcast_charts reads to `CHART_REPLICA_DATABASE` and writes to the
+    primary. Models from other apps are left to the next router.
+    """
+
+    app_label = "podcast_charts"
+
+    def _routes(self, model: type[Model]) -> bool:
+        return model._meta.app_label == self.app_label and bool(get_replica_alias())
+
+    def db_for_read(self, model: type[Model], **hints: Any) -> str | None:
+        if not self._routes(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Related lookups follow the database the instance came from.
+            return instance._state.db
+        if reads_pinned_to_primary():
+            return get_primary_alias()
+        return get_replica_alias()
+
+    def db_for_write(
+        self,
+        model: type[Model],
+        **hints: Any,  # noqa: ARG002
+    ) -> str | None:
+        if not self._routes(model):
+            return None
+        pin_reads_to_primary(shared=False)
+        return get_primary_alias()
+
+    def allow_relation(
+        self,
+        obj1: Model,
+        obj2: Model,
+        **hints: Any,  # noqa: ARG002
+    ) -> bool | None:
+        databases = {get_primary_alias(), get_replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(
+        self,
+        db: str,
+        app_label: str,
+        model_name: str | None = None,  # noqa: ARG002
+        **hints: Any,  # noqa: ARG002
+    ) -> bool | None:
+        if app_label == self.app_label and db == get_replica_alias():
+            # The replica gets its schema from the primary.
+            return False
+        return None
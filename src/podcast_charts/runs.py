@@ -0,0 +1,310 @@
+# runs.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Fetch run history and performance regression reports.
+
+Every call to [fetch_chart_versions][podcast_charts.tasks.fetch_chart_versions]
+is stored as a [FetchRun][podcast_charts.models.FetchRun], with a
+[FetchRunTiming][podcast_charts.models.FetchRunTiming] for each version it
+claimed. Timings are collected in memory during the run and written at its end
+in one insert for the run and batched inserts for the versions, so the
+bookkeeping adds a couple of queries per run rather than per version. Set
+`CHART_FETCH_RUN_HISTORY` to `False` to turn it off.
+
+The `chart_fetch_report` command compares the most recent runs against the runs
+before them with [find_regressions][podcast_charts.runs.find_regressions], and
+lists the slowest countries and charts with
+[get_slowest][podcast_charts.runs.get_slowest].
+"""
+
+import dataclasses
+import datetime
+import math
+from collections.abc import Iterable, Sequence
+from typing import TYPE_CHECKING, Literal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, Max
+from django.utils import timezone
+
+from podcast_charts.models import (
+    ChartCountry,
+    FetchRun,
+    FetchRunTiming,
+    FetchStatusChoices,
+    PodcastChart,
+)
+
+if TYPE_CHECKING:  # no cov
+    from podcast_charts.tasks import ChartFetchResult
+
+TIMING_PHASES = ("http", "parse", "store")
+
+
+def fetch_run_history_enabled() -> bool:
+    """
+    Returns:
+        bool: Whether fetch runs are recorded, from `CHART_FETCH_RUN_HISTORY`.
+    """
+    return getattr(settings, "CHART_FETCH_RUN_HISTORY", True)
+
+
+def record_fetch_run(
+    started_at: datetime.datetime,
+    results: Sequence["ChartFetchResult"],
+    finished_at: datetime.datetime | None = None,
+) -> FetchRun:
+    """
+    Store a fetch run and the timing of each of its versions.
+
+    Args:
+        started_at (datetime.datetime): When the run started.
+        results (Sequence[ChartFetchResult]): The outcome of each version.
+        finished_at (datetime.datetime | None): When the run finished. Defaults
+            to now.
+
+    Returns:
+        FetchRun: The stored run.
+    """
+    timings = []
+    phase_seconds: dict[str, float] = dict.fromkeys(TIMING_PHASES, 0.0)
+    for result in results:
+        for name, seconds in result.timings.items():
+            phase_seconds[name] = phase_seconds.get(name, 0.0) + seconds
+        timings.append(
+            FetchRunTiming(
+                chart_version=result.version,
+                podcast_chart_id=result.version.podcast_chart_id,
+                country_id=result.version.country_id,
+                fetch_status=result.fetch_status,
+                http_seconds=result.timings.get("http", 0.0),
+                parse_seconds=result.timings.get("parse", 0.0),
+                store_seconds=result.timings.get("store", 0.0),
+                response_bytes=result.response_bytes,
+                rows_written=len(result.positions or ()),
+            )
+        )
+    statuses = [result.fetch_status for result in results]
+    with transaction.atomic():
+        run = FetchRun.objects.create(
+            started_at=started_at,
+            finished_at=finished_at or timezone.now(),
+            attempted=len(results),
+            succeeded=statuses.count(FetchStatusChoices.DONE),
+            retried=statuses.count(FetchStatusChoices.RETRY),
+            failed=statuses.count(FetchStatusChoices.ERROR),
+            response_bytes=sum(timing.response_bytes for timing in timings),
+            rows_written=sum(timing.rows_written for timing in timings),
+            phase_seconds=phase_seconds,
+        )
+        for timing in timings:
+            timing.run = run
+        FetchRunTiming.objects.bulk_create(timings, batch_size=500)
+    return run
+
+
+def _percentile(values: Sequence[float], fraction: float) -> float:
+    """
+    The nearest rank percentile of sorted values.
+
+    Example:
+        >>> _percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+        2.0
+        >>> _percentile([1.0, 2.0, 3.0, 4.0], 0.95)
+        4.0
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def _version_seconds() -> F:
+    return F("http_seconds") + F("parse_seconds") + F("store_seconds")
+
+
+@dataclasses.dataclass(frozen=True)
+class FetchRunSummary:
+    """
+    Performance of a group of fetch runs.
+
+    Attributes:
+        runs (int): The number of runs.
+        versions (int): Versions attempted over all runs.
+        throughput (float): Versions stored per second of run time.
+        p50_seconds (float): Median time spent on a version.
+        p95_seconds (float): 95th percentile time spent on a version.
+        failure_rate (float): Share of attempted versions left to retry or failed.
+    """
+
+    runs: int
+    versions: int
+    throughput: float
+    p50_seconds: float
+    p95_seconds: float
+    failure_rate: float
+
+
+def summarize_runs(runs: Iterable[FetchRun]) -> FetchRunSummary:
+    """
+    Summarize the performance of a group of runs.
+
+    Args:
+        runs (Iterable[FetchRun]): The runs to summarize.
+
+    Returns:
+        FetchRunSummary: The summary.
+    """
+    runs = list(runs)
+    seconds = sum(run.seconds for run in runs)
+    attempted = sum(run.attempted for run in runs)
+    latencies = sorted(
+        FetchRunTiming.objects.filter(run__in=runs)
+        .annotate(total_seconds=_version_seconds())
+        .values_list("total_seconds", flat=True)
+    )
+    return FetchRunSummary(
+        runs=len(runs),
+        versions=attempted,
+        throughput=sum(run.succeeded for run in runs) / seconds if seconds else 0.0,
+        p50_seconds=_percentile(latencies, 0.5),
+        p95_seconds=_percentile(latencies, 0.95),
+        failure_rate=(
+            sum(run.retried + run.failed for run in runs) / attempted
+            if attempted
+            else 0.0
+        ),
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class Regression:
+    """
+    A metric that got worse than the baseline by more than the threshold.
+
+    Attributes:
+        metric (str): The name of the metric.
+        baseline (float): The value over the baseline runs.
+        recent (float): The value over the recent runs.
+    """
+
+    metric: str
+    baseline: float
+    recent: float
+
+    @property
+    def change(self) -> float:
+        """
+        Returns:
+            float: The relative change from the baseline.
+        """
+        return (self.recent - self.baseline) / self.baseline
+
+
+# Metrics compared for regressions, and whether higher values are better.
+REGRESSION_METRICS = {
+    "throughput": True,
+    "p50_seconds": False,
+    "p95_seconds": False,
+}
+
+
+def find_regressions(
+    recent: FetchRunSummary, baseline: FetchRunSummary, threshold: float = 0.2
+) -> list[Regression]:
+    """
+    Compare recent runs against a baseline.
+
+    Args:
+        recent (FetchRunSummary): The recent runs.
+        baseline (FetchRunSummary): The runs to compare against.
+        threshold (float): The relative change that counts as a regression.
+
+    Returns:
+        list[Regression]: The throughput and latency metrics that regressed.
+
+    Example:
+        >>> baseline = FetchRunSummary(10, 100, 10.0, 0.5, 1.0, 0.0)
+        >>> recent = FetchRunSummary(5, 50, 9.0, 0.5, 1.5, 0.0)
+        >>> [r.metric for r in find_regressions(recent, baseline)]
+        ['p95_seconds']
+    """
+    regressions = []
+    for metric, higher_is_better in REGRESSION_METRICS.items():
+        regression = Regression(
+            metric, getattr(baseline, metric), getattr(recent, metric)
+        )
+        if not regression.baseline:
+            continue
+        change = -regression.change if higher_is_better else regression.change
+        if change > threshold:
+            regressions.append(regression)
+    return regressions
+
+
+@dataclasses.dataclass(frozen=True)
+class SlowestEntry:
+    """
+    The timings of one country or chart over a group of runs.
+
+    Attributes:
+        name (str): The country code or chart.
+        versions (int): Versions timed.
+        avg_seconds (float): The average time spent on a version.
+        max_seconds (float): The longest time spent on a version.
+    """
+
+    name: str
+    versions: int
+    avg_seconds: float
+    max_seconds: float
+
+
+def get_slowest(
+    runs: Iterable[FetchRun],
+    by: Literal["country", "podcast_chart"],
+    limit: int = 5,
+) -> list[SlowestEntry]:
+    """
+    Get the countries or charts that took longest on average.
+
+    Args:
+        runs (Iterable[FetchRun]): The runs to look at.
+        by (Literal["country", "podcast_chart"]): What to group the timings by.
+        limit (int): How many to return.
+
+    Returns:
+        list[SlowestEntry]: The slowest first.
+    """
+    if by == "country":
+        objects = ChartCountry.objects.all()
+    else:
+        objects = PodcastChart.objects.select_related(
+            "chart_source_category__chart_category"
+        )
+    rows = list(
+        FetchRunTiming.objects.filter(run__in=list(runs))
+        .annotate(total_seconds=_version_seconds())
+        .values(by)
+        .annotate(
+            versions=Count("id"),
+            avg_seconds=Avg("total_seconds", output_field=FloatField()),
+            max_seconds=Max("total_seconds", output_field=FloatField()),
+        )
+        .order_by("-avg_seconds")[:limit]
+    )
+    names = objects.in_bulk([row[by] for row in rows])
+    return [
+        SlowestEntry(
+            name=str(names[row[by]]),
+            versions=row["versions"],
+            avg_seconds=row["avg_seconds"],
+            max_seconds=row["max_seconds"],
+        )
+        for row in rows
+    ]
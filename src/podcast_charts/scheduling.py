@@ -0,0 +1,407 @@
+# scheduling.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Change aware fetch scheduling per chart and country.
+
+Storefronts publish new rankings at different times, so fetching every chart on
+a fixed interval both wastes requests on charts that have not changed and picks
+up changes late. Each chart and country instead gets a
+[ChartFetchSchedule][podcast_charts.models.ChartFetchSchedule] that learns from
+the ranking hash of every version stored:
+
+- A fetch that finds the same ranking as the last one doubles the polling
+  interval, up to `CHART_SCHEDULE_MAX_INTERVAL`, so charts that rarely change are
+  polled rarely.
+- A fetch that finds a new ranking resets the interval to
+  `CHART_SCHEDULE_MIN_INTERVAL` and records the estimated time of day of the
+  change, halfway between this check and the last.
+- Once recent changes cluster around a time of day, the next fetch is planned
+  `CHART_SCHEDULE_LAG` after it, and polling while waiting never overshoots it.
+
+New schedules are seeded from the stored version history. Use
+[plan_chart_fetches][podcast_charts.scheduling.plan_chart_fetches], e.g. through
+`fetch_podcast_charts --scheduled`, to get the versions that are due.
+"""
+
+import datetime
+import itertools
+import math
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from podcast_charts.models import (
+    ENABLED_SOURCES,
+    ChartFetchSchedule,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartVersion,
+)
+from podcast_charts.tasks import ChartFetchResult, get_versions_to_fetch
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def get_min_interval() -> datetime.timedelta:
+    """
+    Returns:
+        datetime.timedelta: The polling interval right after a change.
+    """
+    return datetime.timedelta(
+        seconds=getattr(settings, "CHART_SCHEDULE_MIN_INTERVAL", 15 * 60)
+    )
+
+
+def get_max_interval() -> datetime.timedelta:
+    """
+    Returns:
+        datetime.timedelta: The longest polling interval for unchanged charts.
+    """
+    return datetime.timedelta(
+        seconds=getattr(settings, "CHART_SCHEDULE_MAX_INTERVAL", 24 * 60 * 60)
+    )
+
+
+def get_update_lag() -> datetime.timedelta:
+    """
+    Returns:
+        datetime.timedelta: How long after the typical update time to fetch.
+    """
+    return datetime.timedelta(seconds=getattr(settings, "CHART_SCHEDULE_LAG", 5 * 60))
+
+
+def typical_update_minute(
+    minutes: Iterable[int], tolerance: float | None = None
+) -> int | None:
+    """
+    Find the time of day changes cluster around.
+
+    Minutes are averaged on a circle so that 23:50 and 00:10 average to midnight.
+
+    Args:
+        minutes (Iterable[int]): Minutes past midnight of observed changes.
+        tolerance (float | None): The largest circular standard deviation in
+            minutes that still counts as a daily pattern. Defaults to
+            `CHART_SCHEDULE_TOLERANCE`.
+
+    Returns:
+        int | None: Minutes past midnight, or `None` without at least two
+            observations that agree.
+
+    Examples:
+        >>> typical_update_minute([1430, 10])
+        0
+        >>> typical_update_minute([0, 480, 960]) is None
+        True
+    """
+    max_spread: float = (
+        getattr(settings, "CHART_SCHEDULE_TOLERANCE", 90)
+        if tolerance is None
+        else tolerance
+    )
+    angles = [2 * math.pi * minute / MINUTES_PER_DAY for minute in minutes]
+    if len(angles) < 2:  # noqa: PLR2004
+        return None
+    x = sum(math.cos(angle) for angle in angles) / len(angles)
+    y = sum(math.sin(angle) for angle in angles) / len(angles)
+    resultant = math.hypot(x, y)
+    if resultant == 0:
+        return None
+    # The circular standard deviation, converted from radians to minutes.
+    spread = math.sqrt(-2 * math.log(min(resultant, 1.0)))
+    if spread * MINUTES_PER_DAY / (2 * math.pi) > max_spread:
+        return None
+    return round(math.atan2(y, x) * MINUTES_PER_DAY / (2 * math.pi)) % MINUTES_PER_DAY
+
+
+def next_expected_update(
+    schedule: ChartFetchSchedule, after: datetime.datetime
+) -> datetime.datetime | None:
+    """
+    Args:
+        schedule (ChartFetchSchedule): The schedule.
+        after (datetime.datetime): The earliest time to consider.
+
+    Returns:
+        datetime.datetime | None: When to fetch to catch the next daily update,
+            or `None` if the chart has no daily pattern yet.
+    """
+    minute = typical_update_minute(schedule.change_minutes)
+    if minute is None:
+        return None
+    if schedule.last_changed_at is not None:
+        # A daily update that was already seen is not expected again for a while.
+        after = max(after, schedule.last_changed_at + datetime.timedelta(hours=12))
+    after = after.astimezone(datetime.UTC)
+    expected = (
+        after.replace(hour=0, minute=0, second=0, microsecond=0)
+        + datetime.timedelta(minutes=minute)
+        + get_update_lag()
+    )
+    while expected <= after:
+        expected += datetime.timedelta(days=1)
+    return expected
+
+
+def record_check(
+    schedule: ChartFetchSchedule, content_hash: str, checked_at: datetime.datetime
+) -> bool:
+    """
+    Update a schedule in memory with the result of a fetch and plan the next one.
+
+    Args:
+        schedule (ChartFetchSchedule): The schedule.
+        content_hash (str): The hash of the ranking fetched.
+        checked_at (datetime.datetime): When it was fetched.
+
+    Returns:
+        bool: Whether the ranking changed since the last check.
+    """
+    changed = bool(schedule.content_hash) and content_hash != schedule.content_hash
+    interval = schedule.poll_interval
+    if changed:
+        previous = schedule.last_checked_at or checked_at
+        estimate = previous + (checked_at - previous) / 2
+        estimate = estimate.astimezone(datetime.UTC)
+        history = getattr(settings, "CHART_SCHEDULE_HISTORY", 14)
+        schedule.change_minutes = [
+            *schedule.change_minutes,
+            estimate.hour * 60 + estimate.minute,
+        ][-history:]
+        schedule.last_changed_at = estimate
+        schedule.changes += 1
+        interval = get_min_interval()
+    elif schedule.content_hash:
+        interval = min(interval * 2, get_max_interval())
+    schedule.poll_interval = interval
+    schedule.content_hash = content_hash
+    schedule.last_checked_at = checked_at
+    schedule.checks += 1
+    next_fetch_at = checked_at + interval
+    expected = next_expected_update(schedule, checked_at)
+    if expected is not None and (changed or expected < next_fetch_at):
+        next_fetch_at = expected
+    schedule.next_fetch_at = next_fetch_at
+    return changed
+
+
+def record_failure(schedule: ChartFetchSchedule, failed_at: datetime.datetime) -> None:
+    """
+    Back a schedule off after a fetch failed for good, in memory.
+
+    Args:
+        schedule (ChartFetchSchedule): The schedule.
+        failed_at (datetime.datetime): When the fetch failed.
+    """
+    schedule.poll_interval = min(schedule.poll_interval * 2, get_max_interval())
+    schedule.next_fetch_at = failed_at + schedule.poll_interval
+
+
+def _seed_from_history(
+    schedules: list[ChartFetchSchedule], now: datetime.datetime
+) -> None:
+    """Seed new schedules from the hashes of their recent versions in one query."""
+    by_pair = {(s.podcast_chart_id, s.country_id): s for s in schedules}  # type: ignore
+    history_start = timezone.localdate(now) - datetime.timedelta(
+        days=getattr(settings, "CHART_SCHEDULE_HISTORY", 14)
+    )
+    rows = (
+        PodcastChartVersion.objects.filter(
+            podcast_chart_id__in={chart_id for chart_id, _ in by_pair},
+            country_id__in={country_id for _, country_id in by_pair},
+            fetch_status=FetchStatusChoices.DONE,
+            chart_date__gte=history_start,
+        )
+        .exclude(content_hash="")
+        .order_by("chart_date")
+        .values_list("podcast_chart_id", "country_id", "content_hash", "completed_at")
+    )
+    seen: dict[tuple[int, int], list[tuple[str, datetime.datetime]]] = {}
+    for chart_id, country_id, content_hash, completed_at in rows:
+        if (chart_id, country_id) in by_pair:
+            seen.setdefault((chart_id, country_id), []).append(
+                (content_hash, completed_at)
+            )
+    for pair, versions in seen.items():
+        schedule = by_pair[pair]
+        changes = sum(
+            1
+            for (before, _), (after, _) in itertools.pairwise(versions)
+            if before != after
+        )
+        schedule.content_hash, schedule.last_checked_at = versions[-1]
+        schedule.checks = len(versions)
+        schedule.changes = changes
+        if changes:
+            # Versions are daily, so only the rate of change is known, not the time.
+            days_per_change = len(versions) / changes
+            schedule.poll_interval = max(
+                get_min_interval(),
+                min(get_max_interval(), datetime.timedelta(days=days_per_change) / 4),
+            )
+        elif len(versions) > 1:
+            schedule.poll_interval = get_max_interval()
+
+
+def ensure_fetch_schedules(now: datetime.datetime | None = None) -> int:
+    """
+    Create schedules, due immediately, for enabled charts and countries that
+    have none yet.
+
+    Args:
+        now (datetime.datetime | None): The current time.
+
+    Returns:
+        int: The number of schedules created.
+    """
+    now = now or timezone.now()
+    through = PodcastChart.enabled_countries.through
+    pairs = set(
+        through.objects.filter(
+            podcastchart__enabled=True,
+            podcastchart__chart_source__in=ENABLED_SOURCES,
+            chartcountry__enabled=True,
+        ).values_list("podcastchart_id", "chartcountry_id")
+    ) - set(ChartFetchSchedule.objects.values_list("podcast_chart_id", "country_id"))
+    schedules = [
+        ChartFetchSchedule(
+            podcast_chart_id=chart_id,
+            country_id=country_id,
+            next_fetch_at=now,
+            poll_interval=get_min_interval(),
+        )
+        for chart_id, country_id in sorted(pairs)
+    ]
+    if not schedules:
+        return 0
+    _seed_from_history(schedules, now)
+    ChartFetchSchedule.objects.bulk_create(
+        schedules, batch_size=500, ignore_conflicts=True
+    )
+    return len(schedules)
+
+
+def plan_chart_fetches(
+    now: datetime.datetime | None = None,
+) -> QuerySet[PodcastChartVersion]:
+    """
+    Get the versions for every chart and country whose schedule is due.
+
+    Today's version is created for each due chart, or reset to pending if it
+    failed. A version that is already done is returned as it is, so that
+    fetching it again replaces its ranking only if the chart has since been
+    updated, and it stays visible while that happens.
+
+    Args:
+        now (datetime.datetime | None): The current time.
+
+    Returns:
+        QuerySet[PodcastChartVersion]: The versions to fetch.
+    """
+    now = now or timezone.now()
+    chart_date = timezone.localdate(now)
+    ensure_fetch_schedules(now)
+    due = ChartFetchSchedule.objects.filter(
+        next_fetch_at__lte=now,
+        podcast_chart__enabled=True,
+        podcast_chart__chart_source__in=ENABLED_SOURCES,
+        country__enabled=True,
+    )
+    due_pairs = due.values_list("podcast_chart_id", "country_id")
+    PodcastChartVersion.objects.bulk_create(
+        [
+            PodcastChartVersion(
+                podcast_chart_id=chart_id,
+                country_id=country_id,
+                chart_date=chart_date,
+                fetch_status=FetchStatusChoices.PENDING,
+            )
+            for chart_id, country_id in due_pairs
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    is_due = Exists(
+        due.filter(podcast_chart=OuterRef("podcast_chart"), country=OuterRef("country"))
+    )
+    PodcastChartVersion.objects.filter(
+        is_due, chart_date=chart_date, fetch_status=FetchStatusChoices.ERROR
+    ).transition(FetchStatusChoices.PENDING, num_retries=0)
+    return get_versions_to_fetch(chart_date).filter(
+        is_due
+    ) | PodcastChartVersion.objects.filter(
+        is_due, chart_date=chart_date, fetch_status=FetchStatusChoices.DONE
+    )
+
+
+def update_fetch_schedules(results: Iterable[ChartFetchResult]) -> int:
+    """
+    Fold the outcome of a fetch run into the schedules of the charts it fetched.
+
+    Only versions for the current date are considered, so backfilling history
+    does not disturb the schedules. Versions waiting for a retry are left to the
+    retry handling, and so are failed refetches of finished versions, which are
+    tried again on the next run.
+
+    Args:
+        results (Iterable[ChartFetchResult]): The outcome of each version.
+
+    Returns:
+        int: The number of schedules updated.
+    """
+    today = timezone.localdate()
+    results = [
+        result
+        for result in results
+        if result.version.chart_date == today
+        and result.fetch_status in (FetchStatusChoices.DONE, FetchStatusChoices.ERROR)
+        and not (result.unchanged and result.error is not None)
+    ]
+    if not results:
+        return 0
+    now = timezone.now()
+    ensure_fetch_schedules(now)
+    schedules = {
+        (schedule.podcast_chart_id, schedule.country_id): schedule  # type: ignore
+        for schedule in ChartFetchSchedule.objects.filter(
+            podcast_chart_id__in={r.version.podcast_chart_id for r in results},  # type: ignore
+            country_id__in={r.version.country_id for r in results},  # type: ignore
+        )
+    }
+    updated = []
+    for result in sorted(results, key=lambda result: result.version.modified):
+        version = result.version
+        schedule = schedules.get((version.podcast_chart_id, version.country_id))  # type: ignore
+        if schedule is None:
+            continue
+        if result.fetch_status == FetchStatusChoices.DONE:
+            # An unchanged refetch still carries the time the ranking was stored.
+            checked_at = None if result.unchanged else version.completed_at
+            record_check(schedule, version.content_hash, checked_at or now)
+        else:
+            record_failure(schedule, now)
+        schedule.modified = now
+        updated.append(schedule)
+    ChartFetchSchedule.objects.bulk_update(
+        updated,
+        [
+            "next_fetch_at",
+            "poll_interval",
+            "content_hash",
+            "last_checked_at",
+            "last_changed_at",
+            "change_minutes",
+            "checks",
+            "changes",
+            "modified",
+        ],
+        batch_size=500,
+    )
+    return len(updated)
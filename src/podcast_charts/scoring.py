@@ -0,0 +1,289 @@
+# scoring.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Cross-chart "chart power" scores.
+
+Every position a podcast holds on a date, on any chart and in any country, adds
+to its score:
+
+- `inverse_rank` (default): `weight / position ** exponent`, so the top of every
+    chart counts most.
+- `linear`: `weight * (size - position + 1) / size`, where `size` is the lowest
+    position on that chart, so every chart adds at most `weight`.
+
+`weight` is the product of the chart's and the country's weight, both 1 unless
+configured. Scores are computed over the date's
+[RankMatrix][podcast_charts.matrix.RankMatrix], whose parallel arrays are summed
+per podcast with `numpy` when it is installed (install the `speedups` extra) and
+with a plain loop otherwise.
+
+The top of each date's scores is kept in the
+[ChartPowerScore][podcast_charts.models.ChartPowerScore] leaderboard, rebuilt
+after every fetch run for the dates it stored. Configure scoring with
+`CHART_POWER_SCORING`, a dict of [ChartPowerConfig][] options.
+"""
+
+import dataclasses
+import datetime
+import logging
+from types import ModuleType
+from typing import Any
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import numpy as np
+except ImportError:  # no cov
+    np = None
+
+from podcast_charts.exceptions import ChartImproperlyConfiguredError
+from podcast_charts.matrix import RankMatrix, get_rank_matrix
+from podcast_charts.models import ChartPowerScore, PodcastChartPodcastIdentifier
+
+logger = logging.getLogger(__name__)
+
+SCORE_METHODS = ("inverse_rank", "linear")
+
+
+@dataclasses.dataclass(frozen=True)
+class ChartPowerConfig:
+    """
+    How chart power scores are computed.
+
+    Attributes:
+        method (str): `"inverse_rank"` or `"linear"`.
+        exponent (float): How steeply `inverse_rank` favours the top positions.
+        chart_weights (dict[int, float]): Weights keyed by podcast chart id.
+        country_weights (dict[str, float]): Weights keyed by country code.
+        leaderboard_size (int | None): How many podcasts are stored per date, or
+            `None` to store every podcast that charted.
+    """
+
+    method: str = "inverse_rank"
+    exponent: float = 1.0
+    chart_weights: dict[int, float] = dataclasses.field(default_factory=dict)
+    country_weights: dict[str, float] = dataclasses.field(default_factory=dict)
+    leaderboard_size: int | None = 1000
+
+    def __post_init__(self) -> None:
+        if self.method not in SCORE_METHODS:
+            msg = f"Unknown chart power method {self.method!r}."
+            raise ChartImproperlyConfiguredError(msg)
+
+
+def get_chart_power_config() -> ChartPowerConfig:
+    """
+    Returns:
+        ChartPowerConfig: The configuration from `CHART_POWER_SCORING`.
+    """
+    options: dict[str, Any] = getattr(settings, "CHART_POWER_SCORING", None) or {}
+    return ChartPowerConfig(**options)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ChartPowerEntry:
+    """
+    One podcast's combined score on a date.
+
+    Attributes:
+        podcast_identifier_id (int): The podcast identifier id.
+        score (float): The combined score.
+        appearances (int): How many charts and countries the podcast was on.
+        best_position (int): The podcast's highest position on any chart.
+    """
+
+    podcast_identifier_id: int
+    score: float
+    appearances: int
+    best_position: int
+
+
+def _compute_numpy(
+    np: ModuleType, matrix: RankMatrix, config: ChartPowerConfig
+) -> list[ChartPowerEntry]:
+    positions = np.frombuffer(matrix.positions, dtype=matrix.positions.typecode)
+    podcast_ids = np.frombuffer(matrix.podcast_ids, dtype=matrix.podcast_ids.typecode)
+    if config.method == "linear":
+        bounds = np.array(list(matrix.cell_bounds.values()), dtype=np.int64)
+        sizes = np.repeat(positions[bounds[:, 1] - 1], bounds[:, 1] - bounds[:, 0])
+        scores = (sizes - positions + 1) / sizes
+    else:
+        scores = positions.astype(np.float64) ** -config.exponent
+    if config.chart_weights:
+        chart_ids, inverse = np.unique(
+            np.frombuffer(matrix.chart_ids, dtype=matrix.chart_ids.typecode),
+            return_inverse=True,
+        )
+        scores *= np.array([config.chart_weights.get(int(i), 1.0) for i in chart_ids])[
+            inverse
+        ]
+    if config.country_weights:
+        country_ids, inverse = np.unique(
+            np.frombuffer(matrix.country_ids, dtype=matrix.country_ids.typecode),
+            return_inverse=True,
+        )
+        scores *= np.array(
+            [
+                config.country_weights.get(matrix.countries[int(i)], 1.0)
+                for i in country_ids
+            ]
+        )[inverse]
+    podcasts, inverse, appearances = np.unique(
+        podcast_ids, return_inverse=True, return_counts=True
+    )
+    totals = np.bincount(inverse, weights=scores, minlength=len(podcasts))
+    best = np.full(len(podcasts), np.iinfo(positions.dtype).max, dtype=positions.dtype)
+    np.minimum.at(best, inverse, positions)
+    order = np.lexsort((podcasts, -totals))[: config.leaderboard_size]
+    return [
+        ChartPowerEntry(
+            podcast_identifier_id=int(podcasts[i]),
+            score=float(totals[i]),
+            appearances=int(appearances[i]),
+            best_position=int(best[i]),
+        )
+        for i in order
+    ]
+
+
+def _compute_python(
+    matrix: RankMatrix, config: ChartPowerConfig
+) -> list[ChartPowerEntry]:
+    totals: dict[int, list] = {}
+    for (chart_id, country_id), (start, end) in matrix.cell_bounds.items():
+        weight = config.chart_weights.get(chart_id, 1.0) * (
+            config.country_weights.get(matrix.countries[country_id], 1.0)
+        )
+        size = matrix.positions[end - 1]
+        for podcast_id, position in zip(
+            matrix.podcast_ids[start:end], matrix.positions[start:end], strict=True
+        ):
+            if config.method == "linear":
+                score = weight * (size - position + 1) / size
+            else:
+                score = weight * position**-config.exponent
+            entry = totals.setdefault(podcast_id, [0.0, 0, position])
+            entry[0] += score
+            entry[1] += 1
+            entry[2] = min(entry[2], position)
+    order = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+    return [
+        ChartPowerEntry(
+            podcast_identifier_id=podcast_id,
+            score=score,
+            appearances=appearances,
+            best_position=best_position,
+        )
+        for podcast_id, (score, appearances, best_position) in order[
+            : config.leaderboard_size
+        ]
+    ]
+
+
+def compute_chart_power(
+    matrix: RankMatrix, config: ChartPowerConfig | None = None
+) -> list[ChartPowerEntry]:
+    """
+    Score every podcast on a date across all charts and countries.
+
+    Args:
+        matrix (RankMatrix): The date's positions.
+        config (ChartPowerConfig | None): How to score. Defaults to
+            `CHART_POWER_SCORING`.
+
+    Returns:
+        list[ChartPowerEntry]: The highest scores first, ties broken by
+            identifier id, cut to the configured leaderboard size.
+    """
+    config = config or get_chart_power_config()
+    if not len(matrix):
+        return []
+    if np is not None:
+        return _compute_numpy(np, matrix, config)
+    return _compute_python(matrix, config)
+
+
+def update_chart_power_scores(chart_date: datetime.date, *, cached: bool = True) -> int:
+    """
+    Recompute and store the leaderboard for a date.
+
+    Args:
+        chart_date (datetime.date): The chart date.
+        cached (bool): Whether the date's rank matrix may come from the cache.
+
+    Returns:
+        int: The number of scores stored.
+    """
+    entries = compute_chart_power(get_rank_matrix(chart_date, cached=cached))
+    with transaction.atomic():
+        ChartPowerScore.objects.filter(chart_date=chart_date).delete()
+        ChartPowerScore.objects.bulk_create(
+            [
+                ChartPowerScore(
+                    chart_date=chart_date,
+                    podcast_identifier_id=entry.podcast_identifier_id,
+                    rank=rank,
+                    score=entry.score,
+                    appearances=entry.appearances,
+                    best_position=entry.best_position,
+                )
+                for rank, entry in enumerate(entries, start=1)
+            ],
+            batch_size=1000,
+        )
+    logger.debug(f"Stored {len(entries)} chart power scores for {chart_date}")
+    return len(entries)
+
+
+def get_chart_power_leaderboard(
+    chart_date: datetime.date, limit: int = 50
+) -> list[ChartPowerScore]:
+    """
+    Get the top of the leaderboard for a date.
+
+    Args:
+        chart_date (datetime.date): The chart date.
+        limit (int): How many scores to return.
+
+    Returns:
+        list[ChartPowerScore]: The scores in rank order, with their podcast
+            identifiers loaded.
+    """
+    return list(
+        ChartPowerScore.objects.filter(chart_date=chart_date)
+        .select_related("podcast_identifier")
+        .order_by("rank")[:limit]
+    )
+
+
+def get_chart_power_history(
+    podcast_identifier: PodcastChartPodcastIdentifier | int,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+) -> list[tuple[datetime.date, int, float]]:
+    """
+    Get a podcast's leaderboard places over time.
+
+    Args:
+        podcast_identifier (PodcastChartPodcastIdentifier | int): The podcast.
+        start_date (datetime.date | None): The first date to include.
+        end_date (datetime.date | None): The last date to include.
+
+    Returns:
+        list[tuple[datetime.date, int, float]]: `(chart_date, rank, score)` in date
+            order. Dates the podcast was not on the leaderboard are omitted.
+    """
+    scores = ChartPowerScore.objects.filter(podcast_identifier=podcast_identifier)
+    if start_date is not None:
+        scores = scores.filter(chart_date__gte=start_date)
+    if end_date is not None:
+        scores = scores.filter(chart_date__lte=end_date)
+    return list(
+        scores.order_by("chart_date").values_list("chart_date", "rank", "score")
+    )
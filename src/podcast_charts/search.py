@@ -0,0 +1,194 @@
+# search.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Fuzzy podcast title search over
+[PodcastChartPodcastIdentifier][podcast_charts.models.PodcastChartPodcastIdentifier].
+
+Titles are normalized on save. On PostgreSQL with `django.contrib.postgres` in
+`INSTALLED_APPS`, matching uses `pg_trgm` and its GIN index. Everywhere else, a
+portable trigram table is maintained and candidates are found with a single
+grouped index lookup, then ranked by trigram similarity.
+"""
+
+import dataclasses
+from collections.abc import Iterable
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Count
+
+from podcast_charts.models import PodcastChartPodcastIdentifier, PodcastTitleTrigram
+from podcast_charts.normalize import normalize_title, title_trigrams, trigram_similarity
+
+DEFAULT_MIN_SIMILARITY = 0.3
+
+# How many n-gram candidates to rank for each requested result.
+CANDIDATE_FACTOR = 5
+
+
+@dataclasses.dataclass
+class PodcastSearchResult:
+    """
+    A ranked search match.
+
+    Attributes:
+        podcast_identifier (PodcastChartPodcastIdentifier): The matching podcast.
+        similarity (float): How closely the title matched, between 0 and 1.
+    """
+
+    podcast_identifier: PodcastChartPodcastIdentifier
+    similarity: float
+
+
+def uses_postgres_trigram() -> bool:
+    """
+    Returns:
+        bool: Whether searches are served by PostgreSQL's `pg_trgm`.
+    """
+    return connection.vendor == "postgresql" and apps.is_installed(
+        "django.contrib.postgres"
+    )
+
+
+def index_podcast_identifiers(
+    identifiers: Iterable[PodcastChartPodcastIdentifier],
+) -> None:
+    """
+    Rebuild the trigram rows for the given identifiers.
+
+    Identifiers must have `podcast_title_normalized` up to date, which happens
+    automatically in `save()` and in the bulk write paths of the fetch pipeline.
+
+    Args:
+        identifiers (Iterable[PodcastChartPodcastIdentifier]): The identifiers to
+            index.
+    """
+    if uses_postgres_trigram():
+        return
+    identifiers = list(identifiers)
+    if not identifiers:
+        return
+    with transaction.atomic():
+        PodcastTitleTrigram.objects.filter(
+            podcast_identifier_id__in=[i.id for i in identifiers]
+        ).delete()
+        PodcastTitleTrigram.objects.bulk_create(
+            [
+                PodcastTitleTrigram(podcast_identifier_id=identifier.id, trigram=gram)
+                for identifier in identifiers
+                for gram in title_trigrams(identifier.podcast_title_normalized)
+            ],
+            batch_size=2000,
+        )
+
+
+def refresh_normalized_titles(identifier_ids: Iterable[int]) -> int:
+    """
+    Normalize titles written in bulk and re-index any whose key changed.
+
+    Bulk writes skip `save()`, so callers that update titles with `bulk_create`
+    or `bulk_update` should call this afterwards.
+
+    Args:
+        identifier_ids (Iterable[int]): The ids of the identifiers written.
+
+    Returns:
+        int: The number of identifiers re-indexed.
+    """
+    changed = []
+    for identifier in PodcastChartPodcastIdentifier.objects.filter(
+        id__in=list(identifier_ids)
+    ).only("id", "podcast_title", "podcast_title_normalized"):
+        normalized = normalize_title(identifier.podcast_title)
+        if normalized != identifier.podcast_title_normalized:
+            identifier.podcast_title_normalized = normalized
+            changed.append(identifier)
+    if changed:
+        PodcastChartPodcastIdentifier.objects.bulk_update(
+            changed, ["podcast_title_normalized"], batch_size=500
+        )
+        index_podcast_identifiers(changed)
+    return len(changed)
+
+
+def _search_postgres(
+    query_key: str, chart_source: str | None, limit: int, min_similarity: float
+) -> list[PodcastSearchResult]:
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    qs = PodcastChartPodcastIdentifier.objects.annotate(
+        similarity=TrigramSimilarity("podcast_title_normalized", query_key)
+    ).filter(
+        podcast_title_normalized__trigram_similar=query_key,
+        similarity__gte=min_similarity,
+    )
+    if chart_source is not None:
+        qs = qs.filter(chart_source=chart_source)
+    return [
+        PodcastSearchResult(identifier, identifier.similarity)  # type: ignore
+        for identifier in qs.order_by("-similarity", "id")[:limit]
+    ]
+
+
+def _search_ngram(
+    query_key: str, chart_source: str | None, limit: int, min_similarity: float
+) -> list[PodcastSearchResult]:
+    query_grams = title_trigrams(query_key)
+    if not query_grams:
+        return []
+    candidates = PodcastTitleTrigram.objects.filter(trigram__in=query_grams)
+    if chart_source is not None:
+        candidates = candidates.filter(podcast_identifier__chart_source=chart_source)
+    candidate_ids = (
+        candidates.values("podcast_identifier_id")
+        .annotate(shared=Count("id"))
+        .order_by("-shared")
+        .values_list("podcast_identifier_id", flat=True)[: limit * CANDIDATE_FACTOR]
+    )
+    results = []
+    for identifier in PodcastChartPodcastIdentifier.objects.filter(
+        id__in=list(candidate_ids)
+    ):
+        similarity = (
+            1.0
+            if identifier.podcast_title_normalized == query_key
+            else trigram_similarity(
+                query_grams, title_trigrams(identifier.podcast_title_normalized)
+            )
+        )
+        if similarity >= min_similarity:
+            results.append(PodcastSearchResult(identifier, similarity))
+    results.sort(key=lambda result: (-result.similarity, result.podcast_identifier.id))
+    return results[:limit]
+
+
+def search_podcast_identifiers(
+    query: str,
+    *,
+    chart_source: str | None = None,
+    limit: int = 20,
+    min_similarity: float = DEFAULT_MIN_SIMILARITY,
+) -> list[PodcastSearchResult]:
+    """
+    Find podcasts whose title is similar to the query, best matches first.
+
+    Args:
+        query (str): The title to search for.
+        chart_source (str | None): Only return podcasts from this source backend.
+        limit (int): Maximum number of results.
+        min_similarity (float): Minimum trigram similarity for a match.
+
+    Returns:
+        list[PodcastSearchResult]: The ranked matches.
+    """
+    query_key = normalize_title(query)
+    if not query_key:
+        return []
+    if uses_postgres_trigram():
+        return _search_postgres(query_key, chart_source, limit, min_similarity)
+    return _search_ngram(query_key, chart_source, limit, min_similarity)
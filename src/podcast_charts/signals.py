@@ -0,0 +1,25 @@
+# signals.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Signals sent by the podcast_charts fetch pipeline.
+
+Both are sent with `send_robust`, so a failing receiver is logged and does not
+stop the other receivers or the fetch run.
+"""
+
+from django.dispatch import Signal
+
+# Sent after the positions for a chart version have been stored and the version
+# marked as done.
+# Arguments: sender (PodcastChartVersion class), version (PodcastChartVersion),
+#   positions (list[ChartPositionData])
+chart_version_fetched = Signal()
+
+# Sent once every version in a fetch run has either been stored or failed.
+# Arguments: sender (PodcastChartVersion class), results (list[ChartFetchResult])
+chart_fetch_run_completed = Signal()
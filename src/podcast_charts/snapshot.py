@@ -0,0 +1,291 @@
+# snapshot.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Compact in-memory chart rankings for analytics.
+
+A [ChartSnapshot][podcast_charts.snapshot.ChartSnapshot] stores a version's
+ranking as two typed arrays instead of model instances or dataclasses, about
+eight bytes per position, and exposes them only as read-only views. Loaders
+build snapshots straight from `values_list` rows, so thousands of versions can
+be held in memory at once.
+"""
+
+import array
+import bisect
+import datetime
+import itertools
+import struct
+import sys
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from podcast_charts.models import (
+    FetchStatusChoices,
+    PodcastChartPosition,
+    PodcastChartVersion,
+)
+from podcast_charts.utils import chunked
+
+# version id, chart date ordinal, number of positions
+_HEADER = struct.Struct("<QII")
+
+
+class ChartSnapshot:
+    """
+    An immutable, array-backed ranking of one chart version.
+
+    Attributes:
+        version_id (int): The id of the chart version.
+        chart_date (datetime.date): The date of the chart version.
+        podcast_ids (memoryview): Podcast identifier ids in rank order.
+        positions (memoryview): The position of each podcast, ascending.
+    """
+
+    __slots__ = (
+        "_podcast_ids",
+        "_positions",
+        "_sorted_ids",
+        "_sorted_rows",
+        "chart_date",
+        "version_id",
+    )
+
+    version_id: int
+    chart_date: datetime.date
+    _podcast_ids: array.array
+    _positions: array.array
+    _sorted_ids: array.array | None
+    _sorted_rows: array.array | None
+
+    def __init__(
+        self,
+        version_id: int,
+        chart_date: datetime.date,
+        podcast_ids: array.array,
+        positions: array.array,
+    ) -> None:
+        if len(podcast_ids) != len(positions):
+            msg = "A snapshot needs exactly one position per podcast."
+            raise ValueError(msg)
+        self.version_id = version_id
+        self.chart_date = chart_date
+        self._podcast_ids = podcast_ids
+        self._positions = positions
+        self._sorted_ids = None
+        self._sorted_rows = None
+
+    @classmethod
+    def from_rows(
+        cls,
+        version_id: int,
+        chart_date: datetime.date,
+        rows: Iterable[tuple[int, int]],
+    ) -> "ChartSnapshot":
+        """
+        Build a snapshot from `(podcast_identifier_id, position)` rows.
+
+        Args:
+            version_id (int): The id of the chart version.
+            chart_date (datetime.date): The date of the chart version.
+            rows (Iterable[tuple[int, int]]): The rows, in position order.
+
+        Returns:
+            ChartSnapshot: The snapshot.
+        """
+        podcast_ids = array.array("I")
+        positions = array.array("I")
+        for podcast_id, position in rows:
+            podcast_ids.append(podcast_id)
+            positions.append(position)
+        return cls(version_id, chart_date, podcast_ids, positions)
+
+    @property
+    def podcast_ids(self) -> memoryview:
+        """
+        Returns:
+            memoryview: A read-only view of the podcast identifier ids.
+        """
+        return memoryview(self._podcast_ids).toreadonly()
+
+    @property
+    def positions(self) -> memoryview:
+        """
+        Returns:
+            memoryview: A read-only view of the positions.
+        """
+        return memoryview(self._positions).toreadonly()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self._podcast_ids, self._positions, strict=True)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChartSnapshot):
+            return NotImplemented
+        return (
+            self.version_id == other.version_id
+            and self.chart_date == other.chart_date
+            and self._podcast_ids == other._podcast_ids
+            and self._positions == other._positions
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.version_id, self.chart_date))
+
+    def __repr__(self) -> str:
+        return (
+            f"ChartSnapshot(version_id={self.version_id}, "
+            f"chart_date={self.chart_date!r}, size={len(self)})"
+        )
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (type(self).from_bytes, (self.to_bytes(),))
+
+    def position_of(self, podcast_identifier_id: int) -> int | None:
+        """
+        Look up a podcast's position in logarithmic time.
+
+        On first use the ids are sorted once into a pair of arrays that are
+        bisected, as [RankMatrix][podcast_charts.matrix.RankMatrix] does, so
+        the index stays as compact as the ranking and snapshots that are only
+        iterated never pay for it.
+
+        Args:
+            podcast_identifier_id (int): The podcast identifier id.
+
+        Returns:
+            int | None: The podcast's position, or `None` if it is not on the chart.
+        """
+        if self._sorted_ids is None or self._sorted_rows is None:
+            order = sorted(
+                range(len(self._podcast_ids)), key=self._podcast_ids.__getitem__
+            )
+            self._sorted_rows = array.array("I", order)
+            self._sorted_ids = array.array("I", (self._podcast_ids[i] for i in order))
+        index = bisect.bisect_left(self._sorted_ids, podcast_identifier_id)
+        if (
+            index == len(self._sorted_ids)
+            or self._sorted_ids[index] != podcast_identifier_id
+        ):
+            return None
+        return self._positions[self._sorted_rows[index]]
+
+    def podcast_at(self, position: int) -> int | None:
+        """
+        Args:
+            position (int): A chart position.
+
+        Returns:
+            int | None: The podcast identifier id at that position, if any.
+        """
+        positions = self._positions
+        index = position - 1
+        if not 0 <= index < len(positions) or positions[index] != position:
+            # Positions have gaps, so fall back to a binary search.
+            index = bisect.bisect_left(positions, position)
+            if index == len(positions) or positions[index] != position:
+                return None
+        return self._podcast_ids[index]
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns:
+            bytes: A compact, platform independent encoding of the snapshot.
+        """
+        podcast_ids, positions = self._podcast_ids, self._positions
+        if sys.byteorder == "big":  # no cov
+            podcast_ids, positions = (
+                array.array("I", podcast_ids),
+                array.array("I", positions),
+            )
+            podcast_ids.byteswap()
+            positions.byteswap()
+        header = _HEADER.pack(self.version_id, self.chart_date.toordinal(), len(self))
+        return header + podcast_ids.tobytes() + positions.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChartSnapshot":
+        """
+        Args:
+            data (bytes): Bytes produced by `to_bytes`.
+
+        Returns:
+            ChartSnapshot: The decoded snapshot.
+        """
+        version_id, ordinal, size = _HEADER.unpack_from(data)
+        podcast_ids, positions = array.array("I"), array.array("I")
+        middle = _HEADER.size + size * podcast_ids.itemsize
+        podcast_ids.frombytes(data[_HEADER.size : middle])
+        positions.frombytes(data[middle:])
+        if sys.byteorder == "big":  # no cov
+            podcast_ids.byteswap()
+            positions.byteswap()
+        return cls(
+            version_id, datetime.date.fromordinal(ordinal), podcast_ids, positions
+        )
+
+
+def load_snapshots(
+    versions: Iterable[PodcastChartVersion | int], *, chunk_size: int = 500
+) -> dict[int, ChartSnapshot]:
+    """
+    Load snapshots for many chart versions.
+
+    Positions are read with one `values_list` query per chunk of versions and
+    packed straight into arrays without creating model instances.
+
+    Args:
+        versions (Iterable[PodcastChartVersion | int]): The versions or their ids.
+        chunk_size (int): How many versions to load per query.
+
+    Returns:
+        dict[int, ChartSnapshot]: Snapshots keyed by version id. Versions that
+            have not finished fetching are omitted.
+    """
+    version_ids = [v if isinstance(v, int) else v.id for v in versions]
+    snapshots: dict[int, ChartSnapshot] = {}
+    for chunk in chunked(version_ids, chunk_size):
+        dates = dict(
+            PodcastChartVersion.objects.filter(
+                id__in=chunk, fetch_status=FetchStatusChoices.DONE
+            ).values_list("id", "chart_date")
+        )
+        if not dates:
+            continue
+        rows = (
+            PodcastChartPosition.objects.filter(chart_version_id__in=dates.keys())
+            .order_by("chart_version_id", "position")
+            .values_list("chart_version_id", "podcast_identifier_id", "position")
+            .iterator(chunk_size=10_000)
+        )
+        for version_id, version_rows in itertools.groupby(rows, key=lambda r: r[0]):
+            snapshots[version_id] = ChartSnapshot.from_rows(
+                version_id, dates[version_id], (row[1:] for row in version_rows)
+            )
+        for version_id, chart_date in dates.items():
+            # Versions without positions still get an empty snapshot.
+            if version_id not in snapshots:
+                snapshots[version_id] = ChartSnapshot.from_rows(
+                    version_id, chart_date, ()
+                )
+    return snapshots
+
+
+def load_snapshot(version: PodcastChartVersion | int) -> ChartSnapshot | None:
+    """
+    Args:
+        version (PodcastChartVersion | int): The version or its id.
+
+    Returns:
+        ChartSnapshot | None: The snapshot, or `None` if the version has not
+            finished fetching.
+    """
+    version_id = version if isinstance(version, int) else version.id
+    return load_snapshots([version_id]).get(version_id)
@@ -0,0 +1,307 @@
+# stats.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Per-podcast chart statistics.
+
+[PodcastChartStats][podcast_charts.models.PodcastChartStats] rows are folded
+forward one version at a time. When a version is stored, only podcasts that are on
+it or were on the previous version are touched. Each touched record keeps its values
+from before the latest ranking, so a refetch that replaces that ranking undoes it and
+folds in the new one. Only a version that arrives out of date order rebuilds its
+chart and country from the position history.
+"""
+
+import datetime
+import itertools
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartStats,
+    PodcastChartVersion,
+)
+
+STATS_UPDATE_FIELDS = [
+    "best_position",
+    "last_position",
+    "current_streak",
+    "days_on_chart",
+    "position_total",
+    "first_chart_date",
+    "last_chart_date",
+    "folded_chart_date",
+    "previous_best_position",
+    "previous_last_position",
+    "previous_current_streak",
+    "previous_last_chart_date",
+    "modified",
+]
+
+
+class ChartStatsKey(NamedTuple):
+    """Identifies the chart and country a set of stats belongs to."""
+
+    podcast_chart_id: int
+    country_id: int
+
+
+def apply_ranking(
+    key: ChartStatsKey,
+    stats: dict[int, PodcastChartStats],
+    chart_date: datetime.date,
+    ranking: Iterable[tuple[int, int]],
+) -> set[int]:
+    """
+    Fold one version's ranking into the running stats.
+
+    Each touched record remembers its values from before the ranking, so that
+    [undo_ranking][podcast_charts.stats.undo_ranking] can take it back out.
+
+    Args:
+        key (ChartStatsKey): The chart and country of the ranking.
+        stats (dict[int, PodcastChartStats]): Stats keyed by podcast identifier id.
+            Must include every podcast that was on the previous version. Updated
+            in place, with new records added for podcasts seen for the first time.
+        chart_date (datetime.date): The date of the version.
+        ranking (Iterable[tuple[int, int]]): `(podcast_identifier_id, position)`
+            pairs for the version.
+
+    Returns:
+        set[int]: The podcast identifier ids whose stats changed.
+    """
+    previous_date = max(
+        (s.last_chart_date for s in stats.values() if s.last_position is not None),
+        default=None,
+    )
+    touched = set()
+    for podcast_id, position in ranking:
+        record = stats.get(podcast_id)
+        if record is None:
+            record = stats[podcast_id] = PodcastChartStats(
+                podcast_chart_id=key.podcast_chart_id,
+                country_id=key.country_id,
+                podcast_identifier_id=podcast_id,
+                best_position=position,
+                first_chart_date=chart_date,
+                last_chart_date=chart_date,
+                folded_chart_date=chart_date,
+            )
+        _remember(record, chart_date)
+        on_previous = (
+            record.last_position is not None and record.last_chart_date == previous_date
+        )
+        record.current_streak = record.current_streak + 1 if on_previous else 1
+        record.best_position = min(record.best_position, position)
+        record.days_on_chart += 1
+        record.position_total += position
+        record.last_position = position
+        record.last_chart_date = chart_date
+        touched.add(podcast_id)
+    for podcast_id, record in stats.items():
+        if podcast_id not in touched and record.last_position is not None:
+            _remember(record, chart_date)
+            record.last_position = None
+            record.current_streak = 0
+            touched.add(podcast_id)
+    return touched
+
+
+def _remember(record: PodcastChartStats, chart_date: datetime.date) -> None:
+    if record.folded_chart_date == chart_date:
+        return
+    record.folded_chart_date = chart_date
+    record.previous_best_position = record.best_position
+    record.previous_last_position = record.last_position
+    record.previous_current_streak = record.current_streak
+    record.previous_last_chart_date = record.last_chart_date
+
+
+def undo_ranking(
+    stats: dict[int, PodcastChartStats], chart_date: datetime.date
+) -> tuple[set[int], list[PodcastChartStats]]:
+    """
+    Take the latest ranking back out of the running stats.
+
+    Args:
+        stats (dict[int, PodcastChartStats]): Stats keyed by podcast identifier id.
+            Must include every record the ranking changed. Updated in place, with
+            records the ranking created removed.
+        chart_date (datetime.date): The date of the ranking, which must be the
+            latest one folded in.
+
+    Returns:
+        tuple[set[int], list[PodcastChartStats]]: The podcast identifier ids
+            whose stats were restored, and the records the ranking had created,
+            which should be deleted.
+    """
+    restored, removed = set(), []
+    for podcast_id, record in list(stats.items()):
+        if record.folded_chart_date != chart_date:
+            continue
+        if record.first_chart_date == chart_date:
+            removed.append(stats.pop(podcast_id))
+            continue
+        if record.last_position is not None and record.last_chart_date == chart_date:
+            record.days_on_chart -= 1
+            record.position_total -= record.last_position
+        record.best_position = record.previous_best_position  # type: ignore
+        record.last_position = record.previous_last_position
+        record.current_streak = record.previous_current_streak  # type: ignore
+        record.last_chart_date = record.previous_last_chart_date  # type: ignore
+        record.folded_chart_date = None
+        restored.add(podcast_id)
+    return restored, removed
+
+
+def _latest_chart_date(key: ChartStatsKey) -> datetime.date | None:
+    return PodcastChartStats.objects.filter(
+        podcast_chart_id=key.podcast_chart_id, country_id=key.country_id
+    ).aggregate(latest=Max("last_chart_date"))["latest"]
+
+
+def update_chart_stats(version: PodcastChartVersion) -> int:
+    """
+    Fold a newly stored version into the stats for its chart and country.
+
+    A version for the latest date replaces the ranking already folded in for that
+    date, which is undone first. An older version rebuilds the chart and country
+    from the position history.
+
+    Args:
+        version (PodcastChartVersion): A version whose positions have been stored.
+
+    Returns:
+        int: The number of stats records written.
+    """
+    key = ChartStatsKey(version.podcast_chart_id, version.country_id)  # type: ignore
+    latest = _latest_chart_date(key)
+    if latest is not None and version.chart_date < latest:
+        return rebuild_chart_stats(key)
+    replacing = version.chart_date == latest
+    ranking = list(
+        PodcastChartPosition.objects.filter(chart_version=version).values_list(
+            "podcast_identifier_id", "position"
+        )
+    )
+    stats = {
+        record.podcast_identifier_id: record  # type: ignore
+        for record in PodcastChartStats.objects.filter(
+            Q(podcast_identifier_id__in=[podcast_id for podcast_id, _ in ranking])
+            | Q(last_position__isnull=False)
+            | Q(folded_chart_date=version.chart_date),
+            podcast_chart_id=key.podcast_chart_id,
+            country_id=key.country_id,
+        )
+    }
+    restored, removed = set(), []
+    if replacing:
+        restored, removed = undo_ranking(stats, version.chart_date)
+        if not restored and not removed:
+            # Stats written before undo data was kept cannot be unwound.
+            return rebuild_chart_stats(key)
+    touched = apply_ranking(key, stats, version.chart_date, ranking)
+    now = timezone.now()
+    created, updated = [], []
+    for podcast_id in touched | restored:
+        record = stats.get(podcast_id)
+        if record is None:
+            continue
+        record.modified = now
+        (updated if record.id else created).append(record)
+    with transaction.atomic():
+        if removed:
+            PodcastChartStats.objects.filter(
+                id__in=[record.id for record in removed]
+            ).delete()
+        PodcastChartStats.objects.bulk_update(
+            updated, STATS_UPDATE_FIELDS, batch_size=500
+        )
+        PodcastChartStats.objects.bulk_create(created, batch_size=500)
+    return len(updated) + len(created)
+
+
+def rebuild_chart_stats(key: ChartStatsKey) -> int:
+    """
+    Recompute the stats for a chart and country from the full position history.
+
+    Args:
+        key (ChartStatsKey): The chart and country to rebuild.
+
+    Returns:
+        int: The number of stats records written.
+    """
+    rows = (
+        PodcastChartPosition.objects.filter(
+            chart_version__podcast_chart_id=key.podcast_chart_id,
+            chart_version__country_id=key.country_id,
+            chart_version__fetch_status=FetchStatusChoices.DONE,
+        )
+        .order_by("chart_version__chart_date")
+        .values_list("chart_version__chart_date", "podcast_identifier_id", "position")
+        .iterator(chunk_size=5000)
+    )
+    stats: dict[int, PodcastChartStats] = {}
+    for chart_date, day_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        apply_ranking(
+            key, stats, chart_date, ((podcast, pos) for _, podcast, pos in day_rows)
+        )
+    with transaction.atomic():
+        PodcastChartStats.objects.filter(
+            podcast_chart_id=key.podcast_chart_id, country_id=key.country_id
+        ).delete()
+        PodcastChartStats.objects.bulk_create(stats.values(), batch_size=500)
+    return len(stats)
+
+
+def get_chart_stats_keys() -> list[ChartStatsKey]:
+    """
+    Returns:
+        list[ChartStatsKey]: Every chart and country with stored positions.
+    """
+    return [
+        ChartStatsKey(*values)
+        for values in PodcastChartVersion.objects.filter(
+            fetch_status=FetchStatusChoices.DONE
+        )
+        .values_list("podcast_chart_id", "country_id")
+        .distinct()
+        .order_by("podcast_chart_id", "country_id")
+    ]
+
+
+def get_podcast_chart_stats(
+    podcast_identifier: PodcastChartPodcastIdentifier | int,
+    podcast_chart: PodcastChart | int,
+    country: ChartCountry | int,
+) -> PodcastChartStats | None:
+    """
+    Look up a podcast's stats on a chart in one country.
+
+    Args:
+        podcast_identifier (PodcastChartPodcastIdentifier | int): The podcast.
+        podcast_chart (PodcastChart | int): The chart.
+        country (ChartCountry | int): The country.
+
+    Returns:
+        PodcastChartStats | None: The stats, or `None` if the podcast has never
+            appeared on the chart in that country.
+    """
+    return PodcastChartStats.objects.filter(
+        podcast_identifier=podcast_identifier,
+        podcast_chart=podcast_chart,
+        country=country,
+    ).first()
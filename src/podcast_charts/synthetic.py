@@ -0,0 +1,309 @@
+# synthetic.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""
+Generate synthetic chart history for scale and query performance testing.
+
+Charts start from a random ranking drawn from a shared pool of podcasts. Every day
+each ranking is perturbed: podcasts drift by a random walk weighted towards small
+moves, a share of the chart drops off and is replaced by podcasts from the pool at
+random positions. Everything is written with chunked `bulk_create` calls, one
+transaction per day, so writes are fast and memory stays flat as history grows.
+"""
+
+import dataclasses
+import datetime
+import logging
+import random
+import time
+from collections.abc import Callable
+
+from django.db import transaction
+from django.utils import timezone
+
+from podcast_charts.models import (
+    ChartCategory,
+    ChartCountry,
+    ChartSourceCategory,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+    SourceBackendChoices,
+)
+from podcast_charts.normalize import normalize_title
+from podcast_charts.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_PREFIX = "synthetic"
+
+COUNTRY_CODES = (
+    "us gb ca au ie nz de fr es it nl be se no dk fi pl pt at ch cz hu ro gr tr "
+    "ru ua il ae sa in pk bd jp kr cn tw hk sg my th vn ph id br mx ar cl co pe "
+    "ve za ng ke eg ma"
+).split()
+
+TITLE_WORDS = (
+    "daily news comedy true crime history science weekly morning show radio "
+    "hour talk stories life business money health sports culture music film "
+    "tech politics mystery family kids learning late night friends club inside "
+    "american world great little big secret"
+).split()
+
+
+@dataclasses.dataclass
+class SyntheticHistoryConfig:
+    """
+    The shape of the synthetic data set.
+
+    Attributes:
+        charts (int): Number of charts.
+        countries (int): Number of countries each chart is enabled in.
+        days (int): Number of daily versions per chart and country.
+        chart_size (int): Number of positions in each version.
+        podcasts (int): Size of the podcast pool charts draw from.
+        churn (float): Share of each chart replaced by new entries every day.
+        volatility (float): Standard deviation of the daily rank drift, as a share
+            of the chart size.
+        end_date (datetime.date): The date of the most recent versions.
+        seed (int): Random seed, so runs are reproducible.
+        batch_size (int): Rows per `bulk_create` statement.
+    """
+
+    charts: int = 5
+    countries: int = 5
+    days: int = 30
+    chart_size: int = 200
+    podcasts: int = 10_000
+    churn: float = 0.05
+    volatility: float = 0.03
+    end_date: datetime.date = dataclasses.field(default_factory=timezone.localdate)
+    seed: int = 0
+    batch_size: int = 10_000
+
+    @property
+    def position_count(self) -> int:
+        """
+        Returns:
+            int: The number of position rows the config will generate.
+        """
+        return self.charts * self.countries * self.days * self.chart_size
+
+
+@dataclasses.dataclass
+class SyntheticHistoryResult:
+    """
+    What a generation run created.
+
+    Attributes:
+        charts (list[PodcastChart]): The synthetic charts.
+        countries (list[ChartCountry]): The countries used.
+        podcast_ids (list[int]): The ids of the synthetic podcast identifiers.
+        versions (int): Number of versions created.
+        positions (int): Number of positions created.
+        seconds (float): How long generation took.
+    """
+
+    charts: list[PodcastChart]
+    countries: list[ChartCountry]
+    podcast_ids: list[int]
+    versions: int = 0
+    positions: int = 0
+    seconds: float = 0.0
+
+
+def _country_code(index: int) -> str:
+    if index < len(COUNTRY_CODES):
+        return COUNTRY_CODES[index]
+    return f"x{index:03d}"
+
+
+def _create_countries(count: int) -> list[ChartCountry]:
+    codes = [_country_code(index) for index in range(count)]
+    ChartCountry.objects.bulk_create(
+        [ChartCountry(country=code) for code in codes], ignore_conflicts=True
+    )
+    return list(ChartCountry.objects.filter(country__in=codes).order_by("country"))
+
+
+def _create_charts(count: int, countries: list[ChartCountry]) -> list[PodcastChart]:
+    charts = []
+    for index in range(count):
+        category, _ = ChartCategory.objects.get_or_create(
+            label=f"{SYNTHETIC_PREFIX.title()} {index:03d}"
+        )
+        source_category, _ = ChartSourceCategory.objects.get_or_create(
+            chart_source=SourceBackendChoices.APPLE,
+            chart_category=category,
+            defaults={"chart_source_category_remote_id": f"{SYNTHETIC_PREFIX}-{index}"},
+        )
+        chart, _ = PodcastChart.objects.get_or_create(
+            chart_source=SourceBackendChoices.APPLE,
+            chart_source_category=source_category,
+            defaults={
+                "chart_remote_id": f"{SYNTHETIC_PREFIX}-{index}",
+                "enabled": False,
+            },
+        )
+        chart.enabled_countries.add(*countries)
+        charts.append(chart)
+    return charts
+
+
+def _create_podcasts(config: SyntheticHistoryConfig, rng: random.Random) -> list[int]:
+    remote_ids = [f"{SYNTHETIC_PREFIX}-{index}" for index in range(config.podcasts)]
+    for chunk in chunked(remote_ids, config.batch_size):
+        identifiers = []
+        for remote_id in chunk:
+            title = " ".join(rng.choices(TITLE_WORDS, k=rng.randint(2, 4)))
+            identifiers.append(
+                PodcastChartPodcastIdentifier(
+                    chart_source=SourceBackendChoices.APPLE,
+                    chart_source_podcast_id=remote_id,
+                    podcast_title=title.title(),
+                    podcast_title_normalized=normalize_title(title),
+                )
+            )
+        PodcastChartPodcastIdentifier.objects.bulk_create(
+            identifiers, ignore_conflicts=True
+        )
+    return list(
+        PodcastChartPodcastIdentifier.objects.filter(
+            chart_source=SourceBackendChoices.APPLE,
+            chart_source_podcast_id__startswith=f"{SYNTHETIC_PREFIX}-",
+        )
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def next_ranking(
+    ranking: list[int],
+    pool: list[int],
+    rng: random.Random,
+    churn: float,
+    volatility: float,
+) -> list[int]:
+    """
+    Advance a ranking by one day.
+
+    Args:
+        ranking (list[int]): Podcast ids in rank order.
+        pool (list[int]): Podcast ids that may enter the chart.
+        rng (random.Random): The random source.
+        churn (float): Share of the chart replaced by new entries.
+        volatility (float): Standard deviation of the rank drift as a share of the
+            chart size.
+
+    Returns:
+        list[int]: The new ranking, the same length as the old one.
+    """
+    size = len(ranking)
+    sigma = max(volatility * size, 0.5)
+    # Lower ranked podcasts move more than the top of the chart.
+    scored = sorted(
+        (rank + rng.gauss(0, sigma * (0.5 + rank / size)), podcast_id)
+        for rank, podcast_id in enumerate(ranking)
+    )
+    kept = [podcast_id for _, podcast_id in scored]
+    # Only churn when the pool has podcasts that are not already on the chart.
+    exits = min(size, int(size * churn + rng.random())) if len(pool) > size else 0
+    if exits:
+        kept = kept[: size - exits]
+        present = set(kept)
+        while len(kept) < size:
+            candidate = rng.choice(pool)
+            if candidate not in present:
+                present.add(candidate)
+                kept.insert(rng.randint(size // 4, len(kept)), candidate)
+    return kept
+
+
+def generate_chart_history(
+    config: SyntheticHistoryConfig,
+    progress: Callable[[datetime.date, int], None] | None = None,
+) -> SyntheticHistoryResult:
+    """
+    Generate synthetic charts, countries, podcasts, versions and positions.
+
+    Args:
+        config (SyntheticHistoryConfig): The shape of the data set.
+        progress (Callable[[datetime.date, int], None] | None): Called after each
+            day is written with the date and positions written so far.
+
+    Returns:
+        SyntheticHistoryResult: What was created.
+    """
+    started = time.perf_counter()
+    rng = random.Random(config.seed)  # noqa: S311
+    countries = _create_countries(config.countries)
+    charts = _create_charts(config.charts, countries)
+    podcast_ids = _create_podcasts(config, rng)
+    result = SyntheticHistoryResult(
+        charts=charts, countries=countries, podcast_ids=podcast_ids
+    )
+    chart_size = min(config.chart_size, len(podcast_ids))
+    rankings = {
+        (chart.id, country.id): rng.sample(podcast_ids, chart_size)
+        for chart in charts
+        for country in countries
+    }
+    first_date = config.end_date - datetime.timedelta(days=config.days - 1)
+    for day in range(config.days):
+        chart_date = first_date + datetime.timedelta(days=day)
+        with transaction.atomic():
+            versions = PodcastChartVersion.objects.bulk_create(
+                [
+                    PodcastChartVersion(
+                        podcast_chart_id=chart_id,
+                        country_id=country_id,
+                        chart_remote_id=f"{SYNTHETIC_PREFIX}-{chart_id}",
+                        chart_date=chart_date,
+                        fetch_status=FetchStatusChoices.DONE,
+                    )
+                    for chart_id, country_id in rankings
+                ],
+                batch_size=config.batch_size,
+            )
+            if versions and versions[0].id is None:
+                versions = list(
+                    PodcastChartVersion.objects.filter(chart_date=chart_date)
+                    .filter(chart_remote_id__startswith=f"{SYNTHETIC_PREFIX}-")
+                    .order_by("id")
+                )
+            rows = []
+            for version in versions:
+                key = (version.podcast_chart_id, version.country_id)  # type: ignore
+                if day:
+                    rankings[key] = next_ranking(
+                        rankings[key], podcast_ids, rng, config.churn, config.volatility
+                    )
+                rows.extend(
+                    PodcastChartPosition(
+                        chart_version_id=version.id,
+                        podcast_identifier_id=podcast_id,
+                        position=position,
+                    )
+                    for position, podcast_id in enumerate(rankings[key], start=1)
+                )
+                if len(rows) >= config.batch_size:
+                    PodcastChartPosition.objects.bulk_create(rows)
+                    result.positions += len(rows)
+                    rows = []
+            PodcastChartPosition.objects.bulk_create(rows)
+            result.positions += len(rows)
+            result.versions += len(versions)
+        if progress is not None:
+            progress(chart_date, result.positions)
+    result.seconds = time.perf_counter() - started
+    logger.info(
+        f"Generated {result.versions} versions and {result.positions} positions in "
+        f"{result.seconds:.1f}s"
+    )
+    return result
@@ -0,0 +1,582 @@
+# tasks.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Task functions for fetching and storing podcast chart data."""
+
+import asyncio
+import dataclasses
+import datetime
+import logging
+from collections.abc import Iterable
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from podcast_charts.archive import (
+    archive_enabled,
+    get_content_hash,
+    store_chart_responses,
+)
+from podcast_charts.backends import (
+    ChartBackend,
+    ChartFetchError,
+    ChartParseError,
+    ChartPositionData,
+    ChartSourceUnavailableError,
+)
+from podcast_charts.cache import invalidate_podcast_titles
+from podcast_charts.exceptions import ChartImproperlyConfiguredError
+from podcast_charts.models import (
+    ENABLED_SOURCES,
+    MAX_CHART_RETRIES,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+    get_chart_backend,
+    get_ranking_hash,
+)
+from podcast_charts.profiling import phase
+from podcast_charts.runs import fetch_run_history_enabled, record_fetch_run
+from podcast_charts.search import refresh_normalized_titles
+from podcast_charts.signals import chart_fetch_run_completed, chart_version_fetched
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class ChartFetchResult:
+    """
+    The outcome of fetching a single chart version.
+
+    Attributes:
+        version (PodcastChartVersion): The version that was fetched.
+        fetch_status (str): The resulting fetch status of the version.
+        positions (list[ChartPositionData] | None): The stored positions on success.
+        error (BaseException | None): The error raised, if any.
+        timings (dict[str, float]): Seconds spent per phase: `http`, `parse` and
+            `store`, as far as the fetch got.
+        response_bytes (int): The size of the chart response, if one was received.
+        unchanged (bool): Whether the version was already done and fetching it
+            again stored nothing, because the ranking was the same or the
+            refetch failed and `error` is set.
+    """
+
+    version: PodcastChartVersion
+    fetch_status: str
+    positions: list[ChartPositionData] | None = None
+    error: BaseException | None = None
+    timings: dict[str, float] = dataclasses.field(default_factory=dict)
+    response_bytes: int = 0
+    unchanged: bool = False
+
+
+def create_pending_chart_versions(chart_date: datetime.date) -> int:
+    """
+    Create pending versions for every enabled chart and country on a given date.
+
+    Existing versions are left untouched.
+
+    Args:
+        chart_date (datetime.date): The date the chart versions represent.
+
+    Returns:
+        int: The number of versions that were considered for creation.
+    """
+    charts = PodcastChart.objects.filter(
+        enabled=True, chart_source__in=ENABLED_SOURCES
+    ).prefetch_related("enabled_countries")
+    versions = [
+        PodcastChartVersion(
+            podcast_chart=chart,
+            country=country,
+            chart_date=chart_date,
+            fetch_status=FetchStatusChoices.PENDING,
+        )
+        for chart in charts
+        for country in chart.enabled_countries.all()
+        if country.enabled
+    ]
+    PodcastChartVersion.objects.bulk_create(
+        versions, batch_size=500, ignore_conflicts=True
+    )
+    return len(versions)
+
+
+def get_versions_to_fetch(
+    chart_date: datetime.date | None = None,
+) -> QuerySet[PodcastChartVersion]:
+    """
+    Get the versions that are waiting to be fetched or are eligible for a retry.
+
+    Args:
+        chart_date (datetime.date | None): Optionally restrict to a single date.
+
+    Returns:
+        QuerySet[PodcastChartVersion]: The versions to fetch.
+    """
+    qs = PodcastChartVersion.objects.filter(
+        Q(fetch_status=FetchStatusChoices.PENDING)
+        | Q(fetch_status=FetchStatusChoices.RETRY, num_retries__lt=MAX_CHART_RETRIES)
+    ).select_related("podcast_chart", "podcast_chart__chart_source_category", "country")
+    if chart_date is not None:
+        qs = qs.filter(chart_date=chart_date)
+    return qs
+
+
+async def _fetch_and_parse(
+    backend: ChartBackend, version: PodcastChartVersion, timings: dict[str, float]
+) -> tuple[str, list[ChartPositionData]]:
+    with phase("http", timings):
+        body = await backend.fetch_raw(
+            version.get_remote_chart_id(), version.country.country
+        )
+    with phase("parse", timings):
+        positions = await backend.parse_chart(body, filter_to_podcast_ids=None)
+    return body, positions
+
+
+async def _fetch_version_positions(
+    versions: list[PodcastChartVersion],
+    timings: dict[int, dict[str, float]],
+) -> list[tuple[str, list[ChartPositionData]] | BaseException]:
+    async with httpx.AsyncClient() as client:
+        backends: dict[tuple[str, str], ChartBackend] = {}
+        coros = []
+        for version in versions:
+            key = (
+                version.podcast_chart.chart_source,
+                version.podcast_chart.chart_engine,
+            )
+            if key not in backends:
+                backends[key] = get_chart_backend(key[0], key[1], client=client)  # type: ignore
+            coros.append(_fetch_and_parse(backends[key], version, timings[version.id]))
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+
+def _archive_responses(
+    fetched: list[tuple[PodcastChartVersion, str]],
+) -> None:
+    bodies_by_source: dict[str, list[str]] = {}
+    for version, body in fetched:
+        bodies_by_source.setdefault(version.podcast_chart.chart_source, []).append(body)
+    archives = {}
+    for source, bodies in bodies_by_source.items():
+        archives.update(store_chart_responses(source, bodies))
+    for version, body in fetched:
+        version.response_archive = archives[get_content_hash(body)]
+
+
+def upsert_podcast_identifiers(
+    chart_source: str, positions: Iterable[ChartPositionData]
+) -> dict[str, int]:
+    """
+    Make sure an identifier exists for every podcast in the positions.
+
+    Titles and urls are only overwritten when the backend supplied them.
+
+    Args:
+        chart_source (str): The source backend of the positions.
+        positions (Iterable[ChartPositionData]): The positions to store.
+
+    Returns:
+        dict[str, int]: A mapping of remote podcast id to identifier id.
+    """
+    titled: dict[str, PodcastChartPodcastIdentifier] = {}
+    untitled: dict[str, PodcastChartPodcastIdentifier] = {}
+    for data in positions:
+        identifier = PodcastChartPodcastIdentifier(
+            chart_source=chart_source,
+            chart_source_podcast_id=data.podcast_id,
+            podcast_title=data.podcast_title or "",
+            chart_source_podcast_url=data.podcast_url,
+        )
+        if data.podcast_title:
+            titled[data.podcast_id] = identifier
+        else:
+            untitled[data.podcast_id] = identifier
+    remote_ids = titled.keys() | untitled.keys()
+    if titled:
+        stored = {
+            remote_id: (title, url)
+            for remote_id, title, url in PodcastChartPodcastIdentifier.objects.filter(
+                chart_source=chart_source, chart_source_podcast_id__in=titled.keys()
+            ).values_list(
+                "chart_source_podcast_id", "podcast_title", "chart_source_podcast_url"
+            )
+        }
+        if any(
+            remote_id in stored and stored[remote_id][0] != identifier.podcast_title
+            for remote_id, identifier in titled.items()
+        ):
+            transaction.on_commit(invalidate_podcast_titles)
+        # Identifiers that are already current are not written again.
+        titled = {
+            remote_id: identifier
+            for remote_id, identifier in titled.items()
+            if stored.get(remote_id)
+            != (identifier.podcast_title, identifier.chart_source_podcast_url)
+        }
+    if titled:
+        PodcastChartPodcastIdentifier.objects.bulk_create(
+            titled.values(),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["chart_source", "chart_source_podcast_id"],
+            update_fields=["podcast_title", "chart_source_podcast_url", "modified"],
+        )
+    if untitled:
+        PodcastChartPodcastIdentifier.objects.bulk_create(
+            untitled.values(), batch_size=500, ignore_conflicts=True
+        )
+    identifier_ids = dict(
+        PodcastChartPodcastIdentifier.objects.filter(
+            chart_source=chart_source,
+            chart_source_podcast_id__in=remote_ids,
+        ).values_list("chart_source_podcast_id", "id")
+    )
+    if titled:
+        refresh_normalized_titles(
+            identifier_ids[remote_id]
+            for remote_id in titled
+            if remote_id in identifier_ids
+        )
+    return identifier_ids
+
+
+def _get_positions_hash(positions: list[ChartPositionData]) -> str:
+    return get_ranking_hash(
+        data.podcast_id for data in sorted(positions, key=lambda data: data.position)
+    )
+
+
+def persist_chart_positions(
+    version: PodcastChartVersion, positions: list[ChartPositionData]
+) -> None:
+    """
+    Replace the stored positions for a version and mark it as done.
+
+    Args:
+        version (PodcastChartVersion): The version the positions belong to.
+        positions (list[ChartPositionData]): The positions fetched from the backend.
+    """
+    with transaction.atomic():
+        identifier_ids = upsert_podcast_identifiers(
+            version.podcast_chart.chart_source, positions
+        )
+        PodcastChartPosition.objects.filter(chart_version=version).delete()
+        PodcastChartPosition.objects.bulk_create(
+            [
+                PodcastChartPosition(
+                    chart_version=version,
+                    podcast_identifier_id=identifier_ids[data.podcast_id],
+                    position=data.position,
+                )
+                for data in positions
+            ],
+            batch_size=1000,
+        )
+        version.transition_to(
+            FetchStatusChoices.DONE,
+            response_archive=version.response_archive,
+            content_hash=_get_positions_hash(positions),
+        )
+    # The version is already stored, so a failing receiver is logged rather
+    # than undoing it.
+    chart_version_fetched.send_robust(
+        sender=PodcastChartVersion, version=version, positions=positions
+    )
+
+
+def replace_chart_positions(
+    parsed: list[tuple[PodcastChartVersion, list[ChartPositionData]]],
+) -> int:
+    """
+    Replace the stored positions of many versions at once and mark them as done.
+
+    Unlike [persist_chart_positions][podcast_charts.tasks.persist_chart_positions]
+    no signal is sent and each version keeps its `completed_at`, so rewriting
+    history is not mistaken for newly fetched rankings. Anything derived from the
+    positions, such as stats and rank matrices, has to be rebuilt afterwards.
+
+    Args:
+        parsed (list[tuple[PodcastChartVersion, list[ChartPositionData]]]): The
+            versions, with `podcast_chart` loaded, and their new positions.
+
+    Returns:
+        int: The number of positions written.
+    """
+    by_source: dict[str, list[ChartPositionData]] = {}
+    for version, positions in parsed:
+        by_source.setdefault(version.podcast_chart.chart_source, []).extend(positions)
+    with transaction.atomic():
+        identifier_ids = {
+            source: upsert_podcast_identifiers(source, positions)
+            for source, positions in by_source.items()
+        }
+        PodcastChartPosition.objects.filter(
+            chart_version__in=[version for version, _ in parsed]
+        ).delete()
+        created = PodcastChartPosition.objects.bulk_create(
+            [
+                PodcastChartPosition(
+                    chart_version=version,
+                    podcast_identifier_id=identifier_ids[
+                        version.podcast_chart.chart_source
+                    ][data.podcast_id],
+                    position=data.position,
+                )
+                for version, positions in parsed
+                for data in positions
+            ],
+            batch_size=1000,
+        )
+        for version, positions in parsed:
+            version.transition_to(
+                FetchStatusChoices.DONE,
+                completed_at=version.completed_at,
+                content_hash=_get_positions_hash(positions),
+            )
+    return len(created)
+
+
+def _handle_fetch_error(
+    version: PodcastChartVersion, error: BaseException
+) -> ChartFetchResult:
+    """Decide the outcome of a failed fetch. The status is stored in bulk later."""
+    if version.fetch_status == FetchStatusChoices.DONE:
+        # A same day refetch keeps the ranking that was already stored, so the
+        # version is reported as it stays in the database.
+        logger.warning(f"Refetch of {version} failed, keeping its ranking: {error}")
+        return ChartFetchResult(
+            version=version,
+            fetch_status=FetchStatusChoices.DONE,
+            error=error,
+            unchanged=True,
+        )
+    if isinstance(error, ChartSourceUnavailableError):
+        # The source is down, so this attempt does not count against the version.
+        logger.warning(f"Deferring {version}: {error}")
+        fetch_status = FetchStatusChoices.RETRY
+    elif (
+        isinstance(error, ChartFetchError | ChartParseError)
+        # This failure uses up a retry, so it must leave one to be fetched again.
+        and version.num_retries + 1 < MAX_CHART_RETRIES
+    ):
+        logger.warning(f"Fetch of {version} failed, will retry: {error}")
+        fetch_status = FetchStatusChoices.RETRY
+    else:
+        logger.error(f"Fetch of {version} failed: {error}")
+        fetch_status = FetchStatusChoices.ERROR
+    return ChartFetchResult(version=version, fetch_status=fetch_status, error=error)
+
+
+def _store_failures(failures: list[ChartFetchResult]) -> None:
+    groups: dict[tuple[str, bool], list[PodcastChartVersion]] = {}
+    for result in failures:
+        if result.version.fetch_status != FetchStatusChoices.FETCHING:
+            # Not claimed by this run, e.g. a refetch of a version that is done.
+            continue
+        increment = result.fetch_status == FetchStatusChoices.RETRY and not isinstance(
+            result.error, ChartSourceUnavailableError
+        )
+        groups.setdefault((result.fetch_status, increment), []).append(result.version)
+    now = timezone.now()
+    for (fetch_status, increment), versions in groups.items():
+        # Only versions still held by this run's claim, in case a stale claim
+        # was released and picked up by another run in the meantime.
+        PodcastChartVersion.objects.filter(
+            id__in=[v.id for v in versions],
+            fetch_status=FetchStatusChoices.FETCHING,
+            modified__in={v.modified for v in versions},
+        ).transition(fetch_status, increment_retries=increment, modified=now)
+        for version in versions:
+            version.fetch_status = fetch_status
+            version.modified = now
+            if increment:
+                version.num_retries += 1
+
+
+def claim_chart_versions(
+    versions: Iterable[PodcastChartVersion],
+) -> list[PodcastChartVersion]:
+    """
+    Move versions to fetching, skipping any another worker has already claimed.
+
+    The claim is one conditional update stamped with a unique `modified` time.
+    The versions this call won are then identified by that stamp.
+
+    Args:
+        versions (Iterable[PodcastChartVersion]): Versions waiting to be fetched.
+
+    Returns:
+        list[PodcastChartVersion]: The versions this caller now owns.
+    """
+    by_id = {version.id: version for version in versions}
+    if not by_id:
+        return []
+    claimed_at = timezone.now()
+    PodcastChartVersion.objects.filter(id__in=by_id.keys()).transition(
+        FetchStatusChoices.FETCHING, modified=claimed_at
+    )
+    claimed_ids = set(
+        PodcastChartVersion.objects.filter(
+            id__in=by_id.keys(),
+            fetch_status=FetchStatusChoices.FETCHING,
+            modified=claimed_at,
+        ).values_list("id", flat=True)
+    )
+    skipped = len(by_id) - len(claimed_ids)
+    if skipped:
+        logger.info(f"Skipping {skipped} chart versions claimed by another fetch.")
+    claimed = []
+    for version_id in claimed_ids:
+        version = by_id[version_id]
+        version.fetch_status = FetchStatusChoices.FETCHING
+        version.modified = claimed_at
+        claimed.append(version)
+    return claimed
+
+
+def release_stale_chart_versions(
+    timeout: datetime.timedelta | None = None,
+) -> int:
+    """
+    Give up the claims of fetch runs that crashed or stalled.
+
+    Versions that have been fetching for longer than the timeout are moved back
+    to retry, using up a retry like any other failed attempt, or to error if
+    they have none left.
+
+    Args:
+        timeout (datetime.timedelta | None): How long a claim may be held.
+            Defaults to `CHART_FETCH_CLAIM_TIMEOUT` seconds, or an hour.
+
+    Returns:
+        int: The number of versions released.
+    """
+    if timeout is None:
+        timeout = datetime.timedelta(
+            seconds=getattr(settings, "CHART_FETCH_CLAIM_TIMEOUT", 3600)
+        )
+    now = timezone.now()
+    stale = PodcastChartVersion.objects.filter(
+        fetch_status=FetchStatusChoices.FETCHING, modified__lt=now - timeout
+    )
+    released = stale.filter(num_retries__lt=MAX_CHART_RETRIES - 1).transition(
+        FetchStatusChoices.RETRY, increment_retries=True, modified=now
+    )
+    released += stale.transition(FetchStatusChoices.ERROR, modified=now)
+    if released:
+        logger.warning(f"Released {released} chart versions with stale claims.")
+    return released
+
+
+def fetch_chart_versions(
+    versions: Iterable[PodcastChartVersion],
+) -> list[ChartFetchResult]:
+    """
+    Fetch and store the chart positions for the given versions.
+
+    Network requests for all versions run concurrently and are throttled per host
+    by the backend rate limiters. Versions whose source is unavailable or that
+    fail with a recoverable error are marked for retry. A version that cannot be
+    stored fails on its own without stopping the rest of the run.
+
+    Versions that are already done are fetched again without being claimed,
+    e.g. for a chart that is due to be checked for a later ranking on the same
+    day. They stay done throughout, and their positions are only replaced, and
+    signals sent, if the ranking changed. A failed refetch keeps the ranking.
+
+    Args:
+        versions (Iterable[PodcastChartVersion]): The versions to fetch. These
+            should have `podcast_chart` and `country` already loaded.
+
+    Returns:
+        list[ChartFetchResult]: The outcome for each version.
+    """
+    started_at = timezone.now()
+    versions = list(versions)
+    refetches = [v for v in versions if v.fetch_status == FetchStatusChoices.DONE]
+    versions = [
+        *claim_chart_versions(
+            v for v in versions if v.fetch_status != FetchStatusChoices.DONE
+        ),
+        *refetches,
+    ]
+    if not versions:
+        return []
+    results: list[ChartFetchResult] = []
+    failed: list[ChartFetchResult] = []
+    configured: list[PodcastChartVersion] = []
+    for version in versions:
+        try:
+            version.get_remote_chart_id()
+        except ChartImproperlyConfiguredError as cie:
+            failed.append(_handle_fetch_error(version, cie))
+        else:
+            configured.append(version)
+    timings: dict[int, dict[str, float]] = {version.id: {} for version in configured}
+    outcomes = asyncio.run(_fetch_version_positions(configured, timings))
+    fetched: list[tuple[PodcastChartVersion, str, list[ChartPositionData]]] = []
+    for version, outcome in zip(configured, outcomes, strict=True):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            result = _handle_fetch_error(version, outcome)
+            result.timings = timings[version.id]
+            failed.append(result)
+        elif (
+            version.fetch_status == FetchStatusChoices.DONE
+            and _get_positions_hash(outcome[1]) == version.content_hash
+        ):
+            results.append(
+                ChartFetchResult(
+                    version=version,
+                    fetch_status=FetchStatusChoices.DONE,
+                    timings=timings[version.id],
+                    response_bytes=len(outcome[0].encode()),
+                    unchanged=True,
+                )
+            )
+        else:
+            fetched.append((version, *outcome))
+    if archive_enabled():
+        try:
+            _archive_responses([(version, body) for version, body, _ in fetched])
+        except Exception as e:
+            # The archive is a convenience for re-parsing, so the positions are
+            # still stored without it.
+            logger.error(f"Could not archive {len(fetched)} chart responses: {e}")
+    for version, body, positions in fetched:
+        try:
+            with phase("store", timings[version.id]):
+                persist_chart_positions(version, positions)
+        except Exception as e:
+            result = _handle_fetch_error(version, e)
+            result.timings = timings[version.id]
+            failed.append(result)
+            continue
+        results.append(
+            ChartFetchResult(
+                version=version,
+                fetch_status=FetchStatusChoices.DONE,
+                positions=positions,
+                timings=timings[version.id],
+                response_bytes=len(body.encode()),
+            )
+        )
+    _store_failures(failed)
+    results.extend(failed)
+    if fetch_run_history_enabled():
+        record_fetch_run(started_at, results)
+    chart_fetch_run_completed.send_robust(sender=PodcastChartVersion, results=results)
+    return results
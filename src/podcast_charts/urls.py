@@ -7,6 +7,37 @@
 
 """URL conf for podcast_charts"""
 
+from django.urls import path
+
+from podcast_charts import views
+
 app_name = "podcast_charts"
 
-urlpatterns = []
+urlpatterns = [
+    path("charts/", views.chart_list, name="chart_list"),
+    path(
+        "charts/<int:chart_id>/<str:country>/",
+        views.current_chart,
+        name="current_chart",
+    ),
+    path("podcasts/<int:podcast_id>/", views.podcast_history, name="podcast_history"),
+    path("podcasts/search/", views.podcast_search, name="podcast_search"),
+    path(
+        "versions/<int:version_id>/",
+        views.chart_version_ranking,
+        name="chart_version_ranking",
+    ),
+    path(
+        "versions/<int:from_version_id>/diff/<int:to_version_id>/",
+        views.chart_version_diff,
+        name="chart_version_diff",
+    ),
+    path("charts/<str:chart_date>/matrix/", views.rank_matrix, name="rank_matrix"),
+    path("charts/<str:chart_date>/power/", views.chart_power, name="chart_power"),
+    path(
+        "podcasts/<int:podcast_id>/power/",
+        views.podcast_power_history,
+        name="podcast_power_history",
+    ),
+    path("feed/", views.chart_feed, name="chart_feed"),
+]
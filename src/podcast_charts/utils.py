@@ -0,0 +1,38 @@
+# utils.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Small helpers shared across podcast_charts."""
+
+from collections.abc import Iterable, Iterator
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """
+    Split an iterable into lists of at most `size` items without loading it all.
+
+    Args:
+        iterable (Iterable): The items to split.
+        size (int): The maximum size of each chunk.
+
+    Returns:
+        Iterator[list]: The chunks in order.
+
+    Examples:
+        >>> list(chunked(range(5), 2))
+        [[0, 1], [2, 3], [4]]
+    """
+    chunk: list[T] = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
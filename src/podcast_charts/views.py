@@ -6,3 +6,390 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 """Views for podcast_charts."""
+
+import dataclasses
+import datetime
+import functools
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from podcast_charts.cache import (
+    get_cache_timeout,
+    get_chart_version_ranking,
+    get_title_generation,
+)
+from podcast_charts.diff import diff_chart_versions
+from podcast_charts.exceptions import ChartStatusInvalidError
+from podcast_charts.feed import ChartFeedCursor, wait_for_chart_feed
+from podcast_charts.matrix import get_rank_matrix
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChart,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+)
+from podcast_charts.profiling import ProfiledJsonResponse, phase
+from podcast_charts.scoring import (
+    get_chart_power_history,
+    get_chart_power_leaderboard,
+)
+from podcast_charts.search import search_podcast_identifiers
+
+MAX_SEARCH_RESULTS = 50
+MAX_FEED_PAGE_SIZE = 500
+MAX_POWER_RESULTS = 500
+HISTORY_PAGE_DAYS = 90
+
+
+@require_GET
+@transaction.non_atomic_requests
+def podcast_search(request: HttpRequest) -> JsonResponse:
+    """
+    Search podcasts by title.
+
+    Query parameters:
+        q: The title to search for.
+        source: Optional source backend to restrict results to.
+        limit: Maximum number of results, capped at 50.
+    """
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = min(int(request.GET.get("limit", 20)), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return ProfiledJsonResponse({"error": "limit must be an integer."}, status=400)
+    matches = search_podcast_identifiers(
+        query, chart_source=request.GET.get("source") or None, limit=max(limit, 1)
+    )
+    return ProfiledJsonResponse(
+        {
+            "query": query,
+            "results": [
+                {
+                    "id": match.podcast_identifier.id,
+                    "chart_source": match.podcast_identifier.chart_source,
+                    "chart_source_podcast_id": (
+                        match.podcast_identifier.chart_source_podcast_id
+                    ),
+                    "podcast_title": match.podcast_identifier.podcast_title,
+                    "chart_source_podcast_url": (
+                        match.podcast_identifier.chart_source_podcast_url
+                    ),
+                    "similarity": round(match.similarity, 4),
+                }
+                for match in matches
+            ],
+        }
+    )
+
+
+@require_GET
+@transaction.non_atomic_requests
+def chart_version_ranking(request: HttpRequest, version_id: int) -> JsonResponse:
+    """The positions of a chart version in rank order."""
+    version = (
+        PodcastChartVersion.objects.filter(
+            id=version_id, fetch_status=FetchStatusChoices.DONE
+        )
+        .only("id", "modified")
+        .first()
+    )
+    if version is None:
+        msg = f"No fetched chart version with id {version_id}."
+        raise Http404(msg)
+    return ProfiledJsonResponse(
+        {
+            "version_id": version.id,
+            "positions": [
+                dataclasses.asdict(entry)
+                for entry in get_chart_version_ranking(version)
+            ],
+        }
+    )
+
+
+@require_GET
+@transaction.non_atomic_requests
+def chart_version_diff(
+    request: HttpRequest, from_version_id: int, to_version_id: int
+) -> JsonResponse:
+    """Entries, exits and moves between two chart versions."""
+    try:
+        diff = diff_chart_versions(from_version_id, to_version_id)
+    except PodcastChartVersion.DoesNotExist as dne:
+        raise Http404(str(dne)) from dne
+    except ChartStatusInvalidError as csie:
+        return ProfiledJsonResponse({"error": str(csie)}, status=409)
+    return ProfiledJsonResponse(diff.to_dict())
+
+
+@require_GET
+@transaction.non_atomic_requests
+def rank_matrix(request: HttpRequest, chart_date: str) -> JsonResponse:
+    """
+    Rankings for every chart and country on a date.
+
+    Query parameters:
+        podcast: Only return where this podcast identifier ranks.
+        chart: Only return this chart's ranking in each country.
+        country: Only return the charts for this country code.
+    """
+    try:
+        date = datetime.date.fromisoformat(chart_date)
+    except ValueError as ve:
+        raise Http404(str(ve)) from ve
+    matrix = get_rank_matrix(date)
+    data: dict = {"chart_date": date.isoformat()}
+    try:
+        if "podcast" in request.GET:
+            data["positions"] = [
+                {"chart_id": chart_id, "country": country, "position": position}
+                for (chart_id, country), position in matrix.for_podcast(
+                    int(request.GET["podcast"])
+                ).items()
+            ]
+        elif "chart" in request.GET:
+            data["countries"] = {
+                country: [podcast_id for podcast_id, _ in ranking]
+                for country, ranking in matrix.for_chart(
+                    int(request.GET["chart"])
+                ).items()
+            }
+        elif "country" in request.GET:
+            country_id = (
+                ChartCountry.objects.filter(country=request.GET["country"])
+                .values_list("id", flat=True)
+                .first()
+            )
+            data["charts"] = {
+                chart_id: [podcast_id for podcast_id, _ in ranking]
+                for chart_id, ranking in matrix.for_country(country_id or 0).items()
+            }
+        else:
+            data["charts"] = matrix.grid()
+    except ValueError:
+        return ProfiledJsonResponse({"error": "Ids must be integers."}, status=400)
+    return ProfiledJsonResponse(data)
+
+
+@require_GET
+@transaction.non_atomic_requests
+def chart_power(request: HttpRequest, chart_date: str) -> JsonResponse:
+    """
+    The top of the cross-chart leaderboard on a date.
+
+    Query parameters:
+        limit: Maximum number of podcasts, capped at 500.
+    """
+    try:
+        date = datetime.date.fromisoformat(chart_date)
+    except ValueError as ve:
+        raise Http404(str(ve)) from ve
+    try:
+        limit = max(min(int(request.GET.get("limit", 50)), MAX_POWER_RESULTS), 1)
+    except ValueError:
+        return ProfiledJsonResponse({"error": "limit must be an integer."}, status=400)
+    return ProfiledJsonResponse(
+        {
+            "chart_date": date.isoformat(),
+            "scores": [
+                {
+                    "rank": score.rank,
+                    "podcast_identifier_id": score.podcast_identifier_id,
+                    "podcast_title": score.podcast_identifier.podcast_title,
+                    "score": score.score,
+                    "appearances": score.appearances,
+                    "best_position": score.best_position,
+                }
+                for score in get_chart_power_leaderboard(date, limit)
+            ],
+        }
+    )
+
+
+@require_GET
+@transaction.non_atomic_requests
+def podcast_power_history(request: HttpRequest, podcast_id: int) -> JsonResponse:
+    """
+    A podcast's places on the cross-chart leaderboard over time.
+
+    Query parameters:
+        start: The first date to include, in YYYY-MM-DD format.
+        end: The last date to include, in YYYY-MM-DD format.
+    """
+    try:
+        start, end = (
+            datetime.date.fromisoformat(request.GET[name])
+            if request.GET.get(name)
+            else None
+            for name in ("start", "end")
+        )
+    except ValueError as ve:
+        return ProfiledJsonResponse({"error": str(ve)}, status=400)
+    return ProfiledJsonResponse(
+        {
+            "podcast_identifier_id": podcast_id,
+            "history": [
+                {"chart_date": chart_date.isoformat(), "rank": rank, "score": score}
+                for chart_date, rank, score in get_chart_power_history(
+                    podcast_id, start, end
+                )
+            ],
+        }
+    )
+
+
+@require_GET
+@transaction.non_atomic_requests
+async def chart_feed(request: HttpRequest) -> JsonResponse:
+    """
+    Chart versions completed after a cursor, with their rankings.
+
+    Query parameters:
+        cursor: The cursor returned by the previous page. Omit to start from the
+            beginning of the feed.
+        limit: Maximum number of versions, capped at 500.
+        wait: Seconds to wait for a version to complete if none are available,
+            capped at `CHART_FEED_MAX_WAIT`.
+    """
+    max_wait = getattr(settings, "CHART_FEED_MAX_WAIT", 30.0)
+    try:
+        cursor = (
+            ChartFeedCursor.decode(request.GET["cursor"])
+            if request.GET.get("cursor")
+            else None
+        )
+        limit = max(min(int(request.GET.get("limit", 100)), MAX_FEED_PAGE_SIZE), 1)
+        wait = max(min(float(request.GET.get("wait", 0)), max_wait), 0.0)
+    except ValueError as ve:
+        return ProfiledJsonResponse({"error": str(ve)}, status=400)
+    page = await wait_for_chart_feed(cursor, limit, timeout=wait)
+    return ProfiledJsonResponse(page.to_dict())
+
+
+@require_GET
+@transaction.non_atomic_requests
+def chart_list(request: HttpRequest) -> HttpResponse:
+    """Every enabled chart with links to its current ranking in each country."""
+    chart_countries = (
+        PodcastChart.enabled_countries.through.objects.filter(
+            podcastchart__enabled=True, chartcountry__enabled=True
+        )
+        .select_related(
+            "podcastchart__chart_source_category__chart_category", "chartcountry"
+        )
+        .order_by(
+            "podcastchart__chart_source_category__chart_category__label",
+            "podcastchart_id",
+            "chartcountry__country",
+        )
+    )
+    with phase("serialize"):
+        return render(
+            request,
+            "podcast_charts/chart_list.html",
+            {"chart_countries": chart_countries},
+        )
+
+
+@require_GET
+@transaction.non_atomic_requests
+def current_chart(request: HttpRequest, chart_id: int, country: str) -> HttpResponse:
+    """
+    The latest ranking of a chart in a country.
+
+    The ranking is rendered in a fragment cached under the version's id and
+    `modified` time and the podcast title generation, so it is only read and
+    rendered again after a new fetch or a title change.
+    """
+    version = (
+        PodcastChartVersion.objects.filter(
+            podcast_chart_id=chart_id,
+            country__country=country,
+            fetch_status=FetchStatusChoices.DONE,
+        )
+        .select_related(
+            "podcast_chart__chart_source_category__chart_category", "country"
+        )
+        .order_by("-chart_date")
+        .first()
+    )
+    if version is None:
+        msg = f"No fetched version of chart {chart_id} in {country}."
+        raise Http404(msg)
+    with phase("serialize"):
+        return render(
+            request,
+            "podcast_charts/current_chart.html",
+            {
+                "version": version,
+                # Only called when the cached fragment is missing.
+                "ranking": functools.partial(get_chart_version_ranking, version),
+                "cache_timeout": get_cache_timeout(),
+                "title_generation": get_title_generation(),
+            },
+        )
+
+
+@require_GET
+@transaction.non_atomic_requests
+def podcast_history(request: HttpRequest, podcast_id: int) -> HttpResponse:
+    """
+    The positions a podcast held on every chart and country recently.
+
+    The history is rendered in a fragment cached under the number of positions
+    and the latest `modified` time of the versions they belong to, so it is only
+    read and rendered again once a fetch changes it.
+    """
+    since = timezone.localdate() - datetime.timedelta(days=HISTORY_PAGE_DAYS)
+    in_history = Q(
+        podcastchartposition__chart_version__fetch_status=FetchStatusChoices.DONE,
+        podcastchartposition__chart_version__chart_date__gte=since,
+    )
+    podcast = (
+        PodcastChartPodcastIdentifier.objects.filter(id=podcast_id)
+        .annotate(
+            history_positions=Count("podcastchartposition", filter=in_history),
+            history_modified=Max(
+                "podcastchartposition__chart_version__modified", filter=in_history
+            ),
+        )
+        .first()
+    )
+    if podcast is None:
+        msg = f"No podcast with id {podcast_id}."
+        raise Http404(msg)
+    positions = (
+        PodcastChartPosition.objects.filter(
+            podcast_identifier=podcast,
+            chart_version__fetch_status=FetchStatusChoices.DONE,
+            chart_version__chart_date__gte=since,
+        )
+        .select_related(
+            "chart_version__podcast_chart__chart_source_category__chart_category",
+            "chart_version__country",
+        )
+        .order_by(
+            "chart_version__podcast_chart_id",
+            "chart_version__country__country",
+            "-chart_version__chart_date",
+        )
+    )
+    with phase("serialize"):
+        return render(
+            request,
+            "podcast_charts/podcast_history.html",
+            {
+                "podcast": podcast,
+                "since": since,
+                "positions": positions,
+                "cache_timeout": get_cache_timeout(),
+            },
+        )
@@ -33,9 +33,18 @@ DATABASES = {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "podcast_charts.sqlite",
         "ATOMIC_REQUESTS": True,
-    }
+    },
+    # A second alias for exercising podcast_charts.routers. Tests enable the
+    # router themselves; the replica mirrors the default test database.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "podcast_charts.sqlite",
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+CHART_REPLICA_DATABASE = "replica"
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 ROOT_URLCONF = "tests.urls"
@@ -161,3 +170,7 @@ LOGGING = {
 # Chart Fetching config
 
 CHART_FETCH_MAX_RETRIES = 3
+
+# Deliver rank change notifications to an in-memory outbox.
+
+CHART_NOTIFICATION_SENDER = "podcast_charts.notifications.LocalNotificationSender"
@@ -0,0 +1,87 @@
+# test_apple_feed.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from podcast_charts.backends import ChartParseError
+from podcast_charts.backends.apple_feed import (
+    AppleFeedChartBackend,
+    parse_apple_feed_json,
+)
+from podcast_charts.models import (
+    ChartEngineChoices,
+    PodcastChartPodcastIdentifier,
+    PodcastChartVersion,
+    get_chart_backend,
+)
+from podcast_charts.tasks import fetch_chart_versions
+
+FEED_FIXTURE = Path(__file__).parent / "fixtures" / "apple_feed_us_top.json"
+
+
+@pytest.fixture
+def feed_body() -> str:
+    return FEED_FIXTURE.read_text()
+
+
+def test_parse_feed(feed_body) -> None:
+    positions = parse_apple_feed_json(feed_body, []).to_positions()
+    assert [(p.podcast_id, p.position) for p in positions[:2]] == [
+        ("1200361736", 1),
+        ("1521578868", 2),
+    ]
+    assert positions[0].podcast_title == "The Daily"
+    assert positions[0].podcast_url == (
+        "https://podcasts.apple.com/us/podcast/the-daily/id1200361736"
+    )
+    filtered = parse_apple_feed_json(feed_body, ["1322200189"]).to_positions()
+    assert [(p.podcast_id, p.position) for p in filtered] == [("1322200189", 4)]
+
+
+def test_parse_feed_single_entry_and_errors(feed_body) -> None:
+    feed = json.loads(feed_body)
+    feed["feed"]["entry"] = feed["feed"]["entry"][0]
+    positions = parse_apple_feed_json(json.dumps(feed), []).to_positions()
+    assert len(positions) == 1
+    with pytest.raises(ChartParseError):
+        parse_apple_feed_json("<html></html>", [])
+
+
+def test_engine_selection() -> None:
+    assert isinstance(
+        get_chart_backend("apple", ChartEngineChoices.FEED), AppleFeedChartBackend
+    )
+    assert not isinstance(get_chart_backend("apple"), AppleFeedChartBackend)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fetch_feed_chart(podcast_chart, chart_country, feed_body, mock_transport):
+    mock_transport.handler = lambda _request: httpx.Response(200, text=feed_body)
+    podcast_chart.chart_engine = ChartEngineChoices.FEED
+    podcast_chart.save()
+    version = PodcastChartVersion.objects.create(
+        podcast_chart=podcast_chart,
+        country=chart_country,
+        chart_date=datetime.date(2024, 12, 20),
+        fetch_status="pend",
+    )
+    assert version.get_remote_chart_id() == "1303"
+    fetch_chart_versions([version])
+    assert [str(request.url) for request in mock_transport.requests] == [
+        "https://itunes.apple.com/us/rss/toppodcasts/limit=200/genre=1303/json"
+    ]
+    assert (
+        PodcastChartPodcastIdentifier.objects.get(
+            chart_source_podcast_id="1418960261"
+        ).podcast_title
+        == "Call Her Daddy"
+    )
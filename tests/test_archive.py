@@ -0,0 +1,106 @@
+# test_archive.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import io
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+
+from podcast_charts import tasks
+from podcast_charts.archive import load_chart_response, store_chart_responses
+from podcast_charts.models import (
+    ChartPowerScore,
+    ChartResponseArchive,
+    FetchStatusChoices,
+    PodcastChartPosition,
+    PodcastChartStats,
+    PodcastChartVersion,
+)
+from podcast_charts.signals import chart_version_fetched
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+
+def test_responses_are_content_addressed(db) -> None:
+    archives = store_chart_responses("apple", ["<html>a</html>", "<html>a</html>"])
+    assert len(archives) == 1
+    store_chart_responses("apple", ["<html>a</html>", "<html>b</html>"])
+    assert ChartResponseArchive.objects.count() == 2
+    archive = ChartResponseArchive.objects.get(content_hash=next(iter(archives.keys())))
+    assert load_chart_response(archive) == "<html>a</html>"
+    assert archive.body_size == 14
+
+
+def test_fetch_archives_responses(settings, podcast_chart, fake_backend) -> None:
+    settings.CHART_ARCHIVE_RESPONSES = True
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    version = PodcastChartVersion.objects.select_related("response_archive").get()
+    assert load_chart_response(version.response_archive) == "us:100:First,200:"
+
+
+def test_archive_failure_still_stores_positions(
+    settings, podcast_chart, fake_backend, monkeypatch
+) -> None:
+    def fail(source, bodies):
+        msg = "disk full"
+        raise OSError(msg)
+
+    settings.CHART_ARCHIVE_RESPONSES = True
+    monkeypatch.setattr(tasks, "store_chart_responses", fail)
+    create_pending_chart_versions(CHART_DATE)
+    [result] = fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    assert result.fetch_status == FetchStatusChoices.DONE
+    version = PodcastChartVersion.objects.get()
+    assert version.fetch_status == FetchStatusChoices.DONE
+    assert version.response_archive is None
+    assert PodcastChartPosition.objects.filter(chart_version=version).count() == 2
+
+
+def test_reparse_rebuilds_positions(podcast_chart, chart_country) -> None:
+    html = (Path(__file__).parent / "fixtures" / "apple_chart_room.html").read_text()
+    archive = store_chart_responses("apple", [html]).popitem()[1]
+    version = PodcastChartVersion.objects.create(
+        podcast_chart=podcast_chart,
+        country=chart_country,
+        chart_date=CHART_DATE,
+        fetch_status=FetchStatusChoices.ERROR,
+        response_archive=archive,
+    )
+    call_command("reparse_chart_archives", workers=1, dry_run=True)
+    assert not PodcastChartPosition.objects.exists()
+    fetched = []
+
+    def record_fetched(sender, version, **kwargs):
+        fetched.append(version)
+
+    chart_version_fetched.connect(record_fetched)
+    try:
+        call_command("reparse_chart_archives", workers=1, stdout=io.StringIO())
+    finally:
+        chart_version_fetched.disconnect(record_fetched)
+    assert not fetched
+    version.refresh_from_db()
+    assert version.fetch_status == FetchStatusChoices.DONE
+    # Re-parsed history stays out of the change feed.
+    assert version.completed_at is None
+    assert PodcastChartStats.objects.filter(podcast_chart=podcast_chart).exists()
+    assert ChartPowerScore.objects.filter(chart_date=CHART_DATE).exists()
+    assert list(
+        version.podcastchartposition_set.order_by("position").values_list(
+            "podcast_identifier__chart_source_podcast_id", flat=True
+        )
+    )[:2] == ["1200361736", "1521578868"]
@@ -0,0 +1,110 @@
+# test_cache.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from podcast_charts.cache import (
+    get_chart_version_ranking,
+    get_or_compute,
+    version_cache_key,
+)
+from podcast_charts.models import PodcastChartVersion
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def test_concurrent_misses_compute_once() -> None:
+    calls = []
+
+    def compute() -> str:
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(get_or_compute("k", compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+    assert cache.get("k:lock") is None
+
+
+def test_waits_for_other_process(settings) -> None:
+    settings.CHART_CACHE_LOCK_TIMEOUT = 2
+    # Simulate another process holding the lock and filling the key shortly.
+    cache.add("k:lock", 1)
+    threading.Timer(0.1, lambda: cache.set("k", "theirs")).start()
+    assert get_or_compute("k", lambda: "ours") == "theirs"
+
+
+def test_keeps_lock_it_does_not_own(settings) -> None:
+    settings.CHART_CACHE_LOCK_TIMEOUT = 0.1
+    cache.add("k:lock", "theirs")
+    assert get_or_compute("k", lambda: "ours") == "ours"
+    assert cache.get("k:lock") == "theirs"
+
+    def compute() -> str:
+        # Our lock expired and another process took it over.
+        cache.set("other:lock", "theirs")
+        return "ours"
+
+    assert get_or_compute("other", compute) == "ours"
+    assert cache.get("other:lock") == "theirs"
+
+
+def test_falsy_values_are_cached() -> None:
+    calls = []
+    for _ in range(2):
+        get_or_compute("none", lambda: calls.append(1))
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rankings_warmed_and_keyed_on_modified(
+    podcast_chart, fake_backend, client, django_assert_num_queries
+) -> None:
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    version = PodcastChartVersion.objects.get()
+    with django_assert_num_queries(0):
+        ranking = get_chart_version_ranking(version)
+    assert [entry.chart_source_podcast_id for entry in ranking] == ["100", "200"]
+    old_key = version_cache_key("ranking", version)
+    version.save()
+    assert version_cache_key("ranking", version) != old_key
+    response = client.get(
+        reverse(
+            "podcast_charts:chart_version_ranking", kwargs={"version_id": version.id}
+        )
+    )
+    assert response.json()["positions"][0]["podcast_title"] == "First"
+    missing = reverse(
+        "podcast_charts:chart_version_ranking", kwargs={"version_id": 999}
+    )
+    assert client.get(missing).status_code == 404
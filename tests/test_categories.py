@@ -0,0 +1,138 @@
+# test_categories.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+
+import pytest
+
+from podcast_charts import ChartImproperlyConfiguredError
+from podcast_charts.categories import (
+    get_category_charts,
+    get_category_rollup,
+    get_category_versions,
+)
+from podcast_charts.models import (
+    ChartCategory,
+    ChartCountry,
+    ChartSourceCategory,
+    PodcastChart,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tree(chart_category):
+    improv = ChartCategory.objects.create(label="Improv", parent_label=chart_category)
+    stand_up = ChartCategory.objects.create(
+        label="Stand-Up", parent_label=chart_category
+    )
+    sketch = ChartCategory.objects.create(label="Sketch", parent_label=improv)
+    news = ChartCategory.objects.create(label="News")
+    return {
+        "comedy": chart_category,
+        "improv": improv,
+        "stand_up": stand_up,
+        "sketch": sketch,
+        "news": news,
+    }
+
+
+def make_chart(category, country):
+    source_category = ChartSourceCategory.objects.create(
+        chart_category=category, chart_source_category_remote_id=category.label
+    )
+    chart = PodcastChart.objects.create(
+        chart_source_category=source_category, chart_remote_id=category.label
+    )
+    chart.enabled_countries.add(country)
+    return chart
+
+
+def labels(queryset):
+    return [category.label for category in queryset]
+
+
+def test_category_paths(tree) -> None:
+    assert tree["sketch"].path_ids == [
+        tree["comedy"].id,
+        tree["improv"].id,
+        tree["sketch"].id,
+    ]
+    assert tree["sketch"].depth == 2
+    assert labels(ChartCategory.objects.subtree(tree["comedy"])) == [
+        "Comedy",
+        "Improv",
+        "Sketch",
+        "Stand-Up",
+    ]
+    assert labels(ChartCategory.objects.subtree(tree["improv"], include_self=False))
+    assert labels(ChartCategory.objects.ancestors(tree["sketch"])) == [
+        "Comedy",
+        "Improv",
+    ]
+    assert labels(ChartCategory.objects.roots()) == ["Comedy", "News"]
+
+
+def test_moving_category_moves_subtree(tree) -> None:
+    improv = tree["improv"]
+    improv.parent_label = tree["news"]
+    improv.save()
+    sketch = ChartCategory.objects.get(id=tree["sketch"].id)
+    assert sketch.path_ids == [tree["news"].id, improv.id, sketch.id]
+    assert sketch.depth == 2
+    assert labels(ChartCategory.objects.subtree(tree["comedy"])) == [
+        "Comedy",
+        "Stand-Up",
+    ]
+    comedy = tree["comedy"]
+    comedy.parent_label = tree["stand_up"]
+    with pytest.raises(ChartImproperlyConfiguredError):
+        comedy.save()
+
+
+def test_deleting_parent_makes_children_roots(tree) -> None:
+    tree["comedy"].delete()
+    sketch = ChartCategory.objects.get(id=tree["sketch"].id)
+    assert sketch.path_ids == [tree["improv"].id, sketch.id]
+    assert sketch.depth == 1
+    assert labels(ChartCategory.objects.roots()) == ["Improv", "Stand-Up", "News"]
+
+
+def test_category_rollup(
+    store_chart_version, tree, chart_country, django_assert_num_queries
+) -> None:
+    gb = ChartCountry.objects.create(country="gb")
+    comedy = make_chart(tree["comedy"], chart_country)
+    sketch = make_chart(tree["sketch"], chart_country)
+    news = make_chart(tree["news"], chart_country)
+    store_chart_version(comedy, chart_country, 1, ["1", "2", "3"])
+    store_chart_version(comedy, gb, 1, ["2", "1"])
+    store_chart_version(sketch, chart_country, 1, ["3", "2"])
+    store_chart_version(news, chart_country, 1, ["9", "3"])
+    store_chart_version(comedy, chart_country, 2, ["4"])
+    assert set(get_category_charts(tree["comedy"])) == {comedy, sketch}
+    assert set(get_category_charts(tree["improv"])) == {sketch}
+    assert (
+        get_category_versions(tree["comedy"], datetime.date(2024, 12, 1)).count() == 3
+    )
+    with django_assert_num_queries(1):
+        rollup = get_category_rollup(tree["comedy"], datetime.date(2024, 12, 1))
+    assert [
+        (entry.podcast_title, entry.charts, entry.countries, entry.best_position)
+        for entry in rollup
+    ] == [
+        ("P2", 2, 2, 1),
+        ("P3", 2, 1, 1),
+        ("P1", 1, 2, 1),
+    ]
+    assert rollup[0].appearances == 3
+    assert [entry.podcast_title for entry in get_category_rollup(tree["comedy"])] == [
+        "P4"
+    ]
+    assert len(get_category_rollup(tree["improv"], limit=1)) == 1
+    assert get_category_rollup(tree["stand_up"]) == []
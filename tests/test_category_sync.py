@@ -0,0 +1,139 @@
+# test_category_sync.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import io
+
+import httpx
+import pytest
+from django.core.management import call_command
+
+from podcast_charts.backends.apple import parse_itunes_genres_json
+from podcast_charts.category_sync import sync_chart_categories
+from podcast_charts.models import (
+    ChartCategory,
+    ChartCountry,
+    ChartEngineChoices,
+    ChartSourceCategory,
+    PodcastChart,
+)
+
+pytestmark = pytest.mark.django_db
+
+GENRES = {
+    "26": {
+        "name": "Podcasts",
+        "id": "26",
+        "subgenres": {
+            "1303": {
+                "name": "Comedy",
+                "id": "1303",
+                "subgenres": {
+                    "1495": {"name": "Improv", "id": "1495"},
+                    "1496": {"name": "Stand-Up", "id": "1496"},
+                },
+            },
+            "1489": {
+                "name": "News",
+                "id": "1489",
+                "subgenres": {"1526": {"name": "Improv", "id": "1526"}},
+            },
+        },
+    }
+}
+
+
+def genre_page(chart_id: str) -> str:
+    return (
+        '<h2 data-testId="header-title">'
+        f'<a href="https://podcasts.apple.com/us/room/{chart_id}/see-all">Top</a></h2>'
+    )
+
+
+@pytest.fixture
+def apple(mock_transport):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/genres"):
+            return httpx.Response(200, json=GENRES)
+        genre_id = request.url.path.rsplit("/", maxsplit=1)[1]
+        if genre_id == "1526":
+            return httpx.Response(404)
+        return httpx.Response(200, text=genre_page(f"room-{genre_id}"))
+
+    mock_transport.handler = handler
+    return mock_transport
+
+
+def test_parse_genres() -> None:
+    tree = parse_itunes_genres_json(GENRES)
+    assert [(node.remote_id, node.parent_remote_id) for node in tree] == [
+        ("26", None),
+        ("1303", "26"),
+        ("1489", "26"),
+        ("1495", "1303"),
+        ("1496", "1303"),
+        ("1526", "1489"),
+    ]
+
+
+def test_sync_chart_categories(chart_category, chart_country, apple) -> None:
+    result = sync_chart_categories(countries=["us", "gb"])
+    assert result.categories == 6
+    # Comedy already existed, and the second Improv gets a distinct label.
+    assert result.created_categories == 5
+    assert result.failed == ["1526"]
+    assert result.charts == 5
+    comedy = ChartCategory.objects.get(label="Comedy")
+    assert comedy == chart_category
+    assert [c.label for c in ChartCategory.objects.subtree(comedy)] == [
+        "Comedy",
+        "Improv",
+        "Stand-Up",
+    ]
+    assert ChartCategory.objects.get(label="Improv (1526)").parent_label.label == "News"
+    stand_up = PodcastChart.objects.get(
+        chart_source_category__chart_source_category_remote_id="1496"
+    )
+    assert stand_up.chart_remote_id == "https://podcasts.apple.com/us/room/room-1496"
+    assert set(stand_up.enabled_countries.values_list("country", flat=True)) == {
+        "us",
+        "gb",
+    }
+    assert ChartCountry.objects.count() == 2
+    genre_requests = len(apple.requests)
+
+    # A second sync only retries the category that failed.
+    result = sync_chart_categories(countries=["us"])
+    assert result.created_categories == 0
+    assert len(apple.requests) == genre_requests + 2
+    assert ChartSourceCategory.objects.count() == 6
+
+
+def test_sync_command_feed_engine(apple) -> None:
+    call_command("sync_chart_categories", engine=ChartEngineChoices.FEED)
+    # Feed charts use the category id directly, so only the genre tree is fetched.
+    assert len(apple.requests) == 1
+    assert set(PodcastChart.objects.values_list("chart_remote_id", "chart_engine")) == {
+        (remote_id, ChartEngineChoices.FEED)
+        for remote_id in ("26", "1303", "1489", "1495", "1496", "1526")
+    }
+    # A later sync with another engine keeps the engine chosen for each chart.
+    call_command(
+        "sync_chart_categories", engine=ChartEngineChoices.HTML, stdout=io.StringIO()
+    )
+    assert set(PodcastChart.objects.values_list("chart_engine", flat=True)) == {
+        ChartEngineChoices.FEED
+    }
+    call_command(
+        "sync_chart_categories",
+        engine=ChartEngineChoices.HTML,
+        refresh=True,
+        stdout=io.StringIO(),
+    )
+    assert set(PodcastChart.objects.values_list("chart_remote_id", "chart_engine")) == {
+        (remote_id, ChartEngineChoices.FEED)
+        for remote_id in ("26", "1303", "1489", "1495", "1496", "1526")
+    }
@@ -0,0 +1,108 @@
+# test_diff.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.diff import diff_chart_versions
+from podcast_charts.exceptions import ChartStatusInvalidError
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChartVersion,
+)
+from podcast_charts.tasks import persist_chart_positions
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def versions(store_chart_version, podcast_chart, chart_country):
+    return (
+        store_chart_version(podcast_chart, chart_country, 1, ["1", "2", "3", "4"]),
+        store_chart_version(podcast_chart, chart_country, 2, ["2", "1", "3", "5"]),
+    )
+
+
+def test_diff_versions(versions, django_assert_num_queries) -> None:
+    # Rankings are cached when the versions are stored, so only the freshness
+    # check hits the database.
+    with django_assert_num_queries(1):
+        warm = diff_chart_versions(*versions)
+    cache.clear()
+    with django_assert_num_queries(3):
+        diff = diff_chart_versions(*versions)
+    assert diff == warm
+    assert [(e.podcast_title, e.position) for e in diff.entries] == [("P5", 4)]
+    assert [(e.podcast_title, e.position) for e in diff.exits] == [("P4", 4)]
+    assert [(m.podcast_title, m.delta) for m in diff.moves] == [("P2", 1), ("P1", -1)]
+    assert diff.unchanged == 1
+    # Served from the cache with only the freshness check.
+    with django_assert_num_queries(1):
+        assert diff_chart_versions(versions[0].id, versions[1].id) == diff
+
+
+def test_diff_refreshed_when_version_changes(versions) -> None:
+    first = diff_chart_versions(*versions)
+    persist_chart_positions(
+        versions[1],
+        [ChartPositionData(podcast_id="1", position=1, podcast_title="P1")],
+    )
+    second = diff_chart_versions(*versions)
+    assert second != first
+    assert {e.podcast_title for e in second.exits} == {"P2", "P3", "P4"}
+
+
+def test_diff_across_countries(
+    store_chart_version, podcast_chart, chart_country, versions
+) -> None:
+    gb = ChartCountry.objects.create(country="gb")
+    other = store_chart_version(podcast_chart, gb, 1, ["4", "3", "2", "1"])
+    diff = diff_chart_versions(versions[0], other)
+    assert not diff.entries
+    assert not diff.exits
+    assert [m.delta for m in diff.moves] == [3, 1, -1, -3]
+
+
+def test_diff_requires_done_versions(podcast_chart, chart_country, versions) -> None:
+    pending = PodcastChartVersion.objects.create(
+        podcast_chart=podcast_chart,
+        country=chart_country,
+        chart_remote_id=podcast_chart.chart_remote_id,
+        chart_date=datetime.date(2024, 12, 3),
+        fetch_status=FetchStatusChoices.PENDING,
+    )
+    with pytest.raises(ChartStatusInvalidError):
+        diff_chart_versions(versions[1], pending)
+    with pytest.raises(PodcastChartVersion.DoesNotExist):
+        diff_chart_versions(versions[1].id, 9999)
+
+
+def test_diff_view(client, versions) -> None:
+    url = reverse(
+        "podcast_charts:chart_version_diff",
+        kwargs={"from_version_id": versions[0].id, "to_version_id": versions[1].id},
+    )
+    response = client.get(url)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["entries"][0]["podcast_title"] == "P5"
+    assert data["moves"][0]["delta"] == 1
+    missing = reverse(
+        "podcast_charts:chart_version_diff",
+        kwargs={"from_version_id": versions[0].id, "to_version_id": 9999},
+    )
+    assert client.get(missing).status_code == 404
@@ -0,0 +1,88 @@
+# test_enrichment.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import httpx
+import pytest
+from django.core.management import call_command
+
+from podcast_charts.cache import get_title_generation
+from podcast_charts.enrichment import (
+    enrich_podcast_identifiers,
+    get_identifiers_to_enrich,
+)
+from podcast_charts.models import PodcastChartPodcastIdentifier
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def lookup_result(podcast_id: str, title: str) -> dict:
+    return {
+        "wrapperType": "track",
+        "kind": "podcast",
+        "trackId": int(podcast_id),
+        "trackName": title,
+        "trackViewUrl": f"https://podcasts.apple.com/us/podcast/id{podcast_id}",
+        "genreIds": ["1303", "26"],
+        "genres": ["Comedy", "Podcasts"],
+    }
+
+
+@pytest.fixture
+def identifiers(db):
+    return [
+        PodcastChartPodcastIdentifier.objects.create(
+            chart_source="apple", chart_source_podcast_id=podcast_id, podcast_title=""
+        )
+        for podcast_id in ("100", "200", "300", "400")
+    ]
+
+
+def test_enrich_in_batches(source_category, identifiers, mock_transport) -> None:
+    titles = {"100": "One", "200": "Two", "300": "Three"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        ids = request.url.params["id"].split(",")
+        if "400" in ids:
+            return httpx.Response(500)
+        return httpx.Response(
+            200,
+            json={
+                "resultCount": len(ids),
+                "results": [
+                    lookup_result(podcast_id, titles[podcast_id])
+                    for podcast_id in ids
+                    if podcast_id in titles
+                ],
+            },
+        )
+
+    mock_transport.handler = handler
+    generation = get_title_generation()
+    result = enrich_podcast_identifiers(batch_size=2)
+    # New titles move cached rankings to new keys.
+    assert get_title_generation() != generation
+    assert len(mock_transport.requests) == 2
+    assert (result.requested, result.updated, result.failed) == (4, 2, 2)
+    one = PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="100")
+    assert one.podcast_title == "One"
+    assert one.chart_source_podcast_url == "https://podcasts.apple.com/us/podcast/id100"
+    assert list(one.categories.all()) == [source_category]
+    # The failed batch is left for the next run.
+    assert set(
+        get_identifiers_to_enrich().values_list("chart_source_podcast_id", flat=True)
+    ) == {"300", "400"}
+
+
+def test_enrich_command(identifiers, mock_transport) -> None:
+    mock_transport.handler = lambda _request: httpx.Response(
+        200, json={"resultCount": 0, "results": []}
+    )
+    generation = get_title_generation()
+    call_command("enrich_chart_podcasts", batch_size=200)
+    assert len(mock_transport.requests) == 1
+    assert get_title_generation() == generation
+    assert not get_identifiers_to_enrich().exists()
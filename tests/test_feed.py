@@ -0,0 +1,111 @@
+# test_feed.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+import datetime
+import time
+
+import pytest
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.urls import reverse
+
+from podcast_charts.feed import (
+    ChartFeedCursor,
+    get_chart_feed,
+    get_latest_chart_feed_cursor,
+    wait_for_chart_feed,
+)
+from podcast_charts.models import PodcastChartVersion
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def no_settle(settings):
+    settings.CHART_FEED_SETTLE_SECONDS = 0
+    settings.CHART_FEED_POLL_INTERVAL = 0.05
+    cache.clear()
+
+
+def test_feed_pages(
+    store_chart_version, podcast_chart, chart_country, django_assert_num_queries
+) -> None:
+    first = store_chart_version(podcast_chart, chart_country, 1, ["1", "2"])
+    second = store_chart_version(podcast_chart, chart_country, 2, ["2", "1"])
+    third = store_chart_version(podcast_chart, chart_country, 3, ["3"])
+    # Pending versions are not in the feed.
+    PodcastChartVersion.objects.create(
+        podcast_chart=podcast_chart,
+        country=chart_country,
+        chart_date=datetime.date(2024, 12, 4),
+    )
+    with django_assert_num_queries(3):
+        page = get_chart_feed(limit=2)
+    assert [entry.snapshot.version_id for entry in page.entries] == [
+        first.id,
+        second.id,
+    ]
+    assert page.has_more
+    assert page.entries[1].country == "us"
+    assert [position for _, position in page.entries[1].snapshot] == [1, 2]
+    page = get_chart_feed(ChartFeedCursor.decode(page.cursor.encode()), limit=2)
+    assert [entry.snapshot.version_id for entry in page.entries] == [third.id]
+    assert not page.has_more
+    assert get_latest_chart_feed_cursor() == page.cursor
+    empty = get_chart_feed(page.cursor)
+    assert not empty.entries
+    assert empty.cursor == page.cursor
+    # Storing a version again moves it to the end of the feed.
+    store_chart_version(podcast_chart, chart_country, 1, ["2"])
+    page = get_chart_feed(page.cursor)
+    assert [entry.snapshot.version_id for entry in page.entries] == [first.id]
+    assert page.to_dict()["entries"][0]["podcast_ids"] == list(
+        page.entries[0].snapshot.podcast_ids
+    )
+
+
+def test_feed_waits_for_versions_to_settle(
+    store_chart_version, settings, podcast_chart, chart_country
+) -> None:
+    settings.CHART_FEED_SETTLE_SECONDS = 60
+    store_chart_version(podcast_chart, chart_country, 1, ["1"])
+    assert not get_chart_feed().entries
+
+
+def test_invalid_cursor() -> None:
+    with pytest.raises(ValueError, match="Invalid chart feed cursor"):
+        ChartFeedCursor.decode("not a cursor")
+
+
+@pytest.mark.asyncio
+async def test_long_poll(store_chart_version, podcast_chart, chart_country) -> None:
+    started = time.monotonic()
+    page = await wait_for_chart_feed(timeout=0.2)
+    assert not page.entries
+    assert time.monotonic() - started >= 0.2
+
+    async def complete_later() -> None:
+        await asyncio.sleep(0.2)
+        await sync_to_async(store_chart_version)(podcast_chart, chart_country, 1, ["1"])
+
+    started = time.monotonic()
+    page, _ = await asyncio.gather(wait_for_chart_feed(timeout=5), complete_later())
+    assert len(page.entries) == 1
+    assert time.monotonic() - started < 2
+
+
+def test_feed_view(store_chart_version, client, podcast_chart, chart_country) -> None:
+    version = store_chart_version(podcast_chart, chart_country, 1, ["1", "2"])
+    url = reverse("podcast_charts:chart_feed")
+    data = client.get(url, {"limit": 10}).json()
+    assert [entry["version_id"] for entry in data["entries"]] == [version.id]
+    assert data["entries"][0]["positions"] == [1, 2]
+    data = client.get(url, {"cursor": data["cursor"], "wait": "0"}).json()
+    assert data["entries"] == []
+    assert client.get(url, {"cursor": "bogus"}).status_code == 400
+    assert client.get(url, {"limit": "many"}).status_code == 400
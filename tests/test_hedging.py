@@ -0,0 +1,130 @@
+# test_hedging.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from podcast_charts.backends import AppleChartFetchError
+from podcast_charts.backends.apple import ApplePodcastsChartBackend
+from podcast_charts.backends.hedging import (
+    HedgingConfig,
+    get_latency_window,
+    hedged_get,
+)
+from podcast_charts.backends.ratelimit import CircuitState, get_rate_limiter
+
+HOST = "podcasts.apple.com"
+URL = f"https://{HOST}/us/room/top-podcasts"
+
+
+@pytest.fixture(autouse=True)
+def hedging(settings):
+    settings.CHART_FETCH_HEDGING = {"default": {"min_samples": 5, "min_delay": 0.01}}
+
+
+def prime(key: str, seconds: float = 0.01, samples: int = 10) -> None:
+    window = get_latency_window(HOST, key)
+    for _ in range(samples):
+        window.record(seconds)
+    # Pretend enough requests were made for the hedge budget.
+    window.requests = samples
+
+
+def test_hedge_delay_needs_samples() -> None:
+    config = HedgingConfig(min_samples=3, min_delay=0.5)
+    window = get_latency_window(HOST, "gb")
+    window.record(1.0)
+    assert window.hedge_delay(config) is None
+    window.record(2.0)
+    window.record(3.0)
+    assert window.hedge_delay(config) == 3.0
+    assert window.hedge_delay(HedgingConfig(percentile=None)) is None
+    # Each country is tracked separately.
+    assert len(get_latency_window(HOST, "us")) == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged() -> None:
+    calls = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(5)
+        return httpx.Response(200, text=f"response {calls}")
+
+    prime("us")
+    started = time.monotonic()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        response = await hedged_get(client, URL, key="us")
+    assert time.monotonic() - started < 1
+    assert response.text == "response 2"
+    window = get_latency_window(HOST, "us")
+    assert (window.requests, window.hedges) == (11, 1)
+    # At most one hedge per ten requests.
+    window.requests = 9
+    assert not window.allow_hedge(HedgingConfig())
+
+
+@pytest.mark.asyncio
+async def test_fast_request_is_not_hedged() -> None:
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(200)
+
+    prime("us", seconds=1.0)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await hedged_get(client, URL, key="us")
+    assert calls == 1
+    assert len(get_latency_window(HOST, "us")) == 11
+
+
+@pytest.mark.asyncio
+async def test_deadline(settings, mock_transport) -> None:
+    settings.CHART_FETCH_HEDGING = {HOST: {"deadline": 0.1}}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(5)
+        return httpx.Response(200)
+
+    mock_transport.handler = handler
+    started = time.monotonic()
+    with pytest.raises(AppleChartFetchError, match="within 0.1s"):
+        await ApplePodcastsChartBackend().fetch_raw("top-podcasts", "us")
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_fails_probe(settings) -> None:
+    settings.CHART_FETCH_HEDGING = {HOST: {"deadline": 0.1}}
+    limiter = get_rate_limiter(HOST)
+    limiter.breaker.failure_threshold = 1
+    limiter.breaker.recovery_timeout = 0
+    limiter.record_transport_error()
+    slow = True
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if slow:
+            await asyncio.sleep(5)
+        return httpx.Response(200)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with pytest.raises(httpx.TimeoutException):
+            await hedged_get(client, URL, key="us")
+        # The probe missed its deadline, so the circuit opened again.
+        assert limiter.breaker.state == CircuitState.OPEN
+        assert limiter.breaker.failures == 2
+        slow = False
+        await hedged_get(client, URL, key="us")
+    assert limiter.breaker.state == CircuitState.CLOSED
@@ -0,0 +1,185 @@
+# test_importer.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from podcast_charts.exceptions import ChartImportError
+from podcast_charts.importer import ChartHistoryImporter, read_chart_history
+from podcast_charts.models import (
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+    get_ranking_hash,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+HEADER = "chart,country,date,position,podcast_id,podcast_title,podcast_url\n"
+
+
+def history_csv(podcast_chart, rows) -> str:
+    return HEADER + "".join(
+        f"{podcast_chart.id},{country},{date},{position},{podcast_id},{title},\n"
+        for country, date, position, podcast_id, title in rows
+    )
+
+
+@pytest.fixture
+def history(podcast_chart, tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(
+        history_csv(
+            podcast_chart,
+            [
+                ("us", "2024-01-01", 1, "100", "First"),
+                ("us", "2024-01-01", 2, "200", "Second"),
+                ("us", "2024-01-02", 1, "200", "Second"),
+                ("us", "2024-01-02", 2, "100", "First"),
+                ("GB", "2024-01-01", 1, "300", ""),
+            ],
+        )
+    )
+    return path
+
+
+def test_import_csv(podcast_chart, history, tmp_path) -> None:
+    PodcastChartPodcastIdentifier.objects.create(
+        chart_source=podcast_chart.chart_source,
+        chart_source_podcast_id="100",
+        podcast_title="Current title",
+    )
+    PodcastChartPodcastIdentifier.objects.create(
+        chart_source=podcast_chart.chart_source, chart_source_podcast_id="200"
+    )
+    checkpoint = tmp_path / "checkpoint.json"
+    out = io.StringIO()
+    call_command(
+        "import_chart_history",
+        str(history),
+        chunk_size=2,
+        checkpoint=checkpoint,
+        stdout=out,
+    )
+    assert "Imported 3 versions, 5 positions and 1 new podcasts" in out.getvalue()
+    assert "  4 records imported" in out.getvalue()
+    assert not checkpoint.exists()
+    version = PodcastChartVersion.objects.get(
+        country__country="us", chart_date=datetime.date(2024, 1, 2)
+    )
+    assert version.fetch_status == FetchStatusChoices.DONE
+    assert version.completed_at is None
+    assert version.content_hash == get_ranking_hash(["200", "100"])
+    assert list(
+        PodcastChartPosition.objects.filter(chart_version=version)
+        .order_by("position")
+        .values_list("podcast_identifier__chart_source_podcast_id", flat=True)
+    ) == ["200", "100"]
+    titles = dict(
+        PodcastChartPodcastIdentifier.objects.values_list(
+            "chart_source_podcast_id", "podcast_title"
+        )
+    )
+    # Missing titles are filled in, but current titles are kept.
+    assert titles == {"100": "Current title", "200": "Second", "300": ""}
+    assert not ChartCountry.objects.get(country="gb").enabled
+
+    out = io.StringIO()
+    call_command("import_chart_history", str(history), stdout=out)
+    assert "Imported 0 versions" in out.getvalue()
+    assert "Skipped 3 existing versions" in out.getvalue()
+
+
+def test_import_resumes_from_checkpoint(podcast_chart, history, tmp_path) -> None:
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"path": str(history), "records": 2}))
+    call_command(
+        "import_chart_history",
+        str(history),
+        checkpoint=checkpoint,
+        stdout=io.StringIO(),
+    )
+    assert set(
+        PodcastChartVersion.objects.values_list("country__country", "chart_date")
+    ) == {("us", datetime.date(2024, 1, 2)), ("gb", datetime.date(2024, 1, 1))}
+    checkpoint.write_text(json.dumps({"path": "other.csv", "records": 2}))
+    with pytest.raises(CommandError, match="is for other.csv"):
+        call_command("import_chart_history", str(history), checkpoint=checkpoint)
+
+
+def test_import_ndjson(podcast_chart) -> None:
+    lines = [
+        json.dumps(
+            {
+                "chart": podcast_chart.id,
+                "country": "us",
+                "date": "2024-01-01",
+                "position": position,
+                "podcast_id": podcast_id,
+            }
+        )
+        for position, podcast_id in ((1, "100"), (2, "200"))
+    ]
+    checkpoints = []
+    result = ChartHistoryImporter(use_copy=False).run(
+        read_chart_history(io.StringIO("\n".join(lines) + "\n\n"), "ndjson"),
+        checkpoint=checkpoints.append,
+    )
+    assert (result.records, result.versions, result.positions) == (2, 1, 2)
+    assert checkpoints == [2]
+
+
+@pytest.mark.parametrize(
+    ("rows", "error"),
+    [
+        (
+            [
+                ("us", "2024-01-01", 1, "100", ""),
+                ("us", "2024-01-02", 1, "100", ""),
+                ("us", "2024-01-01", 2, "200", ""),
+            ],
+            "must be consecutive",
+        ),
+        (
+            [("us", "2024-01-01", 1, "100", ""), ("us", "2024-01-01", 1, "200", "")],
+            "Duplicate positions",
+        ),
+        ([("us", "January", 1, "100", "")], "Invalid chart history record"),
+    ],
+)
+def test_import_errors(podcast_chart, tmp_path, rows, error) -> None:
+    path = tmp_path / "history.csv"
+    path.write_text(history_csv(podcast_chart, rows))
+    with pytest.raises(CommandError, match=error):
+        call_command("import_chart_history", str(path), stdout=io.StringIO())
+    assert not PodcastChartVersion.objects.exists()
+
+
+def test_import_version_split_across_chunks(podcast_chart) -> None:
+    rows = [
+        ("us", "2024-01-01", 1, "100", ""),
+        ("us", "2024-01-02", 1, "100", ""),
+        ("us", "2024-01-01", 2, "200", ""),
+    ]
+    records = read_chart_history(io.StringIO(history_csv(podcast_chart, rows)))
+    importer = ChartHistoryImporter(chunk_size=1, use_copy=False)
+    with pytest.raises(ChartImportError, match="were split"):
+        importer.run(records)
+    assert importer.result.skipped_versions == 0
+
+
+def test_import_unknown_chart(tmp_path) -> None:
+    path = tmp_path / "history.csv"
+    path.write_text(HEADER + "999,us,2024-01-01,1,100,,\n")
+    with pytest.raises(CommandError, match="Unknown chart 999"):
+        call_command("import_chart_history", str(path), stdout=io.StringIO())
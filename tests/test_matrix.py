@@ -0,0 +1,89 @@
+# test_matrix.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import pickle
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from podcast_charts.matrix import (
+    RankMatrix,
+    get_rank_matrix,
+    get_rank_matrix_cache_key,
+)
+from podcast_charts.models import ChartCountry, PodcastChartPodcastIdentifier
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def matrix() -> RankMatrix:
+    rows = [
+        (1, 10, 500, 1),
+        (1, 10, 501, 2),
+        (1, 11, 501, 1),
+        (2, 10, 502, 1),
+        (2, 10, 500, 2),
+    ]
+    return RankMatrix.from_rows(CHART_DATE, rows, {10: "us", 11: "gb"})
+
+
+def test_matrix_slices(matrix) -> None:
+    assert len(matrix) == 5
+    assert matrix.cell(1, 10) == [(500, 1), (501, 2)]
+    assert matrix.cell(2, 11) == []
+    assert matrix.for_chart(1) == {"us": [(500, 1), (501, 2)], "gb": [(501, 1)]}
+    assert matrix.for_country(10) == {1: [(500, 1), (501, 2)], 2: [(502, 1), (500, 2)]}
+    assert matrix.for_podcast(500) == {(1, "us"): 1, (2, "us"): 2}
+    assert matrix.for_podcast(999) == {}
+    assert matrix.grid() == {1: {"us": [500, 501], "gb": [501]}, 2: {"us": [502, 500]}}
+    assert pickle.loads(pickle.dumps(matrix)) == matrix  # noqa: S301
+
+
+def test_matrix_built_after_fetch_run(
+    podcast_chart, fake_backend, django_assert_num_queries
+) -> None:
+    podcast_chart.enabled_countries.add(ChartCountry.objects.create(country="gb"))
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    assert cache.get(get_rank_matrix_cache_key(CHART_DATE)) is not None
+    with django_assert_num_queries(0):
+        matrix = get_rank_matrix(CHART_DATE)
+    first = PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="100")
+    assert matrix.for_podcast(first.id) == {
+        (podcast_chart.id, "us"): 1,
+        (podcast_chart.id, "gb"): 1,
+    }
+
+
+def test_rank_matrix_view(podcast_chart, fake_backend, client) -> None:
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    url = reverse("podcast_charts:rank_matrix", kwargs={"chart_date": "2024-12-20"})
+    grid = client.get(url).json()["charts"]
+    assert list(grid[str(podcast_chart.id)]) == ["us"]
+    by_country = client.get(url, {"country": "us"}).json()["charts"]
+    assert len(by_country[str(podcast_chart.id)]) == 2
+    by_chart = client.get(url, {"chart": podcast_chart.id}).json()["countries"]
+    assert len(by_chart["us"]) == 2
+    assert client.get(url, {"podcast": "x"}).status_code == 400
+    bad = reverse("podcast_charts:rank_matrix", kwargs={"chart_date": "today"})
+    assert client.get(bad).status_code == 404
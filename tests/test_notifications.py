@@ -0,0 +1,170 @@
+# test_notifications.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+import datetime
+import json
+
+import httpx
+import pytest
+
+from podcast_charts import notifications
+from podcast_charts.exceptions import NotificationDeliveryError
+from podcast_charts.models import (
+    ChartCountry,
+    NotificationSubscriber,
+    PodcastChartPodcastIdentifier,
+    PodcastSubscription,
+    SourceBackendChoices,
+)
+from podcast_charts.notifications import (
+    NotificationPayload,
+    WebhookNotificationSender,
+    build_notifications,
+    compute_rank_changes,
+    deliver_notifications,
+)
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def empty_outbox():
+    notifications.outbox.clear()
+    yield
+    notifications.outbox.clear()
+
+
+def subscribe(subscriber, podcast_id: str, **kwargs) -> PodcastSubscription:
+    return PodcastSubscription.objects.create(
+        subscriber=subscriber,
+        podcast_identifier=PodcastChartPodcastIdentifier.objects.get(
+            chart_source_podcast_id=podcast_id
+        ),
+        **kwargs,
+    )
+
+
+def payload(name: str, endpoint: str = "") -> NotificationPayload:
+    return NotificationPayload(
+        subscriber_id=1, subscriber_name=name, endpoint=endpoint, changes=()
+    )
+
+
+def test_rank_changes_coalesced_per_subscriber(
+    store_chart_version, podcast_chart, chart_country, django_assert_num_queries
+) -> None:
+    store_chart_version(podcast_chart, chart_country, 1, ["1", "2", "3", "5"])
+    day_two = store_chart_version(podcast_chart, chart_country, 2, ["2", "1", "4", "5"])
+    alice = NotificationSubscriber.objects.create(name="alice")
+    bob = NotificationSubscriber.objects.create(name="bob")
+    carol = NotificationSubscriber.objects.create(name="carol", enabled=False)
+    subscribe(alice, "1")
+    subscribe(alice, "3")
+    subscribe(alice, "5")
+    subscribe(bob, "1", country=chart_country)
+    subscribe(bob, "2", min_change=2)
+    subscribe(bob, "4", country=ChartCountry.objects.create(country="gb"))
+    subscribe(carol, "1")
+
+    with django_assert_num_queries(2):
+        changes = compute_rank_changes([day_two])
+    # Unchanged and unsubscribed podcasts are left out.
+    assert [(c.kind, c.previous_position, c.position) for c in changes] == [
+        ("move", 2, 1),
+        ("move", 1, 2),
+        ("exit", 3, None),
+        ("entry", None, 3),
+    ]
+    with django_assert_num_queries(1):
+        payloads = build_notifications(changes)
+    assert [p.subscriber_name for p in payloads] == ["alice", "bob"]
+    assert [c.kind for c in payloads[0].changes] == ["move", "exit"]
+    # Bob's one place move for "2" is below the threshold and "4" is in another
+    # country.
+    assert [c.podcast_identifier_id for c in payloads[1].changes] == [
+        PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="1").id
+    ]
+    assert payloads[1].to_dict()["changes"][0]["chart_date"] == "2024-12-02"
+
+
+def test_subscribers_notified_after_fetch_run(podcast_chart, fake_backend) -> None:
+    chart_date = datetime.date(2024, 12, 20)
+    podcast_chart.enabled_countries.add(ChartCountry.objects.create(country="gb"))
+    identifier = PodcastChartPodcastIdentifier.objects.create(
+        podcast_title="First",
+        chart_source=SourceBackendChoices.APPLE,
+        chart_source_podcast_id="100",
+    )
+    subscriber = NotificationSubscriber.objects.create(name="alice")
+    subscribe(subscriber, "100")
+    create_pending_chart_versions(chart_date)
+    fetch_chart_versions(get_versions_to_fetch(chart_date))
+    # Both countries arrive in a single payload.
+    assert len(notifications.outbox) == 1
+    assert [
+        (change.country, change.kind, change.podcast_identifier_id)
+        for change in notifications.outbox[0].changes
+    ] == [("gb", "entry", identifier.id), ("us", "entry", identifier.id)]
+
+
+@pytest.mark.asyncio
+async def test_webhook_delivery_retries(mock_transport) -> None:
+    attempts: dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts[request.url.host] = attempts.get(request.url.host, 0) + 1
+        if request.url.host == "flaky.example.com" and attempts[request.url.host] < 2:
+            return httpx.Response(503)
+        if request.url.host == "gone.example.com":
+            return httpx.Response(410)
+        return httpx.Response(204)
+
+    mock_transport.handler = handler
+    results = await deliver_notifications(
+        [
+            payload("flaky", "https://flaky.example.com/hook"),
+            payload("gone", "https://gone.example.com/hook"),
+            payload("missing"),
+        ],
+        WebhookNotificationSender(),
+        backoff=0,
+    )
+    assert [(r.delivered, r.attempts) for r in results] == [
+        (True, 2),
+        (False, 1),
+        (False, 1),
+    ]
+    assert isinstance(results[1].error, NotificationDeliveryError)
+    assert json.loads(mock_transport.requests[0].read()) == {
+        "subscriber": "flaky",
+        "changes": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_delivery_concurrency_is_bounded() -> None:
+    in_flight = peak = 0
+
+    class SlowSender:
+        async def send(self, payload: NotificationPayload) -> None:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    results = await deliver_notifications(
+        [payload(str(i)) for i in range(6)], SlowSender(), concurrency=2
+    )
+    assert all(result.delivered for result in results)
+    assert peak == 2
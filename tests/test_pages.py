@@ -0,0 +1,103 @@
+# test_pages.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.cache import get_chart_version_ranking
+from podcast_charts.models import PodcastChartPodcastIdentifier, PodcastChartVersion
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+    persist_chart_positions,
+    upsert_podcast_identifiers,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def fetched_version(podcast_chart, fake_backend) -> PodcastChartVersion:
+    create_pending_chart_versions(timezone.localdate())
+    fetch_chart_versions(get_versions_to_fetch())
+    return PodcastChartVersion.objects.get()
+
+
+def test_chart_list(client, podcast_chart, django_assert_num_queries) -> None:
+    with django_assert_num_queries(1):
+        response = client.get(reverse("podcast_charts:chart_list"))
+    assert str(podcast_chart) in response.content.decode()
+    assert (
+        reverse("podcast_charts:current_chart", args=[podcast_chart.id, "us"])
+        in response.content.decode()
+    )
+
+
+def test_current_chart(client, fetched_version, django_assert_num_queries) -> None:
+    url = reverse(
+        "podcast_charts:current_chart", args=[fetched_version.podcast_chart_id, "us"]
+    )
+    first = client.get(url).content.decode()
+    assert '<li value="1">' in first
+    assert ">First</a>" in first
+    assert ">200</a>" in first
+    # Served from the fragment cache with only the version lookup.
+    with django_assert_num_queries(1):
+        assert client.get(url).content.decode() == first
+    persist_chart_positions(
+        fetched_version, [ChartPositionData(podcast_id="300", position=1)]
+    )
+    refetched = client.get(url).content.decode()
+    assert ">300</a>" in refetched
+    assert ">First</a>" not in refetched
+    assert client.get(url.replace("/us/", "/gb/")).status_code == 404
+
+
+def test_current_chart_title_changes(client, fetched_version) -> None:
+    url = reverse(
+        "podcast_charts:current_chart", args=[fetched_version.podcast_chart_id, "us"]
+    )
+    assert ">First</a>" in client.get(url).content.decode()
+    # A title stored by a fetch of another chart.
+    upsert_podcast_identifiers(
+        fetched_version.podcast_chart.chart_source,
+        [ChartPositionData(podcast_id="100", position=1, podcast_title="Renamed")],
+    )
+    assert ">Renamed</a>" in client.get(url).content.decode()
+    assert get_chart_version_ranking(fetched_version)[0].podcast_title == "Renamed"
+    # A title edited by hand.
+    podcast = PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="200")
+    podcast.podcast_title = "Second"
+    podcast.save()
+    assert ">Second</a>" in client.get(url).content.decode()
+
+
+def test_podcast_history(client, fetched_version, django_assert_num_queries) -> None:
+    podcast = PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="200")
+    url = reverse("podcast_charts:podcast_history", args=[podcast.id])
+    first = client.get(url).content.decode()
+    assert f"<td>{fetched_version.chart_date:%Y-%m-%d}</td><td>2</td>" in first
+    with django_assert_num_queries(1):
+        assert client.get(url).content.decode() == first
+    persist_chart_positions(
+        fetched_version, [ChartPositionData(podcast_id="200", position=1)]
+    )
+    assert "<td>1</td>" in client.get(url).content.decode()
+    persist_chart_positions(
+        fetched_version, [ChartPositionData(podcast_id="100", position=1)]
+    )
+    assert "has not been on any chart" in client.get(url).content.decode()
+    assert client.get(url.replace(str(podcast.id), "0")).status_code == 404
@@ -0,0 +1,81 @@
+# test_parsing.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+from pathlib import Path
+
+import httpx
+import pytest
+
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.backends.apple import (
+    ApplePodcastsChartBackend,
+    parse_apple_chart_html,
+)
+from podcast_charts.backends.parsing import (
+    CompactChart,
+    run_parser,
+    shutdown_parse_executor,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def room_html() -> str:
+    return (FIXTURES / "apple_chart_room.html").read_text()
+
+
+@pytest.fixture(params=["process", "thread", "inline"])
+def parse_executor(request, settings):
+    shutdown_parse_executor()
+    settings.CHART_PARSE_EXECUTOR = request.param
+    yield request.param
+    shutdown_parse_executor()
+
+
+def test_compact_chart_round_trip() -> None:
+    positions = [
+        ChartPositionData(podcast_id="1", position=1, podcast_title="One"),
+        ChartPositionData(podcast_id="2", position=2),
+    ]
+    compact = CompactChart.from_positions(positions)
+    assert compact.podcast_urls is None
+    assert compact.to_positions() == positions
+
+
+def test_parse_apple_chart_html(room_html) -> None:
+    positions = parse_apple_chart_html(room_html, []).to_positions()
+    assert [(p.podcast_id, p.position) for p in positions] == [
+        ("1200361736", 1),
+        ("1521578868", 2),
+        ("1418960261", 3),
+        ("1322200189", 4),
+        ("1646101002", 5),
+    ]
+    assert positions[0].podcast_url == (
+        "https://podcasts.apple.com/us/podcast/the-daily/id1200361736"
+    )
+    filtered = parse_apple_chart_html(room_html, ["1322200189"]).to_positions()
+    assert [(p.podcast_id, p.position) for p in filtered] == [("1322200189", 4)]
+
+
+@pytest.mark.asyncio
+async def test_run_parser_executors(parse_executor, room_html) -> None:
+    compact = await run_parser(parse_apple_chart_html, room_html, [])
+    assert len(compact.podcast_ids) == 5
+
+
+@pytest.mark.asyncio
+async def test_fetch_parses_off_loop(parse_executor, room_html) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/us/room/1531123543"
+        return httpx.Response(200, text=room_html)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        backend = ApplePodcastsChartBackend(client=client)
+        positions = await backend.fetch("1531123543", "us", filter_to_podcast_ids=None)
+    assert [p.position for p in positions] == [1, 2, 3, 4, 5]
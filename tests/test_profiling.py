@@ -0,0 +1,82 @@
+# test_profiling.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import io
+import json
+import os
+import pstats
+import time
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from podcast_charts.profiling import PROFILE_ID_HEADER, ProfileCapture, phase
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(settings, tmp_path):
+    settings.CHART_PROFILE_DIR = tmp_path
+    return tmp_path
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fetch_command_profile(podcast_chart, fake_backend, profile_dir) -> None:
+    out = io.StringIO()
+    call_command("fetch_podcast_charts", profile="cprofile", stdout=out)
+    assert "fetch_podcast_charts:" in out.getvalue()
+    (summary_path,) = profile_dir.glob("*.json")
+    summary = json.loads(summary_path.read_text())
+    assert set(summary["phases"]) == {"http", "parse", "store"}
+    assert summary["phases"]["http"]["calls"] == 1
+    assert summary["queries"]["count"] > 0
+    stats = pstats.Stats(str(summary_path.with_suffix(".prof")))
+    assert stats.total_calls > 0
+
+
+def test_sampling_profile(profile_dir) -> None:
+    def wait_for_samples() -> None:
+        time.sleep(0.1)
+
+    with ProfileCapture("sampled", mode="sampling", interval=0.001) as capture:
+        with phase("http"):
+            wait_for_samples()
+    assert capture.profile_path.suffix == ".folded"
+    assert "wait_for_samples" in capture.profile_path.read_text()
+    assert capture.phases["http"].seconds >= 0.1
+
+
+def test_profile_directory_size_cap(settings, profile_dir) -> None:
+    settings.CHART_PROFILE_MAX_BYTES = 1
+    old = profile_dir / "old.prof"
+    old.write_bytes(b"x" * 100)
+    os.utime(old, (0, 0))
+    with ProfileCapture("capped") as capture:
+        pass
+    assert not old.exists()
+    # The newest capture is kept even when it exceeds the cap on its own.
+    assert capture.profile_path.exists()
+    assert capture.summary_path.exists()
+
+
+@pytest.mark.django_db
+def test_profiling_middleware(settings, client, admin_client, profile_dir) -> None:
+    settings.MIDDLEWARE = [
+        *settings.MIDDLEWARE,
+        "podcast_charts.profiling.ProfilingMiddleware",
+    ]
+    url = reverse("podcast_charts:podcast_search")
+    response = client.get(url, {"q": "x"}, headers={"X-Chart-Profile": "cprofile"})
+    assert PROFILE_ID_HEADER not in response
+    assert not list(profile_dir.iterdir())
+    response = admin_client.get(url, {"q": "x"}, headers={"X-Chart-Profile": "1"})
+    summary = json.loads(
+        (profile_dir / f"{response[PROFILE_ID_HEADER]}.json").read_text()
+    )
+    assert summary["label"] == f"GET {url}"
+    assert summary["phases"]["serialize"]["calls"] == 1
+    assert summary["queries"]["count"] >= 1
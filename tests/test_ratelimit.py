@@ -0,0 +1,121 @@
+# test_ratelimit.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+
+import httpx
+import pytest
+
+from podcast_charts.backends import ChartRateLimitedError, ChartSourceUnavailableError
+from podcast_charts.backends.ratelimit import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitState,
+    HostRateLimiter,
+    RateLimitConfig,
+    TokenBucket,
+    get_rate_limiter,
+    limited_get,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_reservations() -> None:
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now = 10.0
+    assert bucket.reserve() == 0
+
+
+def test_aimd_limits() -> None:
+    limiter = AdaptiveConcurrencyLimiter(initial=4, minimum=1, maximum=5)
+    limiter.on_throttle()
+    assert limiter.limit == 2
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
+    for _ in range(50):
+        limiter.on_success()
+    assert limiter.limit == 5
+
+
+def test_circuit_breaker_opens_and_probes() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+    clock.now = 31
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # Only one probe at a time.
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    clock.now = 62
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_limited_get_backs_off_on_throttle() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, headers={"Retry-After": "0"})
+
+    limiter = get_rate_limiter("charts.example.com")
+    limiter.config = RateLimitConfig(failure_threshold=2)
+    limiter.breaker.failure_threshold = 2
+    starting_limit = limiter.concurrency.limit
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with pytest.raises(ChartRateLimitedError):
+            await limited_get(client, "https://charts.example.com/room/1")
+        assert limiter.concurrency.limit < starting_limit
+        with pytest.raises(ChartRateLimitedError):
+            await limited_get(client, "https://charts.example.com/room/1")
+        with pytest.raises(ChartSourceUnavailableError):
+            await limited_get(client, "https://charts.example.com/room/1")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_is_released() -> None:
+    clock = FakeClock()
+    limiter = HostRateLimiter(
+        "charts.example.com",
+        RateLimitConfig(failure_threshold=1, recovery_timeout=30),
+        clock=clock,
+    )
+    limiter.record_transport_error()
+    clock.now = 31
+    started = asyncio.Event()
+
+    async def probe() -> None:
+        async with limiter.slot():
+            started.set()
+            await asyncio.sleep(5)
+
+    task = asyncio.create_task(probe())
+    await started.wait()
+    assert not limiter.breaker.allow_request()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # Cancelling is not an outcome, so the circuit stays half open for a new probe.
+    assert limiter.breaker.state == CircuitState.HALF_OPEN
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.breaker.allow_request()
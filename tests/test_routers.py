@@ -0,0 +1,90 @@
+# test_routers.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+
+from podcast_charts import routers
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.models import ChartCountry, PodcastChartVersion
+from podcast_charts.routers import (
+    ChartReplicaRouter,
+    pin_reads_to_primary,
+    use_primary,
+)
+from podcast_charts.tasks import persist_chart_positions
+
+pytestmark = pytest.mark.django_db(transaction=True, databases=["default", "replica"])
+
+
+@pytest.fixture(autouse=True)
+def replica_router(settings):
+    settings.DATABASE_ROUTERS = ["podcast_charts.routers.ChartReplicaRouter"]
+    settings.CHART_READ_YOUR_WRITES_SECONDS = 0.2
+    settings.CHART_REPLICA_PIN_CHECK_INTERVAL = 0
+    cache.clear()
+    routers._shared_pin.update(until=0.0, checked=0.0)
+    routers._pinned_until.set(0.0)
+
+
+def test_reads_go_to_replica() -> None:
+    assert ChartCountry.objects.all().db == "replica"
+    # Other apps are left alone.
+    assert User.objects.all().db == "default"
+    with transaction.atomic():
+        assert ChartCountry.objects.all().db == "default"
+    with use_primary():
+        assert ChartCountry.objects.all().db == "default"
+
+
+def test_read_your_writes(settings) -> None:
+    country = ChartCountry.objects.create(country="us")
+    assert country._state.db == "default"
+    # Reads right after a write stay on the primary.
+    assert ChartCountry.objects.all().db == "default"
+    time.sleep(0.25)
+    assert ChartCountry.objects.all().db == "replica"
+    assert ChartCountry.objects.get(id=country.id) == country
+
+
+def test_version_completion_pins_every_process(podcast_chart, chart_country) -> None:
+    version = PodcastChartVersion.objects.create(
+        podcast_chart=podcast_chart,
+        country=chart_country,
+        chart_remote_id=podcast_chart.chart_remote_id,
+        chart_date=datetime.date(2024, 12, 1),
+    )
+    persist_chart_positions(version, [ChartPositionData(podcast_id="1", position=1)])
+    assert cache.get(routers.PRIMARY_PINNED_CACHE_KEY) > time.time()
+    # Another thread or process has no local pin but sees the shared window.
+    routers._pinned_until.set(0.0)
+    routers._shared_pin.update(until=0.0, checked=0.0)
+    assert PodcastChartVersion.objects.all().db == "default"
+    time.sleep(0.25)
+    assert PodcastChartVersion.objects.all().db == "replica"
+    pin_reads_to_primary(shared=False)
+    assert PodcastChartVersion.objects.all().db == "default"
+
+
+def test_views_read_from_replica(client, django_assert_num_queries) -> None:
+    # ATOMIC_REQUESTS would otherwise keep every view on the primary.
+    with django_assert_num_queries(1, using="replica"):
+        response = client.get(reverse("podcast_charts:podcast_search"), {"q": "x"})
+    assert response.status_code == 200
+
+
+def test_allow_migrate() -> None:
+    router = ChartReplicaRouter()
+    assert router.allow_migrate("replica", "podcast_charts") is False
+    assert router.allow_migrate("default", "podcast_charts") is None
+    assert router.allow_migrate("replica", "auth") is None
@@ -0,0 +1,128 @@
+# test_runs.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import io
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from podcast_charts.backends import AppleChartFetchError
+from podcast_charts.models import (
+    ChartCountry,
+    FetchRun,
+    FetchRunTiming,
+    FetchStatusChoices,
+)
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+
+def test_fetch_run_recorded(podcast_chart, fake_backend) -> None:
+    for code in ("gb", "all"):
+        podcast_chart.enabled_countries.add(ChartCountry.objects.create(country=code))
+    fake_backend.errors = {
+        "gb": AppleChartFetchError("bad status"),
+        "all": NotImplementedError("nope"),
+    }
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    run = FetchRun.objects.get()
+    assert (run.attempted, run.succeeded, run.retried, run.failed) == (3, 1, 1, 1)
+    assert run.rows_written == 2
+    assert run.response_bytes == len("us:100:First,200:")
+    assert set(run.phase_seconds) == {"http", "parse", "store"}
+    assert run.finished_at >= run.started_at
+    timings = {timing.country.country: timing for timing in run.timings.all()}
+    assert timings["us"].fetch_status == FetchStatusChoices.DONE
+    assert timings["us"].store_seconds > 0
+    assert timings["gb"].fetch_status == FetchStatusChoices.RETRY
+    assert timings["gb"].http_seconds > 0
+    assert (timings["gb"].parse_seconds, timings["gb"].rows_written) == (0, 0)
+
+
+def test_fetch_run_history_disabled(settings, podcast_chart, fake_backend) -> None:
+    settings.CHART_FETCH_RUN_HISTORY = False
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    assert not FetchRun.objects.exists()
+
+
+def make_run(
+    podcast_chart, countries, started_at, seconds, version_seconds
+) -> FetchRun:
+    run = FetchRun.objects.create(
+        started_at=started_at,
+        finished_at=started_at + datetime.timedelta(seconds=seconds),
+        attempted=len(countries),
+        succeeded=len(countries),
+    )
+    FetchRunTiming.objects.bulk_create(
+        FetchRunTiming(
+            run=run,
+            podcast_chart=podcast_chart,
+            country=country,
+            fetch_status=FetchStatusChoices.DONE,
+            http_seconds=version_seconds[country.country],
+        )
+        for country in countries
+    )
+    return run
+
+
+def test_report_flags_regressions(podcast_chart, chart_country) -> None:
+    countries = [chart_country, ChartCountry.objects.create(country="gb")]
+    now = timezone.now()
+    for hours_ago in (4, 3, 2):
+        make_run(
+            podcast_chart,
+            countries,
+            now - datetime.timedelta(hours=hours_ago),
+            seconds=2,
+            version_seconds={"us": 1.0, "gb": 1.0},
+        )
+    make_run(
+        podcast_chart,
+        countries,
+        now,
+        seconds=4,
+        version_seconds={"us": 1.0, "gb": 3.0},
+    )
+    out = io.StringIO()
+    call_command("chart_fetch_report", recent=1, baseline=3, stdout=out)
+    report = out.getvalue()
+    assert "Recent 1 runs, 2 versions: 0.50 versions/s" in report
+    assert "Baseline 3 runs, 6 versions: 1.00 versions/s" in report
+    assert "Regression in throughput: 1.000 -> 0.500 (-50%)" in report
+    assert "Regression in p95_seconds: 1.000 -> 3.000 (+200%)" in report
+    assert "Regression in p50_seconds" not in report
+    slowest_countries = report.split("Slowest countries:\n")[1].splitlines()
+    assert slowest_countries[0] == "  gb: avg 3.000s, max 3.000s over 1 versions"
+    with pytest.raises(CommandError, match="Found 2 fetch performance regressions"):
+        call_command(
+            "chart_fetch_report",
+            recent=1,
+            baseline=3,
+            fail_on_regression=True,
+            stdout=io.StringIO(),
+        )
+    out = io.StringIO()
+    call_command("chart_fetch_report", recent=1, threshold=5, stdout=out)
+    assert "No regressions." in out.getvalue()
+
+
+def test_report_without_runs() -> None:
+    with pytest.raises(CommandError, match="No fetch runs"):
+        call_command("chart_fetch_report")
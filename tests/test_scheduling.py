@@ -0,0 +1,153 @@
+# test_scheduling.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import io
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from podcast_charts.backends import AppleChartFetchError, ChartPositionData
+from podcast_charts.models import (
+    ChartFetchSchedule,
+    FetchStatusChoices,
+    PodcastChartVersion,
+    get_ranking_hash,
+)
+from podcast_charts.runs import record_fetch_run
+from podcast_charts.scheduling import (
+    ensure_fetch_schedules,
+    plan_chart_fetches,
+    record_check,
+)
+from podcast_charts.tasks import fetch_chart_versions, persist_chart_positions
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+MINUTE = datetime.timedelta(minutes=1)
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime.datetime:
+    return datetime.datetime(2024, 12, day, hour, minute, tzinfo=datetime.UTC)
+
+
+def test_schedule_learns_update_time() -> None:
+    schedule = ChartFetchSchedule(next_fetch_at=at(1, 0), poll_interval=15 * MINUTE)
+    assert not record_check(schedule, "a", at(1, 0))
+    assert schedule.next_fetch_at == at(1, 0, 15)
+    # Unchanged charts are polled less and less often.
+    assert not record_check(schedule, "a", at(1, 0, 15))
+    assert not record_check(schedule, "a", at(1, 0, 45))
+    assert schedule.poll_interval == 60 * MINUTE
+    schedule.last_checked_at = at(1, 7, 40)
+    assert record_check(schedule, "b", at(1, 8))
+    assert schedule.change_minutes == [7 * 60 + 50]
+    assert schedule.next_fetch_at == at(1, 8, 15)
+    schedule.last_checked_at = at(2, 7, 48)
+    assert record_check(schedule, "c", at(2, 8))
+    # Two changes around 07:52 make a daily pattern, fetched 5 minutes after.
+    assert schedule.next_fetch_at == at(3, 7, 57)
+    assert not record_check(schedule, "c", at(3, 7, 57))
+    assert schedule.next_fetch_at == at(3, 8, 27)
+    assert (schedule.checks, schedule.changes) == (6, 2)
+
+
+def test_scheduled_fetches(
+    podcast_chart, chart_country, fake_backend, monkeypatch
+) -> None:
+    now = timezone.now()
+    versions = list(plan_chart_fetches(now))
+    assert len(versions) == 1
+    fetch_chart_versions(versions)
+    version = PodcastChartVersion.objects.get()
+    assert version.content_hash == get_ranking_hash(["100", "200"])
+    schedule = ChartFetchSchedule.objects.get()
+    assert schedule.content_hash == version.content_hash
+    assert schedule.next_fetch_at == version.completed_at + 15 * MINUTE
+    assert not plan_chart_fetches(now).exists()
+
+    # Once due, today's version is fetched again but stays done.
+    versions = list(plan_chart_fetches(schedule.next_fetch_at))
+    assert [v.id for v in versions] == [version.id]
+    assert versions[0].fetch_status == FetchStatusChoices.DONE
+    [result] = fetch_chart_versions(versions)
+    assert result.unchanged
+    schedule.refresh_from_db()
+    assert schedule.poll_interval == 30 * MINUTE
+    assert (schedule.checks, schedule.changes) == (2, 0)
+    # Nothing was stored for the unchanged ranking.
+    refetched = PodcastChartVersion.objects.get()
+    assert (refetched.modified, refetched.completed_at) == (
+        version.modified,
+        version.completed_at,
+    )
+
+    # A failed refetch keeps the ranking and is reported as it stays stored,
+    # leaving the schedule to try again on the next run.
+    fake_backend.errors = {"us": AppleChartFetchError("bad status")}
+    [result] = fetch_chart_versions(plan_chart_fetches(schedule.next_fetch_at))
+    assert (result.fetch_status, result.unchanged) == (FetchStatusChoices.DONE, True)
+    assert isinstance(result.error, AppleChartFetchError)
+    refetched = PodcastChartVersion.objects.get()
+    assert (refetched.fetch_status, refetched.modified) == (
+        FetchStatusChoices.DONE,
+        version.modified,
+    )
+    failed_refetch = ChartFetchSchedule.objects.get()
+    assert (
+        failed_refetch.next_fetch_at,
+        failed_refetch.poll_interval,
+        failed_refetch.checks,
+    ) == (schedule.next_fetch_at, schedule.poll_interval, schedule.checks)
+    run = record_fetch_run(now, [result])
+    assert (run.succeeded, run.failed) == (1, 0)
+
+    # A new ranking replaces the old one.
+    async def fetch_new_ranking(self, remote_chart_id, country):
+        return f"{country}:200:,300:"
+
+    fake_backend.errors = {}
+    monkeypatch.setattr(fake_backend, "fetch_raw", fetch_new_ranking)
+    schedule.refresh_from_db()
+    [result] = fetch_chart_versions(plan_chart_fetches(schedule.next_fetch_at))
+    assert not result.unchanged
+    refetched = PodcastChartVersion.objects.get()
+    assert refetched.content_hash == get_ranking_hash(["200", "300"])
+    assert refetched.completed_at > version.completed_at
+
+
+def test_scheduled_command(podcast_chart, fake_backend) -> None:
+    out = io.StringIO()
+    call_command("fetch_podcast_charts", scheduled=True, stdout=out)
+    assert "Fetched 1 chart versions" in out.getvalue()
+    call_command("fetch_podcast_charts", scheduled=True, stdout=out)
+    assert "Fetched 0 chart versions" in out.getvalue()
+
+
+def test_schedule_seeded_from_history(podcast_chart, chart_country) -> None:
+    today = timezone.localdate()
+    for days_ago, ranking in ((3, ["1", "2"]), (2, ["1", "2"]), (1, ["2", "1"])):
+        version = PodcastChartVersion.objects.create(
+            podcast_chart=podcast_chart,
+            country=chart_country,
+            chart_date=today - datetime.timedelta(days=days_ago),
+        )
+        persist_chart_positions(
+            version,
+            [
+                ChartPositionData(podcast_id=pid, position=rank)
+                for rank, pid in enumerate(ranking, start=1)
+            ],
+        )
+    assert ensure_fetch_schedules() == 1
+    schedule = ChartFetchSchedule.objects.get()
+    assert schedule.content_hash == get_ranking_hash(["2", "1"])
+    assert (schedule.checks, schedule.changes) == (3, 1)
+    # One change in three days.
+    assert schedule.poll_interval == datetime.timedelta(hours=18)
+    assert ensure_fetch_schedules() == 0
@@ -0,0 +1,152 @@
+# test_scoring.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import io
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from podcast_charts import scoring
+from podcast_charts.exceptions import ChartImproperlyConfiguredError
+from podcast_charts.matrix import RankMatrix
+from podcast_charts.models import ChartPowerScore, PodcastChartPodcastIdentifier
+from podcast_charts.scoring import (
+    ChartPowerConfig,
+    compute_chart_power,
+    get_chart_power_history,
+    get_chart_power_leaderboard,
+)
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+# Chart 1 in us and gb, chart 2 in us.
+MATRIX = RankMatrix.from_rows(
+    CHART_DATE,
+    [
+        (1, 1, 10, 1),
+        (1, 1, 20, 2),
+        (1, 1, 30, 4),
+        (1, 2, 20, 1),
+        (1, 2, 10, 2),
+        (2, 1, 30, 1),
+        (2, 1, 10, 2),
+    ],
+    {1: "us", 2: "gb"},
+)
+
+
+@pytest.fixture(params=["numpy", "python"])
+def vectorized(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(scoring, "np", None)
+    elif scoring.np is None:  # no cov
+        pytest.skip("numpy is not installed")
+    return request.param
+
+
+def summarize(entries) -> list[tuple[int, float, int, int]]:
+    return [
+        (e.podcast_identifier_id, round(e.score, 6), e.appearances, e.best_position)
+        for e in entries
+    ]
+
+
+def test_inverse_rank(vectorized) -> None:
+    assert summarize(compute_chart_power(MATRIX)) == [
+        (10, 2.0, 3, 1),
+        (20, 1.5, 2, 1),
+        (30, 1.25, 2, 1),
+    ]
+    config = ChartPowerConfig(exponent=2, leaderboard_size=2)
+    assert summarize(compute_chart_power(MATRIX, config)) == [
+        (10, 1.5, 3, 1),
+        (20, 1.25, 2, 1),
+    ]
+
+
+def test_linear_with_weights(vectorized) -> None:
+    config = ChartPowerConfig(
+        method="linear", chart_weights={2: 2.0}, country_weights={"gb": 0.5}
+    )
+    assert summarize(compute_chart_power(MATRIX, config)) == [
+        # 1 + 0.5 * 0.5 + 2 * 0.5
+        (10, 2.25, 3, 1),
+        # 0.25 + 2 * 1
+        (30, 2.25, 2, 1),
+        # 0.75 + 0.5 * 1
+        (20, 1.25, 2, 1),
+    ]
+
+
+def test_empty_matrix_and_bad_method() -> None:
+    assert compute_chart_power(RankMatrix.from_rows(CHART_DATE, [], {})) == []
+    with pytest.raises(ChartImproperlyConfiguredError):
+        ChartPowerConfig(method="median")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_leaderboard_after_fetch(client, podcast_chart, fake_backend) -> None:
+    today = timezone.localdate()
+    create_pending_chart_versions(today)
+    fetch_chart_versions(get_versions_to_fetch(today))
+    first, second = get_chart_power_leaderboard(today)
+    assert (first.rank, first.podcast_identifier.podcast_title, first.score) == (
+        1,
+        "First",
+        1.0,
+    )
+    assert (second.rank, second.score) == (2, 0.5)
+    assert get_chart_power_history(second.podcast_identifier_id) == [(today, 2, 0.5)]
+
+    response = client.get(
+        reverse("podcast_charts:chart_power", args=[today.isoformat()]),
+        {"limit": 1},
+    )
+    assert response.json()["scores"] == [
+        {
+            "rank": 1,
+            "podcast_identifier_id": first.podcast_identifier_id,
+            "podcast_title": "First",
+            "score": 1.0,
+            "appearances": 1,
+            "best_position": 1,
+        }
+    ]
+    url = reverse(
+        "podcast_charts:podcast_power_history", args=[first.podcast_identifier_id]
+    )
+    assert client.get(url).json()["history"] == [
+        {"chart_date": today.isoformat(), "rank": 1, "score": 1.0}
+    ]
+    tomorrow = today + datetime.timedelta(days=1)
+    assert client.get(url, {"start": tomorrow.isoformat()}).json()["history"] == []
+    assert client.get(url, {"end": "soon"}).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_backfill_command(podcast_chart, fake_backend) -> None:
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    ChartPowerScore.objects.all().delete()
+    out = io.StringIO()
+    call_command(
+        "score_chart_power",
+        start=CHART_DATE - datetime.timedelta(days=1),
+        end=CHART_DATE,
+        stdout=out,
+    )
+    assert "Stored 2 chart power scores for 2 dates" in out.getvalue()
+    podcast = PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="100")
+    assert get_chart_power_history(podcast) == [(CHART_DATE, 1, 1.0)]
@@ -0,0 +1,155 @@
+# test_search.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import httpx
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from podcast_charts.backends import ChartPositionData, MultiplePodcastsFoundError
+from podcast_charts.backends.apple import ApplePodcastsChartBackend
+from podcast_charts.models import PodcastChartPodcastIdentifier, PodcastTitleTrigram
+from podcast_charts.normalize import normalize_title, title_similarity
+from podcast_charts.search import search_podcast_identifiers
+from podcast_charts.tasks import upsert_podcast_identifiers
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def itunes_result(track_id: int, title: str) -> dict:
+    return {
+        "trackId": track_id,
+        "trackName": title,
+        "trackViewUrl": f"https://podcasts.apple.com/us/podcast/id{track_id}",
+        "genreIds": ["26"],
+        "genres": ["Podcasts"],
+    }
+
+
+@pytest.fixture
+def podcasts(db):
+    return [
+        PodcastChartPodcastIdentifier.objects.create(
+            chart_source="apple",
+            chart_source_podcast_id=str(index),
+            podcast_title=title,
+        )
+        for index, title in enumerate(
+            [
+                "The Daily",
+                "Daily Boost",
+                "Crime Junkie",
+                "Café Stories & More",
+                "Stuff You Should Know",
+            ]
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "title,expected",
+    [
+        ("The Joe Rogan Experience", "joe rogan experience"),
+        ("  Café   Crème!! ", "cafe creme"),
+        ("Rock & Roll", "rock and roll"),
+        ("The", "the"),
+        ("", ""),
+    ],
+)
+def test_normalize_title(title: str, expected: str) -> None:
+    assert normalize_title(title) == expected
+
+
+def test_title_similarity() -> None:
+    assert title_similarity("The Daily", "daily") == 1.0
+    assert 0 < title_similarity("Crime Junkie", "Crime Junky") < 1
+    assert title_similarity("", "") == 0.0
+
+
+def test_save_keeps_index_current(podcasts) -> None:
+    podcast = podcasts[2]
+    assert podcast.podcast_title_normalized == "crime junkie"
+    assert podcast.title_trigrams.filter(trigram="jun").exists()
+    podcast.podcast_title = "Serial"
+    podcast.save(update_fields=["podcast_title"])
+    podcast.refresh_from_db()
+    assert podcast.podcast_title_normalized == "serial"
+    assert not podcast.title_trigrams.filter(trigram="jun").exists()
+
+
+def test_search_ranks_matches(podcasts) -> None:
+    results = search_podcast_identifiers("daily")
+    assert [r.podcast_identifier.podcast_title for r in results] == [
+        "The Daily",
+        "Daily Boost",
+    ]
+    assert results[0].similarity == 1.0
+    typo = search_podcast_identifiers("crime junky")
+    assert typo[0].podcast_identifier == podcasts[2]
+    cafe = search_podcast_identifiers("cafe stories")
+    assert cafe[0].podcast_identifier == podcasts[3]
+    assert search_podcast_identifiers("daily", chart_source="other") == []
+    assert search_podcast_identifiers("!!") == []
+
+
+def test_bulk_upsert_indexes_titles(podcasts) -> None:
+    positions = [
+        ChartPositionData(podcast_id="5", position=1, podcast_title="Radiolab"),
+        ChartPositionData(podcast_id="0", position=2, podcast_title="The Daily"),
+    ]
+    upsert_podcast_identifiers("apple", positions)
+    assert search_podcast_identifiers("radiolab")[0].similarity == 1.0
+    assert PodcastTitleTrigram.objects.filter(
+        podcast_identifier__chart_source_podcast_id="5"
+    ).exists()
+
+
+def test_search_view(client, podcasts) -> None:
+    response = client.get(reverse("podcast_charts:podcast_search"), {"q": "daily"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["results"][0]["podcast_title"] == "The Daily"
+    response = client.get(
+        reverse("podcast_charts:podcast_search"), {"q": "daily", "limit": "x"}
+    )
+    assert response.status_code == 400
+
+
+def test_admin_search(admin_client, podcasts) -> None:
+    response = admin_client.get(
+        reverse("admin:podcast_charts_podcastchartpodcastidentifier_changelist"),
+        {"q": "crime junky"},
+    )
+    assert response.status_code == 200
+    assert list(response.context["cl"].result_list) == [podcasts[2]]
+
+
+@pytest.mark.asyncio
+async def test_remote_podcast_disambiguated_by_title(mock_transport) -> None:
+    mock_transport.handler = lambda _request: httpx.Response(
+        200,
+        json={
+            "resultCount": 3,
+            "results": [
+                itunes_result(1, "Daily Boost"),
+                itunes_result(2, "The Daily"),
+                itunes_result(3, "Daily Show"),
+            ],
+        },
+    )
+    backend = ApplePodcastsChartBackend()
+    podcast = await backend.get_remote_podcast_data("the daily")
+    assert podcast.podcast_id == "2"
+    with pytest.raises(MultiplePodcastsFoundError):
+        await backend.get_remote_podcast_data("daily news")
+
+
+def test_benchmark_command(capsys) -> None:
+    call_command("benchmark_podcast_search", count=200, queries=5)
+    output = capsys.readouterr().out
+    assert "p95" in output
+    assert not PodcastChartPodcastIdentifier.objects.exists()
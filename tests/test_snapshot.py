@@ -0,0 +1,109 @@
+# test_snapshot.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import array
+import datetime
+import pickle
+import tracemalloc
+
+import pytest
+
+from podcast_charts.backends import ChartPositionData
+from podcast_charts.models import FetchStatusChoices, PodcastChartVersion
+from podcast_charts.snapshot import ChartSnapshot, load_snapshot, load_snapshots
+
+
+def test_snapshot_lookups() -> None:
+    snapshot = ChartSnapshot.from_rows(
+        1, datetime.date(2024, 12, 1), [(10, 1), (11, 2), (12, 4)]
+    )
+    assert len(snapshot) == 3
+    assert list(snapshot) == [(10, 1), (11, 2), (12, 4)]
+    assert snapshot.position_of(12) == 4
+    assert snapshot.position_of(99) is None
+    assert snapshot.podcast_at(2) == 11
+    assert snapshot.podcast_at(4) == 12
+    assert snapshot.podcast_at(3) is None
+    assert snapshot.podcast_at(0) is None
+    assert not hasattr(snapshot, "__dict__")
+    assert snapshot.positions.tolist() == [1, 2, 4]
+    assert snapshot.podcast_ids[0] == 10
+    with pytest.raises(TypeError):
+        snapshot.positions[0] = 5
+    with pytest.raises(TypeError):
+        snapshot.podcast_ids[0] = 5
+    assert snapshot.position_of(10) == 1
+
+
+def test_snapshot_position_index() -> None:
+    snapshot = ChartSnapshot.from_rows(
+        1, datetime.date(2024, 12, 1), [(30, 1), (10, 2), (20, 5)]
+    )
+    assert snapshot._sorted_ids is None
+    assert [snapshot.position_of(pid) for pid in (10, 20, 30)] == [2, 5, 1]
+    assert snapshot._sorted_ids == array.array("I", [10, 20, 30])
+    for missing in (5, 15, 25, 99):
+        assert snapshot.position_of(missing) is None
+    assert (
+        ChartSnapshot.from_rows(2, datetime.date(2024, 12, 1), []).position_of(10)
+        is None
+    )
+
+
+def test_snapshot_serialization() -> None:
+    snapshot = ChartSnapshot.from_rows(
+        7, datetime.date(2024, 12, 1), [(i + 1000, i + 1) for i in range(200)]
+    )
+    data = snapshot.to_bytes()
+    assert len(data) < 200 * 8 + 32
+    assert ChartSnapshot.from_bytes(data) == snapshot
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot  # noqa: S301
+
+
+def test_snapshot_memory() -> None:
+    rows = [(i + 1000, i + 1) for i in range(200)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    positions = [
+        ChartPositionData(
+            podcast_id=str(pid), position=rank, podcast_title=f"Podcast {pid}"
+        )
+        for pid, rank in rows
+    ]
+    dataclass_size = tracemalloc.get_traced_memory()[0] - before
+    before = tracemalloc.get_traced_memory()[0]
+    snapshot = ChartSnapshot.from_rows(1, datetime.date(2024, 12, 1), rows)
+    snapshot_size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert len(positions) == len(snapshot)
+    assert snapshot_size * 10 < dataclass_size
+
+
+@pytest.mark.django_db
+def test_load_snapshots(
+    store_chart_version, podcast_chart, chart_country, django_assert_num_queries
+):
+    first = store_chart_version(podcast_chart, chart_country, 1, ["1", "2", "3"])
+    second = store_chart_version(podcast_chart, chart_country, 2, ["3", "1"])
+    empty = store_chart_version(podcast_chart, chart_country, 3, [])
+    pending = PodcastChartVersion.objects.create(
+        podcast_chart=podcast_chart,
+        country=chart_country,
+        chart_remote_id=podcast_chart.chart_remote_id,
+        chart_date=datetime.date(2024, 12, 4),
+        fetch_status=FetchStatusChoices.PENDING,
+    )
+    with django_assert_num_queries(2):
+        snapshots = load_snapshots([first, second.id, empty, pending])
+    assert set(snapshots) == {first.id, second.id, empty.id}
+    assert snapshots[second.id].chart_date == datetime.date(2024, 12, 2)
+    assert [position for _, position in snapshots[second.id]] == [1, 2]
+    assert len(snapshots[empty.id]) == 0
+    podcast_id = snapshots[first.id].podcast_at(3)
+    assert snapshots[second.id].position_of(podcast_id) == 1
+    assert load_snapshot(first) == snapshots[first.id]
+    assert load_snapshot(pending) is None
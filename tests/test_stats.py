@@ -0,0 +1,143 @@
+# test_stats.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+
+import pytest
+from django.core.management import call_command
+
+from podcast_charts import stats
+from podcast_charts.models import (
+    ChartCountry,
+    PodcastChartPodcastIdentifier,
+    PodcastChartStats,
+)
+from podcast_charts.stats import get_podcast_chart_stats
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def snapshot() -> dict[str, tuple]:
+    return {
+        stats.podcast_identifier.chart_source_podcast_id: (
+            stats.best_position,
+            stats.last_position,
+            stats.current_streak,
+            stats.days_on_chart,
+            stats.average_position,
+        )
+        for stats in PodcastChartStats.objects.select_related("podcast_identifier")
+    }
+
+
+@pytest.fixture
+def history(store_chart_version, podcast_chart, chart_country):
+    store_chart_version(podcast_chart, chart_country, 1, ["a", "b", "c"])
+    store_chart_version(podcast_chart, chart_country, 2, ["b", "a"])
+    store_chart_version(podcast_chart, chart_country, 3, ["c", "b", "a"])
+
+
+EXPECTED = {
+    "a": (1, 3, 3, 3, 2.0),
+    "b": (1, 2, 3, 3, 5 / 3),
+    "c": (1, 1, 1, 2, 2.0),
+}
+
+
+def test_stats_updated_incrementally(
+    store_chart_version, podcast_chart, chart_country, history
+) -> None:
+    assert snapshot() == EXPECTED
+    store_chart_version(podcast_chart, chart_country, 4, ["d"])
+    stats = snapshot()
+    assert stats["a"] == (1, None, 0, 3, 2.0)
+    assert stats["d"] == (1, 1, 1, 1, 1.0)
+    podcast = PodcastChartPodcastIdentifier.objects.get(chart_source_podcast_id="d")
+    record = get_podcast_chart_stats(podcast, podcast_chart, chart_country)
+    assert record is not None
+    assert record.first_chart_date == datetime.date(2024, 12, 4)
+
+
+def test_stats_rebuilt_for_out_of_order_versions(
+    store_chart_version, podcast_chart, chart_country, history
+) -> None:
+    # Replacing an older version falls back to a rebuild of the chart.
+    store_chart_version(podcast_chart, chart_country, 2, ["c", "a"])
+    assert snapshot() == {
+        "a": (1, 3, 3, 3, 2.0),
+        "b": (2, 2, 1, 2, 2.0),
+        "c": (1, 1, 3, 3, 5 / 3),
+    }
+
+
+def test_stats_replace_latest_version_incrementally(
+    store_chart_version, podcast_chart, chart_country, history, monkeypatch
+) -> None:
+    def fail(key):
+        msg = f"Rebuilt {key}"
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(stats, "rebuild_chart_stats", fail)
+    # A refetch of the latest date swaps its ranking out without a rebuild.
+    store_chart_version(podcast_chart, chart_country, 3, ["d", "a"])
+    store_chart_version(podcast_chart, chart_country, 3, ["a", "e", "b"])
+    replaced = snapshot()
+    dates = set(
+        PodcastChartStats.objects.values_list(
+            "podcast_identifier_id", "first_chart_date", "last_chart_date"
+        )
+    )
+    monkeypatch.undo()
+    assert replaced == {
+        "a": (1, 1, 3, 3, 4 / 3),
+        "b": (1, 3, 3, 3, 2.0),
+        "c": (3, None, 0, 1, 3.0),
+        "e": (2, 2, 1, 1, 2.0),
+    }
+    PodcastChartStats.objects.all().delete()
+    call_command("rebuild_chart_stats")
+    assert snapshot() == replaced
+    assert (
+        set(
+            PodcastChartStats.objects.values_list(
+                "podcast_identifier_id", "first_chart_date", "last_chart_date"
+            )
+        )
+        == dates
+    )
+    store_chart_version(podcast_chart, chart_country, 4, ["c"])
+    assert snapshot()["c"] == (1, 1, 1, 2, 2.0)
+
+
+def test_rebuild_command_matches_incremental(
+    store_chart_version, podcast_chart, chart_country, history
+) -> None:
+    store_chart_version(
+        podcast_chart, ChartCountry.objects.create(country="gb"), 1, ["a"]
+    )
+    incremental = set(
+        PodcastChartStats.objects.values_list(
+            "country__country",
+            "podcast_identifier__chart_source_podcast_id",
+            "current_streak",
+            "position_total",
+        )
+    )
+    PodcastChartStats.objects.all().delete()
+    call_command("rebuild_chart_stats", workers=2)
+    assert (
+        set(
+            PodcastChartStats.objects.values_list(
+                "country__country",
+                "podcast_identifier__chart_source_podcast_id",
+                "current_streak",
+                "position_total",
+            )
+        )
+        == incremental
+    )
+    assert len(incremental) == 4
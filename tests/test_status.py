@@ -0,0 +1,87 @@
+# test_status.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+
+import pytest
+
+from podcast_charts import ChartStatusInvalidError
+from podcast_charts.models import (
+    MAX_CHART_RETRIES,
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChartVersion,
+)
+from podcast_charts.tasks import claim_chart_versions
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+
+@pytest.fixture
+def versions(podcast_chart, chart_country):
+    countries = [chart_country] + [
+        ChartCountry.objects.create(country=code) for code in ("gb", "ca")
+    ]
+    return [
+        PodcastChartVersion.objects.create(
+            podcast_chart=podcast_chart, country=country, chart_date=CHART_DATE
+        )
+        for country in countries
+    ]
+
+
+def test_transition_to_without_reading(versions, django_assert_num_queries) -> None:
+    version = versions[0]
+    assert version.fetch_status == FetchStatusChoices.PENDING
+    with django_assert_num_queries(1):
+        version.transition_to(FetchStatusChoices.FETCHING)
+    version.transition_to(FetchStatusChoices.RETRY, increment_retries=True)
+    assert (version.fetch_status, version.num_retries) == (FetchStatusChoices.RETRY, 1)
+    version.refresh_from_db()
+    assert (version.fetch_status, version.num_retries) == (FetchStatusChoices.RETRY, 1)
+
+
+def test_illegal_transition_raises(versions) -> None:
+    version = versions[0]
+    with pytest.raises(ChartStatusInvalidError):
+        version.transition_to(FetchStatusChoices.RETRY)
+    with pytest.raises(ChartStatusInvalidError):
+        version.transition_to("bogus")
+    version.refresh_from_db()
+    assert version.fetch_status == FetchStatusChoices.PENDING
+
+
+def test_exhausted_retries_cannot_be_fetched(versions) -> None:
+    PodcastChartVersion.objects.filter(id=versions[0].id).update(
+        fetch_status=FetchStatusChoices.RETRY, num_retries=MAX_CHART_RETRIES
+    )
+    moved = PodcastChartVersion.objects.all().transition(FetchStatusChoices.FETCHING)
+    assert moved == 2
+    versions[0].refresh_from_db()
+    assert versions[0].fetch_status == FetchStatusChoices.RETRY
+
+
+def test_bulk_transition_is_all_or_nothing(versions) -> None:
+    versions[0].transition_to(FetchStatusChoices.FETCHING)
+    with pytest.raises(ChartStatusInvalidError):
+        PodcastChartVersion.objects.all().transition(
+            FetchStatusChoices.FETCHING, expected=3
+        )
+    assert (
+        PodcastChartVersion.objects.filter(
+            fetch_status=FetchStatusChoices.FETCHING
+        ).count()
+        == 1
+    )
+
+
+def test_claim_skips_versions_claimed_elsewhere(versions) -> None:
+    stale = list(PodcastChartVersion.objects.all())
+    assert len(claim_chart_versions(versions)) == 3
+    assert claim_chart_versions(stale) == []
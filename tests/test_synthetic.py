@@ -0,0 +1,104 @@
+# test_synthetic.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+import random
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from podcast_charts.models import PodcastChartPosition, PodcastChartVersion
+from podcast_charts.queries import (
+    get_chart_movers,
+    get_current_chart,
+    get_rank_history,
+)
+from podcast_charts.synthetic import (
+    SyntheticHistoryConfig,
+    generate_chart_history,
+    next_ranking,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+END_DATE = datetime.date(2024, 12, 31)
+
+
+@pytest.fixture
+def history():
+    config = SyntheticHistoryConfig(
+        charts=2,
+        countries=3,
+        days=5,
+        chart_size=20,
+        podcasts=100,
+        end_date=END_DATE,
+        batch_size=50,
+    )
+    return generate_chart_history(config)
+
+
+def test_next_ranking_keeps_size_and_uniqueness() -> None:
+    rng = random.Random(1)  # noqa: S311
+    ranking = list(range(50))
+    for _ in range(20):
+        ranking = next_ranking(ranking, list(range(500)), rng, 0.1, 0.05)
+        assert len(ranking) == len(set(ranking)) == 50
+    # A pool no bigger than the chart cannot churn.
+    unchanged = next_ranking(list(range(5)), list(range(5)), rng, 0.5, 0.1)
+    assert sorted(unchanged) == list(range(5))
+
+
+def test_generate_history(history) -> None:
+    assert history.versions == PodcastChartVersion.objects.count() == 30
+    assert history.positions == PodcastChartPosition.objects.count() == 600
+    assert PodcastChartVersion.objects.latest("chart_date").chart_date == END_DATE
+
+
+def test_read_queries(history) -> None:
+    chart, country = history.charts[0], history.countries[0]
+    current = get_current_chart(chart, country)
+    assert [entry.position for entry in current] == list(range(1, 21))
+    assert current == get_current_chart(chart, country, cached=False)
+    rank_history = get_rank_history(current[0].podcast_identifier_id, chart, country)
+    assert rank_history[-1] == (END_DATE, 1)
+    movers = get_chart_movers(chart, country, limit=3)
+    assert len(movers) <= 3
+    assert [abs(m.delta) for m in movers] == sorted(
+        (abs(m.delta) for m in movers), reverse=True
+    )
+    assert movers == get_chart_movers(chart, country, limit=3, cached=False)
+
+
+def test_generate_command_refuses_overlap(capsys) -> None:
+    options = {
+        "charts": 1,
+        "countries": 1,
+        "days": 2,
+        "chart_size": 5,
+        "podcasts": 20,
+        "end_date": END_DATE,
+    }
+    call_command("generate_chart_history", **options)
+    assert "Created 2 versions and 10 positions" in capsys.readouterr().out
+    with pytest.raises(CommandError):
+        call_command("generate_chart_history", **options)
+
+
+def test_benchmark_command_rolls_back(capsys) -> None:
+    call_command(
+        "benchmark_chart_queries",
+        days="2,3",
+        charts=1,
+        countries=2,
+        chart_size=10,
+        podcasts=50,
+        repeat=3,
+    )
+    output = capsys.readouterr().out
+    assert output.count("movers: p50") == 2
+    assert not PodcastChartVersion.objects.exists()
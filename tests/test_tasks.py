@@ -0,0 +1,149 @@
+# test_tasks.py
+#
+# Copyright (c) 2024 Daniel Andrlik
+# All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from podcast_charts import tasks
+from podcast_charts.backends import (
+    AppleChartFetchError,
+    ChartSourceUnavailableError,
+)
+from podcast_charts.models import (
+    MAX_CHART_RETRIES,
+    ChartCountry,
+    FetchStatusChoices,
+    PodcastChartPodcastIdentifier,
+    PodcastChartPosition,
+    PodcastChartVersion,
+)
+from podcast_charts.signals import chart_fetch_run_completed, chart_version_fetched
+from podcast_charts.tasks import (
+    create_pending_chart_versions,
+    fetch_chart_versions,
+    get_versions_to_fetch,
+    release_stale_chart_versions,
+)
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+CHART_DATE = datetime.date(2024, 12, 20)
+
+
+def test_fetch_stores_positions(podcast_chart, fake_backend) -> None:
+    assert create_pending_chart_versions(CHART_DATE) == 1
+    results = fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    assert [r.fetch_status for r in results] == [FetchStatusChoices.DONE]
+    version = PodcastChartVersion.objects.get()
+    assert version.fetch_status == FetchStatusChoices.DONE
+    assert list(
+        PodcastChartPosition.objects.filter(chart_version=version)
+        .order_by("position")
+        .values_list("podcast_identifier__chart_source_podcast_id", flat=True)
+    ) == ["100", "200"]
+    assert (
+        PodcastChartPodcastIdentifier.objects.get(
+            chart_source_podcast_id="100"
+        ).podcast_title
+        == "First"
+    )
+
+
+def test_fetch_marks_versions_for_retry(podcast_chart, fake_backend) -> None:
+    for code in ("gb", "ca", "all"):
+        podcast_chart.enabled_countries.add(ChartCountry.objects.create(country=code))
+    fake_backend.errors = {
+        "gb": ChartSourceUnavailableError("down"),
+        "ca": AppleChartFetchError("bad status"),
+        "all": NotImplementedError("nope"),
+    }
+    create_pending_chart_versions(CHART_DATE)
+    fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    statuses = {
+        v.country.country: (v.fetch_status, v.num_retries)
+        for v in PodcastChartVersion.objects.select_related("country")
+    }
+    assert statuses == {
+        "us": (FetchStatusChoices.DONE, 0),
+        "gb": (FetchStatusChoices.RETRY, 0),
+        "ca": (FetchStatusChoices.RETRY, 1),
+        "all": (FetchStatusChoices.ERROR, 0),
+    }
+    assert get_versions_to_fetch(CHART_DATE).count() == 2
+
+
+def test_fetch_errors_once_retries_are_used_up(podcast_chart, fake_backend) -> None:
+    fake_backend.errors = {"us": AppleChartFetchError("bad status")}
+    create_pending_chart_versions(CHART_DATE)
+    for _ in range(MAX_CHART_RETRIES):
+        fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    version = PodcastChartVersion.objects.get()
+    assert (version.fetch_status, version.num_retries) == (
+        FetchStatusChoices.ERROR,
+        MAX_CHART_RETRIES - 1,
+    )
+    assert not get_versions_to_fetch(CHART_DATE).exists()
+
+
+def test_store_and_receiver_errors_do_not_stop_the_run(
+    podcast_chart, fake_backend, monkeypatch
+) -> None:
+    podcast_chart.enabled_countries.add(ChartCountry.objects.create(country="gb"))
+    runs = []
+
+    def broken_receiver(sender, version, **kwargs):
+        if version.country.country == "gb":
+            msg = "receiver failed"
+            raise RuntimeError(msg)
+
+    def record_run(sender, results, **kwargs):
+        runs.append(results)
+
+    def store_with_error(version, positions):
+        if version.country.country == "us":
+            msg = "store failed"
+            raise RuntimeError(msg)
+        real_persist(version, positions)
+
+    real_persist = tasks.persist_chart_positions
+    monkeypatch.setattr(tasks, "persist_chart_positions", store_with_error)
+    chart_version_fetched.connect(broken_receiver)
+    chart_fetch_run_completed.connect(record_run)
+    try:
+        create_pending_chart_versions(CHART_DATE)
+        fetch_chart_versions(get_versions_to_fetch(CHART_DATE))
+    finally:
+        chart_version_fetched.disconnect(broken_receiver)
+        chart_fetch_run_completed.disconnect(record_run)
+    assert dict(
+        PodcastChartVersion.objects.values_list("country__country", "fetch_status")
+    ) == {"us": FetchStatusChoices.ERROR, "gb": FetchStatusChoices.DONE}
+    assert len(runs[0]) == 2
+
+
+def test_release_stale_chart_versions(podcast_chart, fake_backend) -> None:
+    podcast_chart.enabled_countries.add(ChartCountry.objects.create(country="gb"))
+    create_pending_chart_versions(CHART_DATE)
+    long_ago = timezone.now() - datetime.timedelta(hours=2)
+    PodcastChartVersion.objects.update(
+        fetch_status=FetchStatusChoices.FETCHING, modified=long_ago
+    )
+    PodcastChartVersion.objects.filter(country__country="gb").update(
+        num_retries=MAX_CHART_RETRIES - 1
+    )
+    assert release_stale_chart_versions(datetime.timedelta(hours=3)) == 0
+    assert release_stale_chart_versions() == 2
+    assert {
+        v.country.country: (v.fetch_status, v.num_retries)
+        for v in PodcastChartVersion.objects.select_related("country")
+    } == {
+        "us": (FetchStatusChoices.RETRY, 1),
+        "gb": (FetchStatusChoices.ERROR, MAX_CHART_RETRIES - 1),
+    }
+    assert get_versions_to_fetch(CHART_DATE).count() == 1